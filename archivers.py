@@ -0,0 +1,290 @@
+# minecraft_telegram_bot/archivers.py
+import os
+import struct
+import tarfile
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from config import BACKUP_COMPRESS_WORKERS, get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# File già compressi: le tabelle .ldb di Bedrock sono blocchi zlib, deflate non guadagna nulla
+_STORED_SUFFIXES = (".ldb", ".zip", ".mcpack", ".mcworld", ".mcaddon", ".png", ".jpg", ".jpeg", ".ogg", ".fsb", ".zst")
+# Se deflate non scende sotto questa frazione dell'originale il file viene salvato non compresso
+_MIN_DEFLATE_GAIN = 0.97
+# File più grandi di così vengono compressi in streaming dal writer invece che in memoria dai worker
+_INLINE_LIMIT = 64 * 1024 * 1024
+_CHUNK_SIZE = 1024 * 1024
+_ZIP64_LIMIT = 0xFFFFFFFF
+
+
+class ArchiveError(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class ArchiveEntry:
+    source: str
+    arcname: str
+    length: int  # byte da copiare (i backup a caldo troncano i file alla lunghezza di save query)
+
+
+@dataclass(slots=True)
+class ArchiveStats:
+    archive_path: str
+    files: int
+    input_bytes: int
+    output_bytes: int
+    seconds: float
+
+    @property
+    def ratio(self) -> float:
+        return self.output_bytes / self.input_bytes if self.input_bytes else 1.0
+
+    @property
+    def throughput_mb_s(self) -> float:
+        return self.input_bytes / (1024 * 1024) / self.seconds if self.seconds else 0.0
+
+
+def directory_entries(world_dir: str) -> list[ArchiveEntry]:
+    """Tutti i file di un mondo, con nomi relativi alla cartella dei mondi (come shutil.make_archive)."""
+    worlds_dir = os.path.dirname(os.path.normpath(world_dir))
+    entries = []
+    for dirpath, _, filenames in os.walk(world_dir):
+        for filename in sorted(filenames):
+            full_path = os.path.join(dirpath, filename)
+            arcname = os.path.relpath(full_path, worlds_dir).replace(os.sep, "/")
+            entries.append(ArchiveEntry(full_path, arcname, os.path.getsize(full_path)))
+    return entries
+
+
+def _read_exact(path: str, length: int) -> bytes:
+    with open(path, "rb") as f:
+        data = f.read(length)
+    if len(data) < length:
+        raise ArchiveError(f"{path}: attesi {length} byte, letti {len(data)}.")
+    return data
+
+
+def _dos_datetime(timestamp: float) -> tuple[int, int]:
+    t = time.localtime(max(timestamp, 315532800))  # il formato DOS parte dal 1980
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class Archiver:
+    name = ""
+    extension = ""
+
+    def write(self, archive_path: str, entries: list[ArchiveEntry]) -> ArchiveStats:
+        raise NotImplementedError
+
+
+class LegacyZipArchiver(Archiver):
+    """Lo zip di sempre (zipfile, deflate livello 6 su tutti i file, un solo core): riferimento per i benchmark."""
+    name = "zip-legacy"
+    extension = ".zip"
+
+    def write(self, archive_path: str, entries: list[ArchiveEntry]) -> ArchiveStats:
+        started = time.monotonic()
+        total = 0
+        with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for entry in entries:
+                archive.writestr(entry.arcname, _read_exact(entry.source, entry.length))
+                total += entry.length
+        return ArchiveStats(archive_path, len(entries), total, os.path.getsize(archive_path), time.monotonic() - started)
+
+
+class ParallelZipArchiver(Archiver):
+    """
+    Zip compatibile con qualsiasi estrattore, scritto a mano per poter comprimere
+    i file in parallelo: i worker leggono e comprimono (zlib rilascia il GIL), il
+    thread chiamante scrive header e dati nell'ordine originale. Le tabelle LevelDB
+    e gli altri file già compressi vengono solo archiviati (STORED), così come i file
+    su cui deflate non guadagna almeno il 3%.
+    """
+    name = "zip"
+    extension = ".zip"
+
+    def __init__(self, workers: int = BACKUP_COMPRESS_WORKERS, level: int = 6):
+        self.workers = max(1, workers)
+        self.level = level
+
+    def _should_compress(self, entry: ArchiveEntry) -> bool:
+        return not entry.arcname.lower().endswith(_STORED_SUFFIXES)
+
+    def _prepare(self, entry: ArchiveEntry):
+        """(metodo, crc, dati) calcolati in un worker; None per i file da comprimere in streaming."""
+        if entry.length > _INLINE_LIMIT:
+            return None
+        data = _read_exact(entry.source, entry.length)
+        crc = zlib.crc32(data)
+        if self._should_compress(entry):
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+            compressed = compressor.compress(data) + compressor.flush()
+            if len(compressed) < len(data) * _MIN_DEFLATE_GAIN:
+                return zipfile.ZIP_DEFLATED, crc, compressed
+        return zipfile.ZIP_STORED, crc, data
+
+    def write(self, archive_path: str, entries: list[ArchiveEntry]) -> ArchiveStats:
+        started = time.monotonic()
+        central = []
+        total = 0
+        with open(archive_path, "wb") as out, ThreadPoolExecutor(self.workers, thread_name_prefix="zip") as pool:
+            # Finestra limitata di file in volo: la memoria resta proporzionale ai worker
+            window = self.workers * 2
+            pending = [pool.submit(self._prepare, entry) for entry in entries[:window]]
+            for index, entry in enumerate(entries):
+                prepared = pending[index].result()
+                pending[index] = None
+                if index + window < len(entries):
+                    pending.append(pool.submit(self._prepare, entries[index + window]))
+                offset = out.tell()
+                if prepared is None:
+                    method, crc, compressed_size = self._write_streamed(out, entry)
+                else:
+                    method, crc, data = prepared
+                    out.write(self._local_header(entry, method, crc, len(data), zip64=False))
+                    out.write(data)
+                    compressed_size = len(data)
+                central.append((entry, method, crc, compressed_size, offset))
+                total += entry.length
+            self._write_central_directory(out, central)
+        return ArchiveStats(archive_path, len(entries), total, os.path.getsize(archive_path), time.monotonic() - started)
+
+    def _local_header(self, entry: ArchiveEntry, method: int, crc: int, compressed_size: int, zip64: bool) -> bytes:
+        name = entry.arcname.encode("utf-8")
+        dos_time, dos_date = _dos_datetime(os.path.getmtime(entry.source))
+        extra = struct.pack("<HHQQ", 0x0001, 16, entry.length, compressed_size) if zip64 else b""
+        sizes = (_ZIP64_LIMIT, _ZIP64_LIMIT) if zip64 else (compressed_size, entry.length)
+        return struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 45 if zip64 else 20, 0x0800, method, dos_time, dos_date,
+            crc, *sizes, len(name), len(extra)) + name + extra
+
+    def _write_streamed(self, out, entry: ArchiveEntry) -> tuple[int, int, int]:
+        """File grandi: header provvisorio (zip64), dati in streaming, poi correzione di crc e dimensioni."""
+        method = zipfile.ZIP_DEFLATED if self._should_compress(entry) else zipfile.ZIP_STORED
+        header_offset = out.tell()
+        out.write(self._local_header(entry, method, 0, 0, zip64=True))
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15) if method == zipfile.ZIP_DEFLATED else None
+        crc, compressed_size, remaining = 0, 0, entry.length
+        with open(entry.source, "rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ArchiveError(f"{entry.source}: file più corto del previsto.")
+                remaining -= len(chunk)
+                crc = zlib.crc32(chunk, crc)
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                out.write(chunk)
+                compressed_size += len(chunk)
+        if compressor:
+            tail = compressor.flush()
+            out.write(tail)
+            compressed_size += len(tail)
+        end = out.tell()
+        out.seek(header_offset)
+        out.write(self._local_header(entry, method, crc, compressed_size, zip64=True))
+        out.seek(end)
+        return method, crc, compressed_size
+
+    def _write_central_directory(self, out, central):
+        cd_offset = out.tell()
+        for entry, method, crc, compressed_size, offset in central:
+            name = entry.arcname.encode("utf-8")
+            dos_time, dos_date = _dos_datetime(os.path.getmtime(entry.source))
+            zip64_fields = [value for value in (entry.length, compressed_size, offset) if value >= _ZIP64_LIMIT]
+            extra = struct.pack(f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields) if zip64_fields else b""
+            mode = os.stat(entry.source).st_mode & 0xFFFF
+            out.write(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | 45, 45 if zip64_fields else 20, 0x0800, method,
+                dos_time, dos_date, crc, min(compressed_size, _ZIP64_LIMIT), min(entry.length, _ZIP64_LIMIT),
+                len(name), len(extra), 0, 0, 0, mode << 16, min(offset, _ZIP64_LIMIT)) + name + extra)
+        cd_size = out.tell() - cd_offset
+        count = len(central)
+        if count >= 0xFFFF or cd_size >= _ZIP64_LIMIT or cd_offset >= _ZIP64_LIMIT:
+            zip64_eocd_offset = out.tell()
+            out.write(struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, (3 << 8) | 45, 45, 0, 0, count, count, cd_size, cd_offset))
+            out.write(struct.pack("<IIQI", 0x07064B50, 0, zip64_eocd_offset, 1))
+        out.write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                              min(cd_size, _ZIP64_LIMIT), min(cd_offset, _ZIP64_LIMIT), 0))
+
+
+class ZstdTarArchiver(Archiver):
+    """
+    tar compresso con zstd multi-thread (richiede il pacchetto `zstandard`). In un
+    unico flusso non si può scegliere la compressione per file, ma zstd riconosce
+    i blocchi incomprimibili (le .ldb) e li salva così come sono, senza rallentare.
+    """
+    name = "tar.zst"
+    extension = ".tar.zst"
+
+    def __init__(self, workers: int = BACKUP_COMPRESS_WORKERS, level: int = 3):
+        if zstandard is None:
+            raise ArchiveError("Formato tar.zst non disponibile: installa il pacchetto 'zstandard'.")
+        self.workers = max(1, workers)
+        self.level = level
+
+    def write(self, archive_path: str, entries: list[ArchiveEntry]) -> ArchiveStats:
+        started = time.monotonic()
+        total = 0
+        compressor = zstandard.ZstdCompressor(level=self.level, threads=self.workers, write_checksum=True)
+        with open(archive_path, "wb") as out, compressor.stream_writer(out, closefd=False) as writer, \
+                tarfile.open(fileobj=writer, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+            for entry in entries:
+                info = tarfile.TarInfo(entry.arcname)
+                stat = os.stat(entry.source)
+                info.size, info.mtime, info.mode = entry.length, int(stat.st_mtime), stat.st_mode & 0o7777
+                with open(entry.source, "rb") as f:
+                    tar.addfile(info, f)  # copia esattamente info.size byte, errore se il file è più corto
+                total += entry.length
+        return ArchiveStats(archive_path, len(entries), total, os.path.getsize(archive_path), time.monotonic() - started)
+
+
+ARCHIVERS = {
+    LegacyZipArchiver.name: LegacyZipArchiver,
+    ParallelZipArchiver.name: ParallelZipArchiver,
+    ZstdTarArchiver.name: ZstdTarArchiver,
+}
+ARCHIVE_EXTENSIONS = (".zip", ".tar.zst")
+
+
+def available_archivers() -> list[str]:
+    return [name for name in ARCHIVERS if name != ZstdTarArchiver.name or zstandard is not None]
+
+
+def get_archiver(name: str) -> Archiver:
+    if name not in ARCHIVERS:
+        raise ArchiveError(f"Formato archivio sconosciuto: {name}")
+    return ARCHIVERS[name]()
+
+
+def is_archive(filename: str) -> bool:
+    return filename.endswith(ARCHIVE_EXTENSIONS)
+
+
+def benchmark_archivers(world_dir: str, work_dir: str) -> list[tuple[str, ArchiveStats | str]]:
+    """Scrive il mondo con ogni archiviatore disponibile in work_dir; (nome, statistiche o errore)."""
+    entries = directory_entries(world_dir)
+    results = []
+    for name in available_archivers():
+        archiver = get_archiver(name)
+        archive_path = os.path.join(work_dir, f"bench_{name.replace('.', '_')}{archiver.extension}")
+        try:
+            results.append((name, archiver.write(archive_path, entries)))
+        except (ArchiveError, OSError) as e:
+            # Il mondo è vivo: una compattazione LevelDB può eliminare una tabella durante la lettura
+            results.append((name, str(e)))
+        finally:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+    return results
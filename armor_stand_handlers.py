@@ -4,33 +4,15 @@ import re
 import os
 import subprocess
 import json  # ADD THIS IMPORT - This was missing!
-import shutil
-import uuid
 
-from config import get_logger
+from config import get_logger, BEDROCK_DATA_PATH
+from entity_reader import find_armor_stands
+from leveldb_reader import LevelDBError
+from world_snapshot import SnapshotError, get_world_snapshots
 # hologram_handlers imports are removed as the function using them is removed.
 
 logger = get_logger(__name__)
 
-def copy_world(source_path: str) -> str:
-    """Copies the world to a temporary directory and returns the path to the copy."""
-    temp_dir = os.path.join(os.path.dirname(source_path), str(uuid.uuid4()))
-    try:
-        shutil.copytree(source_path, temp_dir)
-        logger.info(f"World copied to temporary directory: {temp_dir}")
-        return temp_dir
-    except Exception as e:
-        logger.error(f"Failed to copy world: {e}")
-        return ""
-
-async def remove_world_copy(world_copy_path: str) -> None:
-    """Removes the world copy."""
-    try:
-        shutil.rmtree(world_copy_path)
-        logger.info(f"World copy removed from: {world_copy_path}")
-    except Exception as e:
-        logger.error(f"Failed to remove world copy: {e}")
-
 # --- Constants for search_armorstand.py script ---
 # Assumes this handler file (armor_stand_handlers.py) is in the project root.
 _PROJECT_ROOT = os.path.dirname(__file__)
@@ -39,13 +21,40 @@ VENV_PYTHON_EXECUTABLE = os.path.join(SEARCH_SCRIPT_DIR, "venv", "bin", "python"
 SEARCH_ARMORSTAND_SCRIPT = os.path.join(SEARCH_SCRIPT_DIR, "search_armorstand.py")
 # --- End Constants ---
 
-async def get_armor_stand_data_from_script(world_folder_name: str, coordinates_str: str) -> list[dict]:
+async def get_armor_stand_data(world_folder_name: str, coordinates_str: str, data_path: str = BEDROCK_DATA_PATH,
+                               radius: int = 0) -> list[dict]:
+    """
+    Armor stands within `radius` chunks of "x,y,z", read directly from the world LevelDB
+    (digp/actorprefix and legacy per-chunk entity records) while the server keeps running.
+    Same dictionaries as search_armorstand.py; falls back to the script if the database
+    cannot be read.
+    """
+    from world_management import get_world_directory_path
+    world_dir = get_world_directory_path(world_folder_name, data_path)
+    if not world_dir:
+        logger.error(f"World directory for '{world_folder_name}' not found via get_world_directory_path")
+        return []
+    try:
+        x, _, z = (float(part) for part in coordinates_str.split(","))
+    except ValueError:
+        logger.error(f"Invalid coordinates '{coordinates_str}', expected x,y,z")
+        return []
+    try:
+        stands = await asyncio.to_thread(find_armor_stands, world_dir, x, z, radius)
+    except (LevelDBError, OSError) as e:
+        logger.warning(f"LevelDB entity lookup failed ({e}), falling back to search_armorstand.py")
+        return await get_armor_stand_data_from_script(world_folder_name, coordinates_str, data_path)
+    logger.info(f"Found {len(stands)} armor stand(s) within {radius} chunk(s) of {coordinates_str} via LevelDB.")
+    return stands
+
+async def get_armor_stand_data_from_script(world_folder_name: str, coordinates_str: str, data_path: str = BEDROCK_DATA_PATH) -> list[dict]:
     """
     Runs the search_armorstand.py script and parses its JSON output to find armor stand data.
 
     Args:
         world_folder_name: The name of the world folder (e.g., "Bedrock-piombino").
         coordinates_str: The coordinates string "x,y,z".
+        data_path: The server data volume containing the world.
 
     Returns:
         A list of dictionaries, where each dictionary contains data for a found armor stand.
@@ -66,7 +75,7 @@ async def get_armor_stand_data_from_script(world_folder_name: str, coordinates_s
     # Use the same world path resolution as the debug call
     try:
         from world_management import get_world_directory_path
-        world_dir_path_obj = get_world_directory_path(world_folder_name)
+        world_dir_path_obj = get_world_directory_path(world_folder_name, data_path)
         if not world_dir_path_obj or not os.path.exists(world_dir_path_obj):
             logger.error(f"World directory for '{world_folder_name}' not found via get_world_directory_path")
             return []
@@ -78,15 +87,18 @@ async def get_armor_stand_data_from_script(world_folder_name: str, coordinates_s
         world_path_arg = f"../../bds_data/worlds/{world_folder_name}"
         logger.warning(f"Using fallback relative path: {world_path_arg}")
 
-    # Copy the world
-    world_copy_path = copy_world(world_path_arg)
-    if not world_copy_path:
+    # Snapshot of the world (hardlinked tables, copied MANIFEST/logs) shared with concurrent searches
+    snapshots = get_world_snapshots()
+    try:
+        snapshot = await asyncio.to_thread(snapshots.acquire, world_path_arg)
+    except SnapshotError as e:
+        logger.error(f"Failed to snapshot world: {e}")
         return []
-    
+
     cmd = [
         VENV_PYTHON_EXECUTABLE,
         SEARCH_ARMORSTAND_SCRIPT,
-        world_copy_path,
+        snapshot.path,
         coordinates_str
     ]
 
@@ -159,6 +171,6 @@ async def get_armor_stand_data_from_script(world_folder_name: str, coordinates_s
         logger.error(f"An error occurred while running/parsing armor stand script: {e}", exc_info=True)
         return []
     finally:
-        await remove_world_copy(world_copy_path)
+        await asyncio.to_thread(snapshots.release, snapshot)
 
     return armor_stands_data
@@ -45,24 +45,33 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "<b>/saveloc</b> – Dai un nome alla tua posizione attuale\n\n"
 
         "⚙️ <b>Comandi Avanzati</b>\n"
-        "<b>/cmd comando</b> – Console server (più righe, # commenti)\n"
-        "<b>/logs</b> – Ultime 50 righe di log\n\n"
+        "<b>/cmd comando</b> – Console server (più righe, # commenti; invia un file .mcfunction per uno script)\n"
+        "<b>/logs</b> – Log del server, sfogliabili a pagine\n\n"
 
         "💾 <b>Backup &amp; Ripristino</b>\n"
-        "<b>/backup_world</b> – Crea backup (.zip), ferma/riprende server\n"
-        "<b>/list_backups</b> – Elenca e scarica gli ultimi 15 backup\n\n"
+        "<b>/backup_world [hot|cold]</b> – Crea backup (.zip): a caldo senza fermare il server, o con arresto\n"
+        "<b>/list_backups [testo]</b> – Sfoglia, cerca, scarica o ripristina i backup\n"
+        "<b>/backup_schedule</b> – Pianificazione, attesa e retention dei backup automatici\n"
+        "<b>/backup_bench</b> – Confronta velocità e compressione dei formati di backup\n\n"
 
         "🛠️ <b>Server Control</b>\n"
+        "<b>/server [nome]</b> – Elenca i server o scegli quello su cui agiscono i comandi\n"
         "<b>/startserver</b> – Avvia container Docker\n"
         "<b>/stopserver</b> – Arresta container Docker\n"
-        "<b>/restartserver</b> – Riavvia container Docker\n\n"
+        "<b>/restartserver</b> – Riavvia container Docker\n"
+        "<b>/downtime</b> – Tempi di fermo delle ultime operazioni\n"
+        "<b>/stats [1h|6h|24h]</b> – Grafico CPU, RAM, rete e disco del container\n"
+        "<b>/queue</b> – Stato della coda comandi verso la console\n"
+        "<b>/entities [x z] [raggio] [tipo] [nominati]</b> – Entità vicine dall'indice del mondo (<code>aggiorna</code> per aggiornarlo)\n\n"
 
         "🎨 <b>Resource Pack</b>\n"
         "<b>/addresourcepack</b> – Invia file .zip/.mcpack\n"
         "<b>/editresourcepacks</b> – Gestisci ordine o elimina pack attivi\n\n"
 
         "🛠️ <b>Modalità Creativa</b>\n"
-        "<b>/imnotcreative</b> – Resetta flag creativo (richiede conferma)\n\n"
+        "<b>/imnotcreative</b> – Resetta flag creativo (richiede conferma)\n"
+        "<b>/worldsettings</b> – Difficoltà, spawn e game rule del mondo (più modifiche in un riavvio)\n"
+        "<b>/maintenance</b> – Coda di operazioni a server fermo eseguite in un solo arresto/riavvio\n\n"
 
         "✨ <b>Utility</b>\n"
         "<b>/scarica_items</b> – Aggiorna lista item per <b>/give</b>\n\n"
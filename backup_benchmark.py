@@ -0,0 +1,441 @@
+# minecraft_telegram_bot/backup_benchmark.py
+"""
+Benchmark di backup, ripristino, verifica e retention su mondi Bedrock sintetici.
+
+Genera (e riusa tra un'esecuzione e l'altra) un mondo con tabelle .ldb compresse come
+quelle di Bedrock e un .log di scritture recenti, poi misura ogni percorso usato dal bot
+e scrive i risultati in JSON. Non richiede Docker né rete: gira anche in CI.
+
+    python backup_benchmark.py --size 1G --output bench.json
+    python backup_benchmark.py --size 1G --compare bench.json --tolerance 0.25
+"""
+import argparse
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from heapq import merge
+from types import SimpleNamespace
+
+import nbtlib
+
+from config import get_logger
+import backup_catalog
+from archivers import available_archivers, directory_entries, get_archiver, zstandard
+from backup_catalog import BackupCatalog, KIND_SCHEDULED
+from backup_scheduler import RetentionPolicy, prune_scheduled_backups
+from backup_store import BackupStore
+from backup_verifier import verify_backup
+from leveldb_reader import LevelDB, TableFile, write_manifest, write_table
+from region_snapshot import paste_chunks, snapshot_region
+from restore_engine import restore_world
+
+logger = get_logger(__name__)
+
+WORLD_NAME = "Bedrock level"
+_TABLE_BYTES = 2 * 1024 * 1024  # dimensione delle tabelle scritte da Bedrock
+_LOG_FRACTION = 0.04  # parte del mondo ancora nel .log (al massimo _MAX_LOG_BYTES)
+_MAX_LOG_BYTES = 64 * 1024 * 1024
+_RANDOM_FRACTION = 0.6  # parte incomprimibile dei sottochunk
+_SUBCHUNKS = range(-4, 16)
+_ENTITY_CHUNK_RATIO = 8  # un chunk su N ha entità
+_SUBCHUNK_TAG = 0x2F
+_CHUNK_TAGS = (0x2B, 0x2C, 0x31, 0x36)  # Data3D, Version, BlockEntity, FinalizedState
+_ACTOR_TYPES = ("minecraft:armor_stand", "minecraft:cow", "minecraft:sheep", "minecraft:villager_v2", "minecraft:item")
+_MUTATED_CHUNK_RATIO = 50  # chunk riscritti tra il backup completo e quello incrementale
+_PRUNE_HOURS = 24 * 21  # backup programmati orari simulati per la retention
+_MIN_COMPARABLE_SECONDS = 0.05
+_COMPLETE_MARKER = ".complete.json"
+
+
+@dataclass(slots=True)
+class BenchResult:
+    name: str
+    seconds: float
+    bytes: int = 0
+    detail: dict = field(default_factory=dict)
+    error: str = ""
+
+    @property
+    def mb_s(self) -> float:
+        return self.bytes / (1024 * 1024) / self.seconds if self.seconds and self.bytes else 0.0
+
+
+def parse_size(text: str) -> int:
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?", text.strip(), re.IGNORECASE)
+    if not match:
+        raise argparse.ArgumentTypeError(f"dimensione non valida: {text} (es. 100M, 1G, 10G)")
+    return int(float(match.group(1)) * 1024 ** " KMGT".index(match.group(2).upper() or " "))
+
+
+# --- Mondo sintetico ---
+
+class _WorldGenerator:
+    """Record LevelDB di un mondo Bedrock: sottochunk, metadati di chunk, digest ed entità."""
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self._actor_ids = 0
+
+    def subchunk(self) -> bytes:
+        # Versione 9, palette e indici: parte ripetitiva (comprimibile) e parte casuale
+        size = self.rng.randint(3 * 1024, 9 * 1024)
+        random_bytes = int(size * _RANDOM_FRACTION)
+        pattern = self.rng.randbytes(64)
+        repeated = (pattern * ((size - random_bytes) // 64 + 1))[:size - random_bytes]
+        return b"\x09\x01\x00" + self.rng.randbytes(random_bytes) + repeated
+
+    def chunk_records(self, prefix: bytes) -> list[tuple[bytes, bytes]]:
+        records = [(prefix + bytes([_SUBCHUNK_TAG, y & 0xFF]), self.subchunk()) for y in _SUBCHUNKS]
+        records += [(prefix + bytes([tag]), self.rng.randbytes(768 if tag == 0x2B else 4)) for tag in _CHUNK_TAGS]
+        return records
+
+    def actors(self, prefix: bytes, count: int) -> list[tuple[bytes, bytes]]:
+        """Entità NBT little-endian nel chunk, con un campo di riempimento per le dimensioni reali."""
+        cx, cz = struct.unpack_from("<ii", prefix)
+        actors = []
+        for _ in range(count):
+            self._actor_ids += 1
+            padding = self.rng.randint(200, 1100)
+            actor = nbtlib.File({
+                "identifier": nbtlib.String(self.rng.choice(_ACTOR_TYPES)),
+                "UniqueID": nbtlib.Long(self._actor_ids),
+                "Pos": nbtlib.List[nbtlib.Float]([cx * 16 + self.rng.random() * 16, 64.0, cz * 16 + self.rng.random() * 16]),
+                "Rotation": nbtlib.List[nbtlib.Float]([self.rng.choice((0.0, 90.0, 180.0, 270.0)), 0.0]),
+                "CustomName": nbtlib.String(f"bench_{self._actor_ids}" if self.rng.random() < 0.2 else ""),
+                "Attributes": nbtlib.ByteArray(struct.unpack(f"{padding}b", self.rng.randbytes(padding))),
+            })
+            buffer = io.BytesIO()
+            actor.write(buffer, byteorder="little")
+            actors.append((struct.pack(">q", self._actor_ids), buffer.getvalue()))
+        return actors
+
+
+def _chunk_prefixes(count: int) -> list[bytes]:
+    """Prefissi di un'area quadrata di chunk attorno all'origine, in ordine di chiave."""
+    side = max(1, int(count ** 0.5))
+    half = side // 2
+    return sorted(struct.pack("<ii", cx, cz) for cx in range(-half, side - half) for cz in range(-half, side - half))
+
+
+def _world_records(prefixes: list[bytes], generator: _WorldGenerator):
+    """Tutti i record del mondo in ordine di chiave utente (chunk, digp e actorprefix fusi)."""
+    digests, actors = [], []
+    for prefix in prefixes[::_ENTITY_CHUNK_RATIO]:
+        chunk_actors = generator.actors(prefix, generator.rng.randint(1, 6))
+        digests.append((b"digp" + prefix, b"".join(actor_id for actor_id, _ in chunk_actors)))
+        actors += [(b"actorprefix" + actor_id, value) for actor_id, value in chunk_actors]
+    chunks = (record for prefix in prefixes for record in generator.chunk_records(prefix))
+    return merge(chunks, sorted(digests), sorted(actors), key=lambda record: record[0])
+
+
+def _level_dat(level_name: str) -> bytes:
+    level = nbtlib.File({
+        "LevelName": nbtlib.String(level_name),
+        "StorageVersion": nbtlib.Int(10),
+        "GameType": nbtlib.Int(0),
+        "Difficulty": nbtlib.Int(2),
+        "SpawnX": nbtlib.Int(0), "SpawnY": nbtlib.Int(64), "SpawnZ": nbtlib.Int(0),
+        "LastPlayed": nbtlib.Long(int(time.time())),
+    })
+    buffer = io.BytesIO()
+    level.write(buffer, byteorder="little")
+    body = buffer.getvalue()
+    return struct.pack("<ii", 10, len(body)) + body
+
+
+def generate_world(world_dir: str, size_bytes: int, seed: int) -> dict:
+    """
+    Crea un mondo di circa size_bytes: tabelle .ldb da 2 MB distribuite sui livelli 0-2
+    con intervalli di chiavi disgiunti, un .log con le riscritture più recenti di una
+    parte dei chunk, MANIFEST/CURRENT, level.dat e levelname.txt.
+    """
+    started = time.monotonic()
+    db_dir = os.path.join(world_dir, "db")
+    os.makedirs(db_dir)
+    generator = _WorldGenerator(seed)
+    log_bytes = min(int(size_bytes * _LOG_FRACTION), _MAX_LOG_BYTES)
+    # ~16 KB per chunk su disco (sottochunk compressi + metadati + entità)
+    probe = sum(len(value) for _, value in generator.chunk_records(b"\0" * 8))
+    chunk_bytes = int(probe * (_RANDOM_FRACTION + 0.02))
+    prefixes = _chunk_prefixes(max(1, (size_bytes - log_bytes) // chunk_bytes))
+
+    tables, batch, batch_bytes, sequence, number = [], [], 0, 0, 2
+    for key, value in _world_records(prefixes, generator):
+        sequence += 1
+        batch.append((key + struct.pack("<Q", sequence << 8 | 1), value))
+        batch_bytes += len(key) + len(value)
+        if batch_bytes >= _TABLE_BYTES / (_RANDOM_FRACTION + 0.02):
+            tables.append(_flush_table(db_dir, number, batch))
+            batch, batch_bytes, number = [], 0, number + 1
+    if batch:
+        tables.append(_flush_table(db_dir, number, batch))
+    # Le tabelle più recenti (chiavi alte) a livello 0, le successive a 1 e il resto a 2
+    for i, table in enumerate(reversed(tables)):
+        table.level = 0 if i < 2 else 1 if i < 12 else 2
+    write_manifest(db_dir, tables, log_number=number + 1, last_sequence=sequence)
+
+    with LevelDB(db_dir) as db:
+        written, rewrites = 0, generator.rng.sample(prefixes, len(prefixes))
+        while written < log_bytes and rewrites:
+            records = dict(generator.chunk_records(rewrites.pop()))
+            db.write_batch(records)
+            written += sum(len(value) for value in records.values())
+
+    with open(os.path.join(world_dir, "level.dat"), "wb") as f:
+        f.write(_level_dat(WORLD_NAME))
+    with open(os.path.join(world_dir, "levelname.txt"), "w") as f:
+        f.write(WORLD_NAME)
+    info = {
+        "chunks": len(prefixes),
+        "tables": len(tables),
+        "table_bytes": sum(table.size for table in tables),
+        "log_bytes": written,
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    logger.info(f"🧪 Mondo sintetico: {info['chunks']} chunk, {info['tables']} tabelle, "
+                f"{info['table_bytes'] + written} byte in {info['seconds']}s.")
+    return info
+
+
+def _flush_table(db_dir: str, number: int, entries: list[tuple[bytes, bytes]]) -> TableFile:
+    path = os.path.join(db_dir, f"{number:06d}.ldb")
+    size = write_table(path, entries)
+    return TableFile(level=0, number=number, size=size, smallest=entries[0][0], largest=entries[-1][0])
+
+
+def prepare_world(work_dir: str, size_bytes: int, seed: int) -> tuple[str, dict]:
+    """Mondo sintetico in cache per dimensione e seed, copiato con hard link nella cartella di lavoro."""
+    cache_dir = os.path.join(work_dir, "cache", f"world_{size_bytes}_{seed}")
+    marker = os.path.join(cache_dir, _COMPLETE_MARKER)
+    if os.path.exists(marker):
+        with open(marker) as f:
+            info = json.load(f)
+        info["cached"] = True
+    else:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        info = generate_world(os.path.join(cache_dir, WORLD_NAME), size_bytes, seed)
+        with open(marker, "w") as f:
+            json.dump(info, f)
+        info["cached"] = False
+    run_dir = os.path.join(work_dir, "run")
+    shutil.rmtree(run_dir, ignore_errors=True)
+    world_dir = os.path.join(run_dir, "worlds", WORLD_NAME)
+    shutil.copytree(os.path.join(cache_dir, WORLD_NAME), world_dir, copy_function=os.link)
+    return world_dir, info
+
+
+def mutate_world(world_dir: str, seed: int) -> int:
+    """Riscrive una parte dei chunk nel .log, come il server tra due backup. Restituisce i byte scritti."""
+    db_dir = os.path.join(world_dir, "db")
+    for name in os.listdir(db_dir):
+        if name.endswith(".log"):
+            # Il .log è un hard link al mondo in cache: va separato prima di scriverci
+            path = os.path.join(db_dir, name)
+            shutil.copyfile(path, f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+    generator = _WorldGenerator(seed + 1)
+    written = 0
+    with LevelDB(db_dir) as db:
+        prefixes = sorted({key[:8] for key, _ in db.items() if len(key) in (9, 10)})
+        for prefix in generator.rng.sample(prefixes, max(1, len(prefixes) // _MUTATED_CHUNK_RATIO)):
+            records = dict(generator.chunk_records(prefix))
+            db.write_batch(records)
+            written += sum(len(value) for value in records.values())
+    return written
+
+
+# --- Misure ---
+
+def _measure(results: list[BenchResult], name: str, func, *args, size_of=None) -> object:
+    started = time.monotonic()
+    try:
+        value = func(*args)
+    except Exception as e:
+        logger.error(f"🧪❌ {name}: {e}")
+        results.append(BenchResult(name, time.monotonic() - started, error=str(e)))
+        return None
+    result = BenchResult(name, time.monotonic() - started)
+    if size_of:
+        result.bytes, result.detail = size_of(value)
+    results.append(result)
+    logger.info(f"🧪 {name}: {result.seconds:.2f}s" + (f", {result.mb_s:.1f} MB/s" if result.mb_s else ""))
+    return value
+
+
+def _world_bytes(world_dir: str) -> int:
+    return sum(entry.length for entry in directory_entries(world_dir))
+
+
+def bench_archives(results: list[BenchResult], world_dir: str, backups_dir: str) -> dict[str, str]:
+    backups = {}
+    for name in available_archivers():
+        archiver = get_archiver(name)
+        path = os.path.join(backups_dir, f"bench_{name.replace('.', '_')}{archiver.extension}")
+        stats = _measure(results, f"archive:{name}", lambda: archiver.write(path, directory_entries(world_dir)),
+                         size_of=lambda s: (s.input_bytes, {"output_bytes": s.output_bytes, "ratio": round(s.ratio, 4)}))
+        if stats is not None and name != "zip-legacy":
+            backups[name] = path
+    return backups
+
+
+def bench_store(results: list[BenchResult], world_dir: str, backups_dir: str, name: str) -> str | None:
+    store = BackupStore(backups_dir)
+    snapshot = _measure(results, f"store:{name}", store.snapshot_directory, world_dir, f"bench_{name}", WORLD_NAME,
+                        size_of=lambda s: (s.total_bytes, {"new_bytes": s.new_bytes, "reused_hashes": s.reused_hashes}))
+    return snapshot.manifest_path if snapshot else None
+
+
+def bench_restore(results: list[BenchResult], backups: dict[str, str], world_dir: str, restore_root: str):
+    restore_size = lambda r: (r.bytes_written, {"rewritten": r.rewritten, "unchanged": r.unchanged, "removed": r.removed})
+    for name, path in backups.items():
+        # Ripristino in una cartella vuota (mondo perso) e sopra il mondo attuale (rollback)
+        target = os.path.join(restore_root, name.replace(".", "_"), WORLD_NAME)
+        _measure(results, f"restore:{name}:empty", restore_world, path, target, size_of=restore_size)
+        shutil.rmtree(target)
+        shutil.copytree(world_dir, target, copy_function=os.link)
+        _measure(results, f"restore:{name}:differential", restore_world, path, target, size_of=restore_size)
+        shutil.rmtree(os.path.dirname(target))
+
+
+def bench_verify(results: list[BenchResult], backups: dict[str, str], world_bytes: int):
+    for name, path in backups.items():
+        report = _measure(results, f"verify:{name}", verify_backup, path,
+                          size_of=lambda r: (world_bytes, {"summary": r.summary}))
+        if report is not None and not report.ok:
+            results[-1].error = report.error
+
+
+def bench_prune(results: list[BenchResult], manifest_path: str, work_dir: str):
+    """Retention GFS su _PRUNE_HOURS backup orari (copie del manifest) in un catalogo temporaneo."""
+    backups_dir = os.path.dirname(manifest_path)
+    previous_catalog = backup_catalog._catalog
+    backup_catalog._catalog = catalog = BackupCatalog(os.path.join(work_dir, "bench_catalog.sqlite3"))
+    try:
+        now = time.time()
+        for hour in range(_PRUNE_HOURS):
+            path = os.path.join(backups_dir, f"bench_scheduled_{hour:04d}.manifest")
+            shutil.copyfile(manifest_path, path)
+            catalog.add("bench", path, WORLD_NAME, KIND_SCHEDULED, created_at=now - hour * 3600)
+        _measure(results, "prune:gfs", prune_scheduled_backups, SimpleNamespace(name="bench"), RetentionPolicy(),
+                 size_of=lambda r: (r[1], {"deleted": r[0], "scheduled": _PRUNE_HOURS}))
+    finally:
+        backup_catalog._catalog = previous_catalog
+
+
+def bench_paste_snapshot(results: list[BenchResult], world_dir: str, backups_dir: str):
+    """Snapshot dei chunk di un paste 64x64x64 all'origine (alternativa al backup completo dell'hologram)."""
+    chunks = paste_chunks((0, 64, 0), (64, 64, 64))
+    _measure(results, "paste:snapshot_region", snapshot_region, world_dir, chunks, backups_dir, "benchmark",
+             size_of=lambda s: (s.bytes, {"chunks": s.chunks, "records": s.records}))
+
+
+def run_benchmarks(work_dir: str, size_bytes: int, seed: int, only: list[str] | None = None) -> dict:
+    selected = lambda group: not only or group in only
+    world_dir, world_info = prepare_world(work_dir, size_bytes, seed)
+    run_dir = os.path.dirname(os.path.dirname(world_dir))
+    backups_dir = os.path.join(run_dir, "backups")
+    os.makedirs(backups_dir)
+    world_bytes = _world_bytes(world_dir)
+    results: list[BenchResult] = []
+
+    backups = bench_archives(results, world_dir, backups_dir) if selected("archive") else {}
+    if selected("store") or selected("restore") or selected("verify") or selected("prune"):
+        manifest = bench_store(results, world_dir, backups_dir, "full")
+        if manifest:
+            backups["store"] = manifest
+    if selected("paste"):
+        bench_paste_snapshot(results, world_dir, backups_dir)
+    mutated_bytes = mutate_world(world_dir, seed)
+    if selected("store"):
+        bench_store(results, world_dir, backups_dir, "incremental")
+    if selected("restore"):
+        bench_restore(results, backups, world_dir, os.path.join(run_dir, "restore"))
+    if selected("verify"):
+        bench_verify(results, backups, world_bytes)
+    if selected("prune") and "store" in backups:
+        bench_prune(results, backups["store"], run_dir)
+
+    shutil.rmtree(run_dir, ignore_errors=True)
+    return {
+        "meta": {
+            "size_bytes": size_bytes,
+            "world_bytes": world_bytes,
+            "mutated_bytes": mutated_bytes,
+            "seed": seed,
+            "world": world_info,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "zstandard": zstandard is not None,
+            "crc32c": importlib.util.find_spec("crc32c") is not None,
+        },
+        "results": [{**asdict(result), "seconds": round(result.seconds, 4), "mb_s": round(result.mb_s, 2)}
+                    for result in results],
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Misure più lente della baseline oltre la tolleranza (o fallite); vuoto se nessuna regressione."""
+    previous = {result["name"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        if result["error"]:
+            regressions.append(f"{result['name']}: errore: {result['error']}")
+            continue
+        old = previous.get(result["name"])
+        if not old or old["error"] or old["seconds"] < _MIN_COMPARABLE_SECONDS:
+            continue
+        if result["seconds"] > old["seconds"] * (1 + tolerance):
+            regressions.append(f"{result['name']}: {old['seconds']:.2f}s → {result['seconds']:.2f}s "
+                               f"(+{(result['seconds'] / old['seconds'] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark di backup, ripristino, verifica e retention "
+                                                 "su un mondo Bedrock sintetico.")
+    parser.add_argument("--size", type=parse_size, default=parse_size("100M"), help="dimensione del mondo (100M, 1G, 10G)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--work-dir", help="cartella di lavoro; il mondo generato vi resta in cache (default: temporanea)")
+    parser.add_argument("--only", nargs="+", choices=["archive", "store", "restore", "verify", "prune", "paste"])
+    parser.add_argument("--output", help="file JSON dei risultati")
+    parser.add_argument("--compare", help="JSON di una esecuzione precedente: esce con 1 in caso di regressione")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="rallentamento tollerato rispetto a --compare")
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="backup_benchmark_")
+    try:
+        report = run_benchmarks(work_dir, args.size, args.seed, args.only)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    for result in report["results"]:
+        status = f"❌ {result['error']}" if result["error"] else f"{result['seconds']:8.2f}s {result['mb_s']:8.1f} MB/s"
+        print(f"{result['name']:32} {status}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"⚠️ Regressione: {regression}")
+        return 1 if regressions else 0
+    return 1 if any(result["error"] for result in report["results"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+# minecraft_telegram_bot/backup_catalog.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from config import BACKUP_CATALOG_FILE, get_logger
+from archivers import is_archive
+from backup_store import BackupStore, BackupStoreError, is_manifest
+
+logger = get_logger(__name__)
+
+KIND_MANUAL = "manual"
+KIND_SCHEDULED = "scheduled"
+KIND_HOLOGRAM = "hologram"
+KIND_IMPORTED = "imported"
+KIND_NAMES = {
+    KIND_MANUAL: "manuale",
+    KIND_SCHEDULED: "programmato",
+    KIND_HOLOGRAM: "paste ologramma",
+    KIND_IMPORTED: "importato",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    id INTEGER PRIMARY KEY,
+    server TEXT NOT NULL,
+    backups_dir TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    world TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    mode TEXT NOT NULL DEFAULT '',
+    format TEXT NOT NULL DEFAULT '',
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    total_bytes INTEGER NOT NULL DEFAULT 0,
+    checksum TEXT NOT NULL DEFAULT '',
+    duration REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    verify_status TEXT NOT NULL DEFAULT '',
+    verify_error TEXT NOT NULL DEFAULT '',
+    verify_seconds REAL NOT NULL DEFAULT 0,
+    verified_at REAL NOT NULL DEFAULT 0,
+    UNIQUE (backups_dir, filename)
+);
+CREATE INDEX IF NOT EXISTS backups_by_server ON backups (server, created_at DESC);
+"""
+# Colonne aggiunte dopo la prima versione dello schema: aggiunte ai cataloghi esistenti all'apertura
+_MIGRATIONS = {
+    "verify_status": "TEXT NOT NULL DEFAULT ''",
+    "verify_error": "TEXT NOT NULL DEFAULT ''",
+    "verify_seconds": "REAL NOT NULL DEFAULT 0",
+    "verified_at": "REAL NOT NULL DEFAULT 0",
+}
+_COLUMNS = ("id, server, backups_dir, filename, world, kind, mode, format, size_bytes, total_bytes, checksum, duration,"
+            " created_at, verify_status, verify_error, verify_seconds, verified_at")
+
+VERIFY_OK = "ok"
+VERIFY_FAILED = "failed"
+
+
+@dataclass(slots=True)
+class BackupRecord:
+    id: int
+    server: str
+    backups_dir: str
+    filename: str
+    world: str
+    kind: str
+    mode: str
+    format: str
+    size_bytes: int  # spazio occupato (per lo store: byte nuovi aggiunti)
+    total_bytes: int  # dimensione del mondo salvato
+    checksum: str  # sha256 dell'archivio o del manifest
+    duration: float
+    created_at: float
+    verify_status: str = ""  # "", VERIFY_OK o VERIFY_FAILED (vedi backup_verifier.py)
+    verify_error: str = ""
+    verify_seconds: float = 0.0
+    verified_at: float = 0.0
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.backups_dir, self.filename)
+
+    @property
+    def ratio(self) -> float:
+        return self.size_bytes / self.total_bytes if self.total_bytes else 1.0
+
+
+def backup_format(filename: str) -> str:
+    if is_manifest(filename):
+        return "store"
+    return "tar.zst" if filename.endswith(".tar.zst") else "zip"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BackupCatalog:
+    """
+    Indice SQLite dei backup: i metadati sono registrati alla creazione, e /list_backups
+    legge una pagina per volta dall'indice (server, data) senza elencare la cartella.
+    """
+
+    def __init__(self, path: str = BACKUP_CATALOG_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()  # usato anche dai thread di asyncio.to_thread
+        with self._lock, self._db:
+            self._db.executescript(_SCHEMA)
+            existing = {row[1] for row in self._db.execute("PRAGMA table_info(backups)")}
+            for column, definition in _MIGRATIONS.items():
+                if column not in existing:
+                    self._db.execute(f"ALTER TABLE backups ADD COLUMN {column} {definition}")
+
+    def add(self, server: str, path: str, world: str, kind: str, mode: str = "", size_bytes: int | None = None,
+            total_bytes: int = 0, checksum: str = "", duration: float = 0.0, created_at: float | None = None) -> int:
+        backups_dir, filename = os.path.split(path)
+        size = os.path.getsize(path) if size_bytes is None else size_bytes
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT OR REPLACE INTO backups (server, backups_dir, filename, world, kind, mode, format, size_bytes,"
+                " total_bytes, checksum, duration, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (server, backups_dir, filename, world, kind, mode, backup_format(filename), size,
+                 total_bytes or size, checksum, duration, created_at or time.time()))
+            return cursor.lastrowid
+
+    def get(self, backup_id: int) -> BackupRecord | None:
+        with self._lock:
+            row = self._db.execute(f"SELECT {_COLUMNS} FROM backups WHERE id = ?", (backup_id,)).fetchone()
+        return BackupRecord(*row) if row else None
+
+    def delete(self, backup_id: int):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM backups WHERE id = ?", (backup_id,))
+
+    def set_verification(self, backup_id: int, status: str, error: str = "", seconds: float = 0.0):
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE backups SET verify_status = ?, verify_error = ?, verify_seconds = ?, verified_at = ? WHERE id = ?",
+                (status, error, seconds, time.time(), backup_id))
+
+    def needing_verification(self, verified_before: float, limit: int) -> list[BackupRecord]:
+        """Backup mai verificati (prima i più recenti) o verificati prima di `verified_before`, di tutti i server."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM backups WHERE verified_at < ? "
+                "ORDER BY verified_at = 0 DESC, verified_at ASC, created_at DESC LIMIT ?",
+                (verified_before, limit)).fetchall()
+        return [BackupRecord(*row) for row in rows]
+
+    def page(self, server: str, page: int, page_size: int, search: str = "") -> tuple[list[BackupRecord], int]:
+        """Una pagina di backup del server, dal più recente, e il numero totale di risultati."""
+        where, params = "server = ?", [server]
+        if search:
+            where += " AND (filename LIKE ? OR world LIKE ? OR kind LIKE ? OR mode LIKE ?)"
+            params += [f"%{search}%"] * 4
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM backups WHERE {where}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM backups WHERE {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                params + [page_size, page * page_size]).fetchall()
+        return [BackupRecord(*row) for row in rows], total
+
+    def records(self, server: str) -> list[BackupRecord]:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM backups WHERE server = ? ORDER BY created_at DESC", (server,)).fetchall()
+        return [BackupRecord(*row) for row in rows]
+
+    def import_directory(self, server: str, backups_dir: str, world: str) -> int:
+        """Registra i backup presenti su disco ma non nel catalogo (creati prima del catalogo o a mano)."""
+        if not os.path.isdir(backups_dir):
+            return 0
+        with self._lock:
+            known = {name for (name,) in self._db.execute(
+                "SELECT filename FROM backups WHERE backups_dir = ?", (backups_dir,))}
+        added = 0
+        for filename in os.listdir(backups_dir):
+            if filename in known or not (is_archive(filename) or is_manifest(filename)):
+                continue
+            path = os.path.join(backups_dir, filename)
+            size, total, backup_world = None, 0, world
+            if is_manifest(filename):
+                try:
+                    manifest = BackupStore(backups_dir).read_manifest(filename)
+                    size, total = manifest.get("new_bytes"), manifest.get("total_bytes", 0)
+                    backup_world = manifest.get("world", world)
+                except BackupStoreError:
+                    pass
+            self.add(server, path, backup_world, KIND_IMPORTED, size_bytes=size, total_bytes=total,
+                     created_at=os.path.getmtime(path))
+            added += 1
+        if added:
+            logger.info(f"🗂️ Catalogo backup: importati {added} backup esistenti da {backups_dir}.")
+        return added
+
+
+_catalog: BackupCatalog | None = None
+
+
+def get_backup_catalog() -> BackupCatalog:
+    global _catalog
+    if _catalog is None:
+        _catalog = BackupCatalog()
+    return _catalog
@@ -0,0 +1,182 @@
+# minecraft_telegram_bot/backup_delivery.py
+import asyncio
+import html
+import io
+import os
+import secrets
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InputFile
+from telegram.constants import ParseMode
+from telegram.error import TelegramError
+
+from config import TELEGRAM_UPLOAD_LIMIT_MB, TELEGRAM_LOCAL_MODE, get_logger
+from backup_catalog import file_sha256
+
+logger = get_logger(__name__)
+
+EXPORTS_DIR_NAME = ".exports"
+_SEND_ATTEMPTS = 3
+_UPLOAD_TIMEOUT = 600
+_STALE_EXPORT_SECONDS = 24 * 3600
+# Margine per l'overhead multipart: il limite dell'API riguarda la richiesta intera
+_LIMIT_MARGIN = 512 * 1024
+
+
+class _FileSlice(io.RawIOBase):
+    """
+    Finestra [offset, offset + length) di un file, letta a blocchi: httpx la invia in
+    streaming senza mai caricare in memoria né il volume né l'archivio.
+    """
+
+    def __init__(self, path: str, offset: int, length: int):
+        self._file = open(path, "rb")
+        self._offset = offset
+        self._length = length
+        self._position = 0
+        self._file.seek(offset)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = self._length - self._position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        data = self._file.read(size)
+        self._position += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._length}[whence]
+        self._position = max(0, min(self._length, base + offset))
+        self._file.seek(self._offset + self._position)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+@dataclass(slots=True)
+class Delivery:
+    """Invio di un backup in volumi numerati; next_volume permette di riprendere dopo un errore."""
+    id: str
+    chat_id: int
+    path: str
+    filename: str
+    size: int
+    volume_size: int
+    sha256: str = ""
+    next_volume: int = 0
+    temporary: bool = False  # zip esportato da un manifest, da eliminare a invio completato
+
+    @property
+    def volumes(self) -> int:
+        return max(1, -(-self.size // self.volume_size))
+
+    def volume_name(self, index: int) -> str:
+        return self.filename if self.volumes == 1 else f"{self.filename}.{index + 1:03d}"
+
+
+def upload_limit() -> int:
+    """Byte massimi per file: 50 MB con l'API pubblica, fino a 2000 MB con un Bot API server locale."""
+    return TELEGRAM_UPLOAD_LIMIT_MB * 1024 * 1024 - _LIMIT_MARGIN
+
+
+def exports_dir(backups_dir: str) -> str:
+    """Cartella degli zip esportati dai manifest; quelli abbandonati da più di un giorno vengono rimossi."""
+    path = os.path.join(backups_dir, EXPORTS_DIR_NAME)
+    os.makedirs(path, exist_ok=True)
+    cutoff = time.time() - _STALE_EXPORT_SECONDS
+    for name in os.listdir(path):
+        full_path = os.path.join(path, name)
+        if os.path.getmtime(full_path) < cutoff:
+            os.remove(full_path)
+    return path
+
+
+def _open_volume(delivery: Delivery, index: int) -> _FileSlice:
+    offset = index * delivery.volume_size
+    return _FileSlice(delivery.path, offset, min(delivery.volume_size, delivery.size - offset))
+
+
+def _document(delivery: Delivery, index: int, volume: _FileSlice | None):
+    if volume is None:
+        # Il Bot API server locale legge il file direttamente dal disco condiviso (file://)
+        return Path(delivery.path)
+    # read_file_handle=False (python-telegram-bot >= 21.5): il volume viene letto a blocchi durante l'upload
+    return InputFile(volume, filename=delivery.volume_name(index), read_file_handle=False)
+
+
+def _reassembly_hint(delivery: Delivery) -> str:
+    name = html.escape(delivery.filename)
+    parts = "+".join(html.escape(delivery.volume_name(i)) for i in range(delivery.volumes))
+    lines = [
+        f"🧩 <b>{name}</b> inviato in {delivery.volumes} parti. Per ricomporlo:",
+        f"• Linux/macOS: <code>cat {name}.0* &gt; {name}</code>",
+        f"• Windows: <code>copy /b {parts} {name}</code>",
+    ]
+    if delivery.sha256:
+        lines.append(f"🔑 SHA-256: <code>{delivery.sha256}</code>")
+    return "\n".join(lines)
+
+
+async def prepare_delivery(chat_id: int, path: str, filename: str, temporary: bool = False) -> Delivery:
+    size = os.path.getsize(path)
+    volume_size = upload_limit()
+    delivery = Delivery(secrets.token_hex(4), chat_id, path, filename, size, volume_size, temporary=temporary)
+    if delivery.volumes > 1:
+        delivery.sha256 = await asyncio.to_thread(file_sha256, path)
+    return delivery
+
+
+async def send_delivery(bot, delivery: Delivery, deliveries: dict) -> bool:
+    """
+    Invia i volumi a partire da next_volume, ritentando ciascuno; se uno fallisce la
+    consegna resta in `deliveries` e un bottone permette di riprenderla da quel volume.
+    """
+    deliveries[delivery.id] = delivery
+    while delivery.next_volume < delivery.volumes:
+        index = delivery.next_volume
+        caption = f"💾 {delivery.filename}" + (f" – parte {index + 1}/{delivery.volumes}" if delivery.volumes > 1 else "")
+        for attempt in range(1, _SEND_ATTEMPTS + 1):
+            volume = None if TELEGRAM_LOCAL_MODE and delivery.volumes == 1 else _open_volume(delivery, index)
+            try:
+                await bot.send_document(
+                    chat_id=delivery.chat_id, document=_document(delivery, index, volume),
+                    filename=delivery.volume_name(index),
+                    caption=caption, read_timeout=_UPLOAD_TIMEOUT, write_timeout=_UPLOAD_TIMEOUT)
+                break
+            except TelegramError as e:
+                logger.warning(f"📤⚠️ {delivery.volume_name(index)}: tentativo {attempt}/{_SEND_ATTEMPTS} fallito: {e}")
+                if attempt == _SEND_ATTEMPTS:
+                    await bot.send_message(
+                        delivery.chat_id,
+                        f"⚠️ Invio interrotto alla parte {index + 1}/{delivery.volumes} di "
+                        f"<code>{html.escape(delivery.filename)}</code>: {html.escape(str(e))}",
+                        parse_mode=ParseMode.HTML,
+                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(
+                            f"▶️ Riprendi dalla parte {index + 1}", callback_data=f"bk_resume:{delivery.id}")]]))
+                    return False
+                await asyncio.sleep(2 ** attempt)
+            finally:
+                if volume is not None:
+                    volume.close()
+        delivery.next_volume += 1
+
+    deliveries.pop(delivery.id, None)
+    if delivery.volumes > 1:
+        await bot.send_message(delivery.chat_id, _reassembly_hint(delivery), parse_mode=ParseMode.HTML)
+    if delivery.temporary and os.path.exists(delivery.path):
+        os.remove(delivery.path)
+    logger.info(f"📤✅ {delivery.filename} inviato in {delivery.volumes} parti a {delivery.chat_id}.")
+    return True
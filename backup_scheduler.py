@@ -0,0 +1,272 @@
+# minecraft_telegram_bot/backup_scheduler.py
+import asyncio
+import html
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from config import (
+    BACKUP_MODE, BACKUP_IDLE_WAIT, BACKUP_KEEP_HOURLY, BACKUP_KEEP_DAILY, BACKUP_KEEP_WEEKLY,
+    BACKUP_NOTIFY_CHAT_ID, get_logger
+)
+from backup_catalog import BackupRecord, get_backup_catalog, KIND_SCHEDULED
+from backup_store import BackupStore, is_manifest
+from container_state import get_container_watcher
+from player_presence import get_presence_tracker
+from server_registry import ServerContext
+
+logger = get_logger(__name__)
+
+# minuto, ora, giorno del mese, mese, giorno della settimana (0 = domenica)
+_CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+_CRON_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+# Messaggi dei backup programmati inoltrati anche su Telegram (gli altri vanno solo nel log)
+_NOTIFY_PREFIXES = ("💾✅", "❌", "⚠️", "🛑❌", "🚀❌")
+
+
+def _parse_cron_field(spec: str, low: int, high: int) -> frozenset[int]:
+    values = set()
+    for part in spec.split(","):
+        match = re.fullmatch(r"(\*|\d+(?:-\d+)?)(?:/(\d+))?", part)
+        if not match:
+            raise ValueError(f"campo cron non valido: '{part}'")
+        span, step = match.group(1), int(match.group(2) or 1)
+        if span == "*":
+            start, end = low, high
+        elif "-" in span:
+            start, end = map(int, span.split("-"))
+        else:
+            start = int(span)
+            end = high if match.group(2) else start
+        if not (low <= start <= end <= high) or step < 1:
+            raise ValueError(f"campo cron fuori intervallo: '{part}' ({low}-{high})")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule:
+    """Espressione cron a 5 campi (`*/15 * * * *`, `0 3 * * 1-5`, `@daily`...), valutata al minuto."""
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        fields = _CRON_ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"servono 5 campi cron, trovati {len(fields)}")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_cron_field(field, low, high) for field, (low, high) in zip(fields, _CRON_FIELDS))
+        self.weekdays = frozenset(day % 7 for day in weekdays)
+        # Come in cron: se giorno del mese e della settimana sono entrambi ristretti basta uno dei due
+        self._days_restricted = fields[2] != "*"
+        self._weekdays_restricted = fields[4] != "*"
+
+    def matches(self, when: datetime) -> bool:
+        if when.minute not in self.minutes or when.hour not in self.hours or when.month not in self.months:
+            return False
+        day_ok = when.day in self.days
+        weekday_ok = (when.weekday() + 1) % 7 in self.weekdays
+        if self._days_restricted and self._weekdays_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, when: datetime, horizon: timedelta = timedelta(days=8)) -> datetime | None:
+        candidate = when.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        end = when + horizon
+        while candidate <= end:
+            if self.matches(candidate):
+                return candidate
+            candidate += timedelta(minutes=1)
+        return None
+
+
+@dataclass(slots=True)
+class RetentionPolicy:
+    """Grandfather-father-son: il backup più recente di ciascuna delle ultime N ore, giorni e settimane."""
+    hourly: int = BACKUP_KEEP_HOURLY
+    daily: int = BACKUP_KEEP_DAILY
+    weekly: int = BACKUP_KEEP_WEEKLY
+
+    def retained(self, records: list[BackupRecord]) -> set[int]:
+        records = sorted(records, key=lambda r: r.created_at, reverse=True)
+        keep = {records[0].id} if records else set()
+        buckets = (
+            (self.hourly, lambda d: (d.year, d.month, d.day, d.hour)),
+            (self.daily, lambda d: (d.year, d.month, d.day)),
+            (self.weekly, lambda d: d.isocalendar()[:2]),
+        )
+        for count, bucket_of in buckets:
+            seen = set()
+            for record in records:
+                if len(seen) >= count:
+                    break
+                bucket = bucket_of(datetime.fromtimestamp(record.created_at))
+                if bucket not in seen:
+                    seen.add(bucket)
+                    keep.add(record.id)
+        return keep
+
+
+def prune_scheduled_backups(server: ServerContext, policy: RetentionPolicy | None = None) -> tuple[int, int]:
+    """Elimina i backup programmati fuori dalla retention (file e voce di catalogo). Restituisce (eliminati, byte)."""
+    policy = policy or RetentionPolicy()
+    catalog = get_backup_catalog()
+    records = [r for r in catalog.records(server.name) if r.kind == KIND_SCHEDULED]
+    keep = policy.retained(records)
+    deleted, freed, manifests_deleted, backups_dir = 0, 0, False, None
+    for record in records:
+        if record.id in keep:
+            continue
+        try:
+            if os.path.exists(record.path):
+                if not is_manifest(record.filename):
+                    freed += os.path.getsize(record.path)
+                os.remove(record.path)
+        except OSError as e:
+            logger.error(f"⏰❌ Impossibile eliminare {record.filename}: {e}")
+            continue
+        catalog.delete(record.id)
+        deleted += 1
+        if is_manifest(record.filename):
+            manifests_deleted, backups_dir = True, record.backups_dir
+    if manifests_deleted:
+        # I blob dei manifest eliminati vengono liberati dal gc dello store
+        freed += BackupStore(backups_dir).collect_garbage()[1]
+    if deleted:
+        logger.info(f"⏰🧹 Retention '{server.name}': eliminati {deleted} backup programmati, ~{freed} byte liberati.")
+    return deleted, freed
+
+
+class _ScheduledReporter:
+    """Fa le veci del messaggio Telegram nei backup programmati: log sempre, chat di notifica per gli esiti."""
+
+    def __init__(self, bot, server_name: str):
+        self.bot = bot
+        self.server_name = server_name
+
+    async def reply_text(self, text: str, parse_mode=None, reply_markup=None, **kwargs):
+        plain = re.sub(r"<[^>]+>", "", text) if parse_mode else text
+        logger.info(f"⏰ [{self.server_name}] {html.unescape(plain)}")
+        if self.bot and BACKUP_NOTIFY_CHAT_ID and text.startswith(_NOTIFY_PREFIXES):
+            try:
+                await self.bot.send_message(BACKUP_NOTIFY_CHAT_ID, f"⏰ [{self.server_name}] {text}", parse_mode=parse_mode)
+            except Exception as e:
+                logger.warning(f"⏰⚠️ Notifica backup programmato non inviata: {e}")
+
+
+class BackupScheduler:
+    """
+    Backup programmato di un server, controllato ogni minuto dal JobQueue. All'orario
+    previsto il backup resta in attesa finché non ci sono giocatori online (al massimo
+    BACKUP_IDLE_WAIT minuti) e finché il server è occupato da un'altra operazione
+    esclusiva (paste ologramma, ripristino, /imnotcreative...); poi la retention
+    viene applicata in background.
+    """
+
+    def __init__(self, server: ServerContext, schedule: CronSchedule, idle_wait: int = BACKUP_IDLE_WAIT):
+        self.server = server
+        self.schedule = schedule
+        self.idle_wait = timedelta(minutes=idle_wait)
+        self.pending_since: datetime | None = None
+        self.waiting_reason: str | None = None
+        self.last_run: datetime | None = None
+        self.last_result: bool | None = None
+        self._task: asyncio.Task | None = None
+        self._prune_task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _defer(self, reason: str):
+        if reason != self.waiting_reason:
+            logger.info(f"⏰ Backup programmato di '{self.server.name}' rimandato: {reason}.")
+        self.waiting_reason = reason
+
+    async def tick(self, context):
+        now = datetime.now().replace(second=0, microsecond=0)
+        if self.schedule.matches(now) and self.pending_since is None:
+            self.pending_since = now
+        if self.pending_since is None or self.running:
+            return
+        if not get_container_watcher(self.server.container).running:
+            logger.info(f"⏰ Backup programmato di '{self.server.name}' saltato: server fermo.")
+            self.pending_since, self.waiting_reason = None, None
+            return
+        if self.server.busy:
+            self._defer(f"{self.server.operation or 'operazione'} in corso")
+            return
+        players = get_presence_tracker(self.server.container).online_players()
+        if players and now - self.pending_since < self.idle_wait:
+            self._defer(f"{len(players)} giocatori online")
+            return
+        self.pending_since, self.waiting_reason = None, None
+        self._task = asyncio.create_task(self._run(context))
+
+    async def _run(self, context):
+        from world_handlers import run_backup  # world_handlers importa gli handler Telegram
+        reporter = _ScheduledReporter(context.bot, self.server.name)
+        update = SimpleNamespace(message=reporter, callback_query=None, effective_user=None)
+        self.last_run = datetime.now()
+        try:
+            self.last_result = await run_backup(update, context, self.server, BACKUP_MODE, KIND_SCHEDULED)
+        except Exception as e:
+            self.last_result = False
+            logger.error(f"⏰❌ Backup programmato di '{self.server.name}' fallito: {e}", exc_info=True)
+            return
+        if self.last_result and (self._prune_task is None or self._prune_task.done()):
+            self._prune_task = asyncio.create_task(self._prune())
+
+    async def _prune(self):
+        # Sotto il lock del server: un ripristino non può leggere un backup mentre viene eliminato
+        try:
+            async with self.server.exclusive("retention backup"):
+                await asyncio.to_thread(prune_scheduled_backups, self.server)
+        except Exception as e:
+            logger.error(f"⏰❌ Retention dei backup di '{self.server.name}' fallita: {e}", exc_info=True)
+
+    async def stop(self):
+        for task in (self._task, self._prune_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+
+_schedulers: dict[str, BackupScheduler] = {}
+
+
+def start_backup_scheduler(application, server: ServerContext) -> BackupScheduler | None:
+    if not server.config.backup_schedule:
+        return None
+    if application.job_queue is None:
+        logger.error("⏰❌ JobQueue non disponibile: installa python-telegram-bot[job-queue] per i backup programmati.")
+        return None
+    try:
+        schedule = CronSchedule(server.config.backup_schedule)
+    except ValueError as e:
+        logger.error(f"⏰❌ Pianificazione backup di '{server.name}' non valida ({server.config.backup_schedule}): {e}")
+        return None
+    scheduler = _schedulers[server.name] = BackupScheduler(server, schedule)
+    now = datetime.now()
+    application.job_queue.run_repeating(
+        scheduler.tick, interval=60, first=60 - now.second + 1, name=f"backup:{server.name}")
+    logger.info(f"⏰ Backup programmati di '{server.name}': '{schedule.expression}'.")
+    return scheduler
+
+
+def get_backup_scheduler(server: ServerContext) -> BackupScheduler | None:
+    return _schedulers.get(server.name)
+
+
+async def stop_all_backup_schedulers():
+    for scheduler in list(_schedulers.values()):
+        await scheduler.stop()
+    _schedulers.clear()
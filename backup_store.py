@@ -0,0 +1,226 @@
+# minecraft_telegram_bot/backup_store.py
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zipfile
+from dataclasses import dataclass
+
+from config import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST_SUFFIX = ".manifest"
+OBJECTS_DIR_NAME = "objects"
+_CHUNK_SIZE = 1024 * 1024
+# I blob più recenti di così non vengono mai raccolti: potrebbero appartenere
+# a un backup in corso il cui manifest non è ancora stato scritto
+_GC_GRACE_SECONDS = 3600
+
+
+class BackupStoreError(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class ManifestEntry:
+    path: str  # relativo alla cartella dei mondi, es. "Bedrock level/db/000005.ldb"
+    size: int
+    sha256: str
+    mtime_ns: int = 0
+
+
+@dataclass(slots=True)
+class SnapshotResult:
+    manifest_path: str
+    files: int
+    total_bytes: int
+    new_bytes: int
+    reused_hashes: int
+
+
+def is_manifest(filename: str) -> bool:
+    return filename.endswith(MANIFEST_SUFFIX)
+
+
+class BackupStore:
+    """
+    Archivio dei backup indirizzato per contenuto: ogni file del mondo è salvato una
+    sola volta in objects/<sha256[:2]>/<sha256>, e ogni backup è un piccolo manifest
+    JSON (<nome>.manifest) con percorso, dimensione e hash di ciascun file. Le tabelle
+    .ldb di LevelDB non cambiano dopo la compattazione, quindi un nuovo backup scrive
+    solo i file effettivamente modificati.
+    """
+
+    def __init__(self, backups_dir: str):
+        self.backups_dir = backups_dir
+        self.objects_dir = os.path.join(backups_dir, OBJECTS_DIR_NAME)
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def manifest_path(self, name: str) -> str:
+        if not is_manifest(name):
+            name += MANIFEST_SUFFIX
+        return os.path.join(self.backups_dir, name)
+
+    # --- Scrittura ---
+
+    def _store_file(self, source: str, length: int) -> tuple[str, int]:
+        """Copia i primi `length` byte di `source` nello store calcolandone l'hash. Restituisce (hash, byte nuovi)."""
+        os.makedirs(self.objects_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.objects_dir, prefix=".incoming_")
+        try:
+            with os.fdopen(fd, "wb") as out, open(source, "rb") as f:
+                remaining = length
+                while remaining > 0:
+                    chunk = f.read(min(_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    remaining -= len(chunk)
+            if remaining:
+                raise BackupStoreError(f"{source}: attesi {length} byte, letti {length - remaining}.")
+            sha = digest.hexdigest()
+            target = self.object_path(sha)
+            if os.path.exists(target):
+                os.utime(target)  # protegge il blob dal gc finché il manifest non è scritto
+                os.remove(tmp_path)
+                return sha, 0
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+            return sha, length
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _previous_entries(self, world_name: str) -> dict[str, ManifestEntry]:
+        """Voci dell'ultimo manifest dello stesso mondo, per evitare di rileggere i file invariati."""
+        for name in self.list_manifests():
+            try:
+                manifest = self.read_manifest(name)
+            except BackupStoreError:
+                continue
+            if manifest.get("world") == world_name:
+                return {entry.path: entry for entry in _entries(manifest)}
+        return {}
+
+    def snapshot(self, worlds_dir: str, files: list[tuple[str, int]], name: str,
+                 world_name: str, mode: str) -> SnapshotResult:
+        """
+        Salva nello store i file elencati (percorso relativo a worlds_dir, byte da copiare)
+        e scrive il manifest per ultimo: un manifest esistente è sempre completo.
+        """
+        root = os.path.realpath(worlds_dir)
+        previous = self._previous_entries(world_name)
+        entries, total, new_bytes, reused = [], 0, 0, 0
+        for relative_path, length in files:
+            source = os.path.realpath(os.path.join(root, relative_path))
+            if os.path.commonpath([root, source]) != root:
+                raise BackupStoreError(f"Percorso fuori dalla cartella dei mondi: {relative_path}")
+            relative_path = relative_path.replace(os.sep, "/")
+            stat = os.stat(source)
+            cached = previous.get(relative_path)
+            if (cached and cached.size == length == stat.st_size and cached.mtime_ns == stat.st_mtime_ns
+                    and os.path.exists(self.object_path(cached.sha256))):
+                os.utime(self.object_path(cached.sha256))
+                sha = cached.sha256
+                reused += 1
+            else:
+                sha, stored = self._store_file(source, length)
+                new_bytes += stored
+            entries.append(ManifestEntry(relative_path, length, sha, stat.st_mtime_ns))
+            total += length
+
+        manifest_path = self.manifest_path(name)
+        manifest = {
+            "version": 1,
+            "world": world_name,
+            "mode": mode,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "total_bytes": total,
+            "new_bytes": new_bytes,
+            "files": [[e.path, e.size, e.sha256, e.mtime_ns] for e in entries],
+        }
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, separators=(",", ":"))
+        os.replace(tmp_path, manifest_path)
+        logger.info(f"🗃️ Manifest {os.path.basename(manifest_path)}: {len(entries)} file, "
+                    f"{total} byte, {new_bytes} nuovi ({reused} hash riutilizzati).")
+        return SnapshotResult(manifest_path, len(entries), total, new_bytes, reused)
+
+    def snapshot_directory(self, world_dir: str, name: str, world_name: str, mode: str = "cold") -> SnapshotResult:
+        """Snapshot di un mondo fermo: tutti i file della cartella, per intero."""
+        worlds_dir = os.path.dirname(os.path.normpath(world_dir))
+        files = []
+        for dirpath, _, filenames in os.walk(world_dir):
+            for filename in sorted(filenames):
+                full_path = os.path.join(dirpath, filename)
+                files.append((os.path.relpath(full_path, worlds_dir), os.path.getsize(full_path)))
+        return self.snapshot(worlds_dir, files, name, world_name, mode)
+
+    # --- Lettura ---
+
+    def list_manifests(self) -> list[str]:
+        """Nomi dei manifest, dal più recente."""
+        if not os.path.isdir(self.backups_dir):
+            return []
+        names = [f for f in os.listdir(self.backups_dir) if is_manifest(f)]
+        return sorted(names, key=lambda f: os.path.getmtime(os.path.join(self.backups_dir, f)), reverse=True)
+
+    def read_manifest(self, name: str) -> dict:
+        try:
+            with open(self.manifest_path(name)) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise BackupStoreError(f"Manifest '{name}' non leggibile: {e}") from e
+
+    def export_zip(self, name: str, zip_path: str) -> int:
+        """Zip equivalente a quello dei backup classici, per scaricare un backup del store."""
+        total = 0
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for entry in _entries(self.read_manifest(name)):
+                archive.write(self.object_path(entry.sha256), entry.path)
+                total += entry.size
+        return total
+
+    # --- Manutenzione ---
+
+    def collect_garbage(self) -> tuple[int, int]:
+        """Elimina i blob non referenziati da alcun manifest. Restituisce (blob rimossi, byte liberati)."""
+        if not os.path.isdir(self.objects_dir):
+            return 0, 0
+        referenced = set()
+        for name in self.list_manifests():
+            # Un manifest illeggibile blocca il gc: meglio tenere blob in più che perderne
+            referenced.update(entry.sha256 for entry in _entries(self.read_manifest(name)))
+        cutoff = time.time() - _GC_GRACE_SECONDS
+        removed, freed = 0, 0
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for digest in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, digest)
+                if digest in referenced:
+                    continue
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    continue
+                os.remove(path)
+                removed += 1
+                freed += stat.st_size
+            if not os.listdir(prefix_dir):
+                os.rmdir(prefix_dir)
+        if removed:
+            logger.info(f"🗃️🧹 GC store backup: rimossi {removed} blob, {freed} byte liberati.")
+        return removed, freed
+
+
+def _entries(manifest: dict) -> list[ManifestEntry]:
+    return [ManifestEntry(*row) for row in manifest.get("files", [])]
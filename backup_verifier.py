@@ -0,0 +1,293 @@
+# minecraft_telegram_bot/backup_verifier.py
+import asyncio
+import hashlib
+import html
+import os
+import shutil
+import struct
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+import nbtlib
+from telegram.constants import ParseMode
+
+from config import (
+    BACKUP_VERIFY_WORKERS, BACKUP_VERIFY_NICE, BACKUP_VERIFY_MAX_AGE, BACKUP_NOTIFY_CHAT_ID, get_logger
+)
+from archivers import zstandard
+from backup_catalog import get_backup_catalog, VERIFY_OK, VERIFY_FAILED
+from backup_store import BackupStore, is_manifest
+from leveldb_reader import LevelDB, LevelDBError
+from restore_engine import world_relative_path
+
+logger = get_logger(__name__)
+
+_CHUNK_SIZE = 1024 * 1024
+_STALE_BATCH = 5  # backup riverificati per ogni passata periodica
+_STALE_INTERVAL = 3600
+
+
+class VerifyError(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class VerifyReport:
+    ok: bool
+    summary: str
+    error: str = ""
+    seconds: float = 0.0
+
+
+# --- Controlli (eseguiti nei processi del pool) ---
+
+def _init_worker(niceness: int):
+    # Priorità CPU minima: la verifica non deve rubare tempo al server Bedrock
+    try:
+        os.nice(niceness)
+    except OSError:
+        pass
+
+
+def _needed_for_checks(relative_path: str) -> bool:
+    return relative_path == "level.dat" or relative_path.startswith("db" + os.sep)
+
+
+def _consume(stream, target: str | None, digest=None) -> int:
+    """Legge tutto lo stream (così il formato ne verifica il checksum), copiandolo in target se richiesto."""
+    read = 0
+    out = open(target, "wb") if target else None
+    try:
+        while chunk := stream.read(_CHUNK_SIZE):
+            if digest:
+                digest.update(chunk)
+            if out:
+                out.write(chunk)
+            read += len(chunk)
+    finally:
+        if out:
+            out.close()
+    return read
+
+
+def _work_target(work_dir: str, relative_path: str) -> str | None:
+    if not _needed_for_checks(relative_path):
+        return None
+    target = os.path.join(work_dir, relative_path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    return target
+
+
+def _scan_manifest(backup_path: str, work_dir: str) -> int:
+    store = BackupStore(os.path.dirname(backup_path))
+    files = store.read_manifest(os.path.basename(backup_path)).get("files", [])
+    for path, size, sha256, _ in files:
+        relative_path = world_relative_path(path)
+        if relative_path is None:
+            continue
+        blob = store.object_path(sha256)
+        if not os.path.exists(blob):
+            raise VerifyError(f"blob mancante per {path} ({sha256[:12]})")
+        digest = hashlib.sha256()
+        with open(blob, "rb") as f:
+            read = _consume(f, None, digest)
+        if read != size or digest.hexdigest() != sha256:
+            raise VerifyError(f"checksum errato per {path}: lo store è danneggiato")
+        target = _work_target(work_dir, relative_path)
+        if target:
+            try:
+                os.link(blob, target)
+            except OSError:
+                shutil.copyfile(blob, target)
+    return len(files)
+
+
+def _scan_zip(backup_path: str, work_dir: str) -> int:
+    try:
+        with zipfile.ZipFile(backup_path) as archive:
+            members = archive.infolist()
+            for info in members:
+                relative_path = world_relative_path(info.filename)
+                if relative_path is None:
+                    continue
+                # zipfile confronta il CRC a fine lettura (BadZipFile se non corrisponde)
+                with archive.open(info) as stream:
+                    _consume(stream, _work_target(work_dir, relative_path))
+    except zipfile.BadZipFile as e:
+        raise VerifyError(f"zip danneggiato: {e}") from e
+    return len(members)
+
+
+def _scan_tar_zst(backup_path: str, work_dir: str) -> int:
+    if zstandard is None:
+        raise VerifyError("impossibile leggere .tar.zst: installa il pacchetto 'zstandard'")
+    members = 0
+    try:
+        with open(backup_path, "rb") as f, zstandard.ZstdDecompressor().stream_reader(f) as reader, \
+                tarfile.open(fileobj=reader, mode="r|") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                members += 1
+                relative_path = world_relative_path(member.name)
+                if relative_path is not None:
+                    _consume(tar.extractfile(member), _work_target(work_dir, relative_path))
+    except (tarfile.TarError, zstandard.ZstdError) as e:
+        raise VerifyError(f"tar.zst danneggiato: {e}") from e
+    return members
+
+
+def _check_level_dat(path: str) -> str:
+    """Header Bedrock (versione, lunghezza) + NBT little-endian; restituisce LevelName."""
+    if not os.path.exists(path):
+        raise VerifyError("level.dat mancante nel backup")
+    with open(path, "rb") as f:
+        header = f.read(8)
+        if len(header) < 8:
+            raise VerifyError("level.dat troppo corto (header mancante)")
+        _, length = struct.unpack("<ii", header)
+        if length != os.path.getsize(path) - 8:
+            raise VerifyError(f"level.dat troncato: header {length} byte, presenti {os.path.getsize(path) - 8}")
+        try:
+            level = nbtlib.File.parse(f, byteorder="little")
+        except Exception as e:
+            raise VerifyError(f"level.dat non leggibile: {e}") from e
+    return str(level.get("LevelName", "?"))
+
+
+def verify_backup(backup_path: str) -> VerifyReport:
+    """
+    Verifica completa di un backup: checksum di tutti i file (SHA-256 dello store, CRC
+    dello zip, checksum del frame zstd), apertura in sola lettura del LevelDB con
+    controllo di ogni blocco, e parsing di level.dat. Gira in un processo del pool.
+    """
+    started = time.monotonic()
+    work_dir = tempfile.mkdtemp(prefix=".verify_", dir=os.path.dirname(backup_path))
+    try:
+        if is_manifest(backup_path):
+            files = _scan_manifest(backup_path, work_dir)
+        elif backup_path.endswith(".tar.zst"):
+            files = _scan_tar_zst(backup_path, work_dir)
+        elif backup_path.endswith(".zip"):
+            files = _scan_zip(backup_path, work_dir)
+        else:
+            raise VerifyError(f"formato non supportato: {os.path.basename(backup_path)}")
+        level_name = _check_level_dat(os.path.join(work_dir, "level.dat"))
+        try:
+            check = LevelDB(os.path.join(work_dir, "db")).check()
+        except LevelDBError as e:
+            raise VerifyError(f"LevelDB non apribile: {e}") from e
+        if check.errors:
+            raise VerifyError(f"LevelDB danneggiato: {'; '.join(check.errors[:3])}")
+        summary = (f"{files} file, level.dat '{level_name}', LevelDB: {check.tables} tabelle, "
+                   f"{check.blocks} blocchi, {check.entries} voci, {check.log_records} record di log")
+        return VerifyReport(True, summary, seconds=time.monotonic() - started)
+    except Exception as e:
+        return VerifyReport(False, "", str(e), time.monotonic() - started)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# --- Servizio ---
+
+class BackupVerifier:
+    """
+    Verifica i backup in un pool di processi (BACKUP_VERIFY_WORKERS, con priorità
+    BACKUP_VERIFY_NICE) senza bloccare l'event loop; l'esito è salvato nel catalogo.
+    """
+
+    def __init__(self, bot=None):
+        self.bot = bot
+        self._pool: ProcessPoolExecutor | None = None
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=BACKUP_VERIFY_WORKERS, initializer=_init_worker,
+                                             initargs=(BACKUP_VERIFY_NICE,))
+        return self._pool
+
+    def submit(self, backup_id: int) -> asyncio.Task:
+        """Avvia (o riusa, se già in corso) la verifica di un backup del catalogo."""
+        task = self._tasks.get(backup_id)
+        if task is None or task.done():
+            task = self._tasks[backup_id] = asyncio.create_task(self.verify(backup_id))
+            task.add_done_callback(lambda t: self._tasks.pop(backup_id, None) if self._tasks.get(backup_id) is t else None)
+        return task
+
+    async def verify(self, backup_id: int) -> VerifyReport | None:
+        catalog = get_backup_catalog()
+        record = catalog.get(backup_id)
+        if record is None or not os.path.exists(record.path):
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            report = await loop.run_in_executor(self._executor(), verify_backup, record.path)
+        except FileNotFoundError:
+            return None
+        except BrokenProcessPool as e:
+            self._pool = None
+            logger.error(f"🔍❌ Processo di verifica terminato durante {record.filename}: {e}")
+            return None
+        if not os.path.exists(record.path):
+            return None  # eliminato (retention) durante la verifica
+        catalog.set_verification(record.id, VERIFY_OK if report.ok else VERIFY_FAILED, report.error, report.seconds)
+        if report.ok:
+            logger.info(f"🔍✅ Backup {record.filename} verificato in {report.seconds:.1f}s: {report.summary}.")
+        else:
+            logger.error(f"🔍❌ Backup {record.filename} danneggiato: {report.error}")
+            await self._notify(f"🔍❌ [{html.escape(record.server)}] Backup <code>{html.escape(record.filename)}</code> "
+                               f"danneggiato: {html.escape(report.error)}")
+        return report
+
+    async def _notify(self, text: str):
+        if self.bot and BACKUP_NOTIFY_CHAT_ID:
+            try:
+                await self.bot.send_message(BACKUP_NOTIFY_CHAT_ID, text, parse_mode=ParseMode.HTML)
+            except Exception as e:
+                logger.warning(f"🔍⚠️ Notifica verifica backup non inviata: {e}")
+
+    async def verify_stale(self, context=None):
+        """Passata periodica sul catalogo: backup mai verificati o verificati da più di BACKUP_VERIFY_MAX_AGE giorni."""
+        cutoff = time.time() - BACKUP_VERIFY_MAX_AGE * 86400
+        for record in await asyncio.to_thread(get_backup_catalog().needing_verification, cutoff, _STALE_BATCH):
+            await self.submit(record.id)
+
+    async def stop(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        self._tasks.clear()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+_verifier: BackupVerifier | None = None
+
+
+def get_backup_verifier() -> BackupVerifier:
+    global _verifier
+    if _verifier is None:
+        _verifier = BackupVerifier()
+    return _verifier
+
+
+def start_backup_verifier(application) -> BackupVerifier:
+    verifier = get_backup_verifier()
+    verifier.bot = application.bot
+    if BACKUP_VERIFY_MAX_AGE > 0 and application.job_queue is not None:
+        application.job_queue.run_repeating(verifier.verify_stale, interval=_STALE_INTERVAL, first=300,
+                                            name="backup-verify")
+    return verifier
+
+
+async def stop_backup_verifier():
+    global _verifier
+    if _verifier is not None:
+        await _verifier.stop()
+        _verifier = None
@@ -6,15 +6,16 @@ from telegram.ext import (
     CallbackQueryHandler, InlineQueryHandler, filters, ConversationHandler
 )
 
-from config import TOKEN, CONTAINER, logger, WORLD_NAME
+from config import TOKEN, logger, WORLD_NAME, TELEGRAM_API_URL, TELEGRAM_LOCAL_MODE
 
 # Import handlers from their respective files
 from auth_handlers import start, help_command, login, logout, edituser
-from server_handlers import logs_command, cmd_command, stop_server_command, start_server_command, restart_server_command
-from world_handlers import backup_world_command, list_backups_command, imnotcreative_command
+from server_handlers import logs_command, cmd_command, stop_server_command, start_server_command, restart_server_command, downtime_command, stats_command, queue_command, server_command
+from world_handlers import backup_world_command, list_backups_command, imnotcreative_command, worldsettings_command, backup_bench_command, backup_schedule_command
 from quick_action_handlers import menu_command, give_direct_command, tp_direct_command, weather_direct_command
 from item_handlers import scarica_items_command
 from location_handlers import saveloc_command
+from entity_handlers import entities_command
 from resource_pack_handlers import add_resourcepack_command, edit_resourcepacks_command
 from structure_handlers import handle_split_mcstructure, handle_convert2mc, handle_structura_cli
 from user_management import auth_required
@@ -26,6 +27,23 @@ from message_handlers import handle_text_message
 from callback_handlers import callback_query_handler
 from document_handlers import handle_document_message
 from inline_handlers import inline_query_handler
+from console_session import get_console, close_all_consoles
+from log_stream import get_log_follower, stop_all_followers
+from player_presence import get_presence_tracker, stop_all_trackers
+from container_state import get_container_watcher, stop_all_watchers
+from telemetry import get_stats_sampler, stop_all_samplers
+from command_queue import get_dispatcher, stop_all_dispatchers
+from server_registry import list_servers
+from docker_api import close_all_clients
+from restore_engine import recover_interrupted_restore
+from world_management import get_world_target_path, get_backups_storage_path
+from backup_catalog import get_backup_catalog
+from backup_scheduler import start_backup_scheduler, stop_all_backup_schedulers
+from backup_verifier import start_backup_verifier, stop_backup_verifier
+from world_snapshot import stop_world_snapshots
+from entity_index import start_entity_indexer, stop_entity_indexer
+from maintenance import start_maintenance_scheduler, stop_maintenance_scheduler, recover_interrupted_maintenance
+from maintenance_handlers import maintenance_command
 
 async def set_bot_commands(application):
     commands = [
@@ -39,6 +57,8 @@ async def set_bot_commands(application):
         BotCommand("logs", "📄 Vedi log server"),
         BotCommand("backup_world", "💾 Backup mondo"),
         BotCommand("list_backups", "📂 Lista backup"),
+        BotCommand("backup_bench", "⏱️ Benchmark compressione backup"),
+        BotCommand("backup_schedule", "⏰ Backup programmati"),
         BotCommand("addresourcepack", "📦🖼️ Aggiungi resource pack"),
         BotCommand("editresourcepacks", "📦🛠️ Modifica resource pack"),
         BotCommand("logout", "👋 Esci dal bot"),
@@ -46,7 +66,14 @@ async def set_bot_commands(application):
         BotCommand("startserver", "▶️ Avvia server MC"),
         BotCommand("stopserver", "⏹️ Ferma server MC"),
         BotCommand("restartserver", "🔄 Riavvia server MC"),
+        BotCommand("downtime", "⏱️ Tempi di fermo recenti"),
+        BotCommand("stats", "📈 Risorse del container"),
+        BotCommand("queue", "📨 Stato coda comandi"),
+        BotCommand("entities", "🧭 Entità vicine"),
+        BotCommand("server", "🗄️ Scegli il server"),
         BotCommand("imnotcreative", "🛠️ Resetta flag creativo"),
+        BotCommand("worldsettings", "📜 Impostazioni del mondo"),
+        BotCommand("maintenance", "🧰 Finestra di manutenzione"),
         BotCommand("help", "❓ Aiuto comandi")
     ]
     try:
@@ -55,18 +82,85 @@ async def set_bot_commands(application):
     except Exception as e:
         logger.error(f"❌ Errore impostazione comandi Bot: {e}", exc_info=True)
 
+async def start_server_services(container: str):
+    """Servizi per singolo server: ognuno ha log, console, coda e pool Docker propri."""
+    try:
+        follower = get_log_follower(container)
+        tracker = get_presence_tracker(container)
+        get_stats_sampler(container)
+        console = get_console(container)
+        await console.start()
+        get_dispatcher(container).start()
+    except ValueError as e:
+        logger.error(f"🖥️❌ Sessione console non avviata per '{container}': {e}")
+        return
+
+    def on_container_state(previous, state):
+        # Log e console si riconnettono subito quando il container riparte
+        if state == "running":
+            follower.wake()
+            console.wake()
+        elif previous == "running":
+            tracker.mark_all_offline()
+
+    get_container_watcher(container).add_listener(on_container_state)
+
+async def recover_maintenance_leftovers(server):
+    """Il rollback di una finestra interrotta si fa solo se il server non sta già girando su quel mondo."""
+    try:
+        state = await get_container_watcher(server.container).refresh()
+    except Exception as e:
+        logger.warning(f"🧰⚠️ Stato del container '{server.container}' non leggibile ({e}): lo considero acceso.")
+        state = "running"
+    await asyncio.to_thread(recover_interrupted_maintenance,
+                            get_world_target_path(server.world_name, server.data_path),
+                            server_running=state in ("running", "paused", "restarting"))
+
+async def on_startup(application):
+    for server in list_servers():
+        # Un ripristino interrotto da un crash del bot viene completato o annullato prima di tutto
+        recover_interrupted_restore(get_world_target_path(server.world_name, server.data_path))
+        await recover_maintenance_leftovers(server)
+        await asyncio.to_thread(get_backup_catalog().import_directory, server.name,
+                                get_backups_storage_path(server.data_path), server.world_name)
+        await start_server_services(server.container)
+        start_backup_scheduler(application, server)
+    start_backup_verifier(application)
+    start_entity_indexer(application)
+    start_maintenance_scheduler(application)
+
+async def on_shutdown(application):
+    await stop_all_backup_schedulers()
+    await stop_backup_verifier()
+    stop_world_snapshots()
+    await stop_entity_indexer()
+    await stop_maintenance_scheduler()
+    await stop_all_watchers()
+    await stop_all_samplers()
+    await stop_all_dispatchers()
+    await close_all_consoles()
+    await stop_all_trackers()
+    await stop_all_followers()
+    close_all_clients()
+
 def main_sync():
     if not TOKEN:
         logger.critical("🚨 TOKEN Telegram mancante! Il bot non può avviarsi.")
         return
-    if not CONTAINER: # Già loggato in config.py ma ribadire non fa male
+    if not list_servers(): # Già loggato in config.py ma ribadire non fa male
         logger.warning("⚠️  CONTAINER non impostato in config. Funzionalità server limitate.")
     if not WORLD_NAME: # Già loggato in config.py
         logger.warning("⚠️  WORLD_NAME non impostato in config. Funzionalità mondo (backup, RP) limitate.")
 
 
     logger.info("🤖 Inizializzazione Bot Telegram...")
-    application = ApplicationBuilder().token(TOKEN).build()
+    builder = ApplicationBuilder().token(TOKEN).post_init(on_startup).post_shutdown(on_shutdown)
+    if TELEGRAM_API_URL:
+        logger.info(f"🛰️ Bot API server: {TELEGRAM_API_URL} (local mode: {TELEGRAM_LOCAL_MODE})")
+        builder = (builder.base_url(TELEGRAM_API_URL)
+                   .base_file_url(TELEGRAM_API_URL.removesuffix("/bot") + "/file/bot")
+                   .local_mode(TELEGRAM_LOCAL_MODE))
+    application = builder.build()
 
     loop = asyncio.get_event_loop()
     try:
@@ -93,10 +187,19 @@ def main_sync():
     #application.add_handler(CommandHandler("startserver", start_server_command))
     application.add_handler(CommandHandler("stopserver", auth_required(["stopserver"])(stop_server_command)))
     application.add_handler(CommandHandler("restartserver", auth_required(["restartserver"])(restart_server_command)))
+    application.add_handler(CommandHandler("downtime", auth_required(["downtime"])(downtime_command)))
+    application.add_handler(CommandHandler("stats", auth_required(["stats"])(stats_command)))
+    application.add_handler(CommandHandler("queue", auth_required(["queue"])(queue_command)))
+    application.add_handler(CommandHandler("entities", auth_required(["entities"])(entities_command)))
+    application.add_handler(CommandHandler("server", auth_required(["server"])(server_command)))
 
     application.add_handler(CommandHandler("backup_world", auth_required(["backup_world"])(backup_world_command)))
     application.add_handler(CommandHandler("list_backups", auth_required(["list_backups"])(list_backups_command)))
+    application.add_handler(CommandHandler("backup_bench", auth_required(["backup_bench"])(backup_bench_command)))
+    application.add_handler(CommandHandler("backup_schedule", auth_required(["backup_schedule"])(backup_schedule_command)))
     application.add_handler(CommandHandler("imnotcreative", auth_required(["imnotcreative"])(imnotcreative_command)))
+    application.add_handler(CommandHandler("worldsettings", auth_required(["worldsettings"])(worldsettings_command)))
+    application.add_handler(CommandHandler("maintenance", auth_required(["maintenance"])(maintenance_command)))
 
     application.add_handler(CommandHandler("menu", auth_required(["menu"])(menu_command)))
     application.add_handler(CommandHandler("give", auth_required(["give"])(give_direct_command)))
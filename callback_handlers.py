@@ -8,13 +8,18 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
-from config import CONTAINER, get_logger, WORLD_NAME
+from config import get_logger
 from user_management import (
     is_user_authenticated, get_minecraft_username, get_locations,
     delete_location, users_data, save_users # Added save_users
 )
-from docker_utils import run_docker_command, get_online_players_from_server
+from player_presence import get_presence_tracker
+from console_session import ConsoleError
+from command_queue import enqueue_command
 from world_management import get_backups_storage_path, get_world_directory_path
+from backup_store import BackupStore, MANIFEST_SUFFIX, is_manifest
+from backup_delivery import exports_dir, prepare_delivery, send_delivery
+from server_registry import get_update_server
 from resource_pack_management import manage_world_resource_packs_json, ResourcePackError, get_world_active_packs_with_details
 # Assuming these command handlers will be imported or called from here
 # from command_handlers import show_main_menu_buttons, resource_packs_command
@@ -76,7 +81,8 @@ async def handle_cancel_delete_location_callback(update: Update, context: Contex
 async def handle_menu_give_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles the callback for the /give menu."""
     query = update.callback_query
-    if not CONTAINER:
+    server = get_update_server(update)
+    if not server:
          await query.edit_message_text("Errore: CONTAINER non configurato per il comando give.")
          return
     context.user_data["awaiting_give_prefix"] = True
@@ -88,7 +94,8 @@ async def handle_menu_give_callback(update: Update, context: ContextTypes.DEFAUL
 async def handle_give_item_select_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, item_id: str):
     """Handles the callback for selecting an item after typing a prefix."""
     query = update.callback_query
-    if not CONTAINER:
+    server = get_update_server(update)
+    if not server:
          await query.edit_message_text("Errore: CONTAINER non configurato per il comando give.")
          return
     context.user_data["selected_item_for_give"] = item_id
@@ -101,8 +108,9 @@ async def handle_menu_tp_callback(update: Update, context: ContextTypes.DEFAULT_
     query = update.callback_query
     uid = query.from_user.id
     online_players = []
-    if CONTAINER: # Only try to get players if CONTAINER is set
-        online_players = await get_online_players_from_server()
+    server = get_update_server(update)
+    if server: # Only try to get players if CONTAINER is set
+        online_players = await get_presence_tracker(server.container).current_players()
     else: # If CONTAINER is not set, we can't get players
          await query.edit_message_text(
             "Funzione Teleport limitata: CONTAINER non configurato. "
@@ -135,9 +143,9 @@ async def handle_menu_tp_callback(update: Update, context: ContextTypes.DEFAULT_
                         for i in range(0, len(buttons), 2)] # 2 buttons per row
     markup = InlineKeyboardMarkup(keyboard_layout)
     text_reply = "Scegli una destinazione:"
-    if not online_players and CONTAINER: # CONTAINER set, but no players
+    if not online_players and server: # CONTAINER set, but no players
         text_reply = "Nessun giocatore online.\nScegli tra posizioni salvate o coordinate:"
-    elif not CONTAINER and not online_players: # CONTAINER not set
+    elif not server and not online_players: # CONTAINER not set
          text_reply = ("Impossibile ottenere lista giocatori (CONTAINER non settato).\n"
                        "Scegli tra posizioni salvate o coordinate:")
     await query.edit_message_text(text_reply, reply_markup=markup)
@@ -148,7 +156,8 @@ async def handle_tp_saved_callback(update: Update, context: ContextTypes.DEFAULT
     query = update.callback_query
     uid = query.from_user.id
     minecraft_username = get_minecraft_username(uid) # Get username here
-    if not CONTAINER:
+    server = get_update_server(update)
+    if not server:
          await query.edit_message_text("Errore: CONTAINER non configurato per il comando teleport.")
          return
     user_locs = get_locations(uid)
@@ -158,16 +167,15 @@ async def handle_tp_saved_callback(update: Update, context: ContextTypes.DEFAULT
         return
     x, y, z = loc_coords["x"], loc_coords["y"], loc_coords["z"]
     cmd_text = f"tp {minecraft_username} {x} {y} {z}"
-    docker_args = ["docker", "exec",
-                    CONTAINER, "send-command", cmd_text]
-    await run_docker_command(docker_args, read_output=False)
+    await enqueue_command(cmd_text, user_id=uid, container=server.container)
     await query.edit_message_text(f"Teleport eseguito su '{location_name}': {x:.2f}, {y:.2f}, {z:.2f}")
 
 
 async def handle_tp_coords_input_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles the callback to initiate teleport by coordinates input."""
     query = update.callback_query
-    if not CONTAINER:
+    server = get_update_server(update)
+    if not server:
          await query.edit_message_text("Errore: CONTAINER non configurato per il comando teleport.")
          return
     context.user_data["awaiting_tp_coords_input"] = True
@@ -179,20 +187,20 @@ async def handle_tp_player_callback(update: Update, context: ContextTypes.DEFAUL
     query = update.callback_query
     uid = query.from_user.id
     minecraft_username = get_minecraft_username(uid) # Get username here
-    if not CONTAINER:
+    server = get_update_server(update)
+    if not server:
          await query.edit_message_text("Errore: CONTAINER non configurato per il comando teleport.")
          return
     cmd_text = f"tp {minecraft_username} {target_player}"
-    docker_cmd_args = ["docker", "exec",
-                        CONTAINER, "send-command", cmd_text]
-    await run_docker_command(docker_cmd_args, read_output=False)
+    await enqueue_command(cmd_text, user_id=uid, container=server.container)
     await query.edit_message_text(f"Teleport verso {target_player} eseguito!")
 
 
 async def handle_menu_weather_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles the callback for the /weather menu."""
     query = update.callback_query
-    if not CONTAINER:
+    server = get_update_server(update)
+    if not server:
         await query.edit_message_text("Errore: CONTAINER non configurato per il comando weather.")
         return
     buttons = [
@@ -211,20 +219,20 @@ async def handle_menu_weather_callback(update: Update, context: ContextTypes.DEF
 async def handle_weather_set_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, weather_condition: str):
     """Handles the callback to set the weather."""
     query = update.callback_query
-    if not CONTAINER:
+    server = get_update_server(update)
+    if not server:
         await query.edit_message_text("Errore: CONTAINER non configurato per il comando weather.")
         return
     cmd_text = f"weather {weather_condition}"
-    docker_cmd_args = ["docker", "exec",
-                        CONTAINER, "send-command", cmd_text]
-    await run_docker_command(docker_cmd_args, read_output=False)
+    await enqueue_command(cmd_text, user_id=query.from_user.id, container=server.container)
     await query.edit_message_text(f"Meteo impostato su: {weather_condition.capitalize()}")
 
 
 async def handle_download_backup_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, backup_filename: str):
     """Handles the callback to download a backup file."""
     query = update.callback_query
-    backups_dir = get_backups_storage_path() # This function should handle if path is not configured
+    server = get_update_server(update)
+    backups_dir = get_backups_storage_path(server.data_path) if server else None
     if not backups_dir:
         await query.edit_message_text("Errore: Percorso dei backup non configurato nel bot.")
         return
@@ -240,13 +248,18 @@ async def handle_download_backup_callback(update: Update, context: ContextTypes.
             original_reply_markup = query.message.reply_markup # Save for potential restore
             await query.edit_message_text(f"{original_message_text}\n\n⏳ Preparazione invio di '{html.escape(backup_filename)}'...", reply_markup=None) # Remove buttons during processing
 
-            with open(backup_file_path, "rb") as backup_file:
-                await context.bot.send_document(
-                    chat_id=query.message.chat_id,
-                    document=backup_file,
-                    filename=os.path.basename(backup_file_path),
-                    caption=f"Backup del mondo: {os.path.basename(backup_file_path)}"
-                )
+            if is_manifest(backup_filename):
+                # I backup dello store vengono ricomposti in uno zip temporaneo per l'invio
+                send_name = f"{backup_filename[:-len(MANIFEST_SUFFIX)]}.zip"
+                send_path = os.path.join(exports_dir(backups_dir), send_name)
+                await asyncio.to_thread(BackupStore(backups_dir).export_zip, backup_filename, send_path)
+            else:
+                send_path, send_name = backup_file_path, os.path.basename(backup_file_path)
+            # Oltre il limite di upload l'archivio viene inviato in volumi numerati, con ripresa
+            delivery = await prepare_delivery(query.message.chat_id, send_path, send_name,
+                                              temporary=send_path != backup_file_path)
+            if not await send_delivery(context.bot, delivery, context.bot_data.setdefault("backup_deliveries", {})):
+                return
             # Optionally, restore the original message text and buttons or send a new confirmation.
             # For simplicity, just send a new message:
             await query.message.reply_text(f"✅ File '{html.escape(backup_filename)}' inviato!")
@@ -265,11 +278,26 @@ async def handle_download_backup_callback(update: Update, context: ContextTypes.
         await query.edit_message_text(f"⚠️ File di backup non trovato: <code>{html.escape(backup_filename)}</code>. Potrebbe essere stato spostato o cancellato.", parse_mode=ParseMode.HTML)
 
 
+async def handle_resume_delivery_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, delivery_id: str):
+    """Riprende l'invio a volumi di un backup dalla parte che non è stata consegnata."""
+    query = update.callback_query
+    delivery = context.bot_data.get("backup_deliveries", {}).get(delivery_id)
+    if delivery is None or not os.path.exists(delivery.path):
+        await query.edit_message_text("❓ Invio non più disponibile: richiedi di nuovo il download del backup.")
+        return
+    await query.edit_message_text(
+        f"⏳ Ripresa dell'invio di '{html.escape(delivery.filename)}' dalla parte "
+        f"{delivery.next_volume + 1}/{delivery.volumes}...")
+    if await send_delivery(context.bot, delivery, context.bot_data["backup_deliveries"]):
+        await query.message.reply_text(f"✅ File '{html.escape(delivery.filename)}' inviato!")
+
+
 async def handle_rp_manage_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, pack_uuid: str):
     """Handles the callback to manage a specific resource pack."""
     query = update.callback_query
     try:
-        active_packs_details = await asyncio.to_thread(get_world_active_packs_with_details, WORLD_NAME)
+        server = get_update_server(update)
+        active_packs_details = await asyncio.to_thread(get_world_active_packs_with_details, server.world_name, server.data_path)
         pack_details = next(
             (p for p in active_packs_details if p['uuid'] == pack_uuid), None)
         pack_name = pack_details.get(
@@ -298,10 +326,12 @@ async def handle_rp_manage_callback(update: Update, context: ContextTypes.DEFAUL
 async def handle_rp_action_delete_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, pack_uuid_to_delete: str):
     """Handles the callback to delete a resource pack."""
     query = update.callback_query
+    server = get_update_server(update)
     try:
         manage_world_resource_packs_json(
-            WORLD_NAME,
-            pack_uuid_to_remove=pack_uuid_to_delete
+            server.world_name,
+            pack_uuid_to_remove=pack_uuid_to_delete,
+            data_path=server.data_path
         )
         logger.info(
             f"Resource pack {pack_uuid_to_delete} rimosso — ricordati di /restartserver per applicare.")
@@ -358,7 +388,9 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
     # Import hologram handlers
     from hologram_handlers import (
         handle_hologram_confirm_paste_callback,
-        handle_hologram_cancel_paste_callback
+        handle_hologram_cancel_paste_callback,
+        handle_hologram_undo_paste_callback,
+        handle_hologram_queue_paste_callback
     )
 
     if data == "wizard_action:download_split":
@@ -394,7 +426,8 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
 
     # Centralized Minecraft username check for most actions
     actions_not_requiring_mc_username = [
-        "edit_username", "download_backup_file:",
+        "edit_username", "download_backup_file:", "logs_page:", "select_server:",
+        "bk_page:", "bk:", "bk_dl:", "bk_vf:", "bk_rs:", "bk_resume:",
         "rp_action:cancel_manage", "rp_action:cancel_edit",
         # Wizard actions are handled above and manage their own username needs.
         # Structura opacity is also handled above.
@@ -422,12 +455,12 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
     is_action_requiring_container = any(data.startswith(
         action_prefix) for action_prefix in actions_requiring_container)
 
-    # Specific check for "menu_tp" as it calls get_online_players_from_server
+    # Specific check for "menu_tp" as it reads the online players of the server
     if data == "menu_tp":
         is_action_requiring_container = True
 
 
-    if not CONTAINER and is_action_requiring_container:
+    if not get_update_server(update) and is_action_requiring_container:
         # Allow delete_location and edit_username even if CONTAINER is not set, as they are user data ops
         # delete_loc: is for deleting, not directly interacting with server.
         if not (data == "delete_location" or data.startswith("delete_loc:") or data == "edit_username"):
@@ -489,6 +522,13 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
             from world_handlers import restore_backup_command
             await restore_backup_command(update, context, backup_filename_from_callback)
 
+        elif data.startswith("bk_resume:"):
+            await handle_resume_delivery_callback(update, context, data.split(":", 1)[1])
+
+        elif data.startswith(("bk_page:", "bk:", "bk_dl:", "bk_rs:", "bk_vf:")):
+            from world_handlers import handle_backup_callback
+            await handle_backup_callback(update, context, data)
+
         elif data.startswith("rp_manage:"):
             pack_uuid = data.split(":", 1)[1]
             await handle_rp_manage_callback(update, context, pack_uuid)
@@ -512,6 +552,21 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
             await handle_hologram_cancel_paste_callback(update, context)
             return # Return as this handler manages its own messages
 
+        elif data.startswith("hologram_undo_paste"):
+            await handle_hologram_undo_paste_callback(update, context, data.partition(":")[2])
+            return
+
+        elif data == "hologram_queue_paste":
+            await handle_hologram_queue_paste_callback(update, context)
+            return
+
+        elif data.startswith("logs_page:"):
+            from server_handlers import handle_logs_page_callback
+            await handle_logs_page_callback(update, context, data.split(":", 1)[1])
+        elif data.startswith("select_server:"):
+            from server_handlers import handle_select_server_callback
+            await handle_select_server_callback(update, context, data.split(":", 1)[1])
+
         else:
             logger.warning(f"Unhandled callback_query data: {data}")
             await query.edit_message_text("Azione non riconosciuta o scaduta.")
@@ -523,6 +578,9 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
         await query.edit_message_text(f"Errore dal server Minecraft: {html.escape(error_detail)}. Riprova o contatta un admin.")
         logger.error(
             f"CalledProcessError in callback_query_handler for data '{data}': {e}", exc_info=True)
+    except ConsoleError as e:
+        await query.edit_message_text(f"Console del server non raggiungibile: {html.escape(str(e))}. Riprova più tardi.")
+        logger.error(f"ConsoleError in callback_query_handler for data '{data}': {e}")
     except ValueError as e: # Catch general ValueErrors that might not be handled by specific blocks
         await query.edit_message_text(f"Errore nei dati forniti: {html.escape(str(e))}")
         logger.error(f"ValueError in callback_query_handler for data '{data}': {e}", exc_info=True)
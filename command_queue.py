@@ -0,0 +1,259 @@
+# minecraft_telegram_bot/command_queue.py
+import asyncio
+import re
+import time
+from collections import OrderedDict, deque
+
+from config import CONTAINER, CONSOLE_RATE, CONSOLE_BURST, get_logger
+from console_session import get_console
+from user_management import get_user_data
+
+logger = get_logger(__name__)
+
+# Classi di priorità (valore più basso = servito prima)
+PRIORITY_MAINTENANCE = 0
+PRIORITY_MODERATOR = 1
+PRIORITY_PLAYER = 2
+PRIORITY_NAMES = {PRIORITY_MAINTENANCE: "manutenzione", PRIORITY_MODERATOR: "moderatori", PRIORITY_PLAYER: "giocatori"}
+_AUTH_LEVEL_PRIORITIES = {"admin": PRIORITY_MAINTENANCE, "moderator": PRIORITY_MODERATOR}
+
+# Comandi idempotenti: più richieste identiche in coda diventano un solo invio
+# (niente tp: teletrasporti relativi o con selettori non danno lo stesso risultato se ripetuti)
+_COALESCIBLE_RE = re.compile(r"^(weather|time set|list|gamerule|difficulty)\b", re.IGNORECASE)
+
+
+def priority_for_user(user_id: int | None) -> int:
+    """Richieste interne del bot (user_id None) e admin hanno la priorità di manutenzione."""
+    if user_id is None:
+        return PRIORITY_MAINTENANCE
+    user_data = get_user_data(user_id) or {}
+    return _AUTH_LEVEL_PRIORITIES.get(user_data.get("auth_level"), PRIORITY_PLAYER)
+
+
+class _QueuedCommand:
+    __slots__ = ("command", "key", "user_key", "priority", "enqueued_at", "futures")
+
+    def __init__(self, command: str, user_key, priority: int, coalesce: bool):
+        self.command = command
+        self.key = " ".join(command.split()).lower() if coalesce else None
+        self.user_key = user_key
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.futures = [asyncio.get_running_loop().create_future()]
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CommandDispatcher:
+    """
+    Unico punto di invio verso la console del server: code per classe di priorità,
+    round-robin tra utenti nella stessa classe, token bucket e coalescenza dei
+    comandi idempotenti identici ancora in coda.
+    """
+    WAIT_SAMPLES = 500
+
+    def __init__(self, container: str, rate: float = CONSOLE_RATE, burst: int = CONSOLE_BURST):
+        self.container = container
+        self.bucket = TokenBucket(rate, burst)
+        # priorità -> OrderedDict(utente -> deque di comandi); l'ordine degli utenti è il turno
+        self._queues = {p: OrderedDict() for p in PRIORITY_NAMES}
+        self._pending_by_key: dict[str, _QueuedCommand] = {}
+        self._inflight_queries: dict[tuple, asyncio.Future] = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.waits = deque(maxlen=self.WAIT_SAMPLES)
+        self.counters = {"enqueued": 0, "sent": 0, "coalesced": 0, "failed": 0}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for users in self._queues.values():
+            for items in users.values():
+                for item in items:
+                    for future in item.futures:
+                        if not future.done():
+                            future.cancel()
+            users.clear()
+        self._pending_by_key.clear()
+
+    def depth(self) -> dict:
+        return {p: sum(len(items) for items in users.values()) for p, users in self._queues.items()}
+
+    async def submit(self, command: str, user_id: int | None = None, priority: int | None = None,
+                     coalesce: bool | None = None, timeout: float = 30):
+        """Accoda un comando e attende che sia stato inviato alla console."""
+        command = command.strip()
+        if not command:
+            return
+        self.start()
+        if coalesce is None:
+            coalesce = bool(_COALESCIBLE_RE.match(command))
+        item = _QueuedCommand(command, user_id, priority_for_user(user_id) if priority is None else priority, coalesce)
+        self.counters["enqueued"] += 1
+
+        future = item.futures[0]
+        existing = self._pending_by_key.get(item.key) if item.key else None
+        if existing is not None:
+            # Stesso comando già in coda: si attende il suo invio
+            self.counters["coalesced"] += 1
+            existing.futures.append(future)
+            if item.priority < existing.priority:
+                self._move(existing, item.priority)
+            item = existing
+        else:
+            self._queues[item.priority].setdefault(item.user_key, deque()).append(item)
+            if item.key:
+                self._pending_by_key[item.key] = item
+            self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            # Chi riceve l'errore potrebbe riprovare: il comando non deve partire comunque più tardi
+            self._withdraw(item, future)
+            raise
+
+    def _withdraw(self, item: _QueuedCommand, future: asyncio.Future):
+        """Ritira la richiesta scaduta; il comando esce dalla coda se nessun altro lo attende più."""
+        if future in item.futures:
+            item.futures.remove(future)
+        future.cancel()
+        if item.futures:
+            return
+        items = self._queues[item.priority].get(item.user_key)
+        if items is None or item not in items:
+            return  # già prelevato dal dispatcher: l'invio è in corso
+        items.remove(item)
+        if not items:
+            del self._queues[item.priority][item.user_key]
+        if item.key and self._pending_by_key.get(item.key) is item:
+            del self._pending_by_key[item.key]
+
+    def _move(self, item: _QueuedCommand, priority: int):
+        """Promuove un comando coalescato alla priorità più alta tra i richiedenti."""
+        users = self._queues[item.priority]
+        items = users.get(item.user_key)
+        if items is None or item not in items:
+            return
+        items.remove(item)
+        if not items:
+            del users[item.user_key]
+        item.priority = priority
+        self._queues[priority].setdefault(item.user_key, deque()).append(item)
+
+    def _next_item(self) -> _QueuedCommand | None:
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            if not users:
+                continue
+            user_key, items = next(iter(users.items()))
+            item = items.popleft()
+            # Round-robin: l'utente servito passa in fondo al turno
+            del users[user_key]
+            if items:
+                users[user_key] = items
+            return item
+        return None
+
+    async def _run(self):
+        console = get_console(self.container)
+        while True:
+            item = self._next_item()
+            if item is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self.bucket.acquire()
+            if item.key:
+                self._pending_by_key.pop(item.key, None)
+            self.waits.append(time.monotonic() - item.enqueued_at)
+            try:
+                await console.send(item.command)
+                self.counters["sent"] += 1
+                for future in item.futures:
+                    if not future.done():
+                        future.set_result(None)
+            except Exception as e:
+                self.counters["failed"] += 1
+                for future in item.futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def query(self, command: str, expect=None, user_id: int | None = None, timeout: float = 5, **kwargs) -> list:
+        """
+        Come ConsoleSession.query, ma l'invio passa dalla coda. Query identiche
+        (stesso comando e pattern) già in corso condividono la stessa risposta.
+        """
+        pattern = expect.pattern if isinstance(expect, re.Pattern) else expect
+        key = (" ".join(command.split()).lower(), pattern) if expect is not None else None
+        if key and key in self._inflight_queries:
+            self.counters["coalesced"] += 1
+            return await asyncio.wait_for(asyncio.shield(self._inflight_queries[key]), timeout=timeout)
+
+        async def send_through_queue(line: str, timeout: float = 10):
+            # L'attesa in coda non consuma il timeout della risposta
+            await self.submit(line, user_id=user_id, coalesce=False, timeout=max(timeout, 30))
+
+        task = asyncio.ensure_future(get_console(self.container).query(
+            command, expect=expect, timeout=timeout, send=send_through_queue, **kwargs))
+        if key:
+            self._inflight_queries[key] = task
+            task.add_done_callback(lambda _: self._inflight_queries.pop(key, None))
+        return await task
+
+    def metrics(self) -> dict:
+        waits = sorted(self.waits)
+        p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+        return {
+            "depth": self.depth(),
+            **self.counters,
+            "wait_avg": sum(waits) / len(waits) if waits else 0.0,
+            "wait_p95": p95,
+            "wait_max": waits[-1] if waits else 0.0,
+        }
+
+
+_dispatchers: dict[str, CommandDispatcher] = {}
+
+
+def get_dispatcher(container: str = CONTAINER) -> CommandDispatcher:
+    if not container:
+        raise ValueError("CONTAINER non configurato per la coda comandi.")
+    dispatcher = _dispatchers.get(container)
+    if dispatcher is None:
+        dispatcher = _dispatchers[container] = CommandDispatcher(container)
+    return dispatcher
+
+
+async def enqueue_command(command: str, user_id: int | None = None, container: str = CONTAINER, **kwargs):
+    await get_dispatcher(container).submit(command, user_id=user_id, **kwargs)
+
+
+async def queue_query(command: str, expect=None, user_id: int | None = None, container: str = CONTAINER, **kwargs) -> list:
+    return await get_dispatcher(container).query(command, expect=expect, user_id=user_id, **kwargs)
+
+
+async def stop_all_dispatchers():
+    for dispatcher in list(_dispatchers.values()):
+        await dispatcher.stop()
+    _dispatchers.clear()
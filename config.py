@@ -10,30 +10,105 @@ ITEMS_FILE = "items.json"
 CONTAINER = "bds"  # Assicurati che questo sia il nome corretto del tuo container Docker
 WORLD_NAME = os.getenv("WORLD_NAME", "Bedrock level") # Default or from .env
 BACKUPS_DIR_NAME = "backups"
+BEDROCK_DATA_PATH = "/bedrockData"  # Volume dati del server (montato nel container del bot)
+
+# Modalità predefinita di /backup_world: "hot" (save hold/query/resume, server online) o "cold" (arresto e zip)
+BACKUP_MODE = os.getenv("BACKUP_MODE", "hot").lower()
+# Secondi massimi di attesa perché il server prepari i file dopo "save hold"
+HOT_BACKUP_TIMEOUT = int(os.getenv("HOT_BACKUP_TIMEOUT", "60"))
+# Formato dei backup: "store" (blob deduplicati per hash + manifest, vedi backup_store.py), "zip" o "tar.zst"
+BACKUP_FORMAT = os.getenv("BACKUP_FORMAT", "store").lower()
+# Thread di compressione degli archivi .zip / .tar.zst (vedi archivers.py)
+BACKUP_COMPRESS_WORKERS = int(os.getenv("BACKUP_COMPRESS_WORKERS", str(os.cpu_count() or 2)))
+# Backup programmati: espressione cron (vuota = disattivati), attesa massima (minuti) che il server
+# si svuoti di giocatori, retention grandfather-father-son dei backup programmati
+BACKUP_SCHEDULE = os.getenv("BACKUP_SCHEDULE", "")
+BACKUP_IDLE_WAIT = int(os.getenv("BACKUP_IDLE_WAIT", "60"))
+BACKUP_KEEP_HOURLY = int(os.getenv("BACKUP_KEEP_HOURLY", "24"))
+BACKUP_KEEP_DAILY = int(os.getenv("BACKUP_KEEP_DAILY", "7"))
+BACKUP_KEEP_WEEKLY = int(os.getenv("BACKUP_KEEP_WEEKLY", "4"))
+# Chat Telegram (id) in cui notificare l'esito dei backup programmati
+BACKUP_NOTIFY_CHAT_ID = os.getenv("BACKUP_NOTIFY_CHAT_ID", "")
+# Catalogo SQLite dei backup (metadati, paginazione di /list_backups) e backup per pagina
+BACKUP_CATALOG_FILE = os.getenv("BACKUP_CATALOG_FILE", "botData/backups.sqlite3")
+BACKUPS_PAGE_SIZE = int(os.getenv("BACKUPS_PAGE_SIZE", "8"))
+# Verifica dei backup in processi separati: processi, priorità (nice) e giorni dopo cui riverificare (0 = solo dopo il backup)
+BACKUP_VERIFY_WORKERS = int(os.getenv("BACKUP_VERIFY_WORKERS", "1"))
+BACKUP_VERIFY_NICE = int(os.getenv("BACKUP_VERIFY_NICE", "15"))
+BACKUP_VERIFY_MAX_AGE = int(os.getenv("BACKUP_VERIFY_MAX_AGE", "7"))
+# Secondi per cui uno snapshot del mondo (hard link, vedi world_snapshot.py) viene condiviso tra lettori concorrenti
+WORLD_SNAPSHOT_MAX_AGE = int(os.getenv("WORLD_SNAPSHOT_MAX_AGE", "30"))
+# Indice delle entità dei mondi (vedi entity_index.py): file SQLite, secondi tra due aggiornamenti
+# incrementali (0 = disattivato) e ore dopo cui rileggere tutto il mondo (0 = mai, salvo ripristini)
+ENTITY_INDEX_FILE = os.getenv("ENTITY_INDEX_FILE", "botData/entities.sqlite3")
+ENTITY_INDEX_INTERVAL = int(os.getenv("ENTITY_INDEX_INTERVAL", "600"))
+ENTITY_INDEX_FULL_SCAN_HOURS = float(os.getenv("ENTITY_INDEX_FULL_SCAN_HOURS", "24"))
+# Finestre di manutenzione (vedi maintenance.py): coda salvata, orari cron in cui eseguire le code non
+# vuote (vuoto = solo /maintenance run e /maintenance at) e minuti di attesa che i giocatori escano
+MAINTENANCE_FILE = os.getenv("MAINTENANCE_FILE", "botData/maintenance.json")
+MAINTENANCE_SCHEDULE = os.getenv("MAINTENANCE_SCHEDULE", "")
+MAINTENANCE_IDLE_WAIT = int(os.getenv("MAINTENANCE_IDLE_WAIT", "30"))
+# Bot API server locale (es. http://telegram-bot-api:8081/bot): upload fino a 2000 MB e file letti dal disco
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+TELEGRAM_LOCAL_MODE = bool(TELEGRAM_API_URL) and os.getenv("TELEGRAM_LOCAL_MODE", "true").lower() == "true"
+# Dimensione massima (MB) di un file inviato: i backup più grandi sono spediti in volumi numerati
+TELEGRAM_UPLOAD_LIMIT_MB = int(os.getenv("TELEGRAM_UPLOAD_LIMIT_MB", "2000" if TELEGRAM_LOCAL_MODE else "50"))
+
+# --- Server multipli ---
+# File JSON con i server gestiti ({"nome": {"container": ..., "world": ..., "data_path": ...}});
+# se assente il bot gestisce solo CONTAINER / WORLD_NAME
+SERVERS_FILE = os.getenv("SERVERS_FILE", "botData/servers.json")
+DEFAULT_SERVER = os.getenv("DEFAULT_SERVER", "")
+
+# --- Console del server ---
+# Trasporto della sessione console persistente: "exec" (Engine API), "attach" o "ssh"
+CONSOLE_TRANSPORT = os.getenv("CONSOLE_TRANSPORT", "exec").lower()
+DOCKER_SOCKET = os.getenv("DOCKER_SOCKET", "/var/run/docker.sock")
+SSH_CONSOLE_HOST = os.getenv("SSH_CONSOLE_HOST", CONTAINER)
+SSH_CONSOLE_PORT = int(os.getenv("SSH_CONSOLE_PORT", "2222"))
+SSH_CONSOLE_USER = os.getenv("SSH_CONSOLE_USER", "bedrock")
+SSH_CONSOLE_PASSWORD = os.getenv("SSH_CONSOLE_PASSWORD", "")
+
+# --- Log del server ---
+# Righe mantenute in memoria dal follower dei log (ring buffer)
+LOG_BUFFER_LINES = int(os.getenv("LOG_BUFFER_LINES", "5000"))
+# Intervallo (secondi) di riallineamento dei giocatori online con il comando 'list'
+PRESENCE_RECONCILE_INTERVAL = int(os.getenv("PRESENCE_RECONCILE_INTERVAL", "300"))
+# Comandi al secondo inviati alla console durante l'esecuzione di script (/cmd multi-riga, .mcfunction)
+CMD_BATCH_RATE = float(os.getenv("CMD_BATCH_RATE", "20"))
+# Coda comandi centrale: comandi al secondo verso la console e raffica massima consentita
+CONSOLE_RATE = float(os.getenv("CONSOLE_RATE", "20"))
+CONSOLE_BURST = int(os.getenv("CONSOLE_BURST", "40"))
+# Secondi massimi di attesa per "Server started." dopo l'avvio del container
+SERVER_READY_TIMEOUT = int(os.getenv("SERVER_READY_TIMEOUT", "180"))
+
+# --- Statistiche risorse container ---
+STATS_SAMPLE_INTERVAL = int(os.getenv("STATS_SAMPLE_INTERVAL", "10"))  # secondi tra due campioni
+STATS_RETENTION_HOURS = int(os.getenv("STATS_RETENTION_HOURS", "24"))  # ore mantenute nel ring in memoria
 
 # --- Authentication Levels ---
 AUTH_LEVELS = {
     
     "custom": {
         "password": os.getenv("CUSTOM_PASSWORD", "custom_password"),
-        "permissions": ["give", "tp"]
+        "permissions": ["give", "tp", "server"]
     },
     "basic": {
         "password": os.getenv("BASIC_PASSWORD", "basic_password"),
-        "permissions": ["menu", "give", "tp", "saveloc"]
+        "permissions": ["menu", "give", "tp", "saveloc", "server"]
     },
     
     "player": {
         "password": os.getenv("PLAYER_PASSWORD", "player_password"),
-        "permissions": ["menu", "give", "tp", "saveloc", "weather", "stopserver", "restartserver", "backup_world", "imnotcreative", "scarica_items", "addresourcepack", "editresourcepacks", "split_structure", "convert_structure", "create_resourcepack"]
+        "permissions": ["menu", "give", "tp", "saveloc", "server", "weather", "stopserver", "restartserver", "backup_world", "imnotcreative", "scarica_items", "addresourcepack", "editresourcepacks", "split_structure", "convert_structure", "create_resourcepack"]
     },
     "moderator": {
         "password": os.getenv("MODERATOR_PASSWORD", "moderator_password"),
-        "permissions": ["menu", "give", "tp", "saveloc", "weather", "logs", "cmd", "stopserver", "restartserver", "backup_world", "imnotcreative", "scarica_items", "addresourcepack", "editresourcepacks", "split_structure", "convert_structure", "create_resourcepack"]
+        "permissions": ["menu", "give", "tp", "saveloc", "server", "weather", "logs", "cmd", "stopserver", "restartserver", "downtime", "stats", "queue", "entities", "backup_world", "backup_schedule", "imnotcreative", "worldsettings", "scarica_items", "addresourcepack", "editresourcepacks", "split_structure", "convert_structure", "create_resourcepack"]
     },
     "admin": {
         "password": os.getenv("ADMIN_PASSWORD", "admin_password"),
-        "permissions": ["menu", "give", "tp", "saveloc", "weather", "logs", "cmd", "stopserver", "restartserver", "backup_world", "list_backups", "imnotcreative", "scarica_items", "addresourcepack", "editresourcepacks", "split_structure", "convert_structure", "create_resourcepack"]
+        "permissions": ["menu", "give", "tp", "saveloc", "server", "weather", "logs", "cmd", "stopserver", "restartserver", "downtime", "stats", "queue", "entities", "backup_world", "list_backups", "backup_bench", "backup_schedule", "maintenance", "imnotcreative", "worldsettings", "scarica_items", "addresourcepack", "editresourcepacks", "split_structure", "convert_structure", "create_resourcepack"]
     }
 }
 
@@ -0,0 +1,383 @@
+# minecraft_telegram_bot/console_session.py
+import asyncio
+import re
+import shlex
+from datetime import datetime, timedelta, timezone
+
+from config import (
+    CONTAINER, CONSOLE_TRANSPORT, SSH_CONSOLE_HOST, SSH_CONSOLE_PORT,
+    SSH_CONSOLE_USER, SSH_CONSOLE_PASSWORD, get_logger
+)
+from docker_api import api_request, api_hijack, read_stream_frame, DockerAPIError
+from log_stream import get_log_follower
+from server_registry import get_server_by_container
+
+logger = get_logger(__name__)
+
+try:
+    import asyncssh
+except ImportError:
+    asyncssh = None
+
+
+class ConsoleError(Exception):
+    pass
+
+
+class _ConsoleTransport:
+    """
+    Flusso stdin verso la console del server. Ogni trasporto imposta `closed`
+    quando il flusso termina (es. container arrestato o riavviato).
+    """
+    name = "base"
+
+    def __init__(self, container: str):
+        self.container = container
+        self.closed = asyncio.Event()
+        self._reader_task = None
+
+    async def open(self):
+        raise NotImplementedError
+
+    async def write_line(self, line: str):
+        raise NotImplementedError
+
+    async def close(self):
+        if self._reader_task:
+            self._reader_task.cancel()
+        self.closed.set()
+
+
+class _EngineExecTransport(_ConsoleTransport):
+    """
+    Una sola sessione exec (`sh`) aperta via Engine API su /var/run/docker.sock:
+    ogni comando diventa una riga `send-command ...` scritta sul suo stdin.
+    """
+    name = "exec"
+
+    async def open(self):
+        _, created = await api_request("POST", f"/containers/{self.container}/exec", {
+            "AttachStdin": True, "AttachStdout": True, "AttachStderr": True,
+            "Tty": False, "Cmd": ["sh"],
+        })
+        self._reader, self._writer = await api_hijack(
+            "POST", f"/exec/{created['Id']}/start", {"Detach": False, "Tty": False}
+        )
+        self._reader_task = asyncio.create_task(self._drain())
+
+    async def write_line(self, line: str):
+        self._writer.write(f"send-command {shlex.quote(line)}\n".encode())
+        await self._writer.drain()
+
+    async def _drain(self):
+        try:
+            while True:
+                frame = await read_stream_frame(self._reader)
+                if frame is None:
+                    break
+                stream_type, payload = frame
+                text = payload.decode(errors="replace").strip()
+                if stream_type == 2 and text:
+                    logger.warning(f"🖥️⚠️ Stderr sessione console exec '{self.container}': {text}")
+        finally:
+            self.closed.set()
+
+    async def close(self):
+        await super().close()
+        self._writer.close()
+
+
+class _AttachTransport(_ConsoleTransport):
+    """
+    `docker attach` via Engine API: scrive direttamente sullo stdin del processo
+    principale. Richiede `stdin_open: true` sul servizio bedrock nel compose.
+    """
+    name = "attach"
+
+    async def open(self):
+        self._reader, self._writer = await api_hijack(
+            "POST", f"/containers/{self.container}/attach?stream=1&stdin=1&stdout=0&stderr=0"
+        )
+        self._reader_task = asyncio.create_task(self._drain())
+
+    async def write_line(self, line: str):
+        self._writer.write(f"{line}\n".encode())
+        await self._writer.drain()
+
+    async def _drain(self):
+        try:
+            while await self._reader.read(4096):
+                pass
+        finally:
+            self.closed.set()
+
+    async def close(self):
+        await super().close()
+        self._writer.close()
+
+
+class _SSHTransport(_ConsoleTransport):
+    """Console SSH di itzg/minecraft-bedrock-server (ENABLE_SSH, porta 2222)."""
+    name = "ssh"
+
+    async def open(self):
+        if asyncssh is None:
+            raise ConsoleError("Trasporto SSH richiesto ma il pacchetto 'asyncssh' non è installato.")
+        server = get_server_by_container(self.container)
+        self._conn = await asyncssh.connect(
+            server.config.ssh_host if server else SSH_CONSOLE_HOST, port=SSH_CONSOLE_PORT,
+            username=SSH_CONSOLE_USER, password=SSH_CONSOLE_PASSWORD,
+            known_hosts=None,
+        )
+        self._process = await self._conn.create_process()
+        self._reader_task = asyncio.create_task(self._drain())
+
+    async def write_line(self, line: str):
+        self._process.stdin.write(f"{line}\n")
+        await self._process.stdin.drain()
+
+    async def _drain(self):
+        try:
+            while await self._process.stdout.read(4096):
+                pass
+        finally:
+            self.closed.set()
+
+    async def close(self):
+        await super().close()
+        self._conn.close()
+
+
+_TRANSPORTS = {t.name: t for t in (_EngineExecTransport, _AttachTransport, _SSHTransport)}
+
+
+class _PendingQuery:
+    """Query in attesa di output: `records` contiene la riga trovata e le eventuali righe extra."""
+    __slots__ = ("pattern", "extra_lines", "future", "records", "remaining", "not_before")
+
+    def __init__(self, pattern, extra_lines):
+        self.pattern = pattern
+        self.extra_lines = extra_lines
+        # Le righe storiche (es. il tail caricato all'avvio del follower) non sono risposte
+        self.not_before = datetime.now(timezone.utc) - timedelta(seconds=1)
+        self.future = asyncio.get_running_loop().create_future()
+        self.records = []
+        self.remaining = 0
+
+
+class ConsoleSession:
+    """
+    Sessione console persistente condivisa da tutti gli handler: il trasporto
+    viene aperto una volta sola e riaperto automaticamente quando si chiude.
+    """
+    RECONNECT_MAX_DELAY = 30
+
+    def __init__(self, container: str, transport_name: str = CONSOLE_TRANSPORT):
+        if transport_name not in _TRANSPORTS:
+            raise ValueError(f"Trasporto console sconosciuto: '{transport_name}'. Validi: {', '.join(_TRANSPORTS)}")
+        self.container = container
+        self.transport_name = transport_name
+        self._transport = None
+        self._lock = asyncio.Lock()
+        self._watch_task = None
+        self._wake = asyncio.Event()
+        # Query in attesa, in ordine di registrazione (FIFO)
+        self._pending: list[_PendingQuery] = []
+        self._open_query_lock = asyncio.Lock()
+        self._follower = None
+
+    @property
+    def connected(self) -> bool:
+        return self._transport is not None and not self._transport.closed.is_set()
+
+    async def _open_transport(self):
+        transport = _TRANSPORTS[self.transport_name](self.container)
+        await transport.open()
+        self._transport = transport
+        logger.info(f"🖥️✅ Sessione console '{self.transport_name}' aperta su '{self.container}'.")
+
+    async def _drop_transport(self):
+        if self._transport is not None:
+            try:
+                await self._transport.close()
+            except Exception as e:
+                logger.debug(f"🖥️ Chiusura trasporto console: {e}")
+        self._transport = None
+
+    def _ensure_watch(self):
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        delay = 1
+        while True:
+            if self.connected:
+                await self._transport.closed.wait()
+                logger.warning(f"🖥️🔌 Sessione console '{self.container}' chiusa, riconnessione in corso...")
+                delay = 1
+            async with self._lock:
+                if not self.connected:
+                    await self._drop_transport()
+                    try:
+                        await self._open_transport()
+                        continue
+                    except (OSError, ConnectionError, DockerAPIError, ConsoleError, asyncio.TimeoutError) as e:
+                        logger.info(f"🖥️⏳ Console '{self.container}' non disponibile ({e}), nuovo tentativo tra {delay}s.")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                delay = 1
+            except asyncio.TimeoutError:
+                delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+
+    def wake(self):
+        """Ritenta subito la connessione (es. il container è appena ripartito)."""
+        self._wake.set()
+
+    async def start(self):
+        """Apre la sessione in anticipo (se possibile) e avvia la riconnessione automatica."""
+        self._ensure_watch()
+
+    async def send(self, command: str, timeout: float = 10):
+        command = command.strip()
+        if not command:
+            return
+        last_error = None
+        async with self._lock:
+            for _ in range(2):
+                try:
+                    if not self.connected:
+                        await asyncio.wait_for(self._open_transport(), timeout=timeout)
+                    await asyncio.wait_for(self._transport.write_line(command), timeout=timeout)
+                    logger.debug(f"🖥️➡️ '{self.container}': {command}")
+                    self._ensure_watch()
+                    return
+                except (OSError, ConnectionError, DockerAPIError, ConsoleError) as e:
+                    last_error = e
+                    await self._drop_transport()
+        self._ensure_watch()
+        raise ConsoleError(f"Impossibile inviare '{command}' alla console di '{self.container}': {last_error}")
+
+    def _attach_follower(self):
+        if self._follower is None:
+            self._follower = get_log_follower(self.container)
+            self._follower.add_listener(self._on_log_record)
+
+    def _on_log_record(self, record):
+        """
+        Consegna ogni riga a una sola query: prima a quelle che stanno raccogliendo
+        righe extra, poi alla più vecchia con pattern corrispondente, infine alle
+        query senza pattern (serializzate, quindi al massimo una).
+        """
+        for pending in self._pending:
+            if record.timestamp < pending.not_before:
+                continue
+            if pending.records and pending.remaining > 0:
+                pending.records.append(record)
+                pending.remaining -= 1
+                if pending.remaining == 0 and not pending.future.done():
+                    pending.future.set_result(pending.records)
+                return
+        for pending in self._pending:
+            if pending.pattern is None or pending.records or record.timestamp < pending.not_before:
+                continue
+            match = pending.pattern.search(record.message)
+            if match:
+                pending.records.append(record)
+                extra = pending.extra_lines(match) if callable(pending.extra_lines) else pending.extra_lines
+                pending.remaining = extra
+                if extra == 0 and not pending.future.done():
+                    pending.future.set_result(pending.records)
+                return
+        for pending in self._pending:
+            if pending.pattern is None and record.timestamp >= pending.not_before:
+                pending.records.append(record)
+                if not pending.future.done():
+                    pending.future.set_result(pending.records)
+                return
+
+    async def query(self, command: str, expect: str | re.Pattern | None = None, timeout: float = 5,
+                    extra_lines=0, settle: float = 0.5, send=None) -> list:
+        """
+        Invia un comando e attende l'output corrispondente nei log.
+
+        Con `expect` restituisce la prima riga che corrisponde al pattern seguita da
+        `extra_lines` righe (intero o funzione del match); solleva asyncio.TimeoutError
+        se non arriva entro `timeout`. Senza `expect` restituisce le righe emesse dopo
+        l'invio finché il server resta in silenzio per `settle` secondi (lista vuota
+        se non risponde entro `timeout`). `send` sostituisce l'invio diretto (es. la
+        coda comandi centrale); l'attesa dell'output parte dopo l'invio effettivo.
+        """
+        self._attach_follower()
+        send = send or self.send
+        if expect is None:
+            async with self._open_query_lock:
+                return await self._query_open(command, timeout, settle, send)
+
+        pattern = re.compile(expect) if isinstance(expect, str) else expect
+        pending = _PendingQuery(pattern, extra_lines)
+        self._pending.append(pending)  # registrata prima dell'invio: nessuna riga può sfuggire
+        try:
+            await send(command, timeout=timeout)
+            return await asyncio.wait_for(pending.future, timeout=timeout)
+        finally:
+            self._pending.remove(pending)
+
+    async def _query_open(self, command: str, timeout: float, settle: float, send) -> list:
+        pending = _PendingQuery(None, 0)
+        self._pending.append(pending)
+        try:
+            await send(command, timeout=timeout)
+            try:
+                await asyncio.wait_for(asyncio.shield(pending.future), timeout=timeout)
+            except asyncio.TimeoutError:
+                return []
+            seen = 0
+            while len(pending.records) != seen:
+                seen = len(pending.records)
+                await asyncio.sleep(settle)
+            return list(pending.records)
+        finally:
+            self._pending.remove(pending)
+
+    async def close(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            self._watch_task = None
+        if self._follower is not None:
+            self._follower.remove_listener(self._on_log_record)
+            self._follower = None
+        for pending in self._pending:
+            if not pending.future.done():
+                pending.future.cancel()
+        async with self._lock:
+            await self._drop_transport()
+
+
+_sessions: dict[str, ConsoleSession] = {}
+
+
+def get_console(container: str = CONTAINER) -> ConsoleSession:
+    if not container:
+        raise ValueError("CONTAINER non configurato per la console del server.")
+    session = _sessions.get(container)
+    if session is None:
+        server = get_server_by_container(container)
+        session = _sessions[container] = (
+            ConsoleSession(container, server.config.console_transport) if server else ConsoleSession(container))
+    return session
+
+
+async def send_console_command(command: str, container: str = CONTAINER, timeout: float = 10):
+    await get_console(container).send(command, timeout=timeout)
+
+
+async def query_console(command: str, expect: str | re.Pattern | None = None, container: str = CONTAINER,
+                        timeout: float = 5, extra_lines=0) -> list:
+    return await get_console(container).query(command, expect=expect, timeout=timeout, extra_lines=extra_lines)
+
+
+async def close_all_consoles():
+    for session in list(_sessions.values()):
+        await session.close()
+    _sessions.clear()
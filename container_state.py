@@ -0,0 +1,138 @@
+# minecraft_telegram_bot/container_state.py
+import asyncio
+import json
+import urllib.parse
+
+from config import CONTAINER, get_logger
+from docker_api import api_stream, get_docker_client, DockerAPIError
+
+logger = get_logger(__name__)
+
+# Azioni degli eventi Docker che cambiano lo stato del container
+_ACTION_STATES = {
+    "start": "running",
+    "unpause": "running",
+    "die": "exited",
+    "stop": "exited",
+    "pause": "paused",
+    "destroy": "removed",
+}
+
+
+class ContainerWatcher:
+    """
+    Stato del container ricavato dagli eventi dell'Engine API (`/events`), con
+    una `inspect` iniziale e a ogni riconnessione. Le callback registrate con
+    `add_listener` ricevono (vecchio_stato, nuovo_stato) a ogni transizione.
+    """
+    RECONNECT_MAX_DELAY = 30
+
+    def __init__(self, container: str):
+        self.container = container
+        self.state: str | None = None
+        self._listeners = []
+        self._changed = asyncio.Condition()
+        self._task = None
+        self._stream = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._stream:
+            self._stream.close()
+            self._stream = None
+
+    @property
+    def running(self) -> bool:
+        return self.state == "running"
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    async def _set_state(self, state: str | None):
+        if state == self.state:
+            return
+        previous, self.state = self.state, state
+        logger.info(f"🐳🔁 Container '{self.container}': {previous or '?'} → {state or '?'}")
+        for callback in list(self._listeners):
+            try:
+                callback(previous, state)
+            except Exception as e:
+                logger.error(f"🐳❌ Errore listener stato container: {e}", exc_info=True)
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def refresh(self) -> str | None:
+        """Legge lo stato attuale con una inspect (None se il container non esiste)."""
+        try:
+            info = await get_docker_client(self.container).inspect(self.container)
+            await self._set_state(info.get("State", {}).get("Status"))
+        except DockerAPIError as e:
+            if e.status != 404:
+                raise
+            await self._set_state("removed")
+        return self.state
+
+    async def wait_for(self, *states: str, timeout: float = 60) -> bool:
+        """Attende che il container raggiunga uno degli stati indicati."""
+        async def _wait():
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.state in states)
+        try:
+            await asyncio.wait_for(_wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run(self):
+        filters = urllib.parse.quote(json.dumps({"type": ["container"], "container": [self.container]}))
+        delay = 1
+        while True:
+            try:
+                self._stream = await api_stream("GET", f"/events?filters={filters}")
+                # Lo stato può essere cambiato mentre non eravamo in ascolto
+                await self.refresh()
+                delay = 1
+                async for line in self._stream.lines():
+                    if not line.strip():
+                        continue
+                    event = json.loads(line)
+                    state = _ACTION_STATES.get(event.get("Action") or event.get("status"))
+                    if state:
+                        await self._set_state(state)
+            except (OSError, ConnectionError, DockerAPIError, asyncio.TimeoutError, ValueError) as e:
+                logger.info(f"🐳⏳ Eventi Docker non disponibili ({e}), nuovo tentativo tra {delay}s.")
+            finally:
+                if self._stream:
+                    self._stream.close()
+                    self._stream = None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+
+
+_watchers: dict[str, ContainerWatcher] = {}
+
+
+def get_container_watcher(container: str = CONTAINER) -> ContainerWatcher:
+    if not container:
+        raise ValueError("CONTAINER non configurato per gli eventi Docker.")
+    watcher = _watchers.get(container)
+    if watcher is None:
+        watcher = _watchers[container] = ContainerWatcher(container)
+    watcher.start()
+    return watcher
+
+
+async def stop_all_watchers():
+    for watcher in list(_watchers.values()):
+        await watcher.stop()
+    _watchers.clear()
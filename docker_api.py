@@ -0,0 +1,334 @@
+# minecraft_telegram_bot/docker_api.py
+import asyncio
+import json
+
+from config import DOCKER_SOCKET, get_logger
+
+logger = get_logger(__name__)
+
+
+class DockerAPIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Docker API {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+def _build_request(method: str, path: str, body: dict | None = None, extra_headers: dict | None = None) -> bytes:
+    payload = json.dumps(body).encode() if body is not None else b""
+    headers = {
+        "Host": "docker",
+        "User-Agent": "telegram-bedrock-bot",
+        "Content-Length": str(len(payload)),
+    }
+    if body is not None:
+        headers["Content-Type"] = "application/json"
+    if extra_headers:
+        headers.update(extra_headers)
+    head = f"{method} {path} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+    return head.encode() + payload
+
+
+async def _read_response_head(reader: asyncio.StreamReader) -> tuple[int, dict]:
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connessione al socket Docker chiusa prima della risposta.")
+    parts = status_line.decode("latin-1").split(" ", 2)
+    status = int(parts[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return status, headers
+
+
+async def _read_body(reader: asyncio.StreamReader, headers: dict) -> bytes:
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                await reader.readline()  # CRLF finale
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        return b"".join(chunks)
+    if "content-length" in headers:
+        return await reader.readexactly(int(headers["content-length"]))
+    return await reader.read()
+
+
+def _decode_error(status: int, body: bytes) -> DockerAPIError:
+    try:
+        message = json.loads(body).get("message", "")
+    except (ValueError, AttributeError):
+        message = body.decode(errors="replace")
+    return DockerAPIError(status, message.strip())
+
+
+class DockerClient:
+    """
+    Client HTTP per l'Engine API con un piccolo pool di connessioni keep-alive sul
+    socket unix: le richieste brevi (inspect, start, stop, exec create...) riusano
+    la stessa connessione invece di aprirne una nuova o avviare il binario `docker`.
+    """
+    POOL_SIZE = 4
+
+    def __init__(self, socket_path: str = DOCKER_SOCKET):
+        self.socket_path = socket_path
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def _acquire(self, timeout: float):
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(self.socket_path), timeout=timeout)
+        return reader, writer, False
+
+    def _release(self, reader, writer, reusable: bool):
+        if reusable and len(self._idle) < self.POOL_SIZE and not writer.is_closing():
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def request(self, method: str, path: str, body: dict | None = None, timeout: float = 15):
+        """Restituisce (status, dati) dove i dati sono il JSON decodificato, se presente."""
+        for attempt in range(2):
+            reader, writer, reused = await self._acquire(timeout)
+            try:
+                writer.write(_build_request(method, path, body))
+                await writer.drain()
+                status, headers = await asyncio.wait_for(_read_response_head(reader), timeout=timeout)
+                no_body = status in (204, 304)  # nessun corpo né Content-Length
+                raw = b"" if no_body else await asyncio.wait_for(_read_body(reader, headers), timeout=timeout)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if reused and attempt == 0:
+                    continue  # connessione inattiva chiusa dal demone: si riprova con una nuova
+                raise ConnectionError(f"Richiesta Docker {method} {path} fallita: {e}") from e
+            except BaseException:
+                writer.close()
+                raise
+            keep_alive = headers.get("connection", "").lower() != "close" and (
+                no_body or "content-length" in headers or headers.get("transfer-encoding", "").lower() == "chunked")
+            self._release(reader, writer, keep_alive)
+            if status >= 400:
+                raise _decode_error(status, raw)
+            if raw and headers.get("content-type", "").startswith("application/json"):
+                return status, json.loads(raw)
+            return status, raw
+
+    async def inspect(self, container: str) -> dict:
+        _, data = await self.request("GET", f"/containers/{container}/json")
+        return data
+
+    async def start(self, container: str) -> bool:
+        """Avvia il container. False se era già in esecuzione (304)."""
+        status, _ = await self.request("POST", f"/containers/{container}/start")
+        return status != 304
+
+    async def stop(self, container: str, timeout: int = 30) -> bool:
+        """Arresta il container (SIGTERM, poi SIGKILL dopo `timeout`). False se era già fermo (304)."""
+        status, _ = await self.request("POST", f"/containers/{container}/stop?t={timeout}", timeout=timeout + 15)
+        return status != 304
+
+    async def restart(self, container: str, timeout: int = 30):
+        await self.request("POST", f"/containers/{container}/restart?t={timeout}", timeout=timeout + 30)
+
+    async def logs(self, container: str, tail: int = 100, timestamps: bool = False) -> str:
+        _, raw = await self.request(
+            "GET", f"/containers/{container}/logs?stdout=1&stderr=1&tail={tail}&timestamps={int(timestamps)}")
+        return demultiplex(raw).decode(errors="replace")
+
+    async def exec(self, container: str, cmd: list, timeout: float = 30) -> tuple[int, str]:
+        """Esegue un comando nel container e restituisce (exit code, output combinato)."""
+        _, created = await self.request("POST", f"/containers/{container}/exec", {
+            "Cmd": cmd, "AttachStdout": True, "AttachStderr": True,
+        })
+        exec_id = created["Id"]
+        stream = await api_stream("POST", f"/exec/{exec_id}/start", {"Detach": False, "Tty": False}, timeout=timeout)
+        try:
+            output = "\n".join([line async for line in stream.lines()])
+        finally:
+            stream.close()
+        _, info = await self.request("GET", f"/exec/{exec_id}/json")
+        return info.get("ExitCode") or 0, output
+
+    def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+
+def demultiplex(raw: bytes) -> bytes:
+    """Rimuove gli header di 8 byte dal flusso multiplexato (se presente)."""
+    if len(raw) < 8 or raw[0] not in (0, 1, 2) or raw[1:4] != b"\x00\x00\x00":
+        return raw
+    out, offset = [], 0
+    while offset + 8 <= len(raw):
+        length = int.from_bytes(raw[offset + 4:offset + 8], "big")
+        out.append(raw[offset + 8:offset + 8 + length])
+        offset += 8 + length
+    return b"".join(out)
+
+
+_clients: dict[str, DockerClient] = {}
+
+
+def get_docker_client(container: str | None = None) -> DockerClient:
+    """Client con un pool di connessioni dedicato per container (o condiviso se None)."""
+    key = container or ""
+    client = _clients.get(key)
+    if client is None:
+        client = _clients[key] = DockerClient()
+    return client
+
+
+def close_all_clients():
+    for client in _clients.values():
+        client.close()
+    _clients.clear()
+
+
+async def api_request(method: str, path: str, body: dict | None = None, timeout: float = 15):
+    """
+    Esegue una singola richiesta HTTP verso l'Engine API sul socket unix.
+    Restituisce (status, dati) dove i dati sono il JSON decodificato, se presente.
+    """
+    return await get_docker_client().request(method, path, body, timeout=timeout)
+
+
+async def api_hijack(method: str, path: str, body: dict | None = None, timeout: float = 15):
+    """
+    Apre una connessione "hijacked" (Upgrade: tcp) usata da attach/exec:
+    dopo la risposta 101 il socket diventa un flusso bidirezionale stdin/stdout.
+    """
+    reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(DOCKER_SOCKET), timeout=timeout)
+    try:
+        writer.write(_build_request(method, path, body, {"Connection": "Upgrade", "Upgrade": "tcp"}))
+        await writer.drain()
+        status, headers = await asyncio.wait_for(_read_response_head(reader), timeout=timeout)
+        if status >= 400:
+            raise _decode_error(status, await _read_body(reader, headers))
+        if status not in (101, 200):
+            raise DockerAPIError(status, "Upgrade della connessione non riuscito.")
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer
+
+
+async def read_stream_frame(reader: asyncio.StreamReader) -> tuple[int, bytes] | None:
+    """
+    Legge un frame dal flusso multiplexato di Docker (TTY disattivato):
+    header di 8 byte [tipo, 0, 0, 0, lunghezza big-endian]. None a fine flusso.
+    """
+    try:
+        header = await reader.readexactly(8)
+    except asyncio.IncompleteReadError:
+        return None
+    length = int.from_bytes(header[4:8], "big")
+    try:
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+    return header[0], payload
+
+
+class DockerStream:
+    """Corpo di una risposta in streaming (logs, events, stats) già de-chunkato."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, content_type: str, pump_task=None):
+        self.reader = reader
+        self.content_type = content_type
+        self._writer = writer
+        self._pump_task = pump_task
+
+    async def lines(self):
+        """
+        Restituisce le righe di testo del flusso. Se il container non ha TTY i frame
+        sono multiplexati (header di 8 byte): il formato viene riconosciuto dal primo header.
+        """
+        try:
+            head = await self.reader.readexactly(8)
+        except asyncio.IncompleteReadError as e:
+            head = e.partial
+        multiplexed = len(head) == 8 and head[0] in (0, 1, 2) and head[1:4] == b"\x00\x00\x00"
+        pending = b""
+        if multiplexed:
+            header = head
+            while header is not None:
+                try:
+                    pending += await self.reader.readexactly(int.from_bytes(header[4:8], "big"))
+                except asyncio.IncompleteReadError as e:
+                    pending += e.partial
+                *complete, pending = pending.split(b"\n")
+                for line in complete:
+                    yield line.decode(errors="replace").rstrip("\r")
+                try:
+                    header = await self.reader.readexactly(8)
+                except asyncio.IncompleteReadError:
+                    header = None
+        else:
+            pending = head
+            while True:
+                *complete, pending = pending.split(b"\n")
+                for line in complete:
+                    yield line.decode(errors="replace").rstrip("\r")
+                chunk = await self.reader.read(65536)
+                if not chunk:
+                    break
+                pending += chunk
+        if pending:
+            yield pending.decode(errors="replace").rstrip("\r")
+
+    def close(self):
+        if self._pump_task:
+            self._pump_task.cancel()
+        self._writer.close()
+
+
+async def api_stream(method: str, path: str, body: dict | None = None, timeout: float = 15) -> DockerStream:
+    """
+    Apre una risposta in streaming (es. `logs?follow=1`) e restituisce un DockerStream
+    il cui `reader` espone il corpo già decodificato dal transfer-encoding chunked.
+    """
+    raw_reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(DOCKER_SOCKET), timeout=timeout)
+    try:
+        writer.write(_build_request(method, path, body))
+        await writer.drain()
+        status, headers = await asyncio.wait_for(_read_response_head(raw_reader), timeout=timeout)
+        if status >= 400:
+            raise _decode_error(status, await _read_body(raw_reader, headers))
+    except BaseException:
+        writer.close()
+        raise
+    content_type = headers.get("content-type", "")
+    if headers.get("transfer-encoding", "").lower() != "chunked":
+        return DockerStream(raw_reader, writer, content_type)
+
+    stream = asyncio.StreamReader()
+
+    async def pump():
+        try:
+            while True:
+                size_line = await raw_reader.readline()
+                if not size_line:
+                    break
+                size = int(size_line.split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    break
+                stream.feed_data(await raw_reader.readexactly(size))
+                await raw_reader.readexactly(2)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            stream.feed_eof()
+
+    return DockerStream(stream, writer, content_type, asyncio.create_task(pump()))
@@ -3,9 +3,14 @@ import asyncio
 import subprocess
 import re
 from config import CONTAINER, get_logger
+from console_session import ConsoleError
+from command_queue import queue_query
+from log_stream import get_log_follower
 
 logger = get_logger(__name__)
 
+_PLAYERS_ONLINE_RE = re.compile(r"(?:There are (\d+)/\d+ )?players online:", re.IGNORECASE)
+
 async def run_docker_command(command_args: list, read_output: bool = False, timeout: int = 15):
     if not CONTAINER and "exec" in command_args:
         logger.error("🐳❌ CONTAINER non impostato per Docker exec.")
@@ -58,97 +63,114 @@ async def run_docker_command(command_args: list, read_output: bool = False, time
         logger.error(f"🐳🆘 Errore Docker imprevisto {' '.join(command_args)}: {e}", exc_info=True)
         raise
 
-async def get_online_players_from_server() -> list:
-    if not CONTAINER:
+async def get_player_position(minecraft_username: str, timeout: float = 5, user_id: int | None = None,
+                              container: str = CONTAINER) -> dict | None:
+    """
+    Legge la posizione del giocatore con un teletrasporto nullo e attende la riga
+    "Teleported X to x, y, z" corrispondente. None se il giocatore non è in gioco.
+
+    L'unica risposta accettata nomina il giocatore: "No targets matched selector" non
+    dice a chi si riferisce e potrebbe appartenere a un'altra query o a un /cmd, quindi
+    l'assenza del giocatore si ricava dal tracciamento delle presenze prima dell'invio.
+    Se esce proprio durante la query, asyncio.TimeoutError come per ogni query senza risposta.
+    """
+    from player_presence import get_presence_tracker  # player_presence importa fetch_online_players
+    online = await get_presence_tracker(container).current_players()
+    if minecraft_username.lower() not in (player.lower() for player in online):
+        return None
+    position_re = re.compile(
+        rf"Teleported {re.escape(minecraft_username)} to ([0-9\.\-]+),\s*([0-9\.\-]+),\s*([0-9\.\-]+)", re.IGNORECASE)
+    records = await queue_query(
+        f"execute as {minecraft_username} at @s run tp @s ~ ~ ~0.0001",
+        expect=position_re,
+        user_id=user_id,
+        container=container,
+        timeout=timeout,
+    )
+    match = position_re.search(records[0].message)
+    return {"x": float(match.group(1)), "y": float(match.group(2)), "z": float(match.group(3))}
+
+def _parse_players_from_log_lines(lines: list) -> list | None:
+    """Cerca l'ultima risposta a 'list' nelle righe di log. None se non presente."""
+    player_list = []
+
+    for i in reversed(range(len(lines))):
+        current_line_raw = lines[i]
+        current_line_content = current_line_raw
+        match = re.search(r"\]: (.*)|\] (.*)|คอนโซล: (.*)", current_line_content)
+        if match:
+            current_line_content = next(g for g in match.groups() if g is not None)
+
+        current_line_lower = current_line_content.lower()
+
+        if ("players online:" in current_line_lower and "there are" in current_line_lower) or \
+           ("players online:" in current_line_lower):
+            if ":" in current_line_content:
+                potential_players_str = current_line_content.split(":", 1)[1].strip()
+                if potential_players_str:
+                    if "max players online" not in current_line_lower:
+                        player_list = [
+                            p.strip() for p in potential_players_str.split(',')
+                            if p.strip() and "no players online" not in p.lower() and "nessun giocatore connesso" not in p.lower()
+                        ]
+                        if player_list:
+                            logger.info(f"👤✅ Giocatori online (stessa riga): {player_list}")
+                            return player_list
+
+            if i + 1 < len(lines):
+                next_line_raw = lines[i+1]
+                next_line_content = next_line_raw
+                match_next = re.search(r"\]: (.*)|\] (.*)|คอนโซล: (.*)", next_line_content)
+                if match_next:
+                    next_line_content = next(g for g in match_next.groups() if g is not None)
+                next_line_content_stripped = next_line_content.strip()
+                if next_line_content_stripped and \
+                   not next_line_content_stripped.startswith("[") and \
+                   " INFO" not in next_line_raw and \
+                   " WARN" not in next_line_raw and \
+                   " ERROR" not in next_line_raw and \
+                   "คอนโซล:" not in next_line_raw:
+                    if "no players online" not in next_line_content_stripped.lower() and \
+                       "nessun giocatore connesso" not in next_line_content_stripped.lower():
+                        player_list = [p.strip() for p in next_line_content_stripped.split(',') if p.strip()]
+                        if player_list:
+                            logger.info(f"👤✅ Giocatori online (riga succ.): {player_list}")
+                            return player_list
+
+            logger.info("👤ℹ️ 'players online:' trovato, ma nessun giocatore elencato.")
+            return []
+
+    return None
+
+async def fetch_online_players(container: str = CONTAINER) -> list:
+    """
+    Invia 'list' e attende la risposta: riga "There are N/M players online:" seguita
+    (se N > 0) dalla riga con i nomi. Solleva ConsoleError/asyncio.TimeoutError.
+    """
+    records = await queue_query("list", expect=_PLAYERS_ONLINE_RE, container=container, timeout=5,
+                                extra_lines=lambda m: 0 if m.group(1) == "0" else 1)
+    return _parse_players_from_log_lines([record.raw for record in records]) or []
+
+async def get_online_players_from_server(container: str = CONTAINER) -> list:
+    if not container:
         logger.error("🐳❌ CONTAINER non impostato per lista giocatori.")
         return []
     try:
-        list_command_args = ["docker", "exec", CONTAINER, "send-command", "list"]
-        logger.info(f"🐳👤 Aggiorno lista giocatori: {' '.join(list_command_args)}")
+        logger.info("🐳👤 Aggiorno lista giocatori: list")
         try:
-            await run_docker_command(list_command_args, read_output=False, timeout=5)
-        except subprocess.CalledProcessError as e:
-            # Questo è comune se il server è avviato ma nessun player è loggato, o se il comando 'list'
-            # su Bedrock non produce output se nessuno è online, ma scrive su stderr.
-            # Consideriamo il messaggio "No players online" o "Nessun giocatore connesso" come non-errore.
-            if "no players online" not in (e.stderr or "").lower() and \
-               "nessun giocatore connesso" not in (e.stderr or "").lower():
-                logger.warning(
-                    f"🐳⚠️ Comando '{' '.join(list_command_args)}' errore {e.returncode}, leggo log. Stderr: {e.stderr}"
-                )
-            else:
-                 logger.info(f"🐳ℹ️ Comando list giocatori: {e.stderr}") # Nessun giocatore o messaggio informativo
-        except asyncio.TimeoutError:
-            logger.error(
-                f"🐳⏳ Timeout '{' '.join(list_command_args)}'. Lista giocatori non aggiornata."
-            )
-            return []
-        except Exception as e: # Altre eccezioni da run_docker_command
-            logger.error(
-                f"🐳🆘 Errore '{' '.join(list_command_args)}': {e}. Tento lettura log."
-            )
-
-        await asyncio.sleep(1.0)
-
-        logs_command_args = ["docker", "logs", "--tail", "100", CONTAINER]
-        logger.info(f"🐳📄 Leggo log: {' '.join(logs_command_args)}")
-        output = await run_docker_command(logs_command_args, read_output=True, timeout=5)
+            return await fetch_online_players(container)
+        except (ConsoleError, asyncio.TimeoutError) as e:
+            logger.warning(f"🐳⚠️ Risposta a 'list' non ricevuta ({e or 'timeout'}), leggo log recenti.")
 
-        if not output:
+        lines = [record.raw for record in get_log_follower(container).recent(100)]
+        if not lines:
             logger.warning("🐳❓ Nessun output log dopo comando list.")
             return []
-
-        lines = output.splitlines()
-        player_list = []
-
-        for i in reversed(range(len(lines))):
-            current_line_raw = lines[i]
-            current_line_content = current_line_raw
-            match = re.search(r"\]: (.*)|\] (.*)|คอนโซล: (.*)", current_line_content)
-            if match:
-                current_line_content = next(g for g in match.groups() if g is not None)
-
-            current_line_lower = current_line_content.lower()
-
-            if ("players online:" in current_line_lower and "there are" in current_line_lower) or \
-               ("players online:" in current_line_lower):
-                if ":" in current_line_content:
-                    potential_players_str = current_line_content.split(":", 1)[1].strip()
-                    if potential_players_str:
-                        if "max players online" not in current_line_lower:
-                            player_list = [
-                                p.strip() for p in potential_players_str.split(',')
-                                if p.strip() and "no players online" not in p.lower() and "nessun giocatore connesso" not in p.lower()
-                            ]
-                            if player_list:
-                                logger.info(f"👤✅ Giocatori online (stessa riga): {player_list}")
-                                return player_list
-
-                if i + 1 < len(lines):
-                    next_line_raw = lines[i+1]
-                    next_line_content = next_line_raw
-                    match_next = re.search(r"\]: (.*)|\] (.*)|คอนโซล: (.*)", next_line_content)
-                    if match_next:
-                        next_line_content = next(g for g in match_next.groups() if g is not None)
-                    next_line_content_stripped = next_line_content.strip()
-                    if next_line_content_stripped and \
-                       not next_line_content_stripped.startswith("[") and \
-                       " INFO" not in next_line_raw and \
-                       " WARN" not in next_line_raw and \
-                       " ERROR" not in next_line_raw and \
-                       "คอนโซล:" not in next_line_raw:
-                        if "no players online" not in next_line_content_stripped.lower() and \
-                           "nessun giocatore connesso" not in next_line_content_stripped.lower():
-                            player_list = [p.strip() for p in next_line_content_stripped.split(',') if p.strip()]
-                            if player_list:
-                                logger.info(f"👤✅ Giocatori online (riga succ.): {player_list}")
-                                return player_list
-
-                logger.info("👤ℹ️ 'players online:' trovato, ma nessun giocatore elencato.")
-                return []
-
-        logger.info("👤❓ Pattern 'players online:' non trovato nei log recenti.")
-        return []
+        player_list = _parse_players_from_log_lines(lines)
+        if player_list is None:
+            logger.info("👤❓ Pattern 'players online:' non trovato nei log recenti.")
+            return []
+        return player_list
     except asyncio.TimeoutError:
         logger.error("🐳⏳ Timeout lettura log per giocatori online.")
     except subprocess.CalledProcessError as e:
@@ -8,13 +8,15 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
-from config import get_logger, WORLD_NAME
+from config import get_logger
+from server_registry import get_update_server
 from user_management import is_user_authenticated, get_minecraft_username
 # Assuming these handlers will be imported from their new files
 from structure_wizard_handlers import process_structure_file_wizard
 from hologram_handlers import handle_hologram_structure_upload, cleanup_hologram_data # Added cleanup_hologram_data
 from resource_pack_management import install_resource_pack_from_file, manage_world_resource_packs_json, ResourcePackError # Added ResourcePackError
 from importBuild.lite2Edit import litematica_converter
+from server_handlers import cmd_script_upload
 
 logger = get_logger(__name__)
 
@@ -120,6 +122,13 @@ async def handle_document_message(update: Update, context: ContextTypes.DEFAULT_
             await update.message.reply_text("❌ File non valido. Invia un file .mcstructure, .schematic o .schem")
             return
 
+    # Script di comandi: .mcfunction, oppure .txt con didascalia /cmd
+    caption = (update.message.caption or "").strip()
+    if original_filename and (original_filename.lower().endswith(".mcfunction") or
+                              (original_filename.lower().endswith(".txt") and caption.startswith("/cmd"))):
+        await cmd_script_upload(update, context)
+        return
+
     # Litematica conversion
     if original_filename and original_filename.lower().endswith(".litematic"):
         # Download the file
@@ -216,7 +225,8 @@ async def handle_document_message(update: Update, context: ContextTypes.DEFAULT_
             
             if zip_content_type == 'resource_pack':
                 # È un resource pack valido, procedi con la logica esistente
-                if not WORLD_NAME:
+                server = get_update_server(update)
+                if not server or not server.world_name:
                     await update.message.reply_text("Errore: WORLD_NAME non configurato. Impossibile aggiungere resource pack.")
                     return
                 
@@ -224,20 +234,21 @@ async def handle_document_message(update: Update, context: ContextTypes.DEFAULT_
                 
                 try:
                     installed_pack_path, pack_uuid, pack_version, pack_name = install_resource_pack_from_file(
-                        downloaded_file_path, original_filename
+                        downloaded_file_path, original_filename, server.data_path
                     )
                     logger.info(f"Resource pack installed: {pack_name} ({pack_uuid})")
 
                     manage_world_resource_packs_json(
-                        WORLD_NAME,
+                        server.world_name,
                         pack_uuid_to_add=pack_uuid,
                         pack_version_to_add=pack_version,
-                        add_at_beginning=True
+                        add_at_beginning=True,
+                        data_path=server.data_path
                     )
-                    logger.info(f"Resource pack {pack_name} ({pack_uuid}) activated for world {WORLD_NAME}.")
+                    logger.info(f"Resource pack {pack_name} ({pack_uuid}) activated for world {server.world_name}.")
 
                     await update.message.reply_text(
-                        f"✅ Resource pack '{html.escape(pack_name)}' installato e attivato per il mondo '{html.escape(WORLD_NAME)}'.\n"
+                        f"✅ Resource pack '{html.escape(pack_name)}' installato e attivato per il mondo '{html.escape(server.world_name)}'.\n"
                         "ℹ️ Per applicare le modifiche, esegui il comando: /restartserver\n"
                         "ℹ️ Per gestire i resource pack attivi (es. ordine, eliminazione), usa: /editresourcepacks",
                         parse_mode=ParseMode.HTML
@@ -0,0 +1,100 @@
+# minecraft_telegram_bot/entity_handlers.py
+import asyncio
+import html
+import re
+from datetime import datetime
+
+from telegram import Update
+from telegram.ext import ContextTypes
+from telegram.constants import ParseMode
+
+from config import get_logger
+from user_management import get_minecraft_username
+from docker_utils import get_player_position
+from server_registry import get_update_server
+from entity_index import get_entity_index, get_entity_indexer
+
+logger = get_logger(__name__)
+
+_DEFAULT_RADIUS = 64
+_MAX_RADIUS = 1024
+_MAX_RESULTS = 30
+_NUMBER = re.compile(r"-?\d+(\.\d+)?")
+_NAMED_WORDS = ("nominati", "named")
+_DIMENSIONS = {"overworld": 0, "nether": 1, "end": 2}
+
+
+def _parse_entities_args(args: list[str]) -> tuple[tuple[float, float] | None, float, str | None, bool, int]:
+    """[x z] [raggio] [tipo] [nominati] [overworld|nether|end] → (centro, raggio, tipo, solo nominati, dimensione)."""
+    numbers = [float(arg) for arg in args if _NUMBER.fullmatch(arg)]
+    words = [arg.lower() for arg in args if not _NUMBER.fullmatch(arg)]
+    center = (numbers[0], numbers[1]) if len(numbers) >= 2 else None
+    radius_args = numbers[2:] if center else numbers[:1]
+    radius = min(radius_args[0], _MAX_RADIUS) if radius_args else _DEFAULT_RADIUS
+    named = any(word in _NAMED_WORDS for word in words)
+    dimension = next((_DIMENSIONS[word] for word in words if word in _DIMENSIONS), 0)
+    types = [word for word in words if word not in _NAMED_WORDS and word not in _DIMENSIONS]
+    identifier = None
+    if types:
+        identifier = types[0] if ":" in types[0] else f"minecraft:{types[0]}"
+    return center, radius, identifier, named, dimension
+
+
+async def entities_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/entities [x z] [raggio] [tipo] [nominati]: entità vicine dall'indice; /entities aggiorna lo aggiorna subito."""
+    server = get_update_server(update)
+    if not server:
+        await update.message.reply_text("⚠️ Nessun server configurato.")
+        return
+    args = context.args or []
+    if args[:1] == ["aggiorna"]:
+        await update.message.reply_text("🧭 Aggiornamento dell'indice delle entità in corso...")
+        result = await get_entity_indexer().update(server)
+        if result is None:
+            await update.message.reply_text("❌ Aggiornamento non riuscito, dettagli nei log.")
+        else:
+            await update.message.reply_text(
+                f"🧭✅ Indice {'ricostruito' if result.full else 'aggiornato'} in {result.seconds:.1f}s: "
+                f"{result.tables_read} tabelle lette, {result.upserted} entità scritte, {result.deleted} rimosse.")
+        return
+
+    center, radius, identifier, named, dimension = _parse_entities_args(args)
+    if center is None:
+        minecraft_username = get_minecraft_username(update.effective_user.id)
+        position = None
+        if minecraft_username:
+            try:
+                position = await get_player_position(minecraft_username, user_id=update.effective_user.id,
+                                                     container=server.container)
+            except Exception as e:
+                logger.warning(f"🧭⚠️ Posizione di {minecraft_username} non disponibile: {e}")
+        if not position:
+            await update.message.reply_text(
+                "📍 Non riesco a leggere la tua posizione: indica le coordinate, es. "
+                "<code>/entities 120 -340 64 armor_stand nominati</code>", parse_mode=ParseMode.HTML)
+            return
+        center = (position["x"], position["z"])
+
+    index = get_entity_index()
+    state = await asyncio.to_thread(index.scan_state, server.name)
+    if state is None:
+        get_entity_indexer().update(server)
+        await update.message.reply_text("⏳ L'indice delle entità è in costruzione: riprova tra qualche minuto.")
+        return
+    entities = await asyncio.to_thread(index.query, server.name, center[0], center[1], radius, identifier, named,
+                                       dimension, _MAX_RESULTS)
+    x, z = center
+    filters = " ".join(filter(None, [identifier and f"<code>{html.escape(identifier)}</code>",
+                                     "nominate" if named else ""]))
+    lines = [f"🧭 <b>Entità {filters + ' ' if filters else ''}entro {radius:g} blocchi da {x:.0f}, {z:.0f}</b>"]
+    if not entities:
+        lines.append("Nessuna entità trovata.")
+    for entity in entities:
+        name = f" «{html.escape(entity.name)}»" if entity.name else ""
+        lines.append(f"• <code>{html.escape(entity.identifier.removeprefix('minecraft:'))}</code>{name} "
+                     f"a {entity.x:.1f}, {entity.y:.1f}, {entity.z:.1f} ({entity.distance:.0f} blocchi)")
+    if len(entities) == _MAX_RESULTS:
+        lines.append(f"<i>Mostrate le {_MAX_RESULTS} più vicine.</i>")
+    lines.append(f"\n<i>Indice del {datetime.fromtimestamp(state.scanned_at):%d/%m %H:%M} "
+                 "(le entità caricate dal server dopo l'ultimo salvataggio non compaiono).</i>")
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
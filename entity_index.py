@@ -0,0 +1,358 @@
+# minecraft_telegram_bot/entity_index.py
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import struct
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+from config import ENTITY_INDEX_FILE, ENTITY_INDEX_INTERVAL, ENTITY_INDEX_FULL_SCAN_HOURS, get_logger
+from entity_reader import ACTOR_PREFIX, DIGEST_PREFIX, LEGACY_ENTITY_TAG, NbtError, decode_entities
+from leveldb_reader import LevelDB, LevelDBError
+from server_registry import ServerContext, list_servers
+from world_management import get_world_directory_path
+
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    server TEXT NOT NULL,
+    key BLOB NOT NULL,  -- actorprefix + id, oppure chiave del chunk (0x32) + indice per il formato per chunk
+    dimension INTEGER NOT NULL,
+    cx INTEGER NOT NULL,
+    cz INTEGER NOT NULL,
+    x REAL NOT NULL,
+    y REAL NOT NULL,
+    z REAL NOT NULL,
+    identifier TEXT NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (server, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entities_by_chunk ON entities (server, dimension, cx, cz);
+CREATE TABLE IF NOT EXISTS scans (
+    server TEXT PRIMARY KEY,
+    db_inode INTEGER NOT NULL,
+    tables TEXT NOT NULL,  -- JSON {numero: dimensione} delle tabelle già lette
+    scanned_at REAL NOT NULL,
+    full_scan_at REAL NOT NULL
+);
+"""
+_INDEXED_FIELDS = frozenset({"identifier", "id", "Pos", "CustomName"})
+_WORKER_NICE = 15
+_FIRST_RUN_DELAY = 120
+
+
+@dataclass(slots=True)
+class IndexedEntity:
+    identifier: str
+    x: float
+    y: float
+    z: float
+    name: str
+    dimension: int
+    cx: int
+    cz: int
+    distance: float = 0.0
+
+
+@dataclass(slots=True)
+class ScanState:
+    db_inode: int
+    tables: dict[int, int]
+    scanned_at: float
+    full_scan_at: float
+
+
+@dataclass(slots=True)
+class ScanResult:
+    full: bool
+    tables_read: int
+    keys: int
+    upserted: int
+    deleted: int
+    seconds: float
+
+
+def _legacy_key(key: bytes) -> bool:
+    return len(key) in (9, 13) and key[-1] == LEGACY_ENTITY_TAG
+
+
+def _digest_dimension(key: bytes) -> int | None:
+    """Dimensione di una chiave digp (None se non lo è)."""
+    if not key.startswith(DIGEST_PREFIX):
+        return None
+    if len(key) == len(DIGEST_PREFIX) + 8:
+        return 0
+    if len(key) == len(DIGEST_PREFIX) + 12:
+        return struct.unpack_from("<i", key, len(DIGEST_PREFIX) + 8)[0]
+    return None
+
+
+class EntityIndex:
+    """
+    Indice SQLite delle entità dei mondi (tipo, posizione, nome, chunk), a secchi di chunk:
+    le ricerche per raggio leggono solo i chunk del quadrato che contiene il cerchio.
+    Scritto dal processo dell'indicizzatore e letto dal bot (journal WAL).
+    """
+
+    def __init__(self, path: str = ENTITY_INDEX_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()  # usato anche dai thread di asyncio.to_thread
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def scan_state(self, server: str) -> ScanState | None:
+        with self._lock:
+            row = self._db.execute("SELECT db_inode, tables, scanned_at, full_scan_at FROM scans WHERE server = ?",
+                                   (server,)).fetchone()
+        if row is None:
+            return None
+        return ScanState(row[0], {int(n): size for n, size in json.loads(row[1]).items()}, row[2], row[3])
+
+    def count(self, server: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entities WHERE server = ?", (server,)).fetchone()[0]
+
+    def query(self, server: str, x: float, z: float, radius: float, identifier: str | None = None,
+              named: bool = False, dimension: int = 0, limit: int = 50) -> list[IndexedEntity]:
+        """Entità entro radius blocchi da (x, z), dalla più vicina."""
+        where = ["server = ?", "dimension = ?", "cx BETWEEN ? AND ?", "cz BETWEEN ? AND ?",
+                 "(x - ?) * (x - ?) + (z - ?) * (z - ?) <= ?"]
+        params = [server, dimension, math.floor(x - radius) >> 4, math.floor(x + radius) >> 4,
+                  math.floor(z - radius) >> 4, math.floor(z + radius) >> 4, x, x, z, z, radius * radius]
+        if identifier:
+            where.append("identifier = ?")
+            params.append(identifier)
+        if named:
+            where.append("name != ''")
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT identifier, x, y, z, name, dimension, cx, cz FROM entities WHERE "
+                f"{' AND '.join(where)} ORDER BY (x - ?) * (x - ?) + (z - ?) * (z - ?) LIMIT ?",
+                params + [x, x, z, z, limit]).fetchall()
+        entities = [IndexedEntity(*row) for row in rows]
+        for entity in entities:
+            entity.distance = math.hypot(entity.x - x, entity.z - z)
+        return entities
+
+    # --- Scrittura (processo dell'indicizzatore) ---
+
+    def _dimensions(self, server: str, keys: list[bytes]) -> dict[bytes, int]:
+        dimensions = {}
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            rows = self._db.execute(f"SELECT key, dimension FROM entities WHERE server = ? AND key IN "
+                                    f"({','.join('?' * len(batch))})", [server] + batch).fetchall()
+            dimensions.update(rows)
+        return dimensions
+
+    def apply(self, server: str, rows: list[tuple], deleted_keys: list[bytes], legacy_chunks: list[bytes],
+              state: ScanState, full: bool):
+        """Aggiorna le entità di un server in una sola transazione (full: sostituisce tutto l'indice)."""
+        with self._lock, self._db:
+            if full:
+                self._db.execute("DELETE FROM entities WHERE server = ?", (server,))
+            for chunk_key in legacy_chunks:
+                self._db.execute("DELETE FROM entities WHERE server = ? AND key BETWEEN ? AND ?",
+                                 (server, chunk_key + b"\0\0", chunk_key + b"\xff\xff"))
+            self._db.executemany("DELETE FROM entities WHERE server = ? AND key = ?",
+                                 [(server, key) for key in deleted_keys])
+            self._db.executemany("INSERT OR REPLACE INTO entities (server, key, dimension, cx, cz, x, y, z, identifier,"
+                                 " name) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [(server,) + row for row in rows])
+            self._db.execute("INSERT OR REPLACE INTO scans (server, db_inode, tables, scanned_at, full_scan_at)"
+                             " VALUES (?, ?, ?, ?, ?)", (server, state.db_inode, json.dumps(state.tables),
+                                                         state.scanned_at, state.full_scan_at))
+
+
+def _rows(key: bytes, record: bytes, dimension: int) -> list[tuple]:
+    try:
+        entities = decode_entities(record, _INDEXED_FIELDS)
+    except NbtError as e:
+        logger.warning(f"🧭⚠️ Entità illeggibile ({key.hex()}): {e}")
+        return []
+    rows = []
+    for i, entity in enumerate(entities):
+        # Il formato per chunk ha più entità nello stesso record: la chiave riceve un indice
+        row_key = key + struct.pack(">H", i) if _legacy_key(key) else key
+        x, y, z = entity.position
+        rows.append((row_key, dimension, entity.chunk[0], entity.chunk[1], x, y, z, entity.identifier, entity.custom_name))
+    return rows
+
+
+def _scan(index: EntityIndex, server: str, db: LevelDB, state: ScanState | None, full: bool):
+    """(righe, chiavi eliminate, chunk legacy da ripulire, tabelle lette, chiavi esaminate)."""
+    known = set() if full else {number for number, size in state.tables.items()
+                                if number in db.tables and db.tables[number].size == size}
+    digest_dimensions, actors, legacy = {}, {}, {}
+    if full:
+        for key, value in db.items():
+            dimension = _digest_dimension(key)
+            if dimension is not None:
+                digest_dimensions.update((value[i:i + 8], dimension) for i in range(0, len(value) - 7, 8))
+            elif key.startswith(ACTOR_PREFIX):
+                actors[key] = value
+            elif _legacy_key(key):
+                legacy[key] = value
+        keys = len(actors) + len(legacy)
+    else:
+        changed = db.keys_since(known)
+        keys = len(changed)
+        actor_keys = {key for key in changed if key.startswith(ACTOR_PREFIX)}
+        for key in changed:
+            dimension = _digest_dimension(key)
+            if dimension is not None:
+                digest = db.get(key) or b""
+                ids = [digest[i:i + 8] for i in range(0, len(digest) - 7, 8)]
+                digest_dimensions.update((actor_id, dimension) for actor_id in ids)
+                actor_keys.update(ACTOR_PREFIX + actor_id for actor_id in ids)
+            elif _legacy_key(key):
+                legacy[key] = db.get(key)
+        actors = {key: db.get(key) for key in actor_keys}
+
+    previous = {} if full else index._dimensions(server, [key for key, value in actors.items() if value is not None])
+    rows, deleted = [], []
+    for key, value in actors.items():
+        if value is None:
+            deleted.append(key)
+            continue
+        dimension = digest_dimensions.get(key[len(ACTOR_PREFIX):], previous.get(key, 0))
+        rows += _rows(key, value, dimension)
+    for key, value in legacy.items():
+        if value:
+            dimension = struct.unpack_from("<i", key, 8)[0] if len(key) == 13 else 0
+            rows += _rows(key, value, dimension)
+    return rows, deleted, list(legacy), len(set(db.tables) - known), keys
+
+
+def scan_world(index_path: str, server: str, world_dir: str, full_scan_hours: float) -> ScanResult:
+    """
+    Aggiorna l'indice di un server leggendo solo le tabelle LevelDB create dopo l'ultima
+    scansione e i log; la prima volta, se il database è stato sostituito (ripristino) o
+    dopo full_scan_hours ore, rilegge tutto il mondo. Gira nel processo dell'indicizzatore.
+    """
+    started = time.monotonic()
+    db_dir = os.path.join(world_dir, "db")
+    index = EntityIndex(index_path)
+    try:
+        state = index.scan_state(server)
+        inode = os.stat(db_dir).st_ino
+        now = time.time()
+        full = (state is None or state.db_inode != inode
+                or (full_scan_hours > 0 and now - state.full_scan_at > full_scan_hours * 3600))
+        # Checksum non verificati: l'indice si rigenera, e la verifica dei blocchi è compito di backup_verifier
+        with LevelDB(db_dir, verify_checksums=False) as db:
+            rows, deleted, legacy_chunks, tables_read, keys = _scan(index, server, db, state, full)
+            tables = {number: table.size for number, table in db.tables.items()}
+        new_state = ScanState(inode, tables, now, now if full else state.full_scan_at)
+        index.apply(server, rows, deleted, legacy_chunks, new_state, full)
+    finally:
+        index.close()
+    return ScanResult(full, tables_read, keys, len(rows), len(deleted), time.monotonic() - started)
+
+
+# --- Servizio ---
+
+def _init_worker(niceness: int):
+    try:
+        os.nice(niceness)
+    except OSError:
+        pass
+
+
+class EntityIndexer:
+    """Aggiorna periodicamente l'indice delle entità di ogni server in un processo a bassa priorità."""
+
+    def __init__(self):
+        self._pool: ProcessPoolExecutor | None = None
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(_WORKER_NICE,))
+        return self._pool
+
+    def update(self, server: ServerContext) -> asyncio.Task:
+        """Avvia (o riusa, se già in corso) l'aggiornamento dell'indice di un server."""
+        task = self._tasks.get(server.name)
+        if task is None or task.done():
+            task = self._tasks[server.name] = asyncio.create_task(self._update(server))
+        return task
+
+    async def _update(self, server: ServerContext) -> ScanResult | None:
+        world_dir = await asyncio.to_thread(get_world_directory_path, server.world_name, server.data_path)
+        if not world_dir:
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._executor(), scan_world, ENTITY_INDEX_FILE, server.name,
+                                                world_dir, ENTITY_INDEX_FULL_SCAN_HOURS)
+        except BrokenProcessPool as e:
+            self._pool = None
+            logger.error(f"🧭❌ Processo dell'indice entità terminato ({server.name}): {e}")
+            return None
+        except (LevelDBError, OSError, sqlite3.Error) as e:
+            # Tipicamente una compattazione o un ripristino durante la lettura: si riprova al prossimo giro
+            logger.warning(f"🧭⚠️ Indice entità di '{server.name}' non aggiornato: {e}")
+            return None
+        logger.info(f"🧭 Indice entità '{server.name}' {'ricostruito' if result.full else 'aggiornato'} in "
+                    f"{result.seconds:.2f}s: {result.tables_read} tabelle lette, {result.upserted} entità "
+                    f"scritte, {result.deleted} rimosse.")
+        return result
+
+    async def update_all(self, context=None):
+        for server in list_servers():
+            await self.update(server)
+
+    async def stop(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        self._tasks.clear()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+_index: EntityIndex | None = None
+_indexer: EntityIndexer | None = None
+
+
+def get_entity_index() -> EntityIndex:
+    global _index
+    if _index is None:
+        _index = EntityIndex()
+    return _index
+
+
+def get_entity_indexer() -> EntityIndexer:
+    global _indexer
+    if _indexer is None:
+        _indexer = EntityIndexer()
+    return _indexer
+
+
+def start_entity_indexer(application) -> EntityIndexer:
+    indexer = get_entity_indexer()
+    if ENTITY_INDEX_INTERVAL > 0 and application.job_queue is not None:
+        application.job_queue.run_repeating(indexer.update_all, interval=ENTITY_INDEX_INTERVAL,
+                                            first=_FIRST_RUN_DELAY, name="entity-index")
+    return indexer
+
+
+async def stop_entity_indexer():
+    global _indexer, _index
+    if _indexer is not None:
+        await _indexer.stop()
+        _indexer = None
+    if _index is not None:
+        _index.close()
+        _index = None
@@ -0,0 +1,221 @@
+# minecraft_telegram_bot/entity_reader.py
+import math
+import os
+import struct
+from dataclasses import dataclass, field
+
+from config import get_logger
+from leveldb_reader import LevelDB, LevelDBError
+
+logger = get_logger(__name__)
+
+ARMOR_STAND = "minecraft:armor_stand"
+DIGEST_PREFIX = b"digp"
+ACTOR_PREFIX = b"actorprefix"
+LEGACY_ENTITY_TAG = 0x32  # chunk + 0x32: entità concatenate, prima del formato digp/actorprefix (1.18.30)
+_LEGACY_IDS = {61: ARMOR_STAND}  # id numerico & 0xFF dei mondi vecchi
+_ARMOR_STAND_FIELDS = frozenset({"identifier", "id", "Pos", "Rotation", "CustomName", "Pose", "Invisible",
+                                 "Marker", "UniqueID"})
+_ATTEMPTS = 3
+
+
+class NbtError(Exception):
+    pass
+
+
+# --- NBT little-endian (Bedrock) ---
+
+_FIXED = {1: (1, "<b"), 2: (2, "<h"), 3: (4, "<i"), 4: (8, "<q"), 5: (4, "<f"), 6: (8, "<d")}
+_ARRAYS = {7: (1, "b"), 11: (4, "i"), 12: (8, "q")}
+
+
+def _read_string(data: bytes, pos: int) -> tuple[str, int]:
+    (length,) = struct.unpack_from("<H", data, pos)
+    pos += 2
+    return data[pos:pos + length].decode("utf-8", errors="replace"), pos + length
+
+
+def _read_payload(data: bytes, pos: int, tag: int, wanted: frozenset | None = None, decode: bool = True):
+    """Valore di un tag a partire da pos; con decode=False lo salta soltanto (restituisce None)."""
+    if tag in _FIXED:
+        size, fmt = _FIXED[tag]
+        return (struct.unpack_from(fmt, data, pos)[0] if decode else None), pos + size
+    if tag in _ARRAYS:
+        size, fmt = _ARRAYS[tag]
+        (length,) = struct.unpack_from("<i", data, pos)
+        pos += 4
+        end = pos + length * size
+        return (list(struct.unpack_from(f"<{length}{fmt}", data, pos)) if decode else None), end
+    if tag == 8:
+        if not decode:
+            (length,) = struct.unpack_from("<H", data, pos)
+            return None, pos + 2 + length
+        return _read_string(data, pos)
+    if tag == 9:
+        item_tag = data[pos]
+        (length,) = struct.unpack_from("<i", data, pos + 1)
+        pos += 5
+        if item_tag in _FIXED and not decode:
+            return None, pos + max(length, 0) * _FIXED[item_tag][0]
+        items = []
+        for _ in range(max(length, 0)):
+            item, pos = _read_payload(data, pos, item_tag, decode=decode)
+            items.append(item)
+        return (items if decode else None), pos
+    if tag == 10:
+        return _read_compound(data, pos, wanted, decode)
+    raise NbtError(f"tag NBT {tag} sconosciuto alla posizione {pos}")
+
+
+def _read_compound(data: bytes, pos: int, wanted: frozenset | None = None, decode: bool = True) -> tuple[dict | None, int]:
+    values = {} if decode else None
+    while True:
+        tag = data[pos]
+        pos += 1
+        if tag == 0:
+            return values, pos
+        name, pos = _read_string(data, pos)
+        keep = decode and (wanted is None or name in wanted)
+        # I campi scelti vengono decodificati per intero, gli altri solo saltati
+        value, pos = _read_payload(data, pos, tag, decode=keep)
+        if keep:
+            values[name] = value
+
+
+def read_nbt(data: bytes, pos: int = 0, wanted: frozenset | None = None) -> tuple[dict, int]:
+    """
+    Compound radice little-endian da data[pos:], come dizionario Python; con wanted
+    vengono decodificati solo quei campi di primo livello. Restituisce (valori, fine).
+    """
+    try:
+        if data[pos] != 10:
+            raise NbtError(f"atteso un compound, trovato il tag {data[pos]}")
+        _, pos = _read_string(data, pos + 1)
+        return _read_compound(data, pos, wanted)
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise NbtError(f"NBT troncato o non valido: {e}") from e
+
+
+# --- Entità ---
+
+@dataclass(slots=True)
+class Entity:
+    identifier: str
+    position: tuple[float, float, float]
+    rotation: tuple[float, float]
+    chunk: tuple[int, int]
+    custom_name: str = ""
+    unique_id: int = 0
+    fields: dict = field(default_factory=dict)
+
+
+def chunk_prefix(cx: int, cz: int, dimension: int = 0) -> bytes:
+    prefix = struct.pack("<ii", cx, cz)
+    return prefix + struct.pack("<i", dimension) if dimension else prefix
+
+
+def _identifier(values: dict) -> str:
+    if isinstance(values.get("identifier"), str):
+        return values["identifier"]
+    legacy_id = values.get("id")
+    if isinstance(legacy_id, int):
+        return _LEGACY_IDS.get(legacy_id & 0xFF, f"legacy:{legacy_id & 0xFF}")
+    return str(legacy_id or "?")
+
+
+def _entity(values: dict) -> Entity | None:
+    pos, rotation = values.get("Pos"), values.get("Rotation")
+    if not isinstance(pos, list) or len(pos) < 3 or not all(isinstance(v, float) and math.isfinite(v) for v in pos[:3]):
+        return None
+    if not isinstance(rotation, list) or len(rotation) < 2:
+        rotation = [0.0, 0.0]
+    chunk = (math.floor(pos[0]) >> 4, math.floor(pos[2]) >> 4)
+    return Entity(_identifier(values), (pos[0], pos[1], pos[2]), (rotation[0], rotation[1]), chunk,
+                  values.get("CustomName") or "", values.get("UniqueID") or 0, values)
+
+
+def decode_entities(record: bytes, wanted: frozenset | None = None) -> list[Entity]:
+    """Entità di un record: un compound per actorprefix, più compound di seguito nel formato per chunk."""
+    entities, pos = [], 0
+    while pos < len(record):
+        values, pos = read_nbt(record, pos, wanted)
+        entity = _entity(values)
+        if entity:
+            entities.append(entity)
+    return entities
+
+
+def _chunk_entity_records(db: LevelDB, cx: int, cz: int, dimension: int) -> list[bytes]:
+    """Record NBT delle entità di un chunk: formato digp/actorprefix e formato per chunk (0x32)."""
+    prefix = chunk_prefix(cx, cz, dimension)
+    records = []
+    digest = db.get(DIGEST_PREFIX + prefix)
+    if digest:
+        for i in range(0, len(digest) - 7, 8):
+            actor = db.get(ACTOR_PREFIX + digest[i:i + 8])
+            if actor is not None:
+                records.append(actor)
+    legacy = db.get(prefix + bytes([LEGACY_ENTITY_TAG]))
+    if legacy:
+        records.append(legacy)
+    return records
+
+
+def chunk_entities(db: LevelDB, cx: int, cz: int, dimension: int = 0,
+                   wanted: frozenset | None = None) -> list[Entity]:
+    """Entità salvate in un chunk; wanted limita i campi NBT decodificati (vedi read_nbt)."""
+    entities = []
+    for record in _chunk_entity_records(db, cx, cz, dimension):
+        try:
+            entities += decode_entities(record, wanted)
+        except NbtError as e:
+            logger.warning(f"🧍⚠️ Entità illeggibile nel chunk {cx},{cz}: {e}")
+    return entities
+
+
+def yaw_to_direction(yaw: float) -> str:
+    """Direzione cardinale (come search_armorstand.py) dello sguardo con questo yaw."""
+    directions = ("Sud", "Sud-Ovest", "Ovest", "Nord-Ovest", "Nord", "Nord-Est", "Est", "Sud-Est")
+    return directions[int(((yaw % 360) + 22.5) // 45) % 8]
+
+
+def armor_stand_data(entity: Entity) -> dict:
+    """Dizionario nel formato dell'output JSON di search_armorstand.py, più la posa."""
+    yaw, pitch = entity.rotation
+    pose = entity.fields.get("Pose")
+    return {
+        "id": ARMOR_STAND,
+        "position": [float(v) for v in entity.position],
+        "yaw": float(yaw),
+        "pitch": float(pitch),
+        "direction": yaw_to_direction(yaw),
+        "custom_name": entity.custom_name or None,
+        "marker": bool(entity.fields.get("Marker", False)),
+        "invisible": bool(entity.fields.get("Invisible", False)),
+        "pose": pose.get("PoseIndex") if isinstance(pose, dict) else None,
+        "chunk": list(entity.chunk),
+    }
+
+
+def find_armor_stands(world_dir: str, x: float, z: float, radius: int = 0, dimension: int = 0) -> list[dict]:
+    """
+    Armor stand nei chunk entro radius chunk da (x, z), letti direttamente dal LevelDB
+    del mondo senza lock: funziona a server acceso. Se una compattazione elimina una
+    tabella durante la lettura si riapre il database.
+    """
+    center_x, center_z = math.floor(x) >> 4, math.floor(z) >> 4
+    for attempt in range(1, _ATTEMPTS + 1):
+        try:
+            # Checksum non verificati: è una ricerca, non una verifica, e deve restare nei millisecondi
+            with LevelDB(os.path.join(world_dir, "db"), verify_checksums=False) as db:
+                stands = []
+                for cx in range(center_x - radius, center_x + radius + 1):
+                    for cz in range(center_z - radius, center_z + radius + 1):
+                        stands += [armor_stand_data(entity)
+                                   for entity in chunk_entities(db, cx, cz, dimension, _ARMOR_STAND_FIELDS)
+                                   if entity.identifier == ARMOR_STAND]
+                return stands
+        except (LevelDBError, OSError) as e:
+            if attempt == _ATTEMPTS:
+                raise
+            logger.warning(f"🧍⚠️ Lettura entità da ripetere (tentativo {attempt}): {e}")
@@ -0,0 +1,115 @@
+# minecraft_telegram_bot/hot_backup.py
+import asyncio
+import os
+import re
+import time
+from dataclasses import dataclass
+
+from config import HOT_BACKUP_TIMEOUT, get_logger
+from command_queue import queue_query
+from world_management import get_world_directory_path
+from archivers import ArchiveEntry, get_archiver
+
+logger = get_logger(__name__)
+
+_SAVE_HOLD_RE = re.compile(r"^(Saving\.\.\.|The command is already running)")
+_SAVE_QUERY_RE = re.compile(r"^(Data saved\. Files are now ready to be copied\.|A previous save has not been completed\.)")
+_SAVE_RESUME_RE = re.compile(r"^(Changes to the (level|world) are resumed\.|A previous save has not been completed\.)")
+# "Bedrock level/db/000005.ldb:1234, Bedrock level/level.dat:2048, ..."
+_FILE_ENTRY_RE = re.compile(r"\s*(.+?):(\d+)\s*$")
+
+
+class HotBackupError(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class HotBackupResult:
+    archive_path: str
+    files: int
+    total_bytes: int
+    held_seconds: float
+
+
+def parse_save_query_files(line: str) -> list[tuple[str, int]]:
+    """File da copiare e lunghezza da troncare, dalla riga che segue "Data saved"."""
+    files = []
+    for entry in line.split(","):
+        match = _FILE_ENTRY_RE.match(entry)
+        if match:
+            files.append((match.group(1), int(match.group(2))))
+    return files
+
+
+def _copy_truncated_files(worlds_dir: str, files: list[tuple[str, int]], archive_path: str,
+                          archiver_name: str = "zip") -> int:
+    """
+    Scrive nell'archivio solo i primi `length` byte di ogni file: i file LevelDB possono
+    crescere durante la copia, ma lo snapshot valido è quello indicato da save query.
+    """
+    root = os.path.realpath(worlds_dir)
+    entries = []
+    for relative_path, length in files:
+        source = os.path.realpath(os.path.join(root, relative_path))
+        if os.path.commonpath([root, source]) != root:
+            raise HotBackupError(f"Percorso fuori dalla cartella dei mondi: {relative_path}")
+        entries.append(ArchiveEntry(source, relative_path.replace(os.sep, "/"), length))
+    return get_archiver(archiver_name).write(archive_path, entries).input_bytes
+
+
+async def _save_query(container: str) -> list[tuple[str, int]] | None:
+    """None finché il server non ha finito di preparare lo snapshot."""
+    records = await queue_query(
+        "save query", expect=_SAVE_QUERY_RE, container=container, timeout=10,
+        extra_lines=lambda m: 1 if m.group(1).startswith("Data saved") else 0,
+    )
+    if len(records) < 2:
+        return None
+    return parse_save_query_files(records[1].message)
+
+
+async def hot_backup(container: str, world_name: str, data_path: str, archive_path: str,
+                     timeout: float = HOT_BACKUP_TIMEOUT, copy_files=None,
+                     archive_format: str = "zip") -> HotBackupResult:
+    """
+    Backup a server avviato: `save hold` sospende le scritture sul disco,
+    `save query` restituisce l'elenco dei file con le lunghezze valide, che vengono
+    copiati troncati; `save resume` viene sempre inviato, anche in caso di errore.
+    `copy_files(worlds_dir, files, archive_path) -> byte` sostituisce la scrittura
+    dell'archivio `archive_format` (vedi archivers.py), ad esempio per lo store.
+    """
+    world_dir = get_world_directory_path(world_name, data_path)
+    if not world_dir:
+        raise HotBackupError(f"Directory mondo '{world_name}' non trovata.")
+    worlds_dir = os.path.dirname(world_dir)
+
+    await queue_query("save hold", expect=_SAVE_HOLD_RE, container=container, timeout=10)
+    held_at = time.monotonic()
+    try:
+        deadline = held_at + timeout
+        files = None
+        while files is None:
+            files = await _save_query(container)
+            if files is None:
+                if time.monotonic() >= deadline:
+                    raise HotBackupError(f"Il server non ha completato il salvataggio entro {timeout:.0f}s.")
+                await asyncio.sleep(1)
+        if not files:
+            raise HotBackupError("save query non ha restituito alcun file.")
+        try:
+            if copy_files:
+                total = await asyncio.to_thread(copy_files, worlds_dir, files, archive_path)
+            else:
+                total = await asyncio.to_thread(_copy_truncated_files, worlds_dir, files, archive_path, archive_format)
+        except BaseException:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+            raise
+    finally:
+        try:
+            await queue_query("save resume", expect=_SAVE_RESUME_RE, container=container, timeout=10)
+        except Exception as e:
+            logger.error(f"💾❌ 'save resume' non confermato su '{container}': {e}")
+    held = time.monotonic() - held_at
+    logger.info(f"💾✅ Backup a caldo di '{world_name}': {len(files)} file, {total} byte, scritture sospese per {held:.1f}s.")
+    return HotBackupResult(archive_path, len(files), total, held)
@@ -0,0 +1,236 @@
+# minecraft_telegram_bot/level_dat.py
+import copy
+import io
+import os
+import struct
+import threading
+from dataclasses import dataclass
+
+import nbtlib
+from nbtlib.tag import Byte, Short, Int, Long, Float, Double, String
+
+from config import get_logger
+
+logger = get_logger(__name__)
+
+_HEADER = struct.Struct("<ii")  # versione del formato di salvataggio, lunghezza del payload NBT
+_TRUE = ("true", "1", "si", "sì", "on", "yes")
+_FALSE = ("false", "0", "no", "off")
+DIFFICULTIES = {"peaceful": 0, "pacifica": 0, "easy": 1, "facile": 1, "normal": 2, "normale": 2,
+                "hard": 3, "difficile": 3}
+GAME_MODES = {"survival": 0, "sopravvivenza": 0, "creative": 1, "creativa": 1, "adventure": 2, "avventura": 2}
+# Nomi comodi per /worldsettings → campo di level.dat
+_ALIASES = {"difficulty": "Difficulty", "difficolta": "Difficulty", "difficoltà": "Difficulty",
+            "gamemode": "GameType", "modalita": "GameType", "modalità": "GameType",
+            "creative": "hasBeenLoadedInCreative", "cheats": "commandsEnabled"}
+_SPAWN_FIELDS = ("SpawnX", "SpawnY", "SpawnZ")
+CREATIVE_FLAG = "hasBeenLoadedInCreative"
+
+
+class LevelDatError(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class LevelDat:
+    path: str
+    version: int
+    root: nbtlib.File
+    mtime_ns: int
+    size: int
+
+    def get(self, name: str, default=None):
+        key = _existing_key(self.root, name)
+        return self.root[key] if key else default
+
+
+@dataclass(slots=True)
+class LevelDatChange:
+    key: str
+    old: object
+    new: object
+
+
+def _existing_key(root: nbtlib.File, name: str) -> str | None:
+    """Nome del campo così come compare nel file (i mondi vecchi usano HasBeenLoadedInCreative)."""
+    if name in root:
+        return name
+    lowered = name.lower()
+    return next((key for key in root if key.lower() == lowered), None)
+
+
+def _parse(path: str) -> LevelDat:
+    stat = os.stat(path)
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise LevelDatError(f"{path}: troppo corto (header mancante)")
+        version, length = _HEADER.unpack(header)
+        if length != stat.st_size - _HEADER.size:
+            # Il payload fa fede: l'header viene comunque ricalcolato al salvataggio
+            logger.warning(f"📜⚠️ {path}: header di {length} byte, payload di {stat.st_size - _HEADER.size}")
+        try:
+            root = nbtlib.File.parse(f, byteorder="little")
+        except Exception as e:
+            raise LevelDatError(f"{path}: NBT non leggibile: {e}") from e
+    return LevelDat(path, version, root, stat.st_mtime_ns, stat.st_size)
+
+
+class LevelDatCache:
+    """
+    level.dat già parsati, per percorso: il file viene riletto solo se mtime o
+    dimensione sono cambiati (il server lo riscrive a ogni salvataggio e all'arresto).
+    """
+
+    def __init__(self):
+        self._entries: dict[str, LevelDat] = {}
+        self._lock = threading.Lock()  # letture ed edit girano in asyncio.to_thread
+
+    def read(self, path: str) -> LevelDat:
+        """level.dat in memoria; da trattare in sola lettura (edit() lavora su una copia)."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached and (cached.mtime_ns, cached.size) == (stat.st_mtime_ns, stat.st_size):
+                return cached
+            level = self._entries[path] = _parse(path)
+            return level
+
+    def _apply(self, path: str, edits: dict[str, object]) -> tuple[LevelDat, nbtlib.File, list[LevelDatChange]]:
+        level = self.read(path)
+        root = copy.deepcopy(level.root)
+        return level, root, apply_edits(root, edits)
+
+    def preview(self, path: str, edits: dict[str, object]) -> list[LevelDatChange]:
+        """Modifiche che edit() applicherebbe, senza scrivere nulla (anche a server acceso)."""
+        return self._apply(os.path.abspath(path), edits)[2]
+
+    def edit(self, path: str, edits: dict[str, object]) -> list[LevelDatChange]:
+        """
+        Applica in una sola scrittura tutte le modifiche ({campo: valore}, vedi
+        apply_edits) e restituisce quelle effettive; se nessun valore cambia il file
+        non viene toccato. Da usare a server fermo.
+        """
+        path = os.path.abspath(path)
+        level, root, changes = self._apply(path, edits)
+        if not changes:
+            return []
+        with self._lock:
+            self._entries[path] = _write(path, level.version, root)
+        logger.info(f"📜 {path}: " + ", ".join(f"{c.key} {c.old} → {c.new}" for c in changes))
+        return changes
+
+    def invalidate(self, path: str | None = None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+
+def _write(path: str, version: int, root: nbtlib.File) -> LevelDat:
+    """Header ricalcolato sul nuovo payload, file temporaneo accanto all'originale e rename atomico."""
+    buffer = io.BytesIO()
+    root.write(buffer, byteorder="little")
+    payload = buffer.getvalue()
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(_HEADER.pack(version, len(payload)))
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    stat = os.stat(path)
+    return LevelDat(path, version, root, stat.st_mtime_ns, stat.st_size)
+
+
+def _coerce(key: str, tag, value):
+    """Valore (anche stringa da Telegram) convertito nel tipo del tag già presente."""
+    text = str(value).strip().lower()
+    try:
+        if isinstance(tag, Byte):
+            if isinstance(value, bool) or text in _TRUE + _FALSE:
+                return Byte(1 if value is True or text in _TRUE else 0)
+            return Byte(int(text))
+        if isinstance(tag, (Short, Int, Long)):
+            if key == "Difficulty" and text in DIFFICULTIES:
+                return Int(DIFFICULTIES[text])
+            if key == "GameType" and text in GAME_MODES:
+                return Int(GAME_MODES[text])
+            return type(tag)(int(text))
+        if isinstance(tag, (Float, Double)):
+            return type(tag)(float(text))
+        if isinstance(tag, String):
+            return String(str(value))
+    except (ValueError, OverflowError) as e:
+        raise LevelDatError(f"valore '{value}' non valido per {key}: {e}") from e
+    raise LevelDatError(f"{key} è un {type(tag).__name__}: modificabile solo da un editor NBT")
+
+
+def apply_edits(root: nbtlib.File, edits: dict[str, object]) -> list[LevelDatChange]:
+    """
+    Modifica root in memoria. I campi devono esistere già (Bedrock scrive tutte le game
+    rule in level.dat, quindi un nome assente è quasi sempre un errore di battitura) e
+    mantengono il loro tipo NBT. Nomi accettati, senza distinzione di maiuscole: i campi
+    di level.dat (keepinventory, SpawnX, ...) e gli alias difficulty, gamemode, creative,
+    cheats e spawn ("x,y,z").
+    """
+    expanded: dict[str, object] = {}
+    for name, value in edits.items():
+        if name.lower() == "spawn":
+            coordinates = value if isinstance(value, (list, tuple)) else str(value).split(",")
+            if len(coordinates) != 3:
+                raise LevelDatError(f"spawn richiede x,y,z (ricevuto '{value}')")
+            expanded.update(zip(_SPAWN_FIELDS, coordinates))
+        else:
+            expanded[_ALIASES.get(name.lower(), name)] = value
+
+    changes, missing = [], []
+    for name, value in expanded.items():
+        key = _existing_key(root, name)
+        if key is None:
+            missing.append(name)
+            continue
+        new = _coerce(key, root[key], value)
+        if key == "Difficulty" and not 0 <= new <= 3:
+            raise LevelDatError(f"difficoltà {int(new)} fuori intervallo (0-3)")
+        if root[key] != new:
+            changes.append(LevelDatChange(key, root[key].unpack(), new.unpack()))
+            root[key] = new
+    if missing:
+        raise LevelDatError(f"campi non presenti in level.dat: {', '.join(missing)}")
+    return changes
+
+
+def game_rules(level: LevelDat) -> dict[str, object]:
+    """Game rule del mondo: in Bedrock sono i campi booleani/interi in minuscolo di primo livello."""
+    return {key: level.root[key].unpack() for key in sorted(level.root)
+            if key.islower() and isinstance(level.root[key], (Byte, Int))}
+
+
+_cache: LevelDatCache | None = None
+
+
+def get_level_dat_cache() -> LevelDatCache:
+    global _cache
+    if _cache is None:
+        _cache = LevelDatCache()
+    return _cache
+
+
+def read_level_dat(path: str) -> LevelDat:
+    return get_level_dat_cache().read(path)
+
+
+def preview_level_dat(path: str, edits: dict[str, object]) -> list[LevelDatChange]:
+    return get_level_dat_cache().preview(path, edits)
+
+
+def edit_level_dat(path: str, edits: dict[str, object]) -> list[LevelDatChange]:
+    return get_level_dat_cache().edit(path, edits)
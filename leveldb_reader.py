@@ -0,0 +1,599 @@
+# minecraft_telegram_bot/leveldb_reader.py
+import heapq
+import os
+import struct
+import zlib
+from dataclasses import dataclass, field
+
+from config import get_logger
+
+try:
+    import crc32c as _crc32c  # opzionale: checksum dei blocchi in C invece che in Python
+except ImportError:
+    _crc32c = None
+
+logger = get_logger(__name__)
+
+_TABLE_MAGIC = 0xdb4775248b80fb57
+_FOOTER_SIZE = 48
+_BLOCK_TRAILER_SIZE = 5
+_LOG_BLOCK_SIZE = 32768
+_LOG_HEADER_SIZE = 7
+_LOG_FULL, _LOG_FIRST, _LOG_MIDDLE, _LOG_LAST = 1, 2, 3, 4
+# Compressione dei blocchi: 2 e 4 sono le varianti zlib del fork LevelDB di Mojang
+_NO_COMPRESSION, _SNAPPY, _ZLIB, _ZLIB_RAW = 0, 1, 2, 4
+_TYPE_DELETION, _TYPE_VALUE = 0, 1
+_TABLE_SUFFIXES = (".ldb", ".sst")
+
+
+class LevelDBError(Exception):
+    pass
+
+
+def _make_crc32c_table() -> list[int]:
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC32C_TABLE = _make_crc32c_table()
+
+
+def crc32c(data: bytes) -> int:
+    if _crc32c is not None:
+        return _crc32c.crc32c(data)
+    crc = 0xFFFFFFFF
+    table = _CRC32C_TABLE
+    for byte in data:
+        crc = table[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+def _unmask_crc(masked: int) -> int:
+    rot = (masked - 0xa282ead8) & 0xFFFFFFFF
+    return ((rot >> 17) | (rot << 15)) & 0xFFFFFFFF
+
+
+def _varint(data: bytes, pos: int) -> tuple[int, int]:
+    result, shift = 0, 0
+    while True:
+        if pos >= len(data):
+            raise LevelDBError("varint troncato")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _length_prefixed(data: bytes, pos: int) -> tuple[bytes, int]:
+    length, pos = _varint(data, pos)
+    if pos + length > len(data):
+        raise LevelDBError("slice troncato")
+    return data[pos:pos + length], pos + length
+
+
+def split_internal_key(internal_key: bytes) -> tuple[bytes, int, int]:
+    """(chiave utente, sequenza, tipo) di una chiave interna LevelDB."""
+    if len(internal_key) < 8:
+        raise LevelDBError("chiave interna troppo corta")
+    trailer = int.from_bytes(internal_key[-8:], "little")
+    return internal_key[:-8], trailer >> 8, trailer & 0xFF
+
+
+# --- Log (WAL e MANIFEST) ---
+
+def _read_log(path: str, verify_checksums: bool) -> tuple[list[bytes], int]:
+    """(record completi, offset di fine dell'ultimo record completo)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    records, pending, clean_end = [], None, 0
+    pos = 0
+    while pos + _LOG_HEADER_SIZE <= len(data):
+        block_left = _LOG_BLOCK_SIZE - pos % _LOG_BLOCK_SIZE
+        if block_left < _LOG_HEADER_SIZE:
+            pos += block_left  # padding a fine blocco
+            continue
+        checksum, length, record_type = struct.unpack_from("<IHB", data, pos)
+        start = pos + _LOG_HEADER_SIZE
+        if record_type == 0 and length == 0:
+            pos += block_left  # area preallocata
+            continue
+        if start + length > len(data):
+            break
+        payload = data[start:start + length]
+        if verify_checksums and _unmask_crc(checksum) != crc32c(bytes([record_type]) + payload):
+            raise LevelDBError(f"{os.path.basename(path)}: checksum errato nel record a offset {pos}")
+        record_start, pos = pos, start + length
+        if record_type == _LOG_FULL:
+            records.append(payload)
+            pending, clean_end = None, pos
+        elif record_type == _LOG_FIRST:
+            pending = bytearray(payload)
+        elif record_type == _LOG_MIDDLE and pending is not None:
+            pending += payload
+        elif record_type == _LOG_LAST and pending is not None:
+            pending += payload
+            records.append(bytes(pending))
+            pending, clean_end = None, pos
+        else:
+            raise LevelDBError(f"{os.path.basename(path)}: record di tipo {record_type} inatteso a offset {record_start}")
+    return records, clean_end
+
+
+def read_log_records(path: str, verify_checksums: bool = True) -> list[bytes]:
+    """
+    Record di un file di log LevelDB (.log o MANIFEST). Un record finale incompleto è
+    normale (scrittura interrotta o copia troncata da "save query") e viene ignorato.
+    """
+    return _read_log(path, verify_checksums)[0]
+
+
+def _write_batch_entries(batch: bytes) -> list[tuple[bytes, int, int, bytes]]:
+    """(chiave, sequenza, tipo, valore) di un WriteBatch del WAL."""
+    if len(batch) < 12:
+        raise LevelDBError("WriteBatch troppo corto")
+    sequence, count = struct.unpack_from("<QI", batch, 0)
+    pos, entries = 12, []
+    for i in range(count):
+        if pos >= len(batch):
+            raise LevelDBError("WriteBatch troncato")
+        tag = batch[pos]
+        key, pos = _length_prefixed(batch, pos + 1)
+        if tag == _TYPE_VALUE:
+            value, pos = _length_prefixed(batch, pos)
+        elif tag == _TYPE_DELETION:
+            value = b""
+        else:
+            raise LevelDBError(f"tag {tag} sconosciuto nel WriteBatch")
+        entries.append((key, sequence + i, tag, value))
+    return entries
+
+
+def _encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _mask_crc(crc: int) -> int:
+    return (((crc >> 15) | (crc << 17)) + 0xa282ead8) & 0xFFFFFFFF
+
+
+def _append_log_record(path: str, payload: bytes):
+    """
+    Accoda un record al log rispettando la divisione in blocchi da 32 KiB (FIRST/MIDDLE/LAST).
+    Un record finale incompleto (che LevelDB scarterebbe comunque) viene prima troncato,
+    altrimenti il nuovo record verrebbe letto come sua continuazione e perso.
+    """
+    clean_end = _read_log(path, True)[1] if os.path.exists(path) else 0
+    with open(path, "ab") as f:
+        if f.tell() > clean_end:
+            logger.warning(f"🗄️⚠️ {os.path.basename(path)}: record finale incompleto troncato ({f.tell() - clean_end} byte).")
+            f.truncate(clean_end)
+            f.seek(clean_end)
+        offset = f.tell() % _LOG_BLOCK_SIZE
+        pos, first = 0, True
+        while True:
+            left = _LOG_BLOCK_SIZE - offset
+            if left < _LOG_HEADER_SIZE:
+                f.write(b"\0" * left)
+                offset, left = 0, _LOG_BLOCK_SIZE
+            fragment = payload[pos:pos + left - _LOG_HEADER_SIZE]
+            pos += len(fragment)
+            last = pos >= len(payload)
+            record_type = (_LOG_FULL if last else _LOG_FIRST) if first else (_LOG_LAST if last else _LOG_MIDDLE)
+            checksum = _mask_crc(crc32c(bytes([record_type]) + fragment))
+            f.write(struct.pack("<IHB", checksum, len(fragment), record_type) + fragment)
+            offset = (offset + _LOG_HEADER_SIZE + len(fragment)) % _LOG_BLOCK_SIZE
+            first = False
+            if last:
+                break
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# --- Tabelle (.ldb) ---
+
+@dataclass(slots=True)
+class TableFile:
+    number: int
+    level: int
+    size: int
+    smallest: bytes  # chiavi interne
+    largest: bytes
+
+
+def _block_entries(block: bytes) -> list[tuple[bytes, bytes]]:
+    if len(block) < 4:
+        raise LevelDBError("blocco troppo corto")
+    restarts = struct.unpack_from("<I", block, len(block) - 4)[0]
+    limit = len(block) - 4 - 4 * restarts
+    if limit < 0:
+        raise LevelDBError("array dei restart fuori dal blocco")
+    entries, key, pos = [], b"", 0
+    while pos < limit:
+        shared, pos = _varint(block, pos)
+        non_shared, pos = _varint(block, pos)
+        value_length, pos = _varint(block, pos)
+        if shared > len(key) or pos + non_shared + value_length > limit:
+            raise LevelDBError("voce del blocco corrotta")
+        key = key[:shared] + block[pos:pos + non_shared]
+        pos += non_shared
+        entries.append((key, block[pos:pos + value_length]))
+        pos += value_length
+    return entries
+
+
+def _block_handle(data: bytes, pos: int = 0) -> tuple[int, int, int]:
+    offset, pos = _varint(data, pos)
+    size, pos = _varint(data, pos)
+    return offset, size, pos
+
+
+class Table:
+    """Una tabella ordinata (.ldb) letta blocco per blocco."""
+
+    def __init__(self, path: str, verify_checksums: bool = True):
+        self.path = path
+        self.verify_checksums = verify_checksums
+        self._file = open(path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < _FOOTER_SIZE:
+                raise LevelDBError(f"{os.path.basename(path)}: file troppo corto per una tabella")
+            self._file.seek(size - _FOOTER_SIZE)
+            footer = self._file.read(_FOOTER_SIZE)
+            if int.from_bytes(footer[40:], "little") != _TABLE_MAGIC:
+                raise LevelDBError(f"{os.path.basename(path)}: magic number della tabella errato")
+            _, _, pos = _block_handle(footer)
+            index_offset, index_size, _ = _block_handle(footer, pos)
+            self.index = _block_entries(self.read_block(index_offset, index_size))
+        except BaseException:
+            self._file.close()
+            raise
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read_block(self, offset: int, size: int) -> bytes:
+        self._file.seek(offset)
+        raw = self._file.read(size + _BLOCK_TRAILER_SIZE)
+        if len(raw) != size + _BLOCK_TRAILER_SIZE:
+            raise LevelDBError(f"{os.path.basename(self.path)}: blocco a offset {offset} troncato")
+        compression = raw[size]
+        if self.verify_checksums:
+            expected = _unmask_crc(int.from_bytes(raw[size + 1:], "little"))
+            if crc32c(raw[:size + 1]) != expected:
+                raise LevelDBError(f"{os.path.basename(self.path)}: checksum errato nel blocco a offset {offset}")
+        data = raw[:size]
+        try:
+            if compression == _NO_COMPRESSION:
+                return data
+            if compression == _ZLIB:
+                return zlib.decompress(data)
+            if compression == _ZLIB_RAW:
+                return zlib.decompress(data, -15)
+        except zlib.error as e:
+            raise LevelDBError(f"{os.path.basename(self.path)}: blocco a offset {offset} non decomprimibile: {e}") from e
+        name = "snappy" if compression == _SNAPPY else str(compression)
+        raise LevelDBError(f"{os.path.basename(self.path)}: compressione {name} non supportata")
+
+    def __iter__(self):
+        """Voci (chiave interna, valore) in ordine."""
+        for _, handle in self.index:
+            offset, size, _ = _block_handle(handle)
+            yield from _block_entries(self.read_block(offset, size))
+
+    def seek(self, user_key: bytes):
+        """Voci a partire dal primo blocco che può contenere user_key."""
+        for last_key, handle in self.index:
+            if last_key[:-8] < user_key:
+                continue
+            offset, size, _ = _block_handle(handle)
+            for internal_key, value in _block_entries(self.read_block(offset, size)):
+                if internal_key[:-8] >= user_key:
+                    yield internal_key, value
+
+
+# --- Database ---
+
+@dataclass(slots=True)
+class CheckResult:
+    tables: int = 0
+    blocks: int = 0
+    entries: int = 0
+    log_records: int = 0
+    errors: list[str] = field(default_factory=list)
+
+
+class LevelDB:
+    """
+    Lettura di un database LevelDB di Bedrock (cartella db/ del mondo): CURRENT → MANIFEST
+    → tabelle vive e log, senza lock, quindi utilizzabile su un backup o sul mondo di un
+    server in esecuzione (vista al momento dell'apertura). Le tabelle aperte restano in
+    cache fino a close().
+    """
+
+    def __init__(self, db_dir: str, verify_checksums: bool = True):
+        self.db_dir = db_dir
+        self.verify_checksums = verify_checksums
+        try:
+            with open(os.path.join(db_dir, "CURRENT")) as f:
+                manifest_name = f.read().strip()
+        except OSError as e:
+            raise LevelDBError(f"CURRENT non leggibile in {db_dir}: {e}") from e
+        if not manifest_name.startswith("MANIFEST-"):
+            raise LevelDBError(f"CURRENT non valido: '{manifest_name}'")
+        self.manifest_path = os.path.join(db_dir, manifest_name)
+        if not os.path.isfile(self.manifest_path):
+            raise LevelDBError(f"{manifest_name} indicato da CURRENT non esiste")
+        self.tables: dict[int, TableFile] = {}
+        self.log_number = 0
+        self.prev_log_number = 0
+        self.last_sequence = 0
+        self._log_cache: list[tuple[bytes, int, int, bytes]] | None = None
+        self._log_latest: dict[bytes, tuple[int, int, bytes]] | None = None
+        self._open_tables: dict[int, Table] = {}
+        for record in read_log_records(self.manifest_path, verify_checksums):
+            self._apply_version_edit(record)
+
+    def _apply_version_edit(self, edit: bytes):
+        pos = 0
+        while pos < len(edit):
+            tag, pos = _varint(edit, pos)
+            if tag == 1:  # comparatore
+                _, pos = _length_prefixed(edit, pos)
+            elif tag == 2:
+                self.log_number, pos = _varint(edit, pos)
+            elif tag == 3:  # prossimo numero di file
+                _, pos = _varint(edit, pos)
+            elif tag == 4:
+                self.last_sequence, pos = _varint(edit, pos)
+            elif tag == 5:  # puntatore di compattazione
+                _, pos = _varint(edit, pos)
+                _, pos = _length_prefixed(edit, pos)
+            elif tag == 6:
+                _, pos = _varint(edit, pos)
+                number, pos = _varint(edit, pos)
+                self.tables.pop(number, None)
+            elif tag == 7:
+                level, pos = _varint(edit, pos)
+                number, pos = _varint(edit, pos)
+                size, pos = _varint(edit, pos)
+                smallest, pos = _length_prefixed(edit, pos)
+                largest, pos = _length_prefixed(edit, pos)
+                self.tables[number] = TableFile(number, level, size, smallest, largest)
+            elif tag == 9:
+                self.prev_log_number, pos = _varint(edit, pos)
+            else:
+                raise LevelDBError(f"tag {tag} sconosciuto nel MANIFEST")
+
+    def table_path(self, number: int) -> str:
+        for suffix in _TABLE_SUFFIXES:
+            path = os.path.join(self.db_dir, f"{number:06d}{suffix}")
+            if os.path.exists(path):
+                return path
+        raise LevelDBError(f"tabella {number:06d}.ldb mancante")
+
+    def log_paths(self) -> list[str]:
+        """Log non ancora compattati (numero >= log_number del MANIFEST), dal più vecchio."""
+        logs = []
+        for name in os.listdir(self.db_dir):
+            stem, ext = os.path.splitext(name)
+            if ext == ".log" and stem.isdigit():
+                number = int(stem)
+                if number >= self.log_number or (self.prev_log_number and number == self.prev_log_number):
+                    logs.append((number, os.path.join(self.db_dir, name)))
+        return [path for _, path in sorted(logs)]
+
+    def _log_entries(self) -> list[tuple[bytes, int, int, bytes]]:
+        if self._log_cache is None:
+            entries = []
+            for path in self.log_paths():
+                for record in read_log_records(path, self.verify_checksums):
+                    entries.extend(_write_batch_entries(record))
+            self._log_cache = entries
+        return self._log_cache
+
+    def _table(self, number: int) -> Table:
+        table = self._open_tables.get(number)
+        if table is None:
+            table = self._open_tables[number] = Table(self.table_path(number), self.verify_checksums)
+        return table
+
+    def close(self):
+        for table in self._open_tables.values():
+            table.close()
+        self._open_tables.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _sources(self, prefix: bytes):
+        """Sorgenti ordinate per (chiave utente, sequenza decrescente) a partire da prefix: WAL e tabelle."""
+        def table_source(number):
+            for internal_key, value in self._table(number).seek(prefix):
+                user_key, sequence, kind = split_internal_key(internal_key)
+                yield (user_key, -sequence, kind, value)
+
+        log_entries = sorted(((key, -sequence, kind, value) for key, sequence, kind, value in self._log_entries()
+                              if key >= prefix), key=lambda e: (e[0], e[1]))
+        sources = [iter(log_entries)]
+        for number, table_file in sorted(self.tables.items()):
+            smallest, largest = table_file.smallest[:-8], table_file.largest[:-8]
+            if largest < prefix or (smallest > prefix and not smallest.startswith(prefix)):
+                continue  # la tabella non contiene chiavi con questo prefisso
+            sources.append(table_source(number))
+        return sources
+
+    def items(self, prefix: bytes = b""):
+        """Coppie (chiave, valore) vive in ordine di chiave: per ogni chiave vince la scrittura più recente."""
+        last_key = None
+        for user_key, _, kind, value in heapq.merge(*self._sources(prefix), key=lambda e: (e[0], e[1])):
+            if not user_key.startswith(prefix):
+                break  # oltre l'intervallo del prefisso
+            if user_key == last_key:
+                continue
+            last_key = user_key
+            if kind == _TYPE_VALUE:
+                yield user_key, value
+
+    def get(self, key: bytes) -> bytes | None:
+        if self._log_latest is None:
+            # Ultima scrittura di ogni chiave nei log, per non scorrerli a ogni get
+            self._log_latest = {}
+            for log_key, sequence, kind, value in self._log_entries():
+                if sequence > self._log_latest.get(log_key, (-1,))[0]:
+                    self._log_latest[log_key] = (sequence, kind, value)
+        best_sequence, best = -1, None
+        if key in self._log_latest:
+            best_sequence, kind, value = self._log_latest[key]
+            best = (kind, value)
+        for table_file in self.tables.values():
+            if not (table_file.smallest[:-8] <= key <= table_file.largest[:-8]):
+                continue
+            for internal_key, value in self._table(table_file.number).seek(key):
+                user_key, sequence, kind = split_internal_key(internal_key)
+                if user_key == key and sequence > best_sequence:
+                    best_sequence, best = sequence, (kind, value)
+                break  # la prima voce della chiave è la più recente della tabella
+        if best is None or best[0] != _TYPE_VALUE:
+            return None
+        return best[1]
+
+    def write_batch(self, puts: dict[bytes, bytes], deletes: list[bytes] = ()) -> int:
+        """
+        Unica scrittura supportata: un WriteBatch accodato al log attivo, che LevelDB applica
+        alla prossima apertura come una normale scrittura non ancora compattata. Solo a
+        database chiuso (server fermo). Restituisce la sequenza assegnata al batch.
+        """
+        sequence = max([self.last_sequence] + [s for _, s, _, _ in self._log_entries()]) + 1
+        batch = bytearray(struct.pack("<QI", sequence, len(puts) + len(deletes)))
+        for key, value in puts.items():
+            batch += bytes([_TYPE_VALUE]) + _encode_varint(len(key)) + key + _encode_varint(len(value)) + value
+        for key in deletes:
+            batch += bytes([_TYPE_DELETION]) + _encode_varint(len(key)) + key
+        logs = self.log_paths()
+        log_path = logs[-1] if logs else os.path.join(self.db_dir, f"{self.log_number:06d}.log")
+        _append_log_record(log_path, bytes(batch))
+        self._log_cache = self._log_latest = None
+        return sequence
+
+    def keys_since(self, known_tables: set[int]) -> set[bytes]:
+        """
+        Chiavi utente (scritture e cancellazioni) delle tabelle vive non in known_tables e dei
+        log: tutto ciò che può essere cambiato dopo una lettura che conosceva quelle tabelle.
+        """
+        keys = {key for key, _, _, _ in self._log_entries()}
+        for number in sorted(set(self.tables) - set(known_tables)):
+            keys.update(internal_key[:-8] for internal_key, _ in self._table(number))
+        return keys
+
+    def check(self) -> CheckResult:
+        """Legge ogni blocco di ogni tabella viva e ogni record dei log, verificando checksum e struttura."""
+        result = CheckResult()
+        for number in sorted(self.tables):
+            try:
+                path = self.table_path(number)
+                if os.path.getsize(path) != self.tables[number].size:
+                    raise LevelDBError(f"{os.path.basename(path)}: dimensione diversa da quella del MANIFEST")
+                with Table(path, self.verify_checksums) as table:
+                    for _, handle in table.index:
+                        offset, size, _ = _block_handle(handle)
+                        result.entries += len(_block_entries(table.read_block(offset, size)))
+                        result.blocks += 1
+                result.tables += 1
+            except (LevelDBError, OSError) as e:
+                result.errors.append(str(e))
+        for path in self.log_paths():
+            try:
+                for record in read_log_records(path, self.verify_checksums):
+                    _write_batch_entries(record)
+                    result.log_records += 1
+            except (LevelDBError, OSError) as e:
+                result.errors.append(str(e))
+        return result
+
+
+# --- Creazione di database nuovi (mondi sintetici per backup_benchmark.py) ---
+
+def _build_block(entries: list[tuple[bytes, bytes]], restart_interval: int) -> bytes:
+    out, restarts, last_key = bytearray(), [], b""
+    for i, (key, value) in enumerate(entries):
+        shared = 0
+        if i % restart_interval:
+            limit = min(len(key), len(last_key))
+            while shared < limit and key[shared] == last_key[shared]:
+                shared += 1
+        else:
+            restarts.append(len(out))
+        out += _encode_varint(shared) + _encode_varint(len(key) - shared) + _encode_varint(len(value))
+        out += key[shared:] + value
+        last_key = key
+    restarts = restarts or [0]
+    out += struct.pack(f"<{len(restarts)}I", *restarts) + struct.pack("<I", len(restarts))
+    return bytes(out)
+
+
+def write_table(path: str, entries: list[tuple[bytes, bytes]], block_size: int = 4096) -> int:
+    """
+    Scrive una tabella .ldb con voci (chiave interna, valore) già ordinate, blocchi
+    compressi con lo zlib raw di Mojang. Restituisce la dimensione del file.
+    """
+    def write_block(out, block: bytes, compression: int) -> bytes:
+        if compression == _ZLIB_RAW:
+            compressor = zlib.compressobj(wbits=-15)
+            block = compressor.compress(block) + compressor.flush()
+        offset = out.tell()
+        out.write(block + bytes([compression]))
+        out.write(struct.pack("<I", _mask_crc(crc32c(block + bytes([compression])))))
+        return _encode_varint(offset) + _encode_varint(len(block))
+
+    index, pending, pending_size = [], [], 0
+    with open(path, "wb") as out:
+        for key, value in entries:
+            pending.append((key, value))
+            pending_size += len(key) + len(value)
+            if pending_size >= block_size:
+                index.append((key, write_block(out, _build_block(pending, 16), _ZLIB_RAW)))
+                pending, pending_size = [], 0
+        if pending:
+            index.append((pending[-1][0], write_block(out, _build_block(pending, 16), _ZLIB_RAW)))
+        metaindex_handle = write_block(out, _build_block([], 1), _NO_COMPRESSION)
+        index_handle = write_block(out, _build_block(index, 1), _NO_COMPRESSION)
+        footer = metaindex_handle + index_handle
+        out.write(footer + b"\0" * (40 - len(footer)) + struct.pack("<Q", _TABLE_MAGIC))
+        return out.tell()
+
+
+def write_manifest(db_dir: str, tables: list[TableFile], log_number: int, last_sequence: int):
+    """MANIFEST-000001 e CURRENT per un database nuovo con le tabelle indicate."""
+    edit = bytearray(_encode_varint(1) + _encode_varint(len(b"leveldb.BytewiseComparator")) + b"leveldb.BytewiseComparator")
+    edit += _encode_varint(2) + _encode_varint(log_number)
+    edit += _encode_varint(3) + _encode_varint(max([log_number] + [t.number for t in tables]) + 1)
+    edit += _encode_varint(4) + _encode_varint(last_sequence)
+    for table in tables:
+        edit += _encode_varint(7) + _encode_varint(table.level) + _encode_varint(table.number) + _encode_varint(table.size)
+        edit += _encode_varint(len(table.smallest)) + table.smallest + _encode_varint(len(table.largest)) + table.largest
+    manifest_name = "MANIFEST-000001"
+    _append_log_record(os.path.join(db_dir, manifest_name), bytes(edit))
+    with open(os.path.join(db_dir, "CURRENT"), "w") as f:
+        f.write(f"{manifest_name}\n")
@@ -0,0 +1,189 @@
+# minecraft_telegram_bot/log_stream.py
+import asyncio
+import itertools
+import re
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from config import CONTAINER, LOG_BUFFER_LINES, get_logger
+from docker_api import api_stream, DockerAPIError
+
+logger = get_logger(__name__)
+
+# "2024-05-01T10:00:00.123456789Z <riga>" (docker logs --timestamps)
+_DOCKER_TS_RE = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?Z ?(.*)$")
+# "[2024-05-01 12:00:00:123 INFO] messaggio" (formato Bedrock Dedicated Server)
+_BDS_LINE_RE = re.compile(r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?::\d+)? ([A-Z]+)\] ?(.*)$")
+
+
+@dataclass(slots=True)
+class LogRecord:
+    seq: int
+    timestamp: datetime
+    level: str | None
+    message: str
+    raw: str
+
+
+class LogFollower:
+    """
+    Segue i log del container con un unico stream `logs?follow=1` sull'Engine API,
+    analizza ogni riga una sola volta e la conserva in un ring buffer limitato.
+    I consumatori possono leggere il buffer o iscriversi ai nuovi record.
+    """
+    RECONNECT_MAX_DELAY = 30
+
+    def __init__(self, container: str, capacity: int = LOG_BUFFER_LINES):
+        self.container = container
+        self.records: deque[LogRecord] = deque(maxlen=capacity)
+        self._seq = 0
+        self._last_ts = None  # (secondi, nanosecondi) dell'ultima riga ricevuta
+        self._listeners = []
+        self._subscribers: set[asyncio.Queue] = set()
+        self._task = None
+        self._stream = None
+        self._wake = asyncio.Event()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def wake(self):
+        """Interrompe l'attesa tra due tentativi (es. il container è appena ripartito)."""
+        self._wake.set()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._stream:
+            self._stream.close()
+            self._stream = None
+
+    async def _run(self):
+        delay = 1
+        while True:
+            path = f"/containers/{self.container}/logs?follow=1&stdout=1&stderr=1&timestamps=1"
+            if self._last_ts:
+                path += f"&since={self._last_ts[0]}.{self._last_ts[1]:09d}"
+            else:
+                path += f"&tail={self.records.maxlen}"
+            try:
+                self._stream = await api_stream("GET", path)
+                logger.debug(f"📜 Follow log '{self.container}' attivo.")
+                async for line in self._stream.lines():
+                    self._ingest(line)
+                # Lo stream termina quando il container si ferma: si riprova a breve
+                delay = 1
+            except (OSError, ConnectionError, DockerAPIError, asyncio.TimeoutError) as e:
+                logger.info(f"📜⏳ Log '{self.container}' non disponibili ({e}), nuovo tentativo tra {delay}s.")
+                delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+            finally:
+                if self._stream:
+                    self._stream.close()
+                    self._stream = None
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                delay = 1
+            except asyncio.TimeoutError:
+                pass
+
+    def _ingest(self, line: str):
+        if not line.strip():
+            return
+        timestamp = datetime.now(timezone.utc)
+        raw = line
+        ts_match = _DOCKER_TS_RE.match(line)
+        if ts_match:
+            seconds = int(datetime.fromisoformat(ts_match.group(1)).replace(tzinfo=timezone.utc).timestamp())
+            nanos = int((ts_match.group(2) or "0").ljust(9, "0")[:9])
+            if self._last_ts and (seconds, nanos) <= self._last_ts:
+                return  # già ricevuta prima della riconnessione
+            self._last_ts = (seconds, nanos)
+            timestamp = datetime.fromtimestamp(seconds + nanos / 1e9, timezone.utc)
+            raw = ts_match.group(3)
+
+        level, message = None, raw
+        bds_match = _BDS_LINE_RE.match(raw)
+        if bds_match:
+            level, message = bds_match.group(2), bds_match.group(3)
+
+        self._seq += 1
+        record = LogRecord(self._seq, timestamp, level, message, raw)
+        self.records.append(record)
+        for callback in list(self._listeners):
+            try:
+                callback(record)
+            except Exception as e:
+                logger.error(f"📜❌ Errore listener log: {e}", exc_info=True)
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(record)
+            except asyncio.QueueFull:
+                pass  # consumatore troppo lento: perde i record più recenti
+
+    def add_listener(self, callback):
+        """Registra una callback sincrona chiamata per ogni nuovo record."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def subscribe(self, maxsize: int = 1000) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=maxsize)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def recent(self, count: int) -> list[LogRecord]:
+        if count <= 0:
+            return []
+        return list(itertools.islice(reversed(self.records), count))[::-1]
+
+    def page_before(self, end_seq: int | None, max_chars: int) -> list[LogRecord]:
+        """Record consecutivi precedenti a `end_seq` (escluso) che stanno in `max_chars`."""
+        selected, used = [], 0
+        for record in reversed(self.records):
+            if end_seq is not None and record.seq >= end_seq:
+                continue
+            used += len(record.raw) + 1
+            if selected and used > max_chars:
+                break
+            selected.append(record)
+        return selected[::-1]
+
+    def page_after(self, start_seq: int, max_chars: int) -> list[LogRecord]:
+        """Record consecutivi successivi a `start_seq` (escluso) che stanno in `max_chars`."""
+        selected, used = [], 0
+        for record in self.records:
+            if record.seq <= start_seq:
+                continue
+            used += len(record.raw) + 1
+            if selected and used > max_chars:
+                break
+            selected.append(record)
+        return selected
+
+
+_followers: dict[str, LogFollower] = {}
+
+
+def get_log_follower(container: str = CONTAINER) -> LogFollower:
+    if not container:
+        raise ValueError("CONTAINER non configurato per la lettura dei log.")
+    follower = _followers.get(container)
+    if follower is None:
+        follower = _followers[container] = LogFollower(container)
+    follower.start()
+    return follower
+
+
+async def stop_all_followers():
+    for follower in list(_followers.values()):
+        await follower.stop()
+    _followers.clear()
@@ -0,0 +1,695 @@
+# minecraft_telegram_bot/maintenance.py
+import asyncio
+import html
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from telegram.constants import ParseMode
+
+from config import (
+    BACKUP_FORMAT, BACKUP_NOTIFY_CHAT_ID, MAINTENANCE_FILE, MAINTENANCE_IDLE_WAIT, MAINTENANCE_SCHEDULE, get_logger
+)
+from backup_catalog import KIND_MANUAL
+from backup_scheduler import CronSchedule
+from container_state import get_container_watcher
+from level_dat import CREATIVE_FLAG, LevelDatError, edit_level_dat, preview_level_dat
+from player_presence import get_presence_tracker
+from region_snapshot import paste_chunks, snapshot_region
+from resource_pack_management import get_world_active_packs_with_details
+from restore_engine import recover_interrupted_restore, restore_world
+from server_registry import ServerContext, list_servers
+from world_management import get_backups_storage_path, get_world_directory_path, get_world_level_dat_path
+
+logger = get_logger(__name__)
+
+STEP_BACKUP = "backup"
+STEP_RESTORE = "restore"
+STEP_LEVEL_DAT = "level_dat"
+STEP_RESOURCE_PACKS = "resource_packs"
+STEP_PASTE = "paste"
+# Ordine di esecuzione nella finestra: il backup fotografa il mondo prima di ogni modifica,
+# il ripristino sostituisce il mondo e quindi precede le modifiche che vi si applicano,
+# il paste scrive i chunk per ultimo, sul mondo ormai definitivo.
+_STEP_ORDER = {STEP_BACKUP: 0, STEP_RESTORE: 1, STEP_LEVEL_DAT: 2, STEP_RESOURCE_PACKS: 3, STEP_PASTE: 4}
+# Passi che modificano il mondo: con almeno uno di questi si crea il punto di ripristino
+_MODIFYING_STEPS = frozenset({STEP_RESTORE, STEP_LEVEL_DAT, STEP_PASTE})
+_CHECKPOINT_PREFIX = ".maintenance_"
+_FAILED_PREFIX = ".maintenance_failed_"
+_PARTIAL_PREFIX = ".maintenance_partial_"
+_TABLE_SUFFIXES = (".ldb", ".sst")
+# Messaggi inoltrati in chat nelle finestre programmate (gli altri vanno solo nel log)
+_NOTIFY_PREFIXES = ("🧰", "❌", "⚠️", "🛑❌", "🚀❌")
+
+
+class MaintenanceError(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class MaintenanceStep:
+    kind: str
+    label: str
+    params: dict = field(default_factory=dict)
+    requested_by: int | None = None
+    created: float = field(default_factory=time.time)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
+
+
+@dataclass(slots=True)
+class StepTiming:
+    label: str
+    seconds: float
+    ok: bool = True
+    detail: str = ""
+
+
+@dataclass(slots=True)
+class MaintenanceReport:
+    server: str
+    steps: list[StepTiming] = field(default_factory=list)
+    downtime: float = 0.0
+    total: float = 0.0
+    ok: bool = True
+    rolled_back: bool = False
+    rollback_failed: bool = False
+    error: str = ""
+    paste_done: bool = False
+    undo_path: str = ""  # file di undo dell'ultimo paste della finestra
+
+    def summary(self) -> str:
+        if self.ok:
+            outcome = "completata"
+        elif self.rolled_back:
+            outcome = "annullata (mondo ripristinato)"
+        elif self.rollback_failed:
+            outcome = "non riuscita, rollback fallito: server fermo"
+        else:
+            outcome = "non riuscita"
+        lines = [f"🧰 <b>Manutenzione di '{html.escape(self.server)}' {outcome}</b> in {self.total:.1f}s "
+                 f"(server fermo {self.downtime:.1f}s)"]
+        for step in self.steps:
+            detail = f": {html.escape(step.detail)}" if step.detail else ""
+            lines.append(f"{'✅' if step.ok else '❌'} {html.escape(step.label)} – {step.seconds:.1f}s{detail}")
+        if self.error:
+            lines.append(f"\n❌ {html.escape(self.error)}")
+        return "\n".join(lines)
+
+
+# --- Coda ---
+
+class MaintenanceQueue:
+    """
+    Operazioni a server fermo in attesa della prossima finestra di manutenzione, per
+    server, salvate in MAINTENANCE_FILE: la coda sopravvive a un riavvio del bot.
+    """
+
+    def __init__(self, path: str = MAINTENANCE_FILE):
+        self.path = path
+        self._servers: dict[str, dict] = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            for name, entry in data.get("servers", {}).items():
+                self._servers[name] = {
+                    "steps": [MaintenanceStep(**step) for step in entry.get("steps", [])],
+                    "scheduled_at": entry.get("scheduled_at"),
+                    "notify_chat": entry.get("notify_chat"),
+                }
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"🧰❌ Coda di manutenzione {self.path} illeggibile, si riparte da vuota: {e}")
+            self._servers = {}
+
+    def _save(self):
+        data = {"servers": {name: {"steps": [asdict(step) for step in entry["steps"]],
+                                   "scheduled_at": entry["scheduled_at"], "notify_chat": entry["notify_chat"]}
+                            for name, entry in self._servers.items()}}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _entry(self, server: str) -> dict:
+        return self._servers.setdefault(server, {"steps": [], "scheduled_at": None, "notify_chat": None})
+
+    def steps(self, server: str) -> list[MaintenanceStep]:
+        return list(self._entry(server)["steps"])
+
+    def add(self, server: str, step: MaintenanceStep, notify_chat: int | None = None) -> MaintenanceStep:
+        """Accoda un passo; backup e controllo dei resource pack non si ripetono, un ripristino sostituisce il precedente."""
+        entry = self._entry(server)
+        if step.kind in (STEP_BACKUP, STEP_RESOURCE_PACKS, STEP_RESTORE):
+            for old in [s for s in entry["steps"] if s.kind == step.kind]:
+                entry["steps"].remove(old)
+        entry["steps"].append(step)
+        if notify_chat is not None:
+            entry["notify_chat"] = notify_chat
+        self._save()
+        return step
+
+    def remove(self, server: str, step_ids: list[str]) -> list[MaintenanceStep]:
+        entry = self._entry(server)
+        removed = [step for step in entry["steps"] if step.id in step_ids]
+        entry["steps"] = [step for step in entry["steps"] if step.id not in step_ids]
+        if not entry["steps"]:
+            entry["scheduled_at"] = None
+        self._save()
+        for step in removed:
+            _discard_step_files(step)
+        return removed
+
+    def clear(self, server: str) -> int:
+        return len(self.remove(server, [step.id for step in self.steps(server)]))
+
+    def schedule(self, server: str, when: datetime | None, notify_chat: int | None = None):
+        entry = self._entry(server)
+        entry["scheduled_at"] = when.timestamp() if when else None
+        if notify_chat is not None:
+            entry["notify_chat"] = notify_chat
+        self._save()
+
+    def scheduled_at(self, server: str) -> datetime | None:
+        timestamp = self._entry(server)["scheduled_at"]
+        return datetime.fromtimestamp(timestamp) if timestamp else None
+
+    def notify_chat(self, server: str) -> int | None:
+        return self._entry(server)["notify_chat"]
+
+
+def _discard_step_files(step: MaintenanceStep):
+    """File della struttura copiati all'accodamento di un paste."""
+    path = step.params.get("structure_path")
+    if step.kind == STEP_PASTE and path and os.path.dirname(path) == maintenance_files_dir():
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def maintenance_files_dir() -> str:
+    return os.path.join(os.path.dirname(MAINTENANCE_FILE) or ".", "maintenance")
+
+
+def plan(steps: list[MaintenanceStep]) -> list[MaintenanceStep]:
+    """
+    Passi nell'ordine di esecuzione (_STEP_ORDER, poi ordine di accodamento); le
+    modifiche a level.dat diventano un'unica scrittura, con l'ultima richiesta che
+    prevale sullo stesso campo.
+    """
+    ordered = sorted(steps, key=lambda step: (_STEP_ORDER[step.kind], step.created))
+    merged, level_dat = [], None
+    for step in ordered:
+        if step.kind != STEP_LEVEL_DAT:
+            merged.append(step)
+        elif level_dat is None:
+            level_dat = MaintenanceStep(STEP_LEVEL_DAT, step.label, {"edits": dict(step.params["edits"]),
+                                                                     "merged": [step.id]}, created=step.created)
+            merged.append(level_dat)
+        else:
+            level_dat.params["edits"].update(step.params["edits"])
+            level_dat.params["merged"].append(step.id)
+            level_dat.label = "level.dat (" + ", ".join(level_dat.params["edits"]) + ")"
+    return merged
+
+
+# --- Passi ---
+
+def backup_step(requested_by: int | None = None) -> MaintenanceStep:
+    return MaintenanceStep(STEP_BACKUP, "backup del mondo", requested_by=requested_by)
+
+
+def restore_step(server: ServerContext, filename: str, requested_by: int | None = None) -> MaintenanceStep:
+    if os.path.basename(filename) != filename:
+        raise MaintenanceError(f"nome di backup non valido: {filename}")
+    if not os.path.exists(os.path.join(get_backups_storage_path(server.data_path), filename)):
+        raise MaintenanceError(f"backup '{filename}' non trovato")
+    return MaintenanceStep(STEP_RESTORE, f"ripristino da {filename}", {"filename": filename}, requested_by)
+
+
+def level_dat_step(server: ServerContext, edits: dict[str, object], label: str | None = None,
+                   requested_by: int | None = None) -> MaintenanceStep:
+    """Modifiche a level.dat, validate subito sul file attuale (i nomi sbagliati non arrivano alla finestra)."""
+    path = get_world_level_dat_path(server.world_name, server.data_path)
+    if not path:
+        raise MaintenanceError(f"level.dat del mondo '{server.world_name}' non trovato")
+    try:
+        preview_level_dat(path, edits)
+    except (LevelDatError, OSError) as e:
+        raise MaintenanceError(str(e)) from e
+    label = label or "level.dat (" + ", ".join(f"{key}={value}" for key, value in edits.items()) + ")"
+    return MaintenanceStep(STEP_LEVEL_DAT, label, {"edits": dict(edits)}, requested_by)
+
+
+def imnotcreative_step(server: ServerContext, requested_by: int | None = None) -> MaintenanceStep:
+    return level_dat_step(server, {CREATIVE_FLAG: False}, "reset flag creativo", requested_by)
+
+
+def resource_packs_step(requested_by: int | None = None) -> MaintenanceStep:
+    return MaintenanceStep(STEP_RESOURCE_PACKS, "applicazione resource pack", requested_by=requested_by)
+
+
+def paste_step(pending_action: dict, orientation: str, requested_by: int | None = None) -> MaintenanceStep:
+    """Paste ologramma confermato: la struttura viene copiata accanto alla coda (i file temporanei non durano)."""
+    os.makedirs(maintenance_files_dir(), exist_ok=True)
+    step = MaintenanceStep(STEP_PASTE, f"paste di {pending_action['structure_name']}", requested_by=requested_by)
+    structure_path = os.path.join(maintenance_files_dir(), f"{step.id}_{os.path.basename(pending_action['structure_path'])}")
+    shutil.copyfile(pending_action['structure_path'], structure_path)
+    step.params = {
+        "structure_path": structure_path,
+        "structure_name": pending_action['structure_name'],
+        "paste_coords": pending_action['paste_coords'],
+        "paste_origin": list(pending_action['paste_origin']),
+        "structure_size": list(pending_action['structure_size']),
+        "orientation": orientation,
+    }
+    return step
+
+
+async def _run_backup(update, server: ServerContext, world_dir: str, step: MaintenanceStep) -> str:
+    from world_handlers import write_cold_backup  # world_handlers importa gli handler Telegram
+    if not await write_cold_backup(update, server, KIND_MANUAL):
+        raise MaintenanceError("backup non riuscito")
+    return ""
+
+
+async def _run_restore(update, server: ServerContext, world_dir: str, step: MaintenanceStep) -> str:
+    backup_path = os.path.join(get_backups_storage_path(server.data_path), step.params["filename"])
+    if not os.path.exists(backup_path):
+        raise MaintenanceError(f"backup '{step.params['filename']}' non più disponibile")
+    await asyncio.to_thread(recover_interrupted_restore, world_dir)
+    result = await asyncio.to_thread(restore_world, backup_path, world_dir)
+    return f"{result.rewritten} file riscritti, {result.unchanged} invariati, {result.removed} rimossi"
+
+
+async def _run_level_dat(update, server: ServerContext, world_dir: str, step: MaintenanceStep) -> str:
+    changes = await asyncio.to_thread(edit_level_dat, os.path.join(world_dir, "level.dat"), step.params["edits"])
+    return ", ".join(f"{c.key} {c.old} → {c.new}" for c in changes) or "nessuna modifica necessaria"
+
+
+async def _run_resource_packs(update, server: ServerContext, world_dir: str, step: MaintenanceStep) -> str:
+    """Le modifiche ai resource pack sono già in world_resource_packs.json: basta il riavvio, qui si controllano."""
+    packs = await asyncio.to_thread(get_world_active_packs_with_details, server.world_name, server.data_path)
+    missing = [str(pack["uuid"])[:8] for pack in packs if pack["name"].startswith("Sconosciuto")]
+    if missing:
+        return f"{len(packs)} attivi, non trovati nella cartella dei pack: {', '.join(missing)}"
+    return f"{len(packs)} attivi"
+
+
+async def _run_paste(update, server: ServerContext, world_dir: str, step: MaintenanceStep) -> str:
+    from hologram_handlers import run_paste_structure  # hologram_handlers importa gli handler Telegram
+    params = step.params
+    snapshot = await asyncio.to_thread(
+        snapshot_region, world_dir, paste_chunks(tuple(params["paste_origin"]), tuple(params["structure_size"])),
+        get_backups_storage_path(server.data_path), params["structure_name"])
+    returncode, stdout, stderr = await run_paste_structure(world_dir, params["structure_path"],
+                                                           params["paste_coords"], params["orientation"])
+    if returncode != 0:
+        last_line = (stderr or stdout).strip().splitlines()[-1:] or ["nessun output"]
+        raise MaintenanceError(f"pasteStructure terminato con codice {returncode}: {last_line[0]}")
+    step.params["undo_path"] = snapshot.path
+    return f"{snapshot.chunks} chunk salvati per l'annullamento"
+
+
+_EXECUTORS = {STEP_BACKUP: _run_backup, STEP_RESTORE: _run_restore, STEP_LEVEL_DAT: _run_level_dat,
+              STEP_RESOURCE_PACKS: _run_resource_packs, STEP_PASTE: _run_paste}
+
+
+# --- Punto di ripristino ---
+
+def _checkpoint_paths(world_dir: str) -> tuple[str, str]:
+    worlds_dir, name = os.path.split(os.path.normpath(world_dir))
+    return os.path.join(worlds_dir, f"{_CHECKPOINT_PREFIX}{name}"), os.path.join(worlds_dir, f"{_FAILED_PREFIX}{name}")
+
+
+def _partial_checkpoint_path(world_dir: str) -> str:
+    worlds_dir, name = os.path.split(os.path.normpath(world_dir))
+    return os.path.join(worlds_dir, f"{_PARTIAL_PREFIX}{name}")
+
+
+def pending_checkpoint(world_dir: str) -> str | None:
+    """Punto di ripristino lasciato da una finestra interrotta o da un rollback non riuscito."""
+    checkpoint, _ = _checkpoint_paths(world_dir)
+    return checkpoint if os.path.isdir(checkpoint) else None
+
+
+def manual_recovery_hint(world_dir: str) -> str:
+    checkpoint, failed = _checkpoint_paths(world_dir)
+    modified = failed if os.path.isdir(failed) else world_dir
+    return (f"Il mondo com'era prima della finestra è in {checkpoint}, quello modificato in {modified}. "
+            f"Per ripristinare a mano, a server fermo: sposta {modified} altrove, rinomina {checkpoint} "
+            f"in {world_dir} e avvia il server con /startserver.")
+
+
+def _discard_stale_leftovers(world_dir: str):
+    """Avanzi che non contengono l'unica copia buona del mondo, quindi eliminabili senza rischi."""
+    checkpoint, failed = _checkpoint_paths(world_dir)
+    # Copia del punto di ripristino interrotta: il mondo non era ancora stato toccato
+    shutil.rmtree(_partial_checkpoint_path(world_dir), ignore_errors=True)
+    # Rollback riuscito ma pulizia interrotta: il mondo è già quello del punto di ripristino
+    if os.path.isdir(failed) and os.path.isdir(world_dir) and not os.path.isdir(checkpoint):
+        shutil.rmtree(failed, ignore_errors=True)
+
+
+def recover_interrupted_maintenance(world_dir: str, server_running: bool = False) -> str | None:
+    """
+    Avanzi di una finestra interrotta (crash del bot). A server fermo il mondo torna al
+    punto di ripristino, come dopo un passo fallito: la finestra non è arrivata alla fine e
+    i suoi passi sono ancora in coda. Con il server acceso su quel mondo non si tocca nulla:
+    il punto di ripristino resta al suo posto e blocca le finestre successive finché non
+    viene sistemato a mano.
+    """
+    _discard_stale_leftovers(world_dir)
+    checkpoint = pending_checkpoint(world_dir)
+    if not checkpoint:
+        return None
+    name = os.path.basename(os.path.normpath(world_dir))
+    if server_running:
+        logger.critical(f"🧰🆘 Finestra di manutenzione interrotta su '{name}' ma il server è acceso: "
+                        f"punto di ripristino conservato. {manual_recovery_hint(world_dir)}")
+        return "punto di ripristino conservato"
+    try:
+        rollback_to_checkpoint(world_dir)
+    except (OSError, MaintenanceError) as e:
+        logger.critical(f"🧰🆘 Rollback di '{name}' non riuscito: {e}. {manual_recovery_hint(world_dir)}")
+        return None
+    logger.warning(f"🧰⚠️ Finestra di manutenzione interrotta su '{name}': mondo riportato al punto di ripristino.")
+    return "rollback completato"
+
+
+def create_checkpoint(world_dir: str) -> tuple[str, int, int]:
+    """
+    Copia del mondo fermo da cui tornare indietro: hard link per le tabelle .ldb (LevelDB,
+    Amulet e il ripristino non le riscrivono mai, al più le sostituiscono) e copia per tutto
+    il resto, che può essere riscritto sul posto (log, level.dat, json dei pack). La copia
+    prende il nome definitivo solo quando è completa.
+    """
+    checkpoint, _ = _checkpoint_paths(world_dir)
+    partial = _partial_checkpoint_path(world_dir)
+    if os.path.exists(checkpoint):
+        raise MaintenanceError(f"punto di ripristino {checkpoint} già presente")
+    _discard_stale_leftovers(world_dir)
+    sizes = {"linked": 0, "copied": 0}
+
+    def link_or_copy(source: str, target: str):
+        size = os.path.getsize(source)
+        if source.endswith(_TABLE_SUFFIXES):
+            try:
+                os.link(source, target)
+                sizes["linked"] += size
+                return target
+            except OSError:
+                pass
+        shutil.copy2(source, target)
+        sizes["copied"] += size
+        return target
+
+    try:
+        shutil.copytree(world_dir, partial, symlinks=True, copy_function=link_or_copy)
+        os.rename(partial, checkpoint)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    return checkpoint, sizes["linked"], sizes["copied"]
+
+
+def rollback_to_checkpoint(world_dir: str):
+    """
+    Rimette il mondo com'era all'inizio della finestra, con due rename. La copia modificata
+    viene eliminata solo a rollback riuscito; dopo un tentativo interrotto tra i due rename
+    si può ripetere.
+    """
+    checkpoint, failed = _checkpoint_paths(world_dir)
+    if not os.path.isdir(checkpoint):
+        raise MaintenanceError(f"punto di ripristino {checkpoint} non trovato")
+    if os.path.exists(world_dir):
+        if os.path.exists(failed):
+            raise MaintenanceError(f"{failed} esiste già")
+        os.rename(world_dir, failed)
+    os.rename(checkpoint, world_dir)
+    shutil.rmtree(failed, ignore_errors=True)
+
+
+def discard_checkpoint(world_dir: str):
+    shutil.rmtree(_checkpoint_paths(world_dir)[0], ignore_errors=True)
+
+
+# --- Finestra ---
+
+async def _rollback(server: ServerContext, world_dir: str, report: MaintenanceReport):
+    phase = time.monotonic()
+    try:
+        await asyncio.to_thread(rollback_to_checkpoint, world_dir)
+    except (OSError, MaintenanceError) as e:
+        logger.critical(f"🧰🆘 Rollback di '{server.name}' non riuscito: {e}", exc_info=True)
+        report.steps.append(StepTiming("rollback del mondo", time.monotonic() - phase, ok=False, detail=str(e)))
+        report.rollback_failed = True
+        report.error = (f"{report.error} — " if report.error else "") + \
+            f"Rollback non riuscito, server lasciato fermo. {manual_recovery_hint(world_dir)}"
+        return
+    report.rolled_back, report.paste_done = True, False
+    report.steps.append(StepTiming("rollback del mondo", time.monotonic() - phase))
+
+
+async def run_maintenance(update, context, server: ServerContext) -> MaintenanceReport | None:
+    """
+    Esegue tutta la coda del server in una sola finestra arresto → lavoro → avvio. Se un
+    passo fallisce i successivi vengono saltati e il mondo torna al punto di ripristino;
+    restano in coda i passi annullati dal rollback, il passo fallito viene scartato.
+    None se la coda è vuota.
+    """
+    from server_handlers import stop_server_command, start_server_command
+    reply_target = update.message or update.callback_query.message
+    queue = get_maintenance_queue()
+    async with server.exclusive("manutenzione"):
+        steps = plan(queue.steps(server.name))
+        if not steps:
+            return None
+        report = MaintenanceReport(server.name)
+        started = time.monotonic()
+        await reply_target.reply_text(
+            f"🧰⏳ Finestra di manutenzione per '{server.name}' ({len(steps)} in coda): un solo arresto del server.")
+        world_dir = get_world_directory_path(server.world_name, server.data_path)
+        if not world_dir:
+            report.ok, report.error = False, f"Directory del mondo '{server.world_name}' non trovata."
+            return report
+
+        if pending_checkpoint(world_dir):
+            report.ok = False
+            report.error = (f"Punto di ripristino di una finestra precedente ancora presente: nessun passo eseguito. "
+                            f"{manual_recovery_hint(world_dir)} In alternativa eliminalo se il mondo attuale è quello buono.")
+            report.total = time.monotonic() - started
+            return report
+
+        phase = outage_started = time.monotonic()
+        if not await stop_server_command(update, context, quiet=True, operation="manutenzione", server=server):
+            report.steps.append(StepTiming("arresto server", time.monotonic() - phase, ok=False))
+            report.ok, report.error = False, "Server non arrestato: nessun passo eseguito."
+            await start_server_command(update, context, quiet=True, server=server)
+            report.total = time.monotonic() - started
+            return report
+        stopped_at = time.monotonic()
+        report.steps.append(StepTiming("arresto server", stopped_at - phase))
+
+        done, failed, completed, checkpoint = [], None, False, None
+        try:
+            if any(step.kind in _MODIFYING_STEPS for step in steps):
+                phase = time.monotonic()
+                checkpoint, linked, copied = await asyncio.to_thread(create_checkpoint, world_dir)
+                report.steps.append(StepTiming("punto di ripristino", time.monotonic() - phase,
+                                               detail=f"{linked // (1024 * 1024)} MB in hard link, "
+                                                      f"{copied // (1024 * 1024)} MB copiati"))
+            for step in steps:
+                phase = time.monotonic()
+                await reply_target.reply_text(f"🧰 {step.label}...")
+                try:
+                    detail = await _EXECUTORS[step.kind](update, server, world_dir, step)
+                except Exception as e:
+                    logger.error(f"🧰❌ Manutenzione '{server.name}', passo '{step.label}' fallito: {e}",
+                                 exc_info=not isinstance(e, MaintenanceError))
+                    report.steps.append(StepTiming(step.label, time.monotonic() - phase, ok=False, detail=str(e)))
+                    report.ok, failed = False, step
+                    break
+                report.steps.append(StepTiming(step.label, time.monotonic() - phase, detail=detail))
+                done.append(step)
+                if step.kind == STEP_PASTE:
+                    report.paste_done, report.undo_path = True, step.params.get("undo_path", "")
+            completed = failed is None
+        except Exception as e:
+            logger.error(f"🧰❌ Manutenzione '{server.name}' interrotta: {e}", exc_info=True)
+            report.ok, report.error = False, str(e)
+        finally:
+            # Il punto di ripristino sparisce solo a finestra riuscita o a rollback confermato
+            if checkpoint and completed:
+                await asyncio.to_thread(discard_checkpoint, world_dir)
+            elif checkpoint:
+                await _rollback(server, world_dir, report)
+            if report.rollback_failed:
+                report.steps.append(StepTiming("avvio server", 0.0, ok=False, detail="saltato, mondo da sistemare a mano"))
+            else:
+                phase = time.monotonic()
+                started_ok = await start_server_command(update, context, quiet=True, server=server)
+                report.steps.append(StepTiming("avvio server", time.monotonic() - phase, ok=started_ok))
+            report.downtime = time.monotonic() - outage_started
+
+        # Dopo un rollback (anche solo tentato) restano i passi che non hanno lasciato effetti da rifare
+        undone = report.rolled_back or report.rollback_failed
+        finished = [step for step in done if not undone or step.kind not in _MODIFYING_STEPS]
+        if failed:
+            finished.append(failed)
+        ids = [i for step in finished for i in step.params.get("merged", [step.id])]
+        queue.remove(server.name, ids)
+        if not queue.steps(server.name):
+            queue.schedule(server.name, None)
+        report.total = time.monotonic() - started
+
+    if BACKUP_FORMAT == "store" and any(step.kind == STEP_BACKUP for step in done):
+        from world_handlers import collect_store_garbage
+        await collect_store_garbage(server)
+    return report
+
+
+async def send_report(reply_target, report: MaintenanceReport):
+    markup = None
+    if report.paste_done and report.undo_path:
+        from hologram_handlers import undo_paste_markup  # hologram_handlers importa questo modulo
+        markup = undo_paste_markup(report.undo_path)
+    await reply_target.reply_text(report.summary(), parse_mode=ParseMode.HTML, reply_markup=markup)
+
+
+# --- Finestre programmate ---
+
+class _MaintenanceReporter:
+    """Fa le veci del messaggio Telegram nelle finestre programmate: log sempre, chat di notifica per gli esiti."""
+
+    def __init__(self, bot, server_name: str, chat_id):
+        self.bot = bot
+        self.server_name = server_name
+        self.chat_id = chat_id
+
+    async def reply_text(self, text: str, parse_mode=None, reply_markup=None, **kwargs):
+        plain = re.sub(r"<[^>]+>", "", text) if parse_mode else text
+        logger.info(f"🧰 [{self.server_name}] {html.unescape(plain)}")
+        if self.bot and self.chat_id and text.startswith(_NOTIFY_PREFIXES):
+            try:
+                await self.bot.send_message(self.chat_id, text, parse_mode=parse_mode, reply_markup=reply_markup)
+            except Exception as e:
+                logger.warning(f"🧰⚠️ Notifica di manutenzione non inviata: {e}")
+
+
+class MaintenanceScheduler:
+    """
+    Avvia le finestre di manutenzione all'orario richiesto con /maintenance at o, per le
+    code non vuote, agli orari di MAINTENANCE_SCHEDULE (cron). Come i backup programmati,
+    la finestra attende che non ci siano giocatori online (al massimo MAINTENANCE_IDLE_WAIT
+    minuti) e che il server non sia impegnato in un'altra operazione.
+    """
+
+    def __init__(self, schedule: CronSchedule | None, idle_wait: int = MAINTENANCE_IDLE_WAIT):
+        self.schedule = schedule
+        self.idle_wait = timedelta(minutes=idle_wait)
+        self.pending_since: dict[str, datetime] = {}
+        self.last_report: dict[str, MaintenanceReport] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def running(self, server: str) -> bool:
+        task = self._tasks.get(server)
+        return task is not None and not task.done()
+
+    async def tick(self, context):
+        now = datetime.now().replace(second=0, microsecond=0)
+        queue = get_maintenance_queue()
+        for server in list_servers():
+            if not queue.steps(server.name) or self.running(server.name):
+                continue
+            scheduled_at = queue.scheduled_at(server.name)
+            due = (scheduled_at is not None and scheduled_at <= datetime.now()) or (
+                self.schedule is not None and self.schedule.matches(now))
+            if due:
+                self.pending_since.setdefault(server.name, now)
+            pending_since = self.pending_since.get(server.name)
+            if pending_since is None or server.busy:
+                continue
+            players = get_presence_tracker(server.container).online_players() \
+                if get_container_watcher(server.container).running else []
+            if players and now - pending_since < self.idle_wait:
+                continue
+            del self.pending_since[server.name]
+            self._tasks[server.name] = asyncio.create_task(self._run(context, server))
+
+    async def _run(self, context, server: ServerContext):
+        chat_id = get_maintenance_queue().notify_chat(server.name) or BACKUP_NOTIFY_CHAT_ID
+        reporter = _MaintenanceReporter(context.bot, server.name, chat_id)
+        update = SimpleNamespace(message=reporter, callback_query=None, effective_user=None)
+        try:
+            report = await run_maintenance(update, context, server)
+        except Exception as e:
+            logger.error(f"🧰❌ Manutenzione programmata di '{server.name}' fallita: {e}", exc_info=True)
+            return
+        if report:
+            self.last_report[server.name] = report
+            await send_report(reporter, report)
+
+    async def stop(self):
+        for task in list(self._tasks.values()):
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._tasks.clear()
+
+
+_queue: MaintenanceQueue | None = None
+_scheduler: MaintenanceScheduler | None = None
+
+
+def get_maintenance_queue() -> MaintenanceQueue:
+    global _queue
+    if _queue is None:
+        _queue = MaintenanceQueue()
+    return _queue
+
+
+def get_maintenance_scheduler() -> MaintenanceScheduler:
+    global _scheduler
+    if _scheduler is None:
+        schedule = None
+        if MAINTENANCE_SCHEDULE:
+            try:
+                schedule = CronSchedule(MAINTENANCE_SCHEDULE)
+            except ValueError as e:
+                logger.error(f"🧰❌ MAINTENANCE_SCHEDULE non valida ({MAINTENANCE_SCHEDULE}): {e}")
+        _scheduler = MaintenanceScheduler(schedule)
+    return _scheduler
+
+
+def start_maintenance_scheduler(application) -> MaintenanceScheduler | None:
+    if application.job_queue is None:
+        logger.error("🧰❌ JobQueue non disponibile: le finestre di manutenzione programmate sono disattivate.")
+        return None
+    scheduler = get_maintenance_scheduler()
+    now = datetime.now()
+    application.job_queue.run_repeating(scheduler.tick, interval=60, first=60 - now.second + 1, name="maintenance")
+    if scheduler.schedule:
+        logger.info(f"🧰 Finestre di manutenzione programmate: '{scheduler.schedule.expression}'.")
+    return scheduler
+
+
+async def stop_maintenance_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        await _scheduler.stop()
+        _scheduler = None
@@ -0,0 +1,141 @@
+# minecraft_telegram_bot/maintenance_handlers.py
+import html
+from datetime import datetime, timedelta
+
+from telegram import Update
+from telegram.ext import ContextTypes
+from telegram.constants import ParseMode
+
+from config import MAINTENANCE_SCHEDULE, get_logger
+from server_handlers import notify_if_busy
+from server_registry import get_update_server
+from maintenance import (
+    MaintenanceError, backup_step, imnotcreative_step, level_dat_step, resource_packs_step, restore_step,
+    get_maintenance_queue, get_maintenance_scheduler, plan, run_maintenance, send_report,
+)
+
+logger = get_logger(__name__)
+
+_USAGE = (
+    "🧰 <b>Finestra di manutenzione</b>: le operazioni a server fermo vengono eseguite insieme, "
+    "con un solo arresto e riavvio.\n"
+    "<code>/maintenance add backup</code>\n"
+    "<code>/maintenance add imnotcreative</code>\n"
+    "<code>/maintenance add settings difficulty=hard keepinventory=true</code>\n"
+    "<code>/maintenance add restore &lt;file di backup&gt;</code>\n"
+    "<code>/maintenance add resourcepacks</code>\n"
+    "<code>/maintenance remove &lt;n&gt;</code> · <code>/maintenance clear</code>\n"
+    "<code>/maintenance run</code> (subito) · <code>/maintenance at 04:30</code> · <code>/maintenance at off</code>\n"
+    "I paste ologramma si accodano dal pulsante 🗓️ della conferma."
+)
+
+
+def _next_time(text: str) -> datetime:
+    """Prossima occorrenza di HH:MM (oggi se non è ancora passata, altrimenti domani)."""
+    hours, minutes = (int(part) for part in text.split(":", 1))
+    now = datetime.now()
+    when = now.replace(hour=hours, minute=minutes, second=0, microsecond=0)
+    return when if when > now else when + timedelta(days=1)
+
+
+def _ordered_steps(server) -> list:
+    """Passi in coda nell'ordine in cui la finestra li eseguirà (numerazione di /maintenance remove)."""
+    steps = get_maintenance_queue().steps(server.name)
+    return [step for planned in plan(steps) for step in steps
+            if step.id in planned.params.get("merged", [planned.id])]
+
+
+def _render_queue(server) -> str:
+    queue = get_maintenance_queue()
+    ordered = _ordered_steps(server)
+    lines = [f"🧰 <b>Manutenzione di '{html.escape(server.name)}'</b>"]
+    if not ordered:
+        lines.append("Coda vuota.")
+    for index, step in enumerate(ordered, 1):
+        lines.append(f"{index}. {html.escape(step.label)}")
+    scheduled_at = queue.scheduled_at(server.name)
+    if scheduled_at:
+        lines.append(f"\n⏰ Finestra richiesta per il {scheduled_at:%d/%m alle %H:%M}")
+    if MAINTENANCE_SCHEDULE:
+        lines.append(f"⏰ Finestre automatiche: <code>{html.escape(MAINTENANCE_SCHEDULE)}</code>")
+    report = get_maintenance_scheduler().last_report.get(server.name)
+    if report:
+        lines.append(f"\nUltima finestra programmata: {'✅' if report.ok else '❌'} "
+                     f"(server fermo {report.downtime:.0f}s)")
+    return "\n".join(lines)
+
+
+async def maintenance_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    server = get_update_server(update)
+    if not server or not server.world_name:
+        await update.message.reply_text("⚠️ CONTAINER o WORLD_NAME non configurati.")
+        return
+    args = context.args or []
+    action = args[0].lower() if args else ""
+    queue = get_maintenance_queue()
+    user_id = update.effective_user.id
+    chat_id = update.effective_chat.id
+
+    if not action:
+        await update.message.reply_text(f"{_render_queue(server)}\n\n{_USAGE}", parse_mode=ParseMode.HTML)
+        return
+
+    try:
+        if action == "add" and len(args) >= 2:
+            kind = args[1].lower()
+            if kind == "backup":
+                step = backup_step(user_id)
+            elif kind == "imnotcreative":
+                step = imnotcreative_step(server, user_id)
+            elif kind == "resourcepacks":
+                step = resource_packs_step(user_id)
+            elif kind == "restore" and len(args) >= 3:
+                step = restore_step(server, " ".join(args[2:]), user_id)
+            elif kind == "settings" and len(args) >= 3:
+                edits = {}
+                for arg in args[2:]:
+                    if "=" not in arg:
+                        raise MaintenanceError(f"'{arg}' non è nella forma campo=valore")
+                    name, value = arg.split("=", 1)
+                    edits[name.strip()] = value.strip()
+                step = level_dat_step(server, edits, requested_by=user_id)
+            else:
+                await update.message.reply_text(_USAGE, parse_mode=ParseMode.HTML)
+                return
+            queue.add(server.name, step, notify_chat=chat_id)
+            await update.message.reply_text(
+                f"🧰➕ Accodato: {html.escape(step.label)}\n\n{_render_queue(server)}", parse_mode=ParseMode.HTML)
+        elif action == "remove" and len(args) == 2 and args[1].isdigit():
+            steps = _ordered_steps(server)
+            index = int(args[1]) - 1
+            if not 0 <= index < len(steps):
+                raise MaintenanceError(f"nessun passo numero {args[1]}")
+            queue.remove(server.name, [steps[index].id])
+            await update.message.reply_text(
+                f"🧰➖ Rimosso: {html.escape(steps[index].label)}\n\n{_render_queue(server)}", parse_mode=ParseMode.HTML)
+        elif action == "clear":
+            removed = queue.clear(server.name)
+            await update.message.reply_text(f"🧰🧹 Coda svuotata ({removed} passi rimossi).")
+        elif action == "at" and len(args) == 2:
+            if args[1].lower() == "off":
+                queue.schedule(server.name, None)
+                await update.message.reply_text("🧰⏰ Finestra programmata annullata.")
+                return
+            try:
+                when = _next_time(args[1])
+            except ValueError:
+                raise MaintenanceError(f"orario non valido: {args[1]} (usa HH:MM)")
+            queue.schedule(server.name, when, notify_chat=chat_id)
+            await update.message.reply_text(
+                f"🧰⏰ Finestra di manutenzione il {when:%d/%m alle %H:%M}, appena non ci sono giocatori online.")
+        elif action in ("run", "esegui"):
+            await notify_if_busy(update.message, server)
+            report = await run_maintenance(update, context, server)
+            if report is None:
+                await update.message.reply_text("🧰 Coda vuota: nessuna finestra necessaria.")
+            else:
+                await send_report(update.message, report)
+        else:
+            await update.message.reply_text(_USAGE, parse_mode=ParseMode.HTML)
+    except MaintenanceError as e:
+        await update.message.reply_text(f"🧰❌ {html.escape(str(e))}")
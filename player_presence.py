@@ -0,0 +1,138 @@
+# minecraft_telegram_bot/player_presence.py
+import asyncio
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from config import CONTAINER, PRESENCE_RECONCILE_INTERVAL, get_logger
+from console_session import ConsoleError
+from docker_utils import fetch_online_players
+from log_stream import get_log_follower
+
+logger = get_logger(__name__)
+
+# "Player connected: Steve, xuid: 2535..." / "Player disconnected: Steve, xuid: 2535..., pfid: ..."
+_PLAYER_EVENT_RE = re.compile(r"Player (connected|disconnected): (.+?), xuid: (\d*)")
+# All'avvio o all'arresto del server nessun giocatore è più connesso
+_SERVER_RESET_RE = re.compile(r"^(Server started\.|Stopping server\.\.\.)")
+
+
+@dataclass(slots=True)
+class PlayerPresence:
+    name: str
+    xuid: str | None = None
+    online: bool = False
+    joined_at: datetime | None = None
+    left_at: datetime | None = None
+
+
+class PresenceTracker:
+    """
+    Mantiene l'insieme dei giocatori online dagli eventi di connessione nei log,
+    riallineandolo periodicamente con il comando 'list'.
+    """
+
+    def __init__(self, container: str, reconcile_interval: int = PRESENCE_RECONCILE_INTERVAL):
+        self.container = container
+        self.reconcile_interval = reconcile_interval
+        self.players: dict[str, PlayerPresence] = {}
+        self.last_reconciled: datetime | None = None
+        self._follower = None
+        self._task = None
+
+    def start(self):
+        if self._follower is None:
+            self._follower = get_log_follower(self.container)
+            self._follower.add_listener(self._on_log_record)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._follower is not None:
+            self._follower.remove_listener(self._on_log_record)
+            self._follower = None
+
+    def _on_log_record(self, record):
+        match = _PLAYER_EVENT_RE.search(record.message)
+        if match:
+            event, name, xuid = match.groups()
+            player = self.players.get(name) or self.players.setdefault(name, PlayerPresence(name))
+            if xuid:
+                player.xuid = xuid
+            if event == "connected":
+                player.online, player.joined_at = True, record.timestamp
+                logger.info(f"👤➡️ {name} connesso.")
+            else:
+                player.online, player.left_at = False, record.timestamp
+                logger.info(f"👤⬅️ {name} disconnesso.")
+        elif _SERVER_RESET_RE.match(record.message):
+            self.mark_all_offline(record.timestamp)
+
+    def mark_all_offline(self, when: datetime | None = None):
+        when = when or datetime.now(timezone.utc)
+        for player in self.players.values():
+            if player.online:
+                player.online, player.left_at = False, when
+
+    async def reconcile(self) -> bool:
+        """Corregge eventuali eventi persi confrontando lo stato con l'output di 'list'."""
+        try:
+            names = set(await fetch_online_players(self.container))
+        except (ConsoleError, asyncio.TimeoutError) as e:
+            logger.debug(f"👤 Riallineamento giocatori non riuscito: {e or 'timeout'}")
+            return False
+        now = datetime.now(timezone.utc)
+        for name in names:
+            player = self.players.setdefault(name, PlayerPresence(name))
+            if not player.online:
+                player.online, player.joined_at = True, None  # orario di ingresso sconosciuto
+        for player in self.players.values():
+            if player.online and player.name not in names:
+                player.online, player.left_at = False, now
+        self.last_reconciled = now
+        return True
+
+    async def _reconcile_loop(self):
+        while True:
+            await self.reconcile()
+            await asyncio.sleep(self.reconcile_interval)
+
+    def online_players(self) -> list[str]:
+        online = [p for p in self.players.values() if p.online]
+        online.sort(key=lambda p: p.joined_at or datetime.min.replace(tzinfo=timezone.utc))
+        return [p.name for p in online]
+
+    async def current_players(self) -> list[str]:
+        """Giocatori online; interroga il server solo se non c'è mai stato un riallineamento."""
+        if self.last_reconciled is None:
+            await self.reconcile()
+        return self.online_players()
+
+    def get(self, name: str) -> PlayerPresence | None:
+        return self.players.get(name)
+
+    def is_online(self, name: str) -> bool:
+        player = self.players.get(name)
+        return bool(player and player.online)
+
+
+_trackers: dict[str, PresenceTracker] = {}
+
+
+def get_presence_tracker(container: str = CONTAINER) -> PresenceTracker:
+    if not container:
+        raise ValueError("CONTAINER non configurato per il tracciamento dei giocatori.")
+    tracker = _trackers.get(container)
+    if tracker is None:
+        tracker = _trackers[container] = PresenceTracker(container)
+    tracker.start()
+    return tracker
+
+
+async def stop_all_trackers():
+    for tracker in list(_trackers.values()):
+        await tracker.stop()
+    _trackers.clear()
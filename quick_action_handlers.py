@@ -5,8 +5,9 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from config import get_logger
+from server_registry import get_update_server
 from user_management import auth_required, get_minecraft_username, get_locations, get_user_data
-from docker_utils import get_online_players_from_server
+from player_presence import get_presence_tracker
 
 logger = get_logger(__name__)
 
@@ -40,7 +41,8 @@ async def tp_direct_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     buttons = []
     try:
-        online_players = await get_online_players_from_server()
+        server = get_update_server(update)
+        online_players = await get_presence_tracker(server.container).current_players() if server else []
         user = get_user_data(uid)
         auth_level = user.get("auth_level") if user else None
 
@@ -0,0 +1,162 @@
+# minecraft_telegram_bot/region_snapshot.py
+import base64
+import gzip
+import json
+import os
+import re
+import struct
+import time
+from dataclasses import dataclass
+
+from config import get_logger
+from leveldb_reader import LevelDB
+
+logger = get_logger(__name__)
+
+UNDO_DIR_NAME = "undo"
+UNDO_SUFFIX = ".undo"
+_KEEP_UNDO_FILES = 10
+_DIGEST_PREFIX = b"digp"
+_ACTOR_PREFIX = b"actorprefix"
+
+
+@dataclass(slots=True)
+class RegionSnapshot:
+    path: str
+    chunks: int
+    records: int
+    bytes: int
+    seconds: float
+
+
+@dataclass(slots=True)
+class UndoResult:
+    restored: int
+    deleted: int
+    chunks: int
+    label: str
+
+
+def paste_chunks(origin: tuple[int, int, int], size: tuple[int, int, int]) -> list[tuple[int, int]]:
+    """
+    Chunk toccati da un paste con origine e dimensioni date. L'area copre la struttura in
+    tutte e quattro le rotazioni attorno all'origine, così non dipende dall'orientamento
+    scelto dallo script di paste.
+    """
+    reach = max(size[0], size[2]) - 1
+    x, z = origin[0], origin[2]
+    return [(cx, cz)
+            for cx in range((x - reach) >> 4, ((x + reach) >> 4) + 1)
+            for cz in range((z - reach) >> 4, ((z + reach) >> 4) + 1)]
+
+
+def _chunk_prefix(cx: int, cz: int, dimension: int) -> bytes:
+    prefix = struct.pack("<ii", cx, cz)
+    return prefix + struct.pack("<i", dimension) if dimension else prefix
+
+
+def _chunk_records(db: LevelDB, chunks: list[tuple[int, int]], dimension: int) -> dict[bytes, bytes]:
+    """Record di chunk (sottochunk, biomi, block entity...), digest delle entità e relative entità."""
+    records = {}
+    for cx, cz in chunks:
+        prefix = _chunk_prefix(cx, cz, dimension)
+        # x+z dell'overworld è anche il prefisso dei record delle altre dimensioni: li distingue la lunghezza
+        for key, value in db.items(prefix):
+            if len(key) - len(prefix) in (1, 2):
+                records[key] = value
+        digest = db.get(_DIGEST_PREFIX + prefix)
+        if digest is not None:
+            records[_DIGEST_PREFIX + prefix] = digest
+            for i in range(0, len(digest) - 7, 8):
+                actor_key = _ACTOR_PREFIX + digest[i:i + 8]
+                actor = db.get(actor_key)
+                if actor is not None:
+                    records[actor_key] = actor
+    return records
+
+
+def undo_dir(backups_dir: str) -> str:
+    return os.path.join(backups_dir, UNDO_DIR_NAME)
+
+
+def snapshot_region(world_dir: str, chunks: list[tuple[int, int]], backups_dir: str, label: str,
+                    dimension: int = 0) -> RegionSnapshot:
+    """
+    Salva in un piccolo file di undo i record LevelDB dei chunk indicati, letti dal mondo
+    a server fermo. Sostituisce il backup completo del mondo prima di un paste.
+    """
+    started = time.monotonic()
+    with LevelDB(os.path.join(world_dir, "db")) as db:
+        records = _chunk_records(db, chunks, dimension)
+    os.makedirs(undo_dir(backups_dir), exist_ok=True)
+    world = os.path.basename(os.path.normpath(world_dir))
+    safe_world_name = "".join(c if c.isalnum() else "_" for c in world)
+    path = os.path.join(undo_dir(backups_dir), f"{safe_world_name}_paste_{time.strftime('%Y%m%d_%H%M%S')}{UNDO_SUFFIX}")
+    payload = {
+        "version": 1,
+        "world": world,
+        "label": label,
+        "dimension": dimension,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "chunks": chunks,
+        "records": {key.hex(): base64.b64encode(value).decode() for key, value in records.items()},
+    }
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wt") as f:
+        json.dump(payload, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    _prune_undo_files(undo_dir(backups_dir))
+    snapshot = RegionSnapshot(path, len(chunks), len(records), sum(len(v) for v in records.values()),
+                              time.monotonic() - started)
+    logger.info(f"🧩 Snapshot di {snapshot.chunks} chunk ({snapshot.records} record, {snapshot.bytes} byte) "
+                f"in {snapshot.seconds:.2f}s: {os.path.basename(path)}")
+    return snapshot
+
+
+def _prune_undo_files(directory: str):
+    paths = sorted((os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(UNDO_SUFFIX)),
+                   key=os.path.getmtime)
+    for path in paths[:-_KEEP_UNDO_FILES]:
+        os.remove(path)
+
+
+def undo_stamp(undo_path: str) -> str:
+    """Parte finale del nome di un file di undo (data e ora), abbastanza corta per un callback_data."""
+    return os.path.basename(undo_path).removesuffix(UNDO_SUFFIX).rpartition("_paste_")[2]
+
+
+def find_undo(backups_dir: str, world_name: str, stamp: str) -> str | None:
+    """File di undo del mondo con il timestamp indicato (vedi undo_stamp), se esiste ancora."""
+    if not re.fullmatch(r"\d{8}_\d{6}", stamp):
+        return None
+    safe_world_name = "".join(c if c.isalnum() else "_" for c in world_name)
+    path = os.path.join(undo_dir(backups_dir), f"{safe_world_name}_paste_{stamp}{UNDO_SUFFIX}")
+    return path if os.path.exists(path) else None
+
+
+def read_undo_label(undo_path: str) -> str:
+    with gzip.open(undo_path, "rt") as f:
+        return json.load(f).get("label", "")
+
+
+def undo_region(undo_path: str, world_dir: str) -> UndoResult:
+    """
+    Riporta i chunk dello snapshot allo stato salvato: i record salvati vengono riscritti
+    e quelli comparsi dopo (blocchi, block entity ed entità del paste) eliminati, con un
+    solo WriteBatch. Solo a server fermo; il file di undo viene poi rimosso.
+    """
+    with gzip.open(undo_path, "rt") as f:
+        payload = json.load(f)
+    saved = {bytes.fromhex(key): base64.b64decode(value) for key, value in payload["records"].items()}
+    chunks = [tuple(chunk) for chunk in payload["chunks"]]
+    with LevelDB(os.path.join(world_dir, "db")) as db:
+        current = _chunk_records(db, chunks, payload.get("dimension", 0))
+        puts = {key: value for key, value in saved.items() if current.get(key) != value}
+        deletes = [key for key in current if key not in saved]
+        if puts or deletes:
+            db.write_batch(puts, deletes)
+    os.remove(undo_path)
+    result = UndoResult(len(puts), len(deletes), len(chunks), payload.get("label", ""))
+    logger.info(f"🧩↩️ Undo di '{result.label}': {result.restored} record ripristinati, "
+                f"{result.deleted} eliminati su {result.chunks} chunk.")
+    return result
@@ -6,7 +6,8 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
-from config import WORLD_NAME, get_logger
+from config import get_logger
+from server_registry import get_update_server
 from user_management import auth_required
 from resource_pack_management import (
     ResourcePackError,
@@ -16,7 +17,8 @@ from resource_pack_management import (
 logger = get_logger(__name__)
 
 async def add_resourcepack_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not WORLD_NAME:
+    server = get_update_server(update)
+    if not server or not server.world_name:
         await update.message.reply_text("⚠️ `WORLD_NAME` non impostato. Impossibile aggiungere resource pack.")
         return
     await update.message.reply_text(
@@ -26,12 +28,13 @@ async def add_resourcepack_command(update: Update, context: ContextTypes.DEFAULT
     context.user_data["awaiting_resource_pack"] = True # type: ignore
 
 async def edit_resourcepacks_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not WORLD_NAME:
+    server = get_update_server(update)
+    if not server or not server.world_name:
         await update.message.reply_text("⚠️ `WORLD_NAME` non impostato.")
         return
 
     try:
-        active_packs_details = await asyncio.to_thread(get_world_active_packs_with_details, WORLD_NAME)
+        active_packs_details = await asyncio.to_thread(get_world_active_packs_with_details, server.world_name, server.data_path)
     except Exception as e:
         logger.error(f"📦❌ Errore dettagli RP attivi: {e}", exc_info=True)
         await update.message.reply_text(f"❌ Errore recupero dettagli pacchetti: {html.escape(str(e))}")
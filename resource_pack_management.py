@@ -8,7 +8,7 @@ import uuid
 import asyncio
 from typing import Tuple, Optional, List, Dict, Any
 
-from config import get_logger, WORLD_NAME
+from config import get_logger, WORLD_NAME, BEDROCK_DATA_PATH
 from world_management import get_resource_packs_main_folder_path, get_world_specific_resource_packs_json_path
 
 logger = get_logger(__name__)
@@ -142,9 +142,10 @@ async def download_resource_pack_from_url(url: str, temp_dir: str) -> str:
 
 def install_resource_pack_from_file(
     source_file_path: str,
-    original_filename: str
+    original_filename: str,
+    data_path: str = BEDROCK_DATA_PATH
 ) -> Tuple[str, str, List[int], str]:
-    resource_packs_folder = get_resource_packs_main_folder_path()
+    resource_packs_folder = get_resource_packs_main_folder_path(data_path)
     if not resource_packs_folder:
         raise ResourcePackError(
             "Impossibile determinare la cartella dei resource pack.")
@@ -210,11 +211,12 @@ def manage_world_resource_packs_json(
     pack_uuid_to_remove: Optional[str] = None,
     pack_uuid_to_move: Optional[str] = None,
     new_index_for_move: Optional[int] = None,
-    add_at_beginning: bool = False
+    add_at_beginning: bool = False,
+    data_path: str = BEDROCK_DATA_PATH
 ) -> List[Dict[str, Any]]:
     if not world_name_target:
         raise ResourcePackError("Nome del mondo non specificato.")
-    json_path = get_world_specific_resource_packs_json_path(world_name_target)
+    json_path = get_world_specific_resource_packs_json_path(world_name_target, data_path)
     if not json_path:
         raise ResourcePackError(
             f"Impossibile trovare world_resource_packs.json per '{world_name_target}'.")
@@ -297,8 +299,8 @@ def manage_world_resource_packs_json(
     return active_packs
 
 
-def list_available_packs() -> List[Dict[str, Any]]:
-    packs_folder = get_resource_packs_main_folder_path()
+def list_available_packs(data_path: str = BEDROCK_DATA_PATH) -> List[Dict[str, Any]]:
+    packs_folder = get_resource_packs_main_folder_path(data_path)
     available_packs = []
     if not packs_folder or not os.path.exists(packs_folder):
         logger.warning(
@@ -329,8 +331,8 @@ def list_available_packs() -> List[Dict[str, Any]]:
     return available_packs
 
 
-def get_world_active_packs_with_details(world_name_target: str) -> List[Dict[str, Any]]:
-    json_path = get_world_specific_resource_packs_json_path(world_name_target)
+def get_world_active_packs_with_details(world_name_target: str, data_path: str = BEDROCK_DATA_PATH) -> List[Dict[str, Any]]:
+    json_path = get_world_specific_resource_packs_json_path(world_name_target, data_path)
     active_packs_from_json = []
     if json_path and os.path.exists(json_path):
         try:
@@ -344,7 +346,7 @@ def get_world_active_packs_with_details(world_name_target: str) -> List[Dict[str
     if not active_packs_from_json:
         return []
 
-    all_available_packs = list_available_packs()
+    all_available_packs = list_available_packs(data_path)
     detailed_active_packs = []
 
     for i, active_pack_ref in enumerate(active_packs_from_json):
@@ -0,0 +1,284 @@
+# minecraft_telegram_bot/restore_engine.py
+import hashlib
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+import zlib
+from dataclasses import dataclass
+
+from config import get_logger
+from archivers import zstandard
+from backup_store import BackupStore, is_manifest
+
+logger = get_logger(__name__)
+
+_CHUNK_SIZE = 1024 * 1024
+_STAGING_PREFIX = ".restore_new_"
+_OLD_PREFIX = ".restore_old_"
+_READY_SUFFIX = ".ready"
+
+
+class RestoreError(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class RestoreResult:
+    files: int
+    rewritten: int
+    unchanged: int
+    removed: int
+    bytes_written: int
+    seconds: float
+
+
+def _restore_paths(world_dir: str) -> tuple[str, str, str]:
+    """(cartella di staging, marcatore di staging completo, vecchio mondo durante lo scambio)."""
+    worlds_dir, name = os.path.split(os.path.normpath(world_dir))
+    staging = os.path.join(worlds_dir, f"{_STAGING_PREFIX}{name}")
+    return staging, f"{staging}{_READY_SUFFIX}", os.path.join(worlds_dir, f"{_OLD_PREFIX}{name}")
+
+
+def recover_interrupted_restore(world_dir: str) -> str | None:
+    """
+    Completa o annulla un ripristino interrotto (crash del bot tra i due rename):
+    se il mondo manca si usa lo staging già completo, altrimenti il vecchio mondo.
+    Rimuove poi gli avanzi. Restituisce l'azione eseguita, se ce n'è stata una.
+    """
+    staging, ready_marker, old = _restore_paths(world_dir)
+    action = None
+    if not os.path.exists(world_dir):
+        if os.path.isdir(staging) and os.path.exists(ready_marker):
+            os.rename(staging, world_dir)
+            action = "completato"
+        elif os.path.isdir(old):
+            os.rename(old, world_dir)
+            action = "annullato"
+        if action:
+            logger.warning(f"🔄⚠️ Ripristino interrotto di '{os.path.basename(world_dir)}' {action} al riavvio.")
+    for leftover in (staging, old):
+        if os.path.isdir(leftover):
+            shutil.rmtree(leftover, ignore_errors=True)
+    if os.path.exists(ready_marker):
+        os.remove(ready_marker)
+    return action
+
+
+def world_relative_path(arcname: str) -> str | None:
+    """Percorso relativo alla cartella del mondo (senza la cartella radice dell'archivio); None per le directory."""
+    parts = [p for p in arcname.replace("\\", "/").split("/") if p not in ("", ".")]
+    if len(parts) < 2 or arcname.endswith("/"):
+        return None
+    if any(p == ".." for p in parts):
+        raise RestoreError(f"Percorso non valido nel backup: {arcname}")
+    return os.path.join(*parts[1:])
+
+
+def _link_or_copy(source: str, target: str):
+    """Hard link al file attuale (nessun byte riscritto); copia se il filesystem non lo consente."""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def _file_crc32(path: str) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _copy_rest(stream, out, digest) -> int:
+    written = 0
+    while chunk := stream.read(_CHUNK_SIZE):
+        if digest:
+            digest.update(chunk)
+        out.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def _stage_stream(stream, size: int, current: str, staged: str, digest=None) -> int:
+    """
+    Porta in staging un file del backup leggendolo una sola volta. Se il file attuale ha
+    la stessa dimensione il contenuto viene confrontato a blocchi: finché coincide non si
+    scrive nulla e alla fine si crea un hard link. Restituisce i byte scritti (0 se invariato).
+    """
+    read = 0
+    if os.path.isfile(current) and os.path.getsize(current) == size:
+        with open(current, "rb") as cur:
+            while chunk := stream.read(_CHUNK_SIZE):
+                if digest:
+                    digest.update(chunk)
+                if cur.read(len(chunk)) != chunk:
+                    # Prima differenza: il prefisso identico viene dal file attuale, il resto dal backup
+                    with open(staged, "wb") as out:
+                        cur.seek(0)
+                        remaining = read
+                        while remaining:
+                            remaining -= out.write(cur.read(min(_CHUNK_SIZE, remaining)))
+                        out.write(chunk)
+                        written = read + len(chunk) + _copy_rest(stream, out, digest)
+                    if written != size:
+                        raise RestoreError(f"{staged}: attesi {size} byte, letti {written}.")
+                    return written
+                read += len(chunk)
+        if read != size:
+            raise RestoreError(f"{current}: attesi {size} byte dal backup, letti {read}.")
+        _link_or_copy(current, staged)
+        return 0
+    with open(staged, "wb") as out:
+        written = _copy_rest(stream, out, digest)
+    if written != size:
+        raise RestoreError(f"{staged}: attesi {size} byte, letti {written}.")
+    return written
+
+
+class _Stager:
+    """Costruisce il nuovo mondo nella cartella di staging confrontandolo con quello attuale."""
+
+    def __init__(self, world_dir: str, staging: str):
+        self.world_dir = world_dir
+        self.staging = staging
+        self.seen: set[str] = set()
+        self.rewritten = 0
+        self.unchanged = 0
+        self.bytes_written = 0
+
+    def paths(self, relative_path: str) -> tuple[str, str]:
+        if relative_path in self.seen:
+            raise RestoreError(f"File duplicato nel backup: {relative_path}")
+        self.seen.add(relative_path)
+        staged = os.path.join(self.staging, relative_path)
+        os.makedirs(os.path.dirname(staged), exist_ok=True)
+        return os.path.join(self.world_dir, relative_path), staged
+
+    def link_unchanged(self, current: str, staged: str):
+        _link_or_copy(current, staged)
+        self.unchanged += 1
+
+    def stage(self, stream, size: int, current: str, staged: str, digest=None, mtime_ns: int | None = None):
+        written = _stage_stream(stream, size, current, staged, digest)
+        if written:
+            self.rewritten += 1
+            self.bytes_written += written
+            if mtime_ns is not None:
+                os.utime(staged, ns=(mtime_ns, mtime_ns))
+        else:
+            self.unchanged += 1
+
+
+def _stage_manifest(backup_path: str, stager: _Stager):
+    store = BackupStore(os.path.dirname(backup_path))
+    manifest = store.read_manifest(os.path.basename(backup_path))
+    for path, size, sha256, mtime_ns in manifest.get("files", []):
+        relative_path = world_relative_path(path)
+        if relative_path is None:
+            continue
+        current, staged = stager.paths(relative_path)
+        if os.path.isfile(current):
+            stat = os.stat(current)
+            # Le tabelle LevelDB non cambiano mai: stessa dimensione e mtime del backup = stesso file
+            if stat.st_size == size and stat.st_mtime_ns == mtime_ns:
+                stager.link_unchanged(current, staged)
+                continue
+        blob = store.object_path(sha256)
+        if not os.path.exists(blob):
+            raise RestoreError(f"Blob mancante per {path} ({sha256[:12]}).")
+        digest = hashlib.sha256()
+        with open(blob, "rb") as f:
+            stager.stage(f, size, current, staged, digest, mtime_ns)
+        if digest.hexdigest() != sha256:
+            raise RestoreError(f"Checksum errato per {path}: lo store è danneggiato.")
+
+
+def _stage_zip(backup_path: str, stager: _Stager):
+    with zipfile.ZipFile(backup_path) as archive:
+        for info in archive.infolist():
+            relative_path = world_relative_path(info.filename)
+            if relative_path is None:
+                continue
+            current, staged = stager.paths(relative_path)
+            # Il CRC dello zip permette di riconoscere i file invariati senza decomprimere nulla
+            if os.path.isfile(current) and os.path.getsize(current) == info.file_size and _file_crc32(current) == info.CRC:
+                stager.link_unchanged(current, staged)
+                continue
+            # zipfile verifica il CRC a fine lettura (BadZipFile se non corrisponde)
+            with archive.open(info) as stream:
+                stager.stage(stream, info.file_size, current, staged, mtime_ns=int(time.mktime(info.date_time + (0, 0, -1)) * 1e9))
+
+
+def _stage_tar_zst(backup_path: str, stager: _Stager):
+    if zstandard is None:
+        raise RestoreError("Impossibile leggere .tar.zst: installa il pacchetto 'zstandard'.")
+    # Il checksum del frame zstd viene verificato dal decompressore a fine flusso
+    with open(backup_path, "rb") as f, zstandard.ZstdDecompressor().stream_reader(f) as reader, \
+            tarfile.open(fileobj=reader, mode="r|") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            relative_path = world_relative_path(member.name)
+            if relative_path is None:
+                continue
+            current, staged = stager.paths(relative_path)
+            stager.stage(tar.extractfile(member), member.size, current, staged, mtime_ns=int(member.mtime * 1e9))
+
+
+def restore_world(backup_path: str, world_dir: str) -> RestoreResult:
+    """
+    Ripristina world_dir da un backup (manifest, .zip o .tar.zst) senza mai lasciare il
+    server senza mondo: il nuovo mondo viene costruito accanto a quello attuale, con hard
+    link per i file invariati e verificando i checksum dei file riscritti; solo a staging
+    completo i due mondi vengono scambiati con due rename (annullati se il secondo fallisce).
+    """
+    started = time.monotonic()
+    world_dir = os.path.normpath(world_dir)
+    recover_interrupted_restore(world_dir)
+    staging, ready_marker, old = _restore_paths(world_dir)
+    os.makedirs(staging)
+    stager = _Stager(world_dir, staging)
+    try:
+        if is_manifest(backup_path):
+            _stage_manifest(backup_path, stager)
+        elif backup_path.endswith(".tar.zst"):
+            _stage_tar_zst(backup_path, stager)
+        elif backup_path.endswith(".zip"):
+            _stage_zip(backup_path, stager)
+        else:
+            raise RestoreError(f"Formato di backup non supportato: {os.path.basename(backup_path)}")
+        if not stager.seen:
+            raise RestoreError("Il backup non contiene file.")
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    removed = 0
+    if os.path.isdir(world_dir):
+        for dirpath, _, filenames in os.walk(world_dir):
+            removed += sum(1 for name in filenames
+                           if os.path.relpath(os.path.join(dirpath, name), world_dir) not in stager.seen)
+
+    # Da qui in poi un crash viene risolto da recover_interrupted_restore
+    with open(ready_marker, "w"):
+        pass
+    if os.path.exists(world_dir):
+        os.rename(world_dir, old)
+    try:
+        os.rename(staging, world_dir)
+    except BaseException:
+        if os.path.exists(old):
+            os.rename(old, world_dir)
+        raise
+    os.remove(ready_marker)
+    shutil.rmtree(old, ignore_errors=True)
+
+    result = RestoreResult(len(stager.seen), stager.rewritten, stager.unchanged, removed,
+                           stager.bytes_written, time.monotonic() - started)
+    logger.info(f"🔄✅ Ripristino '{os.path.basename(world_dir)}' da {os.path.basename(backup_path)}: "
+                f"{result.rewritten} file riscritti, {result.unchanged} invariati, {result.removed} rimossi, "
+                f"{result.bytes_written} byte in {result.seconds:.1f}s.")
+    return result
@@ -1,32 +1,93 @@
 # minecraft_telegram_bot/server_handlers.py
 import asyncio
-import subprocess
 import html
+import re
+import time
 
-from telegram import Update
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
+from telegram.error import BadRequest
 
-from config import CONTAINER, get_logger
-from user_management import auth_required
-from docker_utils import run_docker_command
+from config import CMD_BATCH_RATE, get_logger
+from user_management import auth_required, has_permission
+from docker_api import get_docker_client
+from container_state import get_container_watcher
+from server_lifecycle import get_server_lifecycle
+from telemetry import get_stats_sampler, render_text_report, render_png_chart
+from console_session import ConsoleError
+from command_queue import enqueue_command, queue_query, get_dispatcher, PRIORITY_NAMES
+from log_stream import get_log_follower
+from server_registry import ServerContext, get_update_server, get_server, list_servers
+from user_management import set_selected_server
 
 logger = get_logger(__name__)
 
+# Caratteri di log per pagina (prima dell'escape HTML, entro il limite di 4096 di Telegram)
+LOGS_PAGE_CHARS = 3500
+
+def _render_logs_page(container: str, follower, records) -> tuple[str, InlineKeyboardMarkup | None]:
+    if not records:
+        return f"📄 <b>Log ({container}):</b>\n<pre>(Nessun output dai log)</pre>", None
+
+    body = html.escape("\n".join(record.raw for record in records))
+    first_seq, last_seq = records[0].seq, records[-1].seq
+    oldest_seq, newest_seq = follower.records[0].seq, follower.records[-1].seq
+    header = f"📄 <b>Log ({container})</b> righe {first_seq}–{last_seq} (buffer {oldest_seq}–{newest_seq}):"
+
+    buttons = []
+    if first_seq > oldest_seq:
+        buttons.append(InlineKeyboardButton("⬅️ Precedenti", callback_data=f"logs_page:before:{first_seq}"))
+    if last_seq < newest_seq:
+        buttons.append(InlineKeyboardButton("➡️ Successivi", callback_data=f"logs_page:after:{last_seq}"))
+    buttons.append(InlineKeyboardButton("🔄 Ultimi", callback_data="logs_page:latest"))
+    return f"{header}\n<pre>{body}</pre>", InlineKeyboardMarkup([buttons])
+
 async def logs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not CONTAINER:
+    server = get_update_server(update)
+    if not server:
         await update.message.reply_text("⚠️ CONTAINER non impostato.")
         return
     try:
-        output = await run_docker_command(["docker", "logs", "--tail", "50", CONTAINER], read_output=True, timeout=10)
-        safe_output = html.escape(output or "(Nessun output dai log)")
-        await update.message.reply_text(f"📄 <b>Ultimi log ({CONTAINER}):</b>\n<pre>{safe_output[:3900]}</pre>", parse_mode=ParseMode.HTML)
+        follower = get_log_follower(server.container)
+        text, markup = _render_logs_page(server.container, follower, follower.page_before(None, LOGS_PAGE_CHARS))
+        await update.message.reply_text(text, parse_mode=ParseMode.HTML, reply_markup=markup)
     except Exception as e:
         logger.error(f"📄❌ Errore /logs: {e}", exc_info=True)
         await update.message.reply_text(f"❌ Errore recuperando i log: {html.escape(str(e))}")
 
+async def handle_logs_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, page_spec: str):
+    query = update.callback_query
+    if not has_permission(update.effective_user.id, "logs"):
+        await query.edit_message_text("Accesso negato: permessi insufficienti.")
+        return
+    server = get_update_server(update)
+    if not server:
+        await query.edit_message_text("⚠️ CONTAINER non impostato.")
+        return
+
+    follower = get_log_follower(server.container)
+    direction, _, seq = page_spec.partition(":")
+    if direction == "before":
+        records = follower.page_before(int(seq), LOGS_PAGE_CHARS)
+    elif direction == "after":
+        records = follower.page_after(int(seq), LOGS_PAGE_CHARS)
+    else:
+        records = follower.page_before(None, LOGS_PAGE_CHARS)
+
+    if not records:
+        # Le righe richieste sono uscite dal buffer: si torna alle più recenti
+        records = follower.page_before(None, LOGS_PAGE_CHARS)
+    text, markup = _render_logs_page(server.container, follower, records)
+    try:
+        await query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=markup)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+
 async def cmd_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not CONTAINER:
+    server = get_update_server(update)
+    if not server:
         await update.message.reply_text("⚠️ CONTAINER non impostato.")
         return
 
@@ -47,54 +108,216 @@ async def cmd_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Specifica comandi dopo /cmd.")
         return
 
-    commands_to_run = [cmd.strip() for cmd in raw_command_block.splitlines() if cmd.strip() and not cmd.strip().startswith("#")]
+    commands_to_run = parse_command_script(raw_command_block)
 
     if not commands_to_run:
         await update.message.reply_text("Nessun comando valido da eseguire (ignora commenti e righe vuote).")
         return
 
-    await update.message.reply_text(f"⚙️ Invio di {len(commands_to_run)} comandi...")
-    for i, single_command in enumerate(commands_to_run):
-        try:
-            await run_docker_command(["docker", "exec", CONTAINER, "send-command", single_command], read_output=False)
-            await update.message.reply_text(f"⚙️✅ Comando {i+1} (<code>{html.escape(single_command)}</code>) inviato.", parse_mode=ParseMode.HTML)
-            await asyncio.sleep(0.2)
-        except Exception as e:
-            await update.message.reply_text(f"⚙️❌ Errore comando {i+1} (<code>{html.escape(single_command)}</code>): {html.escape(str(e))}", parse_mode=ParseMode.HTML)
-            logger.error(f"⚙️❌ Errore /cmd '{single_command}': {e}", exc_info=True)
-            break
+    if len(commands_to_run) > 1:
+        await run_command_batch(update.message, commands_to_run, "/cmd", update.effective_user.id, server.container)
+        return
+
+    single_command = commands_to_run[0]
+    try:
+        response = await queue_query(single_command, user_id=update.effective_user.id, container=server.container, timeout=3)
+        response_text = "\n".join(record.message for record in response) or "(nessuna risposta dal server)"
+        await update.message.reply_text(
+            f"⚙️✅ <code>{html.escape(single_command)}</code>:\n<pre>{html.escape(response_text[:3500])}</pre>",
+            parse_mode=ParseMode.HTML
+        )
+    except Exception as e:
+        await update.message.reply_text(f"⚙️❌ Errore comando (<code>{html.escape(single_command)}</code>): {html.escape(str(e))}", parse_mode=ParseMode.HTML)
+        logger.error(f"⚙️❌ Errore /cmd '{single_command}': {e}", exc_info=True)
+
+# Risposte della console che indicano un comando fallito
+_SERVER_ERROR_RE = re.compile(r"^(Unknown command|Syntax error|No targets matched|Incorrect argument)", re.IGNORECASE)
+MAX_SCRIPT_BYTES = 1024 * 1024
+
+def parse_command_script(text: str) -> list[str]:
+    """Righe di comando di uno script, senza righe vuote e commenti (#)."""
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.strip().startswith("#")]
+
+async def _edit_status(message, text: str):
+    try:
+        await message.edit_text(text, parse_mode=ParseMode.HTML)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            logger.warning(f"⚙️⚠️ Aggiornamento stato batch non riuscito: {e}")
+
+async def run_command_batch(reply_target, commands: list[str], label: str, user_id: int | None = None, container: str | None = None):
+    """
+    Invia gli script tramite la coda comandi centrale a CMD_BATCH_RATE comandi/s,
+    aggiorna un unico messaggio di stato e termina con un riepilogo degli errori
+    (invii falliti ed errori segnalati dal server nei log).
+    """
+    total = len(commands)
+    status = await reply_target.reply_text(f"⚙️⏳ {html.escape(label)}: 0/{total} comandi inviati...")
+    container = container or get_server().container
+    follower = get_log_follower(container)
+    server_errors = []
+
+    def collect_errors(record):
+        if record.level == "ERROR" or _SERVER_ERROR_RE.match(record.message):
+            server_errors.append(record.message)
+
+    follower.add_listener(collect_errors)
+    loop = asyncio.get_running_loop()
+    interval = 1 / CMD_BATCH_RATE if CMD_BATCH_RATE > 0 else 0
+    started = next_send = last_edit = loop.time()
+    sent, send_error = 0, None
+    try:
+        for index, command in enumerate(commands, 1):
+            delay = next_send - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_send = max(next_send + interval, loop.time())
+            try:
+                # Nessuna coalescenza: l'ordine e le ripetizioni dello script contano
+                await enqueue_command(command, user_id=user_id, container=container, coalesce=False)
+            except (ConsoleError, asyncio.TimeoutError) as e:
+                # La sessione ha già ritentato: inutile proseguire con il resto dello script
+                send_error = (index, command, str(e))
+                break
+            sent += 1
+            if loop.time() - last_edit >= 2:
+                last_edit = loop.time()
+                await _edit_status(status, f"⚙️⏳ {html.escape(label)}: {sent}/{total} comandi inviati...")
+
+        # Attende che il server smetta di rispondere prima del riepilogo (max 3 s)
+        quiet_deadline = loop.time() + 3
+        last_seq = follower.records[-1].seq if follower.records else 0
+        while loop.time() < quiet_deadline:
+            await asyncio.sleep(0.5)
+            current_seq = follower.records[-1].seq if follower.records else 0
+            if current_seq == last_seq:
+                break
+            last_seq = current_seq
+    finally:
+        follower.remove_listener(collect_errors)
+
+    elapsed = loop.time() - started
+    icon = "✅" if not send_error and not server_errors else "⚠️"
+    lines = [f"⚙️{icon} {html.escape(label)}: {sent}/{total} comandi inviati in {elapsed:.1f}s."]
+    if send_error:
+        index, command, error = send_error
+        lines.append(f"❌ Invio interrotto al comando {index} (<code>{html.escape(command)}</code>): {html.escape(error)}")
+    if server_errors:
+        lines.append(f"⚠️ {len(server_errors)} errori segnalati dal server:")
+        lines.extend(f"• {html.escape(message[:200])}" for message in server_errors[:10])
+        if len(server_errors) > 10:
+            lines.append(f"… e altri {len(server_errors) - 10}.")
+    logger.info(f"⚙️ Batch '{label}': {sent}/{total} inviati, {len(server_errors)} errori server, {elapsed:.1f}s.")
+    await _edit_status(status, "\n".join(lines))
+
+async def cmd_script_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Esegue uno script .mcfunction (o .txt con didascalia /cmd) caricato come documento."""
+    document = update.message.document
+    if not has_permission(update.effective_user.id, "cmd"):
+        await update.message.reply_text("Accesso negato: permessi insufficienti.")
+        return
+    server = get_update_server(update)
+    if not server:
+        await update.message.reply_text("⚠️ CONTAINER non impostato.")
+        return
+    if document.file_size and document.file_size > MAX_SCRIPT_BYTES:
+        await update.message.reply_text(f"❌ Script troppo grande (max {MAX_SCRIPT_BYTES // 1024} KB).")
+        return
+    try:
+        new_file = await context.bot.get_file(document.file_id)
+        content = bytes(await new_file.download_as_bytearray()).decode("utf-8-sig", errors="replace")
+    except Exception as e:
+        logger.error(f"⚙️❌ Errore scaricamento script '{document.file_name}': {e}", exc_info=True)
+        await update.message.reply_text(f"❌ Errore scaricamento script: {html.escape(str(e))}")
+        return
 
-async def stop_server_command(update: Update, context: ContextTypes.DEFAULT_TYPE, quiet: bool = False) -> bool:
+    commands = parse_command_script(content)
+    if not commands:
+        await update.message.reply_text("Nessun comando valido nello script (ignora commenti e righe vuote).")
+        return
+    await run_command_batch(update.message, commands, document.file_name or "script", update.effective_user.id, server.container)
+
+async def notify_if_busy(reply_target, server: ServerContext):
+    """Avvisa che il server è impegnato in un'altra operazione (la richiesta attende il suo turno)."""
+    if server.busy and reply_target:
+        await reply_target.reply_text(f"⏳ '{server.name}' è occupato ({server.operation}): l'operazione partirà appena possibile.")
+
+async def stop_server_command(update: Update, context: ContextTypes.DEFAULT_TYPE, quiet: bool = False, operation: str | None = None,
+                              server: ServerContext | None = None) -> bool:
+    """
+    Arresta il container e attende che i file del mondo siano rilasciati.
+    Con `operation` apre una finestra di fermo i cui tempi vengono registrati fino al riavvio.
+    """
     reply_target = update.message or (update.callback_query.message if update.callback_query else None)
-    if not CONTAINER:
+    server = server or get_update_server(update)
+    if not server:
         if not quiet and reply_target: await reply_target.reply_text("⚠️ CONTAINER non impostato.")
         return False
-    if not quiet and reply_target: await reply_target.reply_text(f"🛑⏳ Arresto '{CONTAINER}'...")
+    if not quiet:
+        await notify_if_busy(reply_target, server)
+    async with server.exclusive("arresto"):
+        return await _stop_server(server, reply_target, quiet, operation)
+
+async def _stop_server(server: ServerContext, reply_target, quiet: bool, operation: str | None) -> bool:
+    container = server.container
+    watcher = get_container_watcher(container)
+    lifecycle = get_server_lifecycle(container)
+    if operation:
+        lifecycle.begin(operation)
+    if watcher.state is not None and not watcher.running:
+        if not quiet and reply_target: await reply_target.reply_text(f"🛑ℹ️ '{container}' è già arrestato.")
+        return await lifecycle.wait_stopped(timeout=15)
+    if not quiet and reply_target: await reply_target.reply_text(f"🛑⏳ Arresto '{container}'...")
     try:
-        await run_docker_command(["docker", "stop", CONTAINER], read_output=True, timeout=45)
-        if not quiet and reply_target: await reply_target.reply_text(f"🛑✅ '{CONTAINER}' arrestato.")
+        stopped = await get_docker_client(container).stop(container, timeout=30)
+        if not await lifecycle.wait_stopped(timeout=30):
+            if not quiet and reply_target: await reply_target.reply_text(f"🛑⚠️ '{container}' non ha rilasciato i file del mondo.")
+            return False
+        if not quiet and reply_target: await reply_target.reply_text(f"🛑✅ '{container}' arrestato." if stopped else f"🛑ℹ️ '{container}' era già arrestato.")
         return True
     except Exception as e:
         logger.error(f"🛑❌ Errore /stopserver: {e}", exc_info=True)
         if not quiet and reply_target: await reply_target.reply_text(f"❌ Errore arresto: {html.escape(str(e))}")
     return False
 
-async def start_server_command(update: Update, context: ContextTypes.DEFAULT_TYPE, quiet: bool = False) -> bool:
+async def start_server_command(update: Update, context: ContextTypes.DEFAULT_TYPE, quiet: bool = False,
+                               server: ServerContext | None = None) -> bool:
+    """Avvia il container e attende che il mondo sia caricato ("Server started.")."""
     reply_target = update.message or (update.callback_query.message if update.callback_query else None)
-    if not CONTAINER:
+    server = server or get_update_server(update)
+    if not server:
         if not quiet and reply_target: await reply_target.reply_text("⚠️ CONTAINER non impostato.")
         return False
-    if not quiet and reply_target: await reply_target.reply_text(f"🚀⏳ Avvio '{CONTAINER}'...")
-    try:
-        await run_docker_command(["docker", "start", CONTAINER], read_output=True, timeout=30)
-        if not quiet and reply_target: await reply_target.reply_text(f"🚀✅ '{CONTAINER}' avviato.")
+    if not quiet:
+        await notify_if_busy(reply_target, server)
+    async with server.exclusive("avvio"):
+        return await _start_server(server, reply_target, quiet)
+
+async def _start_server(server: ServerContext, reply_target, quiet: bool) -> bool:
+    container = server.container
+    watcher = get_container_watcher(container)
+    lifecycle = get_server_lifecycle(container)
+    if lifecycle.window:
+        # Tempo trascorso a server fermo per l'operazione stessa
+        lifecycle.mark(lifecycle.window.operation)
+    if watcher.running:
+        if not quiet and reply_target: await reply_target.reply_text(f"🚀ℹ️ '{container}' è già avviato.")
+        await lifecycle.wait_ready()
         return True
-    except subprocess.CalledProcessError as e:
-        err_str = (e.stderr or str(e.output) or str(e)).lower()
-        if "is already started" in err_str:
-            if not quiet and reply_target: await reply_target.reply_text(f"🚀ℹ️ '{CONTAINER}' è già avviato.")
+    if not quiet and reply_target: await reply_target.reply_text(f"🚀⏳ Avvio '{container}'...")
+    try:
+        if not await get_docker_client(container).start(container):
+            # 304: era già in esecuzione (stato non ancora noto dagli eventi)
+            if not quiet and reply_target: await reply_target.reply_text(f"🚀ℹ️ '{container}' è già avviato.")
+            await lifecycle.wait_ready(timeout=5)
             return True
-        raise
+        lifecycle.mark_starting()
+        lifecycle.mark("avvio container")
+        if await lifecycle.wait_ready():
+            if not quiet and reply_target: await reply_target.reply_text(f"🚀✅ '{container}' avviato e pronto.")
+        else:
+            if not quiet and reply_target: await reply_target.reply_text(f"🚀⚠️ '{container}' avviato ma non ancora pronto. Controlla /logs.")
+        return True
     except Exception as e:
         logger.error(f"🚀❌ Errore /startserver: {e}", exc_info=True)
         if not quiet and reply_target: await reply_target.reply_text(f"❌ Errore avvio: {html.escape(str(e))}")
@@ -102,7 +325,8 @@ async def start_server_command(update: Update, context: ContextTypes.DEFAULT_TYP
 
 async def restart_server_command(update: Update, context: ContextTypes.DEFAULT_TYPE, quiet: bool = False):
     reply_target = update.message or (update.callback_query.message if update.callback_query else None)
-    if not CONTAINER:
+    server = get_update_server(update)
+    if not server:
         if not quiet and reply_target: await reply_target.reply_text("⚠️ CONTAINER non impostato.")
         return
 
@@ -110,11 +334,139 @@ async def restart_server_command(update: Update, context: ContextTypes.DEFAULT_T
         logger.error("💬❌ /restartserver: Impossibile determinare target risposta.")
         return
 
-    if not quiet: await reply_target.reply_text(f"🔄⏳ Riavvio '{CONTAINER}'...")
+    if not quiet:
+        await notify_if_busy(reply_target, server)
+    async with server.exclusive("riavvio"):
+        await _restart_server(server, reply_target, quiet)
+
+async def _restart_server(server: ServerContext, reply_target, quiet: bool):
+    container = server.container
+    if not quiet: await reply_target.reply_text(f"🔄⏳ Riavvio '{container}'...")
     try:
-        await run_docker_command(["docker", "restart", CONTAINER], read_output=False, timeout=60)
-        logger.info(f"🐳🔄 Comando 'docker restart {CONTAINER}' inviato.")
-        if not quiet: await reply_target.reply_text(f"🔄✅ Comando riavvio per '{CONTAINER}' inviato. Controlla /logs.")
+        lifecycle = get_server_lifecycle(container)
+        window = lifecycle.begin("riavvio")
+        lifecycle.mark_starting()
+        await get_docker_client(container).restart(container, timeout=30)
+        lifecycle.mark("riavvio container")
+        ready = await lifecycle.wait_ready()
+        logger.info(f"🐳🔄 Riavvio di '{container}' completato.")
+        if not quiet:
+            if ready:
+                await reply_target.reply_text(f"🔄✅ '{container}' riavviato e pronto.\n⏱️ {window.summary()}")
+            else:
+                await reply_target.reply_text(f"🔄⚠️ '{container}' riavviato ma non ancora pronto. Controlla /logs.")
     except Exception as e:
         logger.error(f"🔄❌ Errore /restartserver: {e}", exc_info=True)
         if not quiet: await reply_target.reply_text(f"❌ Errore riavvio: {html.escape(str(e))}")
+
+def _server_selector(current: ServerContext | None) -> tuple[str, InlineKeyboardMarkup | None]:
+    lines = ["🗄️ <b>Server disponibili:</b>"]
+    buttons = []
+    for server in list_servers():
+        state = get_container_watcher(server.container).state or "sconosciuto"
+        marker = "👉 " if current is not None and server.name == current.name else "• "
+        busy = f", {html.escape(server.operation)} in corso" if server.busy else ""
+        lines.append(f"{marker}<b>{html.escape(server.name)}</b> – {html.escape(server.world_name)} ({state}{busy})")
+        callback_data = f"select_server:{server.name}"
+        if len(callback_data.encode("utf-8")) <= 64:
+            buttons.append([InlineKeyboardButton(f"🎯 {server.name}", callback_data=callback_data)])
+    return "\n".join(lines), InlineKeyboardMarkup(buttons) if len(buttons) > 1 else None
+
+async def server_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/server [nome]: mostra i server gestiti o sceglie quello su cui agiscono i comandi."""
+    if not list_servers():
+        await update.message.reply_text("⚠️ Nessun server configurato.")
+        return
+    uid = update.effective_user.id
+    if context.args:
+        name = " ".join(context.args)
+        server = get_server(name)
+        if server is None:
+            await update.message.reply_text(f"❓ Server '{html.escape(name)}' non trovato. Usa /server per l'elenco.")
+            return
+        set_selected_server(uid, server.name)
+        await update.message.reply_text(f"🎯 Server selezionato: <b>{html.escape(server.name)}</b>", parse_mode=ParseMode.HTML)
+        return
+    text, markup = _server_selector(get_update_server(update))
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML, reply_markup=markup)
+
+async def handle_select_server_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, name: str):
+    query = update.callback_query
+    if not has_permission(update.effective_user.id, "server"):
+        await query.edit_message_text("Accesso negato: permessi insufficienti.")
+        return
+    server = get_server(name)
+    if server is None:
+        await query.edit_message_text(f"❓ Server '{html.escape(name)}' non più configurato.")
+        return
+    set_selected_server(update.effective_user.id, server.name)
+    text, markup = _server_selector(server)
+    try:
+        await query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=markup)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+
+async def downtime_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Mostra i tempi di fermo delle ultime operazioni (arresto, lavoro, avvio, caricamento)."""
+    server = get_update_server(update)
+    if not server:
+        await update.message.reply_text("⚠️ CONTAINER non impostato.")
+        return
+    container = server.container
+    history = list(get_server_lifecycle(container).history)[-10:]
+    if not history:
+        await update.message.reply_text("⏱️ Nessuna operazione con fermo del server registrata.")
+        return
+    lines = ["⏱️ <b>Fermi del server recenti:</b>"]
+    for window in reversed(history):
+        lines.append(f"• {window.started_at:%d/%m %H:%M} <b>{html.escape(window.operation)}</b>: {html.escape(window.summary())}")
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
+
+async def queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Stato della coda comandi centrale: profondità per classe, contatori e attese."""
+    server = get_update_server(update)
+    if not server:
+        await update.message.reply_text("⚠️ CONTAINER non impostato.")
+        return
+    container = server.container
+    metrics = get_dispatcher(container).metrics()
+    depth = ", ".join(f"{name} {metrics['depth'][priority]}" for priority, name in PRIORITY_NAMES.items())
+    lines = [
+        "📨 <b>Coda comandi console:</b>",
+        f"• In coda: {depth}",
+        f"• Accodati {metrics['enqueued']}, inviati {metrics['sent']}, coalescati {metrics['coalesced']}, falliti {metrics['failed']}",
+        f"• Attesa: media {metrics['wait_avg'] * 1000:.0f} ms, p95 {metrics['wait_p95'] * 1000:.0f} ms, max {metrics['wait_max'] * 1000:.0f} ms",
+    ]
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
+
+_STATS_WINDOW_RE = re.compile(r"^(\d+)([mh])$")
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/stats [30m|6h|24h]: CPU, RAM, rete e disco del container nell'intervallo richiesto."""
+    server = get_update_server(update)
+    if not server:
+        await update.message.reply_text("⚠️ CONTAINER non impostato.")
+        return
+    container = server.container
+    window_arg = (context.args[0].lower() if context.args else "1h")
+    match = _STATS_WINDOW_RE.match(window_arg)
+    if not match:
+        await update.message.reply_text("Uso: /stats [intervallo], es. /stats 30m, /stats 6h, /stats 24h")
+        return
+    seconds = int(match.group(1)) * (60 if match.group(2) == "m" else 3600)
+    since = time.time() - seconds
+
+    sampler = get_stats_sampler(container)
+    report = render_text_report(sampler, since)
+    if not report:
+        await update.message.reply_text("📈 Nessun campione disponibile: il campionamento è appena partito o il container è fermo.")
+        return
+    chart = await asyncio.to_thread(render_png_chart, sampler, since)
+    caption = f"📈 <b>Risorse '{container}' (ultimi {html.escape(window_arg)})</b>"
+    if chart:
+        full_caption = f"{caption}\n<pre>{html.escape(report)}</pre>"
+        # Le didascalie delle foto sono limitate a 1024 caratteri
+        await update.message.reply_photo(photo=chart, caption=full_caption if len(full_caption) <= 1024 else caption, parse_mode=ParseMode.HTML)
+    else:
+        await update.message.reply_text(f"{caption}\n<pre>{html.escape(report)}</pre>", parse_mode=ParseMode.HTML)
@@ -0,0 +1,168 @@
+# minecraft_telegram_bot/server_lifecycle.py
+import asyncio
+import fcntl
+import os
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from config import CONTAINER, WORLD_NAME, BEDROCK_DATA_PATH, SERVER_READY_TIMEOUT, get_logger
+from container_state import get_container_watcher
+from log_stream import get_log_follower
+from world_management import get_world_directory_path
+from server_registry import get_server_by_container
+
+logger = get_logger(__name__)
+
+_SERVER_STARTED_RE = re.compile(r"^Server started\.")
+_IPV4_READY_RE = re.compile(r"^IPv4 supported")
+
+
+@dataclass(slots=True)
+class DowntimeWindow:
+    """Fasi (nome, secondi) di un'operazione dall'arresto al server di nuovo pronto."""
+    operation: str
+    started_at: datetime = field(default_factory=datetime.now)
+    phases: list = field(default_factory=list)
+    total: float | None = None
+    _t0: float = field(default_factory=time.monotonic, init=False, repr=False)
+    _mark: float = field(default_factory=time.monotonic, init=False, repr=False)
+
+    def mark(self, phase: str, at: float | None = None) -> float:
+        now = at if at is not None else time.monotonic()
+        elapsed = now - self._mark
+        self.phases.append((phase, elapsed))
+        self._mark = now
+        return elapsed
+
+    def finish(self):
+        self.total = time.monotonic() - self._t0
+
+    def summary(self) -> str:
+        parts = " · ".join(f"{phase} {seconds:.1f}s" for phase, seconds in self.phases)
+        total = f" (fermo totale {self.total:.1f}s)" if self.total is not None else ""
+        return f"{parts}{total}"
+
+
+class ServerLifecycle:
+    """
+    Stati del server ricavati da eventi Docker e log: arrestato con i file del
+    mondo rilasciati (lock LevelDB libero) e pronto ("IPv4 supported" +
+    "Server started."). Registra i tempi di ogni fase per operazione.
+    """
+
+    def __init__(self, container: str, world_name: str = WORLD_NAME, data_path: str = BEDROCK_DATA_PATH):
+        self.container = container
+        self.world_name = world_name
+        self.data_path = data_path
+        self.history: deque[DowntimeWindow] = deque(maxlen=50)
+        self.window: DowntimeWindow | None = None
+        self._network_at: float | None = None
+        self._ready = asyncio.Event()
+        self._ready_at: float | None = None
+        self._watcher = get_container_watcher(container)
+        self._watcher.add_listener(self._on_container_state)
+        get_log_follower(container).add_listener(self._on_log_record)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def _on_container_state(self, previous, state):
+        if state != "running":
+            self.mark_starting()
+
+    def _on_log_record(self, record):
+        if self._watcher.state not in (None, "running"):
+            return  # righe storiche di un'esecuzione precedente
+        if _IPV4_READY_RE.match(record.message):
+            self._network_at = time.monotonic()
+        elif _SERVER_STARTED_RE.match(record.message):
+            self._ready_at = time.monotonic()
+            self._ready.set()
+
+    def begin(self, operation: str) -> DowntimeWindow:
+        """Apre la finestra di fermo per un'operazione (chiusa da wait_ready)."""
+        self.window = DowntimeWindow(operation)
+        return self.window
+
+    def mark(self, phase: str, at: float | None = None):
+        if self.window:
+            self.window.mark(phase, at=at)
+
+    def _lock_path(self) -> str | None:
+        world_dir = get_world_directory_path(self.world_name, self.data_path) if self.world_name else None
+        return os.path.join(world_dir, "db", "LOCK") if world_dir else None
+
+    def _world_lock_free(self, lock_path: str | None) -> bool:
+        """Prova a prendere il lock fcntl usato da LevelDB sul file db/LOCK."""
+        if not lock_path or not os.path.exists(lock_path):
+            return True
+        try:
+            fd = os.open(lock_path, os.O_RDWR)
+        except OSError:
+            return True
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+            return True
+        except OSError:
+            return False
+        finally:
+            os.close(fd)
+
+    async def wait_stopped(self, timeout: float = 60) -> bool:
+        """Attende il container fermo e il lock del database del mondo rilasciato."""
+        deadline = time.monotonic() + timeout
+        if not await self._watcher.wait_for("exited", "removed", "created", timeout=timeout):
+            logger.warning(f"⏱️⚠️ '{self.container}' non risulta arrestato dopo {timeout}s.")
+            return False
+        self.mark("arresto")
+        lock_path = self._lock_path()
+        while not await asyncio.to_thread(self._world_lock_free, lock_path):
+            if time.monotonic() > deadline:
+                logger.warning(f"⏱️⚠️ Lock del mondo ancora occupato dopo {timeout}s: {lock_path}")
+                return False
+            await asyncio.sleep(0.1)
+        self.mark("rilascio file")
+        return True
+
+    def mark_starting(self):
+        """Chiamata prima dell'avvio: le righe di pronto precedenti non valgono più."""
+        self._network_at = None
+        self._ready_at = None
+        self._ready.clear()
+
+    async def wait_ready(self, timeout: float = SERVER_READY_TIMEOUT) -> bool:
+        """Attende "IPv4 supported" e "Server started." dopo l'avvio e chiude la finestra di fermo."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            if self._network_at is not None:
+                self.mark("rete", at=self._network_at)
+            self.mark("mondo caricato", at=self._ready_at)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️⚠️ '{self.container}' non pronto entro {timeout}s.")
+            return False
+        finally:
+            if self.window:
+                self.window.finish()
+                logger.info(f"⏱️ {self.window.operation}: {self.window.summary()}")
+                self.history.append(self.window)
+                self.window = None
+
+
+_lifecycles: dict[str, ServerLifecycle] = {}
+
+
+def get_server_lifecycle(container: str = CONTAINER) -> ServerLifecycle:
+    if not container:
+        raise ValueError("CONTAINER non configurato per il ciclo di vita del server.")
+    lifecycle = _lifecycles.get(container)
+    if lifecycle is None:
+        server = get_server_by_container(container)
+        lifecycle = _lifecycles[container] = (
+            ServerLifecycle(container, server.world_name, server.data_path) if server else ServerLifecycle(container))
+    return lifecycle
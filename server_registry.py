@@ -0,0 +1,150 @@
+# minecraft_telegram_bot/server_registry.py
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from config import (
+    CONTAINER, WORLD_NAME, CONSOLE_TRANSPORT, SSH_CONSOLE_HOST,
+    SERVERS_FILE, DEFAULT_SERVER, BEDROCK_DATA_PATH, BACKUP_SCHEDULE, get_logger
+)
+from user_management import get_selected_server_name
+
+logger = get_logger(__name__)
+
+
+@dataclass(slots=True)
+class ServerConfig:
+    """Un server Bedrock gestito dal bot: container Docker, mondo e dati su disco."""
+    name: str
+    container: str
+    world_name: str
+    data_path: str = BEDROCK_DATA_PATH
+    console_transport: str = CONSOLE_TRANSPORT
+    ssh_host: str = ""
+    backup_schedule: str = BACKUP_SCHEDULE
+
+    def __post_init__(self):
+        if not self.ssh_host:
+            self.ssh_host = self.container
+
+
+@dataclass(slots=True)
+class ServerContext:
+    """
+    Stato isolato di un server: le operazioni che lo fermano o ne modificano il
+    mondo (backup, ripristino, riavvio...) sono serializzate dal suo lock, mentre
+    server diversi procedono in parallelo.
+    """
+    config: ServerConfig
+    cache: dict = field(default_factory=dict)
+    _lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    _lock_owner: object = None
+    operation: str | None = None
+
+    @property
+    def name(self) -> str:
+        return self.config.name
+
+    @property
+    def container(self) -> str:
+        return self.config.container
+
+    @property
+    def world_name(self) -> str:
+        return self.config.world_name
+
+    @property
+    def data_path(self) -> str:
+        return self.config.data_path
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    @asynccontextmanager
+    async def exclusive(self, operation: str):
+        """
+        Lock delle operazioni sul server, rientrante per lo stesso task: un backup
+        che richiama /stopserver e /startserver non si blocca su sé stesso.
+        """
+        task = asyncio.current_task()
+        if self._lock_owner is task:
+            yield self
+            return
+        async with self._lock:
+            self._lock_owner, self.operation = task, operation
+            try:
+                yield self
+            finally:
+                self._lock_owner, self.operation = None, None
+
+
+def _load_server_configs() -> dict[str, ServerConfig]:
+    """
+    Legge SERVERS_FILE ({"nome": {"container": ..., "world": ..., "data_path": ...,
+    "console_transport": ..., "ssh_host": ..., "backup_schedule": ...}}). Senza file resta il singolo server
+    definito da CONTAINER e WORLD_NAME.
+    """
+    servers = {}
+    if os.path.exists(SERVERS_FILE):
+        try:
+            with open(SERVERS_FILE) as f:
+                data = json.load(f)
+            for name, entry in data.items():
+                servers[name] = ServerConfig(
+                    name=name,
+                    container=entry["container"],
+                    world_name=entry.get("world", WORLD_NAME),
+                    data_path=entry.get("data_path", BEDROCK_DATA_PATH),
+                    console_transport=entry.get("console_transport", CONSOLE_TRANSPORT).lower(),
+                    ssh_host=entry.get("ssh_host", ""),
+                    backup_schedule=entry.get("backup_schedule", BACKUP_SCHEDULE),
+                )
+        except Exception as e:
+            logger.error(f"🗄️❌ Errore caricamento {SERVERS_FILE}: {e}. Uso il server singolo da config.")
+            servers = {}
+    if not servers and CONTAINER:
+        servers[CONTAINER] = ServerConfig(
+            name=CONTAINER, container=CONTAINER, world_name=WORLD_NAME, ssh_host=SSH_CONSOLE_HOST)
+    return servers
+
+
+_servers: dict[str, ServerContext] = {
+    name: ServerContext(config) for name, config in _load_server_configs().items()
+}
+if _servers:
+    logger.info(f"🗄️ Server configurati: {', '.join(_servers)}")
+
+
+def list_servers() -> list[ServerContext]:
+    return list(_servers.values())
+
+
+def get_default_server() -> ServerContext | None:
+    if DEFAULT_SERVER in _servers:
+        return _servers[DEFAULT_SERVER]
+    return next(iter(_servers.values()), None)
+
+
+def get_server(name: str | None = None) -> ServerContext | None:
+    if name is None:
+        return get_default_server()
+    return _servers.get(name)
+
+
+def get_server_by_container(container: str) -> ServerContext | None:
+    return next((server for server in _servers.values() if server.container == container), None)
+
+
+def get_user_server(user_id: int | None) -> ServerContext | None:
+    """Server selezionato dall'utente con /server (il predefinito se non scelto o non più esistente)."""
+    name = get_selected_server_name(user_id) if user_id is not None else None
+    return _servers.get(name) if name in _servers else get_default_server()
+
+
+def get_update_server(update) -> ServerContext | None:
+    """Server su cui agisce un update Telegram (comando o callback)."""
+    user = update.effective_user
+    return get_user_server(user.id if user else None)
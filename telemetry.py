@@ -0,0 +1,250 @@
+# minecraft_telegram_bot/telemetry.py
+import asyncio
+import io
+import json
+import time
+from array import array
+from datetime import datetime
+
+from config import CONTAINER, STATS_SAMPLE_INTERVAL, STATS_RETENTION_HOURS, get_logger
+from docker_api import api_stream, DockerAPIError
+
+logger = get_logger(__name__)
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+except ImportError:
+    plt = None
+
+# Metrica -> (etichetta, unità)
+METRICS = {
+    "cpu": ("CPU", "%"),
+    "mem": ("RAM", "MiB"),
+    "net_rx": ("Rete in", "KiB/s"),
+    "net_tx": ("Rete out", "KiB/s"),
+    "blk_read": ("Disco lettura", "KiB/s"),
+    "blk_write": ("Disco scrittura", "KiB/s"),
+}
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+class MetricRing:
+    """
+    Ring buffer a capacità fissa su array compatti: un array di timestamp
+    (uint32) e un array float32 per metrica, ~4 byte per valore.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = array("I", bytes(4 * capacity))
+        self.values = {name: array("f", bytes(4 * capacity)) for name in METRICS}
+        self.head = 0
+        self.count = 0
+
+    def append(self, timestamp: float, sample: dict):
+        self.timestamps[self.head] = int(timestamp)
+        for name, values in self.values.items():
+            values[self.head] = sample.get(name, 0.0)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def _indices(self):
+        start = (self.head - self.count) % self.capacity
+        return ((start + i) % self.capacity for i in range(self.count))
+
+    def series(self, metric: str, since: float = 0) -> tuple[list, list]:
+        values = self.values[metric]
+        times, points = [], []
+        for i in self._indices():
+            if self.timestamps[i] >= since:
+                times.append(self.timestamps[i])
+                points.append(values[i])
+        return times, points
+
+    def latest(self) -> dict | None:
+        if not self.count:
+            return None
+        i = (self.head - 1) % self.capacity
+        return {"timestamp": self.timestamps[i], **{name: values[i] for name, values in self.values.items()}}
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.itemsize * self.capacity * (1 + len(self.values))
+
+
+def _sum_blkio(stats: dict, op: str) -> int:
+    entries = (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []
+    return sum(e.get("value", 0) for e in entries if str(e.get("op", "")).lower() == op)
+
+
+def _counters(stats: dict) -> dict:
+    networks = stats.get("networks") or {}
+    return {
+        "net_rx": sum(n.get("rx_bytes", 0) for n in networks.values()),
+        "net_tx": sum(n.get("tx_bytes", 0) for n in networks.values()),
+        "blk_read": _sum_blkio(stats, "read"),
+        "blk_write": _sum_blkio(stats, "write"),
+    }
+
+
+def _cpu_percent(stats: dict) -> float:
+    cpu, precpu = stats.get("cpu_stats") or {}, stats.get("precpu_stats") or {}
+    cpu_delta = cpu.get("cpu_usage", {}).get("total_usage", 0) - precpu.get("cpu_usage", {}).get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    online = cpu.get("online_cpus") or len(cpu.get("cpu_usage", {}).get("percpu_usage") or []) or 1
+    if cpu_delta <= 0 or system_delta <= 0:
+        return 0.0
+    return cpu_delta / system_delta * online * 100
+
+
+def _memory_mib(stats: dict) -> float:
+    memory = stats.get("memory_stats") or {}
+    detail = memory.get("stats") or {}
+    # Come `docker stats`: esclude la page cache (cgroup v1 "cache", v2 "inactive_file")
+    usage = memory.get("usage", 0) - detail.get("inactive_file", detail.get("cache", 0))
+    return max(usage, 0) / (1024 * 1024)
+
+
+class StatsSampler:
+    """Campiona lo stream `stats` del container (un'unica connessione) ogni STATS_SAMPLE_INTERVAL secondi."""
+    RECONNECT_MAX_DELAY = 60
+
+    def __init__(self, container: str, interval: int = STATS_SAMPLE_INTERVAL, retention_hours: int = STATS_RETENTION_HOURS):
+        self.container = container
+        self.interval = interval
+        self.ring = MetricRing(max(1, retention_hours * 3600 // interval))
+        self.memory_limit_mib: float | None = None
+        self._previous = None  # (monotonic, contatori cumulativi)
+        self._task = None
+        self._stream = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._stream:
+            self._stream.close()
+            self._stream = None
+
+    async def _run(self):
+        delay = 1
+        while True:
+            try:
+                self._stream = await api_stream("GET", f"/containers/{self.container}/stats?stream=1")
+                self._previous = None
+                next_sample = 0.0
+                async for line in self._stream.lines():
+                    now = time.monotonic()
+                    if now < next_sample or not line.strip():
+                        continue  # Docker emette un record al secondo: si tiene uno ogni `interval`
+                    next_sample = now + self.interval
+                    self._ingest(json.loads(line), now)
+                    delay = 1
+            except (OSError, ConnectionError, DockerAPIError, asyncio.TimeoutError, ValueError) as e:
+                logger.info(f"📈⏳ Statistiche '{self.container}' non disponibili ({e}), nuovo tentativo tra {delay}s.")
+            finally:
+                if self._stream:
+                    self._stream.close()
+                    self._stream = None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+
+    def _ingest(self, stats: dict, now: float):
+        if not stats.get("read") or not (stats.get("memory_stats") or {}).get("usage"):
+            return  # container fermo: Docker invia record vuoti
+        counters = _counters(stats)
+        sample = {"cpu": _cpu_percent(stats), "mem": _memory_mib(stats)}
+        if self._previous:
+            elapsed = now - self._previous[0]
+            for name, value in counters.items():
+                # KiB/s; un contatore che torna indietro indica un riavvio del container
+                sample[name] = max(value - self._previous[1][name], 0) / 1024 / elapsed if elapsed > 0 else 0.0
+        self._previous = (now, counters)
+        limit = (stats.get("memory_stats") or {}).get("limit")
+        if limit:
+            self.memory_limit_mib = limit / (1024 * 1024)
+        self.ring.append(time.time(), sample)
+
+
+def _downsample(points: list, width: int) -> list:
+    if len(points) <= width:
+        return points
+    bucket = len(points) / width
+    return [max(points[int(i * bucket):max(int((i + 1) * bucket), int(i * bucket) + 1)]) for i in range(width)]
+
+
+def sparkline(points: list, width: int = 40) -> str:
+    points = _downsample(points, width)
+    if not points:
+        return ""
+    low, high = min(points), max(points)
+    span = high - low or 1
+    return "".join(SPARK_CHARS[min(int((p - low) / span * (len(SPARK_CHARS) - 1) + 0.5), len(SPARK_CHARS) - 1)] for p in points)
+
+
+def render_text_report(sampler: StatsSampler, since: float) -> str:
+    lines = []
+    for name, (label, unit) in METRICS.items():
+        _, points = sampler.ring.series(name, since)
+        if not points:
+            continue
+        lines.append(f"{label} ({unit}) ora {points[-1]:.1f} · media {sum(points) / len(points):.1f} · max {max(points):.1f}")
+        lines.append(sparkline(points))
+    if sampler.memory_limit_mib:
+        lines.append(f"Limite RAM: {sampler.memory_limit_mib:.0f} MiB")
+    return "\n".join(lines)
+
+
+def render_png_chart(sampler: StatsSampler, since: float) -> bytes | None:
+    """Grafico PNG delle metriche (None se matplotlib non è installato o non ci sono campioni)."""
+    if plt is None:
+        return None
+    figure, axes = plt.subplots(3, 1, figsize=(8, 7), sharex=True)
+    groups = [("cpu",), ("mem",), ("net_rx", "net_tx", "blk_read", "blk_write")]
+    plotted = False
+    for axis, group in zip(axes, groups):
+        for name in group:
+            times, points = sampler.ring.series(name, since)
+            if not points:
+                continue
+            label, unit = METRICS[name]
+            axis.plot([datetime.fromtimestamp(t) for t in times], points, label=f"{label} ({unit})", linewidth=1)
+            plotted = True
+        if "mem" in group and sampler.memory_limit_mib:
+            axis.axhline(sampler.memory_limit_mib, color="red", linestyle="--", linewidth=0.8, label="Limite")
+        axis.grid(alpha=0.3)
+        axis.legend(loc="upper left", fontsize=8)
+    axes[-1].xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
+    figure.suptitle(f"Risorse container '{sampler.container}'")
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    if plotted:
+        figure.savefig(buffer, format="png", dpi=100)
+    plt.close(figure)
+    return buffer.getvalue() if plotted else None
+
+
+_samplers: dict[str, StatsSampler] = {}
+
+
+def get_stats_sampler(container: str = CONTAINER) -> StatsSampler:
+    if not container:
+        raise ValueError("CONTAINER non configurato per le statistiche.")
+    sampler = _samplers.get(container)
+    if sampler is None:
+        sampler = _samplers[container] = StatsSampler(container)
+    sampler.start()
+    return sampler
+
+
+async def stop_all_samplers():
+    for sampler in list(_samplers.values()):
+        await sampler.stop()
+    _samplers.clear()
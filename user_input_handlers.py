@@ -2,18 +2,20 @@ import asyncio
 import subprocess
 import html
 
-import re
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
-from config import CONTAINER, get_logger, WORLD_NAME
+from config import get_logger
+from server_registry import get_update_server
 from user_management import (
     get_minecraft_username, set_minecraft_username, save_location,
     get_locations, delete_location, users_data, save_users # Added save_users
 )
 from item_management import get_items
-from docker_utils import run_docker_command, get_online_players_from_server
+from docker_utils import get_online_players_from_server, get_player_position
+from console_session import ConsoleError
+from command_queue import enqueue_command
 from world_management import get_backups_storage_path, get_world_directory_path
 # Assuming these command handlers will be imported or called from here
 # from command_handlers import menu_command, give_direct_command, tp_direct_command, weather_direct_command, saveloc_command, paste_hologram_command
@@ -109,7 +111,9 @@ async def handle_saveloc_name_input(update: Update, context: ContextTypes.DEFAUL
         return
     context.user_data.pop("awaiting_saveloc_name", None)
 
-    if not CONTAINER:
+    server = get_update_server(update)
+
+    if not server:
         await update.message.reply_text("Impossibile salvare la posizione: CONTAINER non configurato.")
         return
     minecraft_username = get_minecraft_username(uid) # Get username here
@@ -118,50 +122,32 @@ async def handle_saveloc_name_input(update: Update, context: ContextTypes.DEFAUL
         # Consider re-prompting for username or guiding the user
         return
 
-    docker_cmd_get_pos = [
-        "docker", "exec", CONTAINER, "send-command",
-        f"execute as {minecraft_username} at @s run tp @s ~ ~ ~0.0001"
-    ]
     try:
-        logger.info(
-            f"Esecuzione per ottenere coordinate: {' '.join(docker_cmd_get_pos)}")
-        await run_docker_command(docker_cmd_get_pos, read_output=False, timeout=10)
-        await asyncio.sleep(1.0)
-
-        log_args = ["docker", "logs", "--tail", "100", CONTAINER]
-        output = await run_docker_command(log_args, read_output=True, timeout=5)
-
-        pattern = rf"Teleported {re.escape(minecraft_username)} to ([0-9\.\-]+),\s*([0-9\.\-]+),\s*([0-9\.\-]+)"
-        matches = re.findall(pattern, output)
-        if not matches:
-            pattern_bedrock = rf"Teleported {re.escape(minecraft_username)} to ([0-9\.\-]+), ([0-9\.\-]+), ([0-9\.\-]+)"
-            matches = re.findall(pattern_bedrock, output)
-
-        if not matches:
+        logger.info(f"Lettura coordinate di {minecraft_username} per /saveloc")
+        coords = await get_player_position(minecraft_username, user_id=uid, container=server.container)
+        if coords is None:
             logger.warning(
-                f"Nessuna coordinata trovata nei log per {minecraft_username} dopo /saveloc.")
-            logger.debug(f"Output log per saveloc: {output}")
+                f"Nessuna coordinata trovata per {minecraft_username} dopo /saveloc.")
             await update.message.reply_text(
-                "Impossibile trovare le coordinate nei log. Assicurati di essere in gioco, che i comandi siano abilitati e che l'output del comando 'tp' sia visibile nei log. Riprova più tardi."
+                "Impossibile trovare le coordinate. Assicurati di essere in gioco e che i comandi siano abilitati. Riprova più tardi."
             )
             return
 
-        x_str, y_str, z_str = matches[-1]
-        coords = {"x": float(x_str), "y": float(y_str), "z": float(z_str)}
-
         save_location(uid, location_name, coords)
         await update.message.reply_text(
             f"✅ Posizione '{location_name}' salvata: X={coords['x']:.2f}, Y={coords['y']:.2f}, Z={coords['z']:.2f}"
         )
     except asyncio.TimeoutError:
-        await update.message.reply_text("Timeout durante il salvataggio della posizione. Riprova.")
+        await update.message.reply_text("Il server non ha restituito le coordinate in tempo. Assicurati di essere in gioco e riprova.")
     except subprocess.CalledProcessError as e:
         await update.message.reply_text(
             f"Errore del server Minecraft durante il salvataggio: {e.stderr or e.output or e}. "
             "Potrebbe essere necessario abilitare i comandi o verificare l'username."
         )
+    except ConsoleError as e:
+        await update.message.reply_text(f"Console del server non raggiungibile: {e}")
     except ValueError as e:
-        logger.error(f"ValueError in saveloc parsing coordinates: {e} from output: {output}", exc_info=True)
+        logger.error(f"ValueError in saveloc parsing coordinates: {e}", exc_info=True)
         await update.message.reply_text(f"Errore interpretando le coordinate dai log: {str(e)}")
     except Exception as e:
         logger.error(
@@ -197,7 +183,8 @@ async def handle_give_prefix_input(update: Update, context: ContextTypes.DEFAULT
 async def handle_item_quantity_input(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
     """Handles the input for the item quantity for the /give command."""
     uid = update.effective_user.id
-    if not CONTAINER:
+    server = get_update_server(update)
+    if not server:
         await update.message.reply_text("Errore: CONTAINER non configurato per il comando give.")
         context.user_data.pop("awaiting_item_quantity", None)
         context.user_data.pop("selected_item_for_give", None)
@@ -222,9 +209,7 @@ async def handle_item_quantity_input(update: Update, context: ContextTypes.DEFAU
             return
 
         cmd_text = f"give {minecraft_username} {item_id} {quantity}"
-        docker_cmd_args = ["docker", "exec",
-                            CONTAINER, "send-command", cmd_text]
-        await run_docker_command(docker_cmd_args, read_output=False)
+        await enqueue_command(cmd_text, user_id=uid, container=server.container)
         await update.message.reply_text(f"Comando eseguito: /give {minecraft_username} {item_id} {quantity}")
 
     except ValueError as e:
@@ -241,6 +226,10 @@ async def handle_item_quantity_input(update: Update, context: ContextTypes.DEFAU
         await update.message.reply_text(f"Errore dal server Minecraft: {e.stderr or e.output or e}")
         context.user_data.pop("selected_item_for_give", None)
         context.user_data.pop("awaiting_item_quantity", None)
+    except ConsoleError as e:
+        await update.message.reply_text(f"Console del server non raggiungibile: {e}")
+        context.user_data.pop("selected_item_for_give", None)
+        context.user_data.pop("awaiting_item_quantity", None)
     except Exception as e:
         logger.error(
             f"Errore imprevisto in handle_item_quantity_input: {e}", exc_info=True)
@@ -307,10 +296,12 @@ async def handle_rp_new_position_input(update: Update, context: ContextTypes.DEF
 
         # Assuming manage_world_resource_packs_json and ResourcePackError are accessible
         from resource_pack_management import manage_world_resource_packs_json, ResourcePackError
+        server = get_update_server(update)
         manage_world_resource_packs_json(
-            WORLD_NAME,
+            server.world_name,
             pack_uuid_to_move=pack_uuid_to_move,
-            new_index_for_move=new_index
+            new_index_for_move=new_index,
+            data_path=server.data_path
         )
 
         logger.info(
@@ -338,7 +329,8 @@ async def handle_rp_new_position_input(update: Update, context: ContextTypes.DEF
 async def handle_tp_coords_input(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
     """Handles the input for teleport coordinates."""
     uid = update.effective_user.id
-    if not CONTAINER:
+    server = get_update_server(update)
+    if not server:
         await update.message.reply_text("Errore: CONTAINER non configurato per il comando teleport.")
         context.user_data.pop("awaiting_tp_coords_input", None)
         return
@@ -358,9 +350,7 @@ async def handle_tp_coords_input(update: Update, context: ContextTypes.DEFAULT_T
                 return
 
             cmd_text = f"tp {minecraft_username} {x} {y} {z}"
-            docker_cmd_args = ["docker", "exec",
-                                CONTAINER, "send-command", cmd_text]
-            await run_docker_command(docker_cmd_args, read_output=False)
+            await enqueue_command(cmd_text, user_id=uid, container=server.container)
             await update.message.reply_text(f"Comando eseguito: /tp {minecraft_username} {x} {y} {z}")
             context.user_data.pop("awaiting_tp_coords_input", None) # Clear on success
 
@@ -375,6 +365,9 @@ async def handle_tp_coords_input(update: Update, context: ContextTypes.DEFAULT_T
         except subprocess.CalledProcessError as e:
             await update.message.reply_text(f"Errore dal server Minecraft: {e.stderr or e.output or e}")
             context.user_data.pop("awaiting_tp_coords_input", None) # Clear on this error
+        except ConsoleError as e:
+            await update.message.reply_text(f"Console del server non raggiungibile: {e}")
+            context.user_data.pop("awaiting_tp_coords_input", None) # Clear on this error
         except Exception as e:
             logger.error(
                 f"Errore imprevisto in handle_tp_coords_input: {e}", exc_info=True)
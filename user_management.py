@@ -69,6 +69,17 @@ def get_minecraft_username(user_id: int) -> str | None:
     user = get_user_data(user_id)
     return user.get("minecraft_username") if user else None
 
+def get_selected_server_name(user_id: int) -> str | None:
+    user = get_user_data(user_id)
+    return user.get("server") if user else None
+
+def set_selected_server(user_id: int, server_name: str):
+    if user_id in users_data:
+        users_data[user_id]["server"] = server_name
+        save_users()
+        return True
+    return False
+
 def save_location(user_id: int, loc_name: str, coords: dict):
     if user_id in users_data:
         if "locations" not in users_data[user_id]: # Assicura che la chiave esista
@@ -117,3 +128,12 @@ def auth_required(required_permissions):
             return await func(update, context, *args, **kwargs)
         return wrapper
     return decorator
+
+def has_permission(user_id: int, permission: str) -> bool:
+    """Verifica un permesso fuori dal decoratore (es. nelle callback inline)."""
+    user_data = get_user_data(user_id)
+    auth_level = user_data.get("auth_level") if user_data else None
+    if auth_level not in AUTH_LEVELS:
+        return False
+    user_permissions = AUTH_LEVELS[auth_level]["permissions"]
+    return "*" in user_permissions or permission in user_permissions
@@ -3,6 +3,7 @@ import asyncio
 import html
 import os
 import shutil
+import time
 from datetime import datetime
 import tempfile
 
@@ -10,127 +11,351 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
-from config import CONTAINER, WORLD_NAME, get_logger
-from user_management import auth_required
+from config import BACKUP_MODE, BACKUP_FORMAT, BACKUPS_PAGE_SIZE, get_logger
+from user_management import auth_required, has_permission
 from world_management import (
-    reset_creative_flag, get_world_directory_path, get_backups_storage_path,
+    reset_creative_flag, get_world_directory_path, get_world_target_path, get_backups_storage_path,
+    get_world_level_dat_path,
 )
-from server_handlers import stop_server_command, start_server_command # Import from the new server_handlers
+from level_dat import (
+    CREATIVE_FLAG, DIFFICULTIES, GAME_MODES, LevelDatError, edit_level_dat, game_rules, preview_level_dat,
+    read_level_dat,
+)
+from server_handlers import stop_server_command, start_server_command, notify_if_busy # Import from the new server_handlers
+from server_lifecycle import get_server_lifecycle
+from server_registry import ServerContext, get_update_server
+from container_state import get_container_watcher
+from hot_backup import hot_backup, HotBackupError
+from backup_store import BackupStore, BackupStoreError, is_manifest
+from archivers import ArchiveError, directory_entries, get_archiver, benchmark_archivers
+from restore_engine import restore_world, recover_interrupted_restore
+from console_session import ConsoleError
+from backup_catalog import (
+    BackupRecord, get_backup_catalog, file_sha256, KIND_MANUAL, KIND_SCHEDULED, KIND_NAMES, VERIFY_OK, VERIFY_FAILED,
+)
+from backup_verifier import get_backup_verifier
 
 logger = get_logger(__name__)
 
 async def backup_world_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not CONTAINER or not WORLD_NAME:
+    server = get_update_server(update)
+    if not server or not server.world_name:
         await update.message.reply_text("⚠️ CONTAINER o WORLD_NAME non configurati.")
         return
-    await update.message.reply_text(f"💾⏳ Avvio backup per '{WORLD_NAME}'...")
+    mode = (context.args[0].lower() if context.args else BACKUP_MODE)
+    if mode not in ("hot", "cold"):
+        await update.message.reply_text("Uso: /backup_world [hot|cold] (hot: senza fermare il server, cold: con arresto)")
+        return
+    await notify_if_busy(update.message, server)
+    await run_backup(update, context, server, mode)
+
+async def run_backup(update: Update, context: ContextTypes.DEFAULT_TYPE, server: ServerContext,
+                     mode: str, kind: str = KIND_MANUAL) -> bool:
+    """
+    Backup hot (con ripiego cold) o cold sotto il lock del server; usato da /backup_world e
+    dallo scheduler. I backup programmati non ripiegano sull'arresto: con giocatori ancora
+    online fermerebbero il server senza che nessuno l'abbia chiesto, quindi si salta il turno.
+    """
+    async with server.exclusive("backup" if kind == KIND_MANUAL else f"backup {KIND_NAMES[kind]}"):
+        if mode == "hot" and get_container_watcher(server.container).running:
+            if await _hot_backup_world(update, server, kind):
+                return True
+            if kind == KIND_SCHEDULED:
+                await update.message.reply_text("⚠️ Backup programmato saltato: nessun ripiego sull'arresto del server.")
+                return False
+            await update.message.reply_text("↩️ Ripiego sul backup con arresto del server.")
+        return await _backup_world(update, context, server, kind)
+
+def _backup_archive_base(server: ServerContext) -> str:
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_world_name = "".join(c if c.isalnum() else "_" for c in server.world_name)
+    return os.path.join(get_backups_storage_path(server.data_path), f"{safe_world_name}_backup_{timestamp}")
+
+def _backup_size_summary(archive_path: str) -> str:
+    """Dimensione del backup: per i manifest i byte effettivamente aggiunti allo store."""
+    if is_manifest(archive_path):
+        manifest = BackupStore(os.path.dirname(archive_path)).read_manifest(os.path.basename(archive_path))
+        return (f"{manifest['new_bytes'] / (1024 * 1024):.1f} MB nuovi su "
+                f"{manifest['total_bytes'] / (1024 * 1024):.1f} MB (incrementale)")
+    return f"{os.path.getsize(archive_path) / (1024 * 1024):.1f} MB"
+
+async def _catalog_backup(server: ServerContext, archive_path: str, kind: str, mode: str,
+                          total_bytes: int, duration: float):
+    """Registra il backup appena creato nel catalogo (checksum calcolato in un thread)."""
+    try:
+        checksum = await asyncio.to_thread(file_sha256, archive_path)
+        size = None
+        if is_manifest(archive_path):
+            size = BackupStore(os.path.dirname(archive_path)).read_manifest(os.path.basename(archive_path))["new_bytes"]
+        backup_id = get_backup_catalog().add(server.name, archive_path, server.world_name, kind, mode, size_bytes=size,
+                                             total_bytes=total_bytes, checksum=checksum, duration=duration)
+        get_backup_verifier().submit(backup_id)
+    except Exception as e:
+        logger.error(f"🗂️❌ Backup {os.path.basename(archive_path)} non registrato nel catalogo: {e}", exc_info=True)
 
-    stopped_properly = await stop_server_command(update, context, quiet=True) # quiet=True per gestire messaggi qui
+async def collect_store_garbage(server: ServerContext):
+    try:
+        await asyncio.to_thread(BackupStore(get_backups_storage_path(server.data_path)).collect_garbage)
+    except (BackupStoreError, OSError) as e:
+        logger.warning(f"🗃️⚠️ GC store backup non eseguito: {e}")
+
+async def _hot_backup_world(update: Update, server: ServerContext, kind: str = KIND_MANUAL) -> bool:
+    """Backup a server avviato (save hold/query/resume). False se occorre ripiegare sull'arresto."""
+    await update.message.reply_text(f"💾⏳ Backup a caldo per '{server.world_name}' (il server resta online)...")
+    started = time.monotonic()
+    archive_base = _backup_archive_base(server)
+    if BACKUP_FORMAT == "store":
+        store = BackupStore(os.path.dirname(archive_base))
+        name = os.path.basename(archive_base)
+        archive_path = store.manifest_path(name)
+        def copy_files(worlds_dir, files, _archive_path):
+            return store.snapshot(worlds_dir, files, name, server.world_name, "hot").total_bytes
+    else:
+        try:
+            archive_path = f"{archive_base}{get_archiver(BACKUP_FORMAT).extension}"
+        except ArchiveError as e:
+            await update.message.reply_text(f"⚠️ {html.escape(str(e))}")
+            return False
+        copy_files = None
+    try:
+        result = await hot_backup(server.container, server.world_name, server.data_path, archive_path,
+                                  copy_files=copy_files, archive_format=BACKUP_FORMAT)
+    except (HotBackupError, BackupStoreError, ArchiveError, ConsoleError, asyncio.TimeoutError, OSError) as e:
+        logger.warning(f"💾⚠️ Backup a caldo di '{server.world_name}' non riuscito: {e}")
+        await update.message.reply_text(f"⚠️ Backup a caldo non riuscito: {html.escape(str(e) or 'timeout')}")
+        return False
+    await update.message.reply_text(
+        f"💾✅ Backup completato: <code>{html.escape(os.path.basename(result.archive_path))}</code>\n"
+        f"{result.files} file, {_backup_size_summary(result.archive_path)}; "
+        f"salvataggi sospesi per {result.held_seconds:.1f}s.",
+        parse_mode=ParseMode.HTML)
+    await _catalog_backup(server, result.archive_path, kind, "hot", result.total_bytes, time.monotonic() - started)
+    if BACKUP_FORMAT == "store":
+        await collect_store_garbage(server)
+    return True
+
+async def _backup_world(update: Update, context: ContextTypes.DEFAULT_TYPE, server: ServerContext, kind: str = KIND_MANUAL) -> bool:
+    await update.message.reply_text(f"💾⏳ Avvio backup per '{server.world_name}'...")
+    started = time.monotonic()
+
+    stopped_properly = await stop_server_command(update, context, quiet=True, operation="backup", server=server) # quiet=True per gestire messaggi qui
     if not stopped_properly:
         await update.message.reply_text("🛑❌ Backup annullato: server non arrestato correttamente.")
         # Tentiamo comunque un riavvio se il server era attivo
-        await _restart_server_after_action(update, context, CONTAINER, "backup (errore stop)", "tentativo riavvio post-errore")
-        return
+        await _restart_server_after_action(update, context, server, "backup (errore stop)", "tentativo riavvio post-errore")
+        return False
     await update.message.reply_text("🛑✅ Server arrestato per backup.")
 
+    try:
+        completed = await write_cold_backup(update, server, kind, started)
+    finally:
+        await _restart_server_after_action(update, context, server, "backup", "riavvio server post-backup")
+    if BACKUP_FORMAT == "store":
+        await collect_store_garbage(server)
+    return completed
 
-    await update.message.reply_text("⏳ Attesa rilascio file...")
-    await asyncio.sleep(5)
-
-    world_dir_path = get_world_directory_path(WORLD_NAME)
-    backups_storage = get_backups_storage_path()
+async def write_cold_backup(update: Update, server: ServerContext, kind: str = KIND_MANUAL,
+                            started: float | None = None) -> bool:
+    """Backup del mondo a server già fermo (store o archivio) e registrazione nel catalogo; usato anche dalla manutenzione."""
+    started = started or time.monotonic()
+    world_dir_path = get_world_directory_path(server.world_name, server.data_path)
 
     if not world_dir_path or not os.path.exists(world_dir_path):
-        await update.message.reply_text(f"🌍❓ Directory mondo '{WORLD_NAME}' non trovata. Backup annullato.")
-        await _restart_server_after_action(update, context, CONTAINER, "backup (path non trovato)", "riavvio server")
-        return
+        await update.message.reply_text(f"🌍❓ Directory mondo '{server.world_name}' non trovata. Backup annullato.")
+        return False
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    safe_world_name = "".join(c if c.isalnum() else "_" for c in WORLD_NAME)
-    archive_name_base = os.path.join(backups_storage, f"{safe_world_name}_backup_{timestamp}")
+    archive_name_base = _backup_archive_base(server)
 
     try:
-        await update.message.reply_text("🗜️ Creazione archivio zip...")
-        await asyncio.to_thread(
-            shutil.make_archive,
-            base_name=archive_name_base,
-            format='zip',
-            root_dir=os.path.dirname(world_dir_path),
-            base_dir=os.path.basename(world_dir_path)
-        )
-        final_archive_name = f"{archive_name_base}.zip"
-        await update.message.reply_text(f"💾✅ Backup completato: <code>{html.escape(os.path.basename(final_archive_name))}</code>", parse_mode=ParseMode.HTML)
+        if BACKUP_FORMAT == "store":
+            await update.message.reply_text("🗃️ Salvataggio dei file modificati nello store...")
+            store = BackupStore(os.path.dirname(archive_name_base))
+            result = await asyncio.to_thread(
+                store.snapshot_directory, world_dir_path, os.path.basename(archive_name_base), server.world_name)
+            final_archive_name, total_bytes = result.manifest_path, result.total_bytes
+        else:
+            archiver = get_archiver(BACKUP_FORMAT)
+            await update.message.reply_text(f"🗜️ Creazione archivio {archiver.extension.lstrip('.')}...")
+            final_archive_name = f"{archive_name_base}{archiver.extension}"
+            stats = await asyncio.to_thread(archiver.write, final_archive_name, directory_entries(world_dir_path))
+            logger.info(f"🗜️ {os.path.basename(final_archive_name)}: {stats.files} file, "
+                        f"{stats.throughput_mb_s:.0f} MB/s, rapporto {stats.ratio:.2f}")
+            total_bytes = stats.input_bytes
+        await update.message.reply_text(
+            f"💾✅ Backup completato: <code>{html.escape(os.path.basename(final_archive_name))}</code>\n"
+            f"{_backup_size_summary(final_archive_name)}", parse_mode=ParseMode.HTML)
+        await _catalog_backup(server, final_archive_name, kind, "cold", total_bytes, time.monotonic() - started)
+        return True
     except Exception as e:
         logger.error(f"💾❌ Errore creazione backup: {e}", exc_info=True)
         await update.message.reply_text(f"❌ Errore creazione backup: {html.escape(str(e))}")
-    finally:
-        await _restart_server_after_action(update, context, CONTAINER, "backup", "riavvio server post-backup")
+        return False
 
-async def _restart_server_after_action(update: Update, context: ContextTypes.DEFAULT_TYPE, container_name: str, action_name: str, message_prefix: str):
+async def _restart_server_after_action(update: Update, context: ContextTypes.DEFAULT_TYPE, server: ServerContext, action_name: str, message_prefix: str):
     # Usa reply_target per rispondere al messaggio originale o al callback query
     reply_target = update.message or (update.callback_query.message if update.callback_query else None)
     if not reply_target:
         logger.error(f"💬❌ Impossibile determinare target risposta per riavvio post-{action_name}")
         return
 
+    container_name = server.container
     await reply_target.reply_text(f"🚀⏳ {message_prefix} per '{container_name}'...")
-    started = await start_server_command(update, context, quiet=True) # Usa start_server_command
+    lifecycle = get_server_lifecycle(container_name)
+    started = await start_server_command(update, context, quiet=True, server=server) # Usa start_server_command
     if started:
-        await reply_target.reply_text(f"🚀✅ Server '{container_name}' (ri)avviato dopo {action_name}.")
+        status = "pronto" if lifecycle.ready else "avviato (mondo non ancora caricato, controlla /logs)"
+        timing = f"\n⏱️ {lifecycle.history[-1].summary()}" if lifecycle.history else ""
+        await reply_target.reply_text(f"🚀✅ Server '{container_name}' {status} dopo {action_name}.{timing}")
     else:
         await reply_target.reply_text(f"🚀❌ Errore (ri)avvio server '{container_name}' dopo {action_name}. Controlla /logs.")
 
 
-async def list_backups_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    backups_dir = get_backups_storage_path()
-    if not os.path.exists(backups_dir):
-        await update.message.reply_text(f"📂❓ Directory backup ({backups_dir}) non trovata.")
-        return
-    try:
-        backup_files = sorted(
-            [f for f in os.listdir(backups_dir) if f.endswith(".zip")],
-            key=lambda f: os.path.getmtime(os.path.join(backups_dir, f)),
-            reverse=True
-        )
-    except Exception as e:
-        await update.message.reply_text(f"📂❌ Errore lettura directory backup: {html.escape(str(e))}")
-        return
+def _format_size(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} MB" if size >= 1024 * 1024 else f"{size / 1024:.0f} KB"
 
-    if not backup_files:
-        await update.message.reply_text("📂ℹ️ Nessun backup .zip trovato.")
-        return
+def _verify_badge(record: BackupRecord) -> str:
+    return {VERIFY_OK: "✅", VERIFY_FAILED: "❌"}.get(record.verify_status, "⏳")
 
+def _render_backups_page(server: ServerContext, page: int, search: str) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Pagina di /list_backups letta dal catalogo; i bottoni usano l'id del backup (callback brevi)."""
+    records, total = get_backup_catalog().page(server.name, page, BACKUPS_PAGE_SIZE, search)
+    if not total:
+        suffix = f" per '{html.escape(search)}'" if search else ""
+        return f"📂ℹ️ Nessun backup trovato{suffix}.", None
+    pages = (total + BACKUPS_PAGE_SIZE - 1) // BACKUPS_PAGE_SIZE
+    header = f"📂 <b>Backup di {html.escape(server.name)}</b>"
+    if search:
+        header += f" – ricerca '<i>{html.escape(search)}</i>'"
+    lines = [f"{header} ({total}, pagina {page + 1}/{pages})"]
     buttons = []
-    for filename in backup_files[:15]:
-        cb_data_download = f"download_backup_file:{filename}"
-        cb_data_restore = f"restore_backup_file:{filename}"
-        
-        row_buttons = []
-        
-        if len(cb_data_download.encode('utf-8')) <= 64: # Limite Telegram per callback_data
-            row_buttons.append(InlineKeyboardButton(f"📥 {filename}", callback_data=cb_data_download))
-        else:
-            logger.warning(f"💾⚠️ Nome file backup '{filename}' troppo lungo per download callback.")
-        
-        if len(cb_data_restore.encode('utf-8')) <= 64: # Limite Telegram per callback_data
-            row_buttons.append(InlineKeyboardButton(f"🔄 {filename}", callback_data=cb_data_restore))
-        else:
-            logger.warning(f"💾⚠️ Nome file backup '{filename}' troppo lungo per download callback.")
-
-        if row_buttons:
-            buttons.append(row_buttons)
+    for record in records:
+        created = datetime.fromtimestamp(record.created_at)
+        lines.append(f"• {_verify_badge(record)} <code>{html.escape(record.filename)}</code> – {KIND_NAMES.get(record.kind, record.kind)}, "
+                     f"{record.format}, {_format_size(record.size_bytes)}")
+        buttons.append([InlineKeyboardButton(f"{_verify_badge(record)} {created:%d/%m %H:%M} · {_format_size(record.size_bytes)}",
+                                             callback_data=f"bk:{record.id}:{page}")])
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅️", callback_data=f"bk_page:{page - 1}"))
+    if page + 1 < pages:
+        nav.append(InlineKeyboardButton("➡️", callback_data=f"bk_page:{page + 1}"))
+    if nav:
+        buttons.append(nav)
+    return "\n".join(lines), InlineKeyboardMarkup(buttons)
+
+def _render_backup_detail(record: BackupRecord, page: int) -> tuple[str, InlineKeyboardMarkup]:
+    created = datetime.fromtimestamp(record.created_at)
+    lines = [
+        f"💾 <code>{html.escape(record.filename)}</code>",
+        f"🌍 Mondo: {html.escape(record.world)}",
+        f"🗓️ Creato: {created:%d/%m/%Y %H:%M:%S}",
+        f"🏷️ Tipo: {KIND_NAMES.get(record.kind, record.kind)}{f' ({record.mode})' if record.mode else ''}, formato {record.format}",
+        f"📦 Dimensione: {_format_size(record.size_bytes)} su {_format_size(record.total_bytes)} (rapporto {record.ratio:.2f})",
+    ]
+    if record.duration:
+        lines.append(f"⏱️ Durata: {record.duration:.1f}s")
+    if record.checksum:
+        lines.append(f"🔑 SHA-256: <code>{record.checksum[:16]}…</code>")
+    if record.verify_status:
+        verified = datetime.fromtimestamp(record.verified_at)
+        outcome = "integro" if record.verify_status == VERIFY_OK else f"danneggiato ({html.escape(record.verify_error)})"
+        lines.append(f"🔍 Verifica: {_verify_badge(record)} {outcome}, {verified:%d/%m %H:%M} in {record.verify_seconds:.1f}s")
+    else:
+        lines.append("🔍 Verifica: ⏳ non ancora eseguita")
+    buttons = [
+        [InlineKeyboardButton("📥 Scarica", callback_data=f"bk_dl:{record.id}"),
+         InlineKeyboardButton("🔄 Ripristina", callback_data=f"bk_rs:{record.id}")],
+        [InlineKeyboardButton("🔍 Verifica ora", callback_data=f"bk_vf:{record.id}:{page}")],
+        [InlineKeyboardButton("⬅️ Elenco", callback_data=f"bk_page:{page}")],
+    ]
+    return "\n".join(lines), InlineKeyboardMarkup(buttons)
 
-    if not buttons and backup_files: # Se c'erano file ma nessuno convertibile in bottone
-        await update.message.reply_text("📂⚠️ Nomi file backup troppo lunghi per bottoni diretti. Impossibile elencarli.")
+async def list_backups_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/list_backups [testo]: backup del server dal catalogo, a pagine, con ricerca opzionale."""
+    server = get_update_server(update)
+    if not server:
+        await update.message.reply_text("⚠️ Nessun server configurato.")
         return
-    elif not buttons: # Se non c'erano file adatti (o la lista era vuota fin dall'inizio, già gestito)
-        await update.message.reply_text("📂ℹ️ Nessun backup disponibile per download via bottoni.")
+    search = " ".join(context.args).strip() if context.args else ""
+    context.user_data["backups_search"] = search  # le pagine successive mantengono il filtro
+    text, markup = _render_backups_page(server, 0, search)
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML, reply_markup=markup)
+
+async def handle_backup_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, data: str):
+    """Callback dei bottoni di /list_backups: bk_page:<n>, bk:<id>:<pagina>, bk_dl:<id>, bk_rs:<id>, bk_vf:<id>:<pagina>."""
+    query = update.callback_query
+    if not has_permission(update.effective_user.id, "list_backups"):
+        await query.edit_message_text("Accesso negato: permessi insufficienti.")
+        return
+    server = get_update_server(update)
+    if not server:
+        await query.edit_message_text("⚠️ Nessun server configurato.")
+        return
+    action, _, argument = data.partition(":")
+    if action == "bk_page":
+        text, markup = _render_backups_page(server, int(argument), context.user_data.get("backups_search", ""))
+        await query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=markup)
         return
 
-    await update.message.reply_text("📂 Seleziona backup da scaricare o ripristinare (più recenti prima):", reply_markup=InlineKeyboardMarkup(buttons))
+    backup_id, _, page = argument.partition(":")
+    record = get_backup_catalog().get(int(backup_id))
+    if record is None or record.server != server.name:
+        await query.edit_message_text("❓ Backup non trovato nel catalogo del server selezionato.")
+        return
+    if not os.path.exists(record.path):
+        get_backup_catalog().delete(record.id)
+        await query.edit_message_text(f"❓ Il file <code>{html.escape(record.filename)}</code> non esiste più: "
+                                      "rimosso dal catalogo.", parse_mode=ParseMode.HTML)
+        return
+    if action == "bk":
+        text, markup = _render_backup_detail(record, int(page or 0))
+        await query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=markup)
+    elif action == "bk_dl":
+        from callback_handlers import handle_download_backup_callback
+        await handle_download_backup_callback(update, context, record.filename)
+    elif action == "bk_rs":
+        await restore_backup_command(update, context, record.filename)
+    elif action == "bk_vf":
+        await query.edit_message_text(f"🔍⏳ Verifica di <code>{html.escape(record.filename)}</code> in corso...",
+                                      parse_mode=ParseMode.HTML)
+        await get_backup_verifier().submit(record.id)
+        text, markup = _render_backup_detail(get_backup_catalog().get(record.id) or record, int(page or 0))
+        await query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=markup)
+
+async def backup_schedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/backup_schedule: pianificazione, stato e retention dei backup programmati del server."""
+    from backup_scheduler import get_backup_scheduler, RetentionPolicy
+    server = get_update_server(update)
+    if not server:
+        await update.message.reply_text("⚠️ Nessun server configurato.")
+        return
+    scheduler = get_backup_scheduler(server)
+    if scheduler is None:
+        await update.message.reply_text(
+            f"⏰ Nessun backup programmato per '{server.name}' (imposta BACKUP_SCHEDULE o \"backup_schedule\" in servers.json).")
+        return
+    now = datetime.now()
+    next_run = scheduler.schedule.next_after(now)
+    policy = RetentionPolicy()
+    scheduled = [r for r in get_backup_catalog().records(server.name) if r.kind == KIND_SCHEDULED]
+    lines = [
+        f"⏰ <b>Backup programmati di {html.escape(server.name)}</b>",
+        f"📅 Pianificazione: <code>{html.escape(scheduler.schedule.expression)}</code> (modalità {BACKUP_MODE})",
+        f"⏭️ Prossimo: {next_run:%d/%m %H:%M}" if next_run else "⏭️ Prossimo: oltre 8 giorni",
+    ]
+    if scheduler.running:
+        lines.append("🔄 Backup in corso.")
+    elif scheduler.pending_since:
+        lines.append(f"⏳ In attesa dalle {scheduler.pending_since:%H:%M}: {html.escape(scheduler.waiting_reason or 'avvio')}")
+    if scheduler.last_run:
+        lines.append(f"🕒 Ultimo: {scheduler.last_run:%d/%m %H:%M} {'✅' if scheduler.last_result else '❌'}")
+    lines.append(f"🗂️ Retention: {policy.hourly} orari, {policy.daily} giornalieri, {policy.weekly} settimanali – "
+                 f"{len(scheduled)} backup programmati, {len(scheduled) - len(policy.retained(scheduled))} da eliminare")
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
 
 async def imnotcreative_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not CONTAINER or not WORLD_NAME:
+    server = get_update_server(update)
+    if not server or not server.world_name:
         await update.message.reply_text("⚠️ CONTAINER o WORLD_NAME non configurati.")
         return
 
@@ -138,90 +363,190 @@ async def imnotcreative_command(update: Update, context: ContextTypes.DEFAULT_TY
     if user_input != "conferma":
         await update.message.reply_text(
             "🛠️ ATTENZIONE: Modifica file mondo e arresta server.\n"
-            f"Mondo target: '{WORLD_NAME}'.\n"
+            f"Mondo target: '{server.world_name}'.\n"
             "Digita `/imnotcreative conferma` per procedere.",
             parse_mode=ParseMode.HTML
         )
         return
 
-    await update.message.reply_text(f"🛠️⏳ Avvio /imnotcreative per '{WORLD_NAME}'...")
-    stopped_properly = await stop_server_command(update, context, quiet=True)
+    await notify_if_busy(update.message, server)
+    async with server.exclusive("imnotcreative"):
+        await _reset_creative(update, context, server)
+
+async def _reset_creative(update: Update, context: ContextTypes.DEFAULT_TYPE, server: ServerContext):
+    await update.message.reply_text(f"🛠️⏳ Avvio /imnotcreative per '{server.world_name}'...")
+    stopped_properly = await stop_server_command(update, context, quiet=True, operation="imnotcreative", server=server)
     if not stopped_properly:
         await update.message.reply_text("🛑❌ Operazione annullata: server non arrestato.")
-        await _restart_server_after_action(update, context, CONTAINER, "imnotcreative (errore stop)", "tentativo riavvio post-errore")
+        await _restart_server_after_action(update, context, server, "imnotcreative (errore stop)", "tentativo riavvio post-errore")
         return
     await update.message.reply_text("🛑✅ Server arrestato.")
 
-
-    await update.message.reply_text("⏳ Attesa rilascio file...")
-    await asyncio.sleep(5)
-
-    success, message = await reset_creative_flag(WORLD_NAME)
+    success, message = await reset_creative_flag(server.world_name, server.data_path)
     await update.message.reply_text(f"{'✅' if success else '⚠️'} {html.escape(message)}")
 
-    await _restart_server_after_action(update, context, CONTAINER, "imnotcreative", "riavvio server post-imnotcreative")
+    await _restart_server_after_action(update, context, server, "imnotcreative", "riavvio server post-imnotcreative")
+
+def _parse_world_settings(args: list[str]) -> tuple[dict[str, str], bool]:
+    """campo=valore ... [conferma] → ({campo: valore}, confermato)."""
+    edits, confirmed = {}, False
+    for arg in args:
+        if arg.lower() == "conferma":
+            confirmed = True
+        elif "=" in arg:
+            name, value = arg.split("=", 1)
+            edits[name.strip()] = value.strip()
+        else:
+            raise LevelDatError(f"'{arg}' non è nella forma campo=valore")
+    return edits, confirmed
+
+def _describe_world_settings(level) -> str:
+    def name_of(names: dict, value) -> str:
+        return next((name for name, number in names.items() if number == value), str(value))
+    spawn = ", ".join(str(level.get(key, "?")) for key in ("SpawnX", "SpawnY", "SpawnZ"))
+    lines = [
+        f"🌍 <b>Impostazioni di '{html.escape(str(level.get('LevelName', '?')))}'</b> (ultimo salvataggio)",
+        f"Difficoltà: <code>{name_of(DIFFICULTIES, level.get('Difficulty'))}</code>",
+        f"Modalità: <code>{name_of(GAME_MODES, level.get('GameType'))}</code>",
+        f"Spawn: <code>{spawn}</code>",
+        f"Caricato in creativa: <code>{bool(level.get(CREATIVE_FLAG, 0))}</code>",
+        f"Comandi: <code>{bool(level.get('commandsEnabled', 0))}</code>",
+        "",
+        "<b>Game rule</b>: " + ", ".join(f"{key}=<code>{value}</code>" for key, value in game_rules(level).items()),
+    ]
+    return "\n".join(lines)
+
+async def worldsettings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /worldsettings: impostazioni attuali da level.dat. /worldsettings campo=valore ...
+    mostra l'anteprima; con "conferma" applica tutte le modifiche in un solo riavvio.
+    """
+    server = get_update_server(update)
+    if not server or not server.world_name:
+        await update.message.reply_text("⚠️ CONTAINER o WORLD_NAME non configurati.")
+        return
+    level_dat_path = get_world_level_dat_path(server.world_name, server.data_path)
+    if not level_dat_path:
+        await update.message.reply_text(f"📜❓ level.dat del mondo '{server.world_name}' non trovato.")
+        return
+    try:
+        edits, confirmed = _parse_world_settings(context.args or [])
+        if not edits:
+            level = await asyncio.to_thread(read_level_dat, level_dat_path)
+            await update.message.reply_text(
+                _describe_world_settings(level) + "\n\nModifica: <code>/worldsettings difficulty=hard "
+                "keepinventory=true spawn=0,70,0 conferma</code>", parse_mode=ParseMode.HTML)
+            return
+        changes = await asyncio.to_thread(preview_level_dat, level_dat_path, edits)
+    except (LevelDatError, OSError) as e:
+        await update.message.reply_text(f"📜❌ {html.escape(str(e))}")
+        return
+    if not changes:
+        await update.message.reply_text("📜 Nessuna modifica: i valori sono già quelli richiesti.")
+        return
+    summary = "\n".join(f"• {html.escape(c.key)}: <code>{c.old}</code> → <code>{c.new}</code>" for c in changes)
+    if not confirmed:
+        await update.message.reply_text(
+            f"📜 Modifiche a level.dat di '{html.escape(server.world_name)}':\n{summary}\n\n"
+            "Il server verrà arrestato e riavviato una volta sola: aggiungi <code>conferma</code> per procedere.",
+            parse_mode=ParseMode.HTML)
+        return
+
+    await notify_if_busy(update.message, server)
+    async with server.exclusive("worldsettings"):
+        await update.message.reply_text(f"📜⏳ Applicazione di {len(changes)} modifiche a '{server.world_name}'...")
+        stopped_properly = await stop_server_command(update, context, quiet=True, operation="worldsettings", server=server)
+        if not stopped_properly:
+            await update.message.reply_text("🛑❌ Operazione annullata: server non arrestato.")
+            await _restart_server_after_action(update, context, server, "worldsettings (errore stop)", "tentativo riavvio post-errore")
+            return
+        try:
+            # Il server riscrive level.dat all'arresto: le modifiche si ricalcolano sul file appena salvato
+            applied = await asyncio.to_thread(edit_level_dat, level_dat_path, edits)
+            summary = "\n".join(f"• {html.escape(c.key)}: <code>{c.old}</code> → <code>{c.new}</code>" for c in applied)
+            await update.message.reply_text(f"📜✅ level.dat aggiornato:\n{summary or 'nessuna modifica necessaria'}",
+                                            parse_mode=ParseMode.HTML)
+        except (LevelDatError, OSError) as e:
+            logger.error(f"📜❌ Modifica di level.dat per '{server.world_name}' non riuscita: {e}", exc_info=True)
+            await update.message.reply_text(f"📜❌ level.dat invariato: {html.escape(str(e))}")
+        finally:
+            await _restart_server_after_action(update, context, server, "worldsettings", "riavvio server post-worldsettings")
 
 async def restore_backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE, filename: str):
     message = update.message or update.callback_query.message
-    if not CONTAINER or not WORLD_NAME:
+    server = get_update_server(update)
+    if not server or not server.world_name:
         await message.reply_text("⚠️ CONTAINER o WORLD_NAME non configurati.")
         return
-    
-    await message.reply_text(f"🔄⏳ Avvio ripristino backup '{filename}' per '{WORLD_NAME}'...")
+    await notify_if_busy(message, server)
+    async with server.exclusive("ripristino"):
+        await _restore_backup(update, context, server, filename)
 
-    stopped_properly = await stop_server_command(update, context, quiet=True)
+async def _restore_backup(update: Update, context: ContextTypes.DEFAULT_TYPE, server: ServerContext, filename: str):
+    message = update.message or update.callback_query.message
+    await message.reply_text(f"🔄⏳ Avvio ripristino backup '{filename}' per '{server.world_name}'...")
+
+    stopped_properly = await stop_server_command(update, context, quiet=True, operation="ripristino", server=server)
     if not stopped_properly:
         await message.reply_text("🛑❌ Ripristino annullato: server non arrestato correttamente.")
-        await _restart_server_after_action(update, context, CONTAINER, "restore (errore stop)", "tentativo riavvio post-errore")
+        await _restart_server_after_action(update, context, server, "restore (errore stop)", "tentativo riavvio post-errore")
         return
     await message.reply_text("🛑✅ Server arrestato per ripristino.")
 
-    await message.reply_text("⏳ Attesa rilascio file...")
-    await asyncio.sleep(5)
+    world_dir_path = get_world_target_path(server.world_name, server.data_path)
+    backup_file_path = os.path.join(get_backups_storage_path(server.data_path), filename)
 
-    world_dir_path = get_world_directory_path(WORLD_NAME)
-    backups_storage = get_backups_storage_path()
-    backup_file_path = os.path.join(backups_storage, filename)
-
-    if not world_dir_path or not os.path.exists(world_dir_path):
-        await message.reply_text(f"🌍❓ Directory mondo '{WORLD_NAME}' non trovata. Ripristino annullato.")
-        await _restart_server_after_action(update, context, CONTAINER, "restore (path non trovato)", "riavvio server")
-        return
-    
     if not os.path.exists(backup_file_path):
         await message.reply_text(f"💾❓ File backup '{filename}' non trovato. Ripristino annullato.")
-        await _restart_server_after_action(update, context, CONTAINER, "restore (backup non trovato)", "riavvio server")
+        await _restart_server_after_action(update, context, server, "restore (backup non trovato)", "riavvio server")
         return
 
     try:
-        await message.reply_text(f"🔄 Estrazione archivio '{filename}' in area temporanea...")
-        # Create a temporary directory
-        temp_dir = tempfile.mkdtemp(dir=os.path.dirname(world_dir_path), prefix="restore_temp_")
-        # Extract the backup to the temporary directory
-        shutil.unpack_archive(backup_file_path, temp_dir)
-
-        await message.reply_text(f"🔄 Spostamento mondo ripristinato in posizione originale...")
-        # Remove existing world directory
-        shutil.rmtree(world_dir_path)
-        # Rename the extracted directory to the original world name
-        extracted_path = temp_dir
-        extracted_dir = os.path.join(extracted_path, os.listdir(extracted_path)[0])
-
-        # Check if the extracted directory has the same name as the world directory
-        if os.path.basename(extracted_dir) != os.path.basename(world_dir_path):
-            logger.warning(f"🔄⚠️ La directory estratta '{os.path.basename(extracted_dir)}' non corrisponde al nome del mondo '{os.path.basename(world_dir_path)}'. Tentativo di correzione...")
-            new_extracted_dir = os.path.join(extracted_path, os.path.basename(world_dir_path))
-            os.rename(extracted_dir, new_extracted_dir)
-            extracted_dir = new_extracted_dir
-        os.rename(extracted_dir, world_dir_path)
-
-        # Clean up the temporary directory
-        shutil.rmtree(temp_dir)
-
-        await message.reply_text(f"🔄✅ Ripristino completato da: <code>{html.escape(filename)}</code>", parse_mode=ParseMode.HTML)
+        await asyncio.to_thread(recover_interrupted_restore, world_dir_path)
+        await message.reply_text(f"🔄 Confronto di '{filename}' con il mondo attuale e verifica dei checksum...")
+        result = await asyncio.to_thread(restore_world, backup_file_path, world_dir_path)
+        await message.reply_text(
+            f"🔄✅ Ripristino completato da: <code>{html.escape(filename)}</code>\n"
+            f"{result.rewritten} file riscritti ({result.bytes_written / (1024 * 1024):.1f} MB), "
+            f"{result.unchanged} invariati, {result.removed} rimossi in {result.seconds:.1f}s.",
+            parse_mode=ParseMode.HTML)
 
     except Exception as e:
+        # Il mondo attuale viene sostituito solo a staging completo: qui è ancora intatto
         logger.error(f"🔄❌ Errore durante il ripristino del backup '{filename}': {e}", exc_info=True)
-        await message.reply_text(f"❌ Errore durante il ripristino del backup: {html.escape(str(e))}")
+        await message.reply_text(f"❌ Errore durante il ripristino del backup (mondo attuale invariato): {html.escape(str(e))}")
     finally:
-        await _restart_server_after_action(update, context, CONTAINER, "restore", "riavvio server post-restore")
+        await _restart_server_after_action(update, context, server, "restore", "riavvio server post-restore")
+
+async def backup_bench_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    server = get_update_server(update)
+    if not server or not server.world_name:
+        await update.message.reply_text("⚠️ CONTAINER o WORLD_NAME non configurati.")
+        return
+    world_dir_path = get_world_directory_path(server.world_name, server.data_path)
+    if not world_dir_path or not os.path.exists(world_dir_path):
+        await update.message.reply_text(f"🌍❓ Directory mondo '{server.world_name}' non trovata.")
+        return
+
+    await notify_if_busy(update.message, server)
+    async with server.exclusive("benchmark backup"):
+        await update.message.reply_text(f"⏱️ Benchmark archiviatori su '{server.world_name}' (il server resta online)...")
+        work_dir = tempfile.mkdtemp(dir=get_backups_storage_path(server.data_path), prefix=".bench_")
+        try:
+            results = await asyncio.to_thread(benchmark_archivers, world_dir_path, work_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = next((stats for name, stats in results if name == "zip-legacy" and not isinstance(stats, str)), None)
+    lines = [f"⏱️ <b>Benchmark backup</b> – {html.escape(server.world_name)}"]
+    for name, stats in results:
+        if isinstance(stats, str):
+            lines.append(f"• <b>{name}</b>: errore ({html.escape(stats)})")
+            continue
+        speedup = f", x{baseline.seconds / stats.seconds:.1f}" if baseline and stats.seconds else ""
+        lines.append(
+            f"• <b>{name}</b>: {stats.seconds:.1f}s, {stats.throughput_mb_s:.0f} MB/s, "
+            f"{stats.output_bytes / (1024 * 1024):.1f} MB (rapporto {stats.ratio:.2f}{speedup})")
+    if results and not isinstance(results[0][1], str):
+        lines.append(f"<i>{results[0][1].files} file, {results[0][1].input_bytes / (1024 * 1024):.1f} MB letti.</i>")
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
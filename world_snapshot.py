@@ -0,0 +1,191 @@
+# minecraft_telegram_bot/world_snapshot.py
+import asyncio
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+
+from config import WORLD_SNAPSHOT_MAX_AGE, get_logger
+from leveldb_reader import LevelDB, LevelDBError
+
+logger = get_logger(__name__)
+
+SNAPSHOT_PREFIX = ".snapshot_"
+_TABLE_SUFFIXES = (".ldb", ".sst")
+# File del mondo letti dai lettori offline oltre a db/ (copiati: il server li riscrive)
+_WORLD_FILES = ("level.dat", "levelname.txt")
+# File di db/ che non servono a chi legge (e LOCK non va mai condiviso)
+_SKIPPED_DB_FILES = ("LOCK", "LOG", "LOG.old")
+_ATTEMPTS = 3
+
+
+class SnapshotError(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class WorldSnapshot:
+    world_dir: str
+    path: str
+    created: float
+    linked_bytes: int
+    copied_bytes: int
+    refs: int = 0
+
+
+def _link_or_copy(source: str, target: str):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _build_snapshot(world_dir: str, target: str) -> tuple[int, int]:
+    """
+    Vista coerente di un mondo anche a server acceso: prima i file mutabili (log,
+    CURRENT, MANIFEST), poi hard link alle tabelle, che LevelDB non modifica mai. Se una
+    compattazione elimina nel frattempo una tabella citata dal MANIFEST copiato, la
+    verifica finale fallisce e il chiamante riprova.
+    """
+    source_db, target_db = os.path.join(world_dir, "db"), os.path.join(target, "db")
+    os.makedirs(target_db)
+    linked = copied = 0
+    names = os.listdir(source_db)
+    mutable = sorted(n for n in names if n.endswith(".log")) + ["CURRENT"]
+    with open(os.path.join(source_db, "CURRENT")) as f:
+        mutable.append(f.read().strip())
+    for name in mutable:
+        shutil.copyfile(os.path.join(source_db, name), os.path.join(target_db, name))
+        copied += os.path.getsize(os.path.join(target_db, name))
+    for name in os.listdir(source_db):
+        if name in mutable or name in _SKIPPED_DB_FILES or name.startswith("MANIFEST-"):
+            continue
+        source = os.path.join(source_db, name)
+        try:
+            if name.endswith(_TABLE_SUFFIXES):
+                _link_or_copy(source, os.path.join(target_db, name))
+                linked += os.path.getsize(source)
+            elif os.path.isfile(source):
+                shutil.copyfile(source, os.path.join(target_db, name))
+                copied += os.path.getsize(source)
+        except FileNotFoundError:
+            continue  # tabella compattata durante la copia: se serviva lo dice la verifica
+    for name in _WORLD_FILES:
+        source = os.path.join(world_dir, name)
+        if os.path.exists(source):
+            shutil.copyfile(source, os.path.join(target, name))
+            copied += os.path.getsize(source)
+
+    with LevelDB(target_db) as db:
+        for number in db.tables:
+            db.table_path(number)
+    return linked, copied
+
+
+class WorldSnapshotManager:
+    """
+    Snapshot dei mondi per i lettori offline (ricerca armor stand, script Amulet): le
+    tabelle .ldb sono hard link e solo i file mutabili vengono copiati, quindi uno
+    snapshot costa pochi MB invece dell'intero mondo. Gli snapshot hanno un contatore di
+    riferimenti: lettori concorrenti entro WORLD_SNAPSHOT_MAX_AGE secondi condividono lo
+    stesso, che viene eliminato quando l'ultimo lo rilascia.
+    """
+
+    def __init__(self, max_age: float = WORLD_SNAPSHOT_MAX_AGE):
+        self.max_age = max_age
+        self._snapshots: dict[str, WorldSnapshot] = {}  # world_dir → snapshot condivisibile
+        self._lock = threading.Lock()  # acquire/release girano anche in asyncio.to_thread
+        self._cleaned: set[str] = set()
+
+    def _remove_leftovers(self, worlds_dir: str):
+        """Snapshot rimasti da un'esecuzione precedente interrotta."""
+        if worlds_dir in self._cleaned:
+            return
+        self._cleaned.add(worlds_dir)
+        for name in os.listdir(worlds_dir):
+            if name.startswith(SNAPSHOT_PREFIX):
+                shutil.rmtree(os.path.join(worlds_dir, name), ignore_errors=True)
+                logger.info(f"📸🧹 Rimosso snapshot orfano {name}")
+
+    def acquire(self, world_dir: str) -> WorldSnapshot:
+        world_dir = os.path.normpath(world_dir)
+        with self._lock:
+            snapshot = self._snapshots.get(world_dir)
+            if snapshot and time.time() - snapshot.created <= self.max_age:
+                snapshot.refs += 1
+                return snapshot
+            worlds_dir, world_name = os.path.split(world_dir)
+            self._remove_leftovers(worlds_dir)
+            started = time.monotonic()
+            for attempt in range(1, _ATTEMPTS + 1):
+                path = os.path.join(worlds_dir, f"{SNAPSHOT_PREFIX}{world_name}_{uuid.uuid4().hex[:8]}")
+                try:
+                    linked, copied = _build_snapshot(world_dir, path)
+                    break
+                except (OSError, LevelDBError) as e:
+                    shutil.rmtree(path, ignore_errors=True)
+                    if attempt == _ATTEMPTS:
+                        raise SnapshotError(f"Snapshot di '{world_name}' non riuscito: {e}") from e
+                    logger.warning(f"📸⚠️ Snapshot di '{world_name}' da ripetere (tentativo {attempt}): {e}")
+            # Uno snapshot scaduto ancora in uso resta a chi lo tiene e sparisce al suo rilascio
+            snapshot = self._snapshots[world_dir] = WorldSnapshot(world_dir, path, time.time(), linked, copied, refs=1)
+        logger.info(f"📸 Snapshot di '{world_name}' in {time.monotonic() - started:.2f}s: "
+                    f"{linked} byte in hard link, {copied} copiati.")
+        return snapshot
+
+    def release(self, snapshot: WorldSnapshot):
+        with self._lock:
+            snapshot.refs -= 1
+            if snapshot.refs > 0:
+                return
+            if self._snapshots.get(snapshot.world_dir) is snapshot:
+                del self._snapshots[snapshot.world_dir]
+        shutil.rmtree(snapshot.path, ignore_errors=True)
+
+    def clear(self):
+        with self._lock:
+            snapshots, self._snapshots = list(self._snapshots.values()), {}
+        for snapshot in snapshots:
+            shutil.rmtree(snapshot.path, ignore_errors=True)
+
+
+_manager: WorldSnapshotManager | None = None
+
+
+def get_world_snapshots() -> WorldSnapshotManager:
+    global _manager
+    if _manager is None:
+        _manager = WorldSnapshotManager()
+    return _manager
+
+
+def stop_world_snapshots():
+    global _manager
+    if _manager is not None:
+        _manager.clear()
+        _manager = None
+
+
+@contextmanager
+def world_snapshot(world_dir: str):
+    """Percorso di uno snapshot del mondo, valido fino all'uscita dal blocco (sola lettura)."""
+    manager = get_world_snapshots()
+    snapshot = manager.acquire(world_dir)
+    try:
+        yield snapshot.path
+    finally:
+        manager.release(snapshot)
+
+
+@asynccontextmanager
+async def async_world_snapshot(world_dir: str):
+    """Come world_snapshot, con creazione ed eliminazione fuori dall'event loop."""
+    manager = get_world_snapshots()
+    snapshot = await asyncio.to_thread(manager.acquire, world_dir)
+    try:
+        yield snapshot.path
+    finally:
+        await asyncio.to_thread(manager.release, snapshot)